@@ -0,0 +1,530 @@
+"""
+API请求执行引擎
+统一处理变量替换（见 templating）、请求准备、发送、断言和请求历史保存，
+接口调试、测试套件执行和定时任务都通过该引擎执行请求。
+
+传输方式:
+    sync   - 每个请求单独建立连接（与 requests.request 行为一致）
+    pooled - 共享连接池的会话，同一主机复用 keep-alive 连接，按并发数用线程池发送
+    async  - 基于 httpx.AsyncClient，在事件循环中并发发送同一批次的请求
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+
+import httpx
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .history import RequestHistoryWriter, build_response_data
+from .models import RequestHistory, TestExecution
+from .templating import get_compiled_request, get_environment_variables
+from .utils import execute_assertions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+
+
+def prepare_request(api_request, variables):
+    """根据扁平化的环境变量渲染请求，返回值与 RequestHistory.request_data 的结构一致"""
+    return get_compiled_request(api_request).render(variables)
+
+
+def build_execution_stages(suite_requests):
+    """按依赖关系把套件请求切分为批次
+
+    依赖前序请求的请求会开启新批次，保证它在之前的所有请求完成后才执行。
+    返回 [[(index, suite_request), ...], ...]，index 为请求在套件中的位置。
+    """
+    stages = []
+    for index, suite_request in enumerate(suite_requests):
+        if not stages or suite_request.depends_on_previous:
+            stages.append([])
+        stages[-1].append((index, suite_request))
+    return stages
+
+
+def resolve_concurrency(concurrency, default=1):
+    """解析并发数，限制在 1 到 API_TESTING_SUITE_MAX_CONCURRENCY 之间"""
+    if concurrency in (None, ''):
+        concurrency = default
+    try:
+        concurrency = int(concurrency)
+    except (TypeError, ValueError):
+        concurrency = 1
+    upper_limit = getattr(settings, 'API_TESTING_SUITE_MAX_CONCURRENCY', 16)
+    return max(1, min(concurrency, upper_limit))
+
+
+def parse_bool(value):
+    """解析请求参数中的布尔值（"false"、"0" 等字符串为 False），未传入时返回 None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+class SyncTransport:
+    """同步传输，每个请求单独建立连接"""
+    name = 'sync'
+
+    def __init__(self, pool_size=1, timeout=DEFAULT_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+    def _request(self, prepared):
+        return requests.request(
+            method=prepared['method'],
+            url=prepared['url'],
+            headers=prepared['headers'],
+            params=prepared['params'],
+            json=prepared['body'],
+            timeout=self.timeout
+        )
+
+    def send(self, prepared):
+        """发送单个请求，返回 (response, 响应时间ms)"""
+        start_time = time.time()
+        response = self._request(prepared)
+        return response, (time.time() - start_time) * 1000
+
+    def _send_safely(self, prepared):
+        try:
+            response, response_time = self.send(prepared)
+            return response, response_time, None
+        except Exception as e:
+            return None, None, e
+
+    def send_many(self, prepared_list):
+        """发送一批相互独立的请求，返回与输入顺序一致的 [(response, 响应时间ms, 异常)]"""
+        return [self._send_safely(prepared) for prepared in prepared_list]
+
+    def close(self):
+        pass
+
+
+class PooledTransport(SyncTransport):
+    """连接池传输，同一主机复用 keep-alive 连接，pool_size > 1 时用线程池并发发送"""
+    name = 'pooled'
+
+    def __init__(self, pool_size=1, timeout=DEFAULT_TIMEOUT):
+        super().__init__(pool_size, timeout)
+        self.session = requests.Session()
+        # 不保存 Cookie，保持各请求之间相互隔离
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size) if pool_size > 1 else None
+
+    def _request(self, prepared):
+        return self.session.request(
+            method=prepared['method'],
+            url=prepared['url'],
+            headers=prepared['headers'],
+            params=prepared['params'],
+            json=prepared['body'],
+            timeout=self.timeout
+        )
+
+    def send_many(self, prepared_list):
+        if self.executor is None or len(prepared_list) < 2:
+            return super().send_many(prepared_list)
+        return list(self.executor.map(self._send_safely, prepared_list))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.session.close()
+
+
+class AsyncTransport(SyncTransport):
+    """异步传输，所有批次在同一个事件循环中通过同一个 httpx.AsyncClient 并发发送，批次之间复用 keep-alive 连接"""
+    name = 'async'
+
+    def __init__(self, pool_size=1, timeout=DEFAULT_TIMEOUT):
+        super().__init__(pool_size, timeout)
+        self._loop = None
+        self._client = None
+
+    def _ensure_client(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            # 与 requests 一致，自动跟随重定向
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True)
+        return self._loop
+
+    def send(self, prepared):
+        response, response_time, error = self.send_many([prepared])[0]
+        if error is not None:
+            raise error
+        return response, response_time
+
+    def send_many(self, prepared_list):
+        return self._ensure_client().run_until_complete(self._send_all(prepared_list))
+
+    async def _send_all(self, prepared_list):
+        semaphore = asyncio.Semaphore(self.pool_size)
+        client = self._client
+
+        async def send_one(prepared):
+            async with semaphore:
+                try:
+                    start_time = time.time()
+                    response = await client.request(
+                        prepared['method'],
+                        prepared['url'],
+                        headers=prepared['headers'],
+                        params=prepared['params'],
+                        json=prepared['body']
+                    )
+                    return response, (time.time() - start_time) * 1000, None
+                except Exception as e:
+                    return None, None, e
+
+        return await asyncio.gather(*(send_one(prepared) for prepared in prepared_list))
+
+    def close(self):
+        if self._loop is None:
+            return
+        loop, self._loop = self._loop, None
+        try:
+            loop.run_until_complete(self._client.aclose())
+        finally:
+            self._client = None
+            loop.close()
+
+
+TRANSPORTS = {
+    SyncTransport.name: SyncTransport,
+    PooledTransport.name: PooledTransport,
+    AsyncTransport.name: AsyncTransport,
+}
+
+
+def create_transport(name=None, pool_size=1, timeout=DEFAULT_TIMEOUT):
+    """根据名称创建传输方式，未指定时使用 API_TESTING_DEFAULT_TRANSPORT"""
+    name = name or getattr(settings, 'API_TESTING_DEFAULT_TRANSPORT', PooledTransport.name)
+    if name not in TRANSPORTS:
+        raise ValueError(f"未知的传输方式: {name}，可选值: {', '.join(TRANSPORTS)}")
+    return TRANSPORTS[name](pool_size=pool_size, timeout=timeout)
+
+
+class ApiExecutionEngine:
+    """API请求执行引擎
+
+    用法:
+        with ApiExecutionEngine(environment, user, transport='pooled', concurrency=4) as engine:
+            result = engine.run_suite(test_suite)
+
+    profile=True 时记录每个请求在准备、发送、断言、保存各阶段的耗时，
+    结果项中附带 profile 字段，并通过 profile_summary() 汇总。
+    """
+
+    PROFILE_PHASES = ('prepare', 'send', 'assert', 'save')
+
+    def __init__(self, environment=None, executed_by=None, transport=None, concurrency=1, profile=None):
+        self.environment = environment
+        self.executed_by = executed_by
+        self.variables = get_environment_variables(environment)
+        self.concurrency = resolve_concurrency(concurrency)
+        if transport is None or isinstance(transport, str):
+            transport = create_transport(transport, pool_size=self.concurrency)
+        self.transport = transport
+        profile = parse_bool(profile)
+        if profile is None:
+            profile = getattr(settings, 'API_TESTING_PROFILE', False)
+        self.profile = bool(profile)
+        self.profile_totals = defaultdict(float)
+        self.profile_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self):
+        self.transport.close()
+
+    # ---------------- 执行 ----------------
+
+    def execute(self, api_request, suite_assertions=None):
+        """执行单个请求，返回执行结果（不保存请求历史）"""
+        return self.execute_many([(api_request, suite_assertions)])[0]
+
+    def execute_many(self, items):
+        """执行一批相互独立的请求
+
+        items 为 [(api_request, suite_assertions)]，返回与输入顺序一致的执行结果列表。
+        """
+        outcomes = []
+        to_send = []
+        for api_request, suite_assertions in items:
+            outcome = {
+                'api_request': api_request,
+                'suite_assertions': suite_assertions or [],
+                'request_data': None,
+                'response': None,
+                'response_time': None,
+                'assertions_results': [],
+                'passed': False,
+                'error': '',
+                'exception': None,
+                'profile': {phase: 0.0 for phase in self.PROFILE_PHASES},
+            }
+            started = time.perf_counter()
+            try:
+                outcome['request_data'] = prepare_request(api_request, self.variables)
+                to_send.append(outcome)
+            except Exception as e:
+                outcome['exception'] = e
+                outcome['error'] = str(e)
+            outcome['profile']['prepare'] = (time.perf_counter() - started) * 1000
+            outcomes.append(outcome)
+
+        started = time.perf_counter()
+        sent = self.transport.send_many([outcome['request_data'] for outcome in to_send])
+        send_elapsed = (time.perf_counter() - started) * 1000
+
+        for outcome, (response, response_time, error) in zip(to_send, sent):
+            outcome['profile']['send'] = response_time if response_time is not None else send_elapsed
+            if error is not None:
+                outcome['exception'] = error
+                outcome['error'] = str(error)
+                continue
+            outcome['response'] = response
+            outcome['response_time'] = response_time
+            started = time.perf_counter()
+            try:
+                self._evaluate(outcome)
+            except Exception as e:
+                outcome['exception'] = e
+                outcome['passed'] = False
+                outcome['error'] = str(e)
+            outcome['profile']['assert'] = (time.perf_counter() - started) * 1000
+
+        return outcomes
+
+    def _evaluate(self, outcome):
+        """执行接口断言和套件断言"""
+        api_request = outcome['api_request']
+        response = outcome['response']
+
+        # 响应时间断言需要实际响应时间
+        assertions = api_request.assertions or []
+        for assertion in assertions:
+            if assertion.get('type') == 'response_time':
+                assertion['actual_time'] = outcome['response_time']
+        assertions_results = execute_assertions(response, assertions)
+
+        passed = True
+        error_message = ''
+
+        # 检查套件请求的断言
+        for assertion in outcome['suite_assertions']:
+            if assertion.get('type') == 'status_code':
+                expected = assertion.get('value')
+                if response.status_code != expected:
+                    passed = False
+                    error_message = f'状态码断言失败: 期望 {expected}, 实际 {response.status_code}'
+                    break
+
+        # 检查接口自身的断言
+        if passed and assertions_results:
+            for assertion_result in assertions_results:
+                if not assertion_result.get('passed', True):
+                    passed = False
+                    error_message = f"断言失败: {assertion_result.get('name', '未命名断言')} - {assertion_result.get('error', '断言不通过')}"
+                    break
+
+        outcome['assertions_results'] = assertions_results
+        outcome['passed'] = passed
+        outcome['error'] = error_message
+
+    # ---------------- 结果与历史 ----------------
+
+    def build_result(self, outcome):
+        """生成 TestExecution.results 中的结果项"""
+        api_request = outcome['api_request']
+        if outcome['exception'] is not None:
+            result = {
+                'name': api_request.name,
+                'method': api_request.method,
+                'url': api_request.url,
+                'passed': False,
+                'error': outcome['error']
+            }
+        else:
+            result = {
+                'name': api_request.name,
+                'method': api_request.method,
+                'url': outcome['request_data']['url'],
+                'status_code': outcome['response'].status_code,
+                'response_time': outcome['response_time'],
+                'passed': outcome['passed'],
+                'error': outcome['error'],
+                'assertions_results': outcome['assertions_results']
+            }
+        if self.profile:
+            result['profile'] = {phase: round(value, 3) for phase, value in outcome['profile'].items()}
+        return result
+
+    def build_history(self, outcome):
+        """生成未保存的请求历史记录"""
+        api_request = outcome['api_request']
+        if outcome['response'] is None:
+            # 请求未成功发送时记录原始请求数据和错误信息
+            return RequestHistory(
+                request=api_request,
+                environment=self.environment,
+                request_data=outcome['request_data'] or {
+                    'url': api_request.url,
+                    'method': api_request.method,
+                    'headers': api_request.headers,
+                    'params': api_request.params,
+                    'body': api_request.body
+                },
+                error_message=outcome['error'],
+                executed_by=self.executed_by
+            )
+
+        response = outcome['response']
+        response_data = build_response_data(response)
+        return RequestHistory(
+            request=api_request,
+            environment=self.environment,
+            request_data=outcome['request_data'],
+            response_data=response_data,
+            body_ref=response_data.get('body_ref', ''),
+            status_code=response.status_code,
+            response_time=outcome['response_time'],
+            assertions_results=outcome['assertions_results'],
+            executed_by=self.executed_by
+        )
+
+    def save_history(self, outcome, writer=None):
+        """保存请求历史，传入 writer 时交给批量写入器缓存写入"""
+        started = time.perf_counter()
+        history = self.build_history(outcome)
+        if writer is None:
+            history.save()
+            outcome['profile']['save'] = (time.perf_counter() - started) * 1000
+        else:
+            flush_time_before = writer.flush_time_ms
+            writer.add(history)
+            # 批量写入的耗时在套件结束时统一计入
+            outcome['profile']['save'] = (
+                (time.perf_counter() - started) * 1000 - (writer.flush_time_ms - flush_time_before)
+            )
+        self._record_profile(outcome)
+        return history
+
+    def _record_profile(self, outcome):
+        if not self.profile:
+            return
+        self.profile_count += 1
+        for phase, value in outcome['profile'].items():
+            self.profile_totals[phase] += value
+
+    def profile_summary(self):
+        """汇总各阶段耗时(ms)"""
+        count = self.profile_count or 1
+        return {
+            'requests': self.profile_count,
+            'transport': self.transport.name,
+            'concurrency': self.concurrency,
+            'total_ms': {phase: round(self.profile_totals[phase], 3) for phase in self.PROFILE_PHASES},
+            'avg_ms': {phase: round(self.profile_totals[phase] / count, 3) for phase in self.PROFILE_PHASES},
+        }
+
+    # ---------------- 测试套件 ----------------
+
+    def run_suite(self, test_suite):
+        """执行测试套件并返回结果
+
+        相互独立的请求按批次并发执行，标记为依赖前序请求的请求会等待之前的请求全部完成。
+        请求历史通过 RequestHistoryWriter 批量写入；请求发送失败时不记录请求历史，只在结果中记录错误。
+        """
+        execution = None
+        try:
+            # 创建执行记录
+            execution = TestExecution.objects.create(
+                test_suite=test_suite,
+                status='RUNNING',
+                start_time=timezone.now(),
+                executed_by=self.executed_by
+            )
+
+            # 获取套件中的请求
+            suite_requests = list(
+                test_suite.testsuiterequest_set.filter(enabled=True).select_related('request').order_by('order')
+            )
+
+            execution.total_requests = len(suite_requests)
+            execution.save()
+
+            results = [None] * len(suite_requests)
+            passed_count = 0
+            failed_count = 0
+
+            # 请求历史批量写入，中途出错时也会写入已缓存的记录
+            with RequestHistoryWriter() as writer:
+                for stage in build_execution_stages(suite_requests):
+                    outcomes = self.execute_many([
+                        (suite_request.request, suite_request.assertions) for _, suite_request in stage
+                    ])
+                    # 数据库写入统一在当前线程完成
+                    for (index, _), outcome in zip(stage, outcomes):
+                        if outcome['response'] is not None:
+                            self.save_history(outcome, writer)
+                        else:
+                            self._record_profile(outcome)
+                        results[index] = self.build_result(outcome)
+                        if results[index]['passed']:
+                            passed_count += 1
+                        else:
+                            failed_count += 1
+            if self.profile:
+                self.profile_totals['save'] += writer.flush_time_ms
+
+            # 更新执行结果
+            execution.end_time = timezone.now()
+            execution.passed_requests = passed_count
+            execution.failed_requests = failed_count
+            execution.status = 'COMPLETED' if failed_count == 0 else 'FAILED'
+            execution.results = results
+            execution.save()
+
+            result = {
+                'success': True,
+                'execution_id': execution.id,
+                'passed_count': passed_count,
+                'failed_count': failed_count,
+                'total_count': execution.total_requests,
+                'results': results
+            }
+            if self.profile:
+                result['profile'] = self.profile_summary()
+                logger.info(f"测试套件 {test_suite.name} 执行耗时分布: {result['profile']}")
+            return result
+
+        except Exception as e:
+            if execution is not None:
+                execution.status = 'FAILED'
+                execution.end_time = timezone.now()
+                execution.save()
+            return {
+                'success': False,
+                'execution_id': execution.id if execution is not None else None,
+                'error': str(e)
+            }
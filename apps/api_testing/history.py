@@ -0,0 +1,165 @@
+"""
+请求历史的存储
+- 响应体存储策略: 不超过 API_TESTING_HISTORY_INLINE_BODY_LIMIT 字节的响应体直接保存在 response_data 中；
+  超过阈值的只保存预览，完整内容 gzip 压缩后按 sha256 存放在 MEDIA_ROOT 下，相同内容只存一份。
+  解析后的 JSON 不再重复保存，需要时通过 get_full_body/parse_json_body 按需获取。
+- 批量写入: 测试套件执行期间把请求历史缓存在内存中，达到 flush_size 或套件结束时用 bulk_create 批量写入，
+  避免每个请求单独往返数据库。作为上下文管理器使用时，即使执行中途出错也会写入已缓存的记录。
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+from .models import RequestHistory
+
+logger = logging.getLogger(__name__)
+
+
+def _body_store_root():
+    return os.path.join(settings.MEDIA_ROOT, getattr(settings, 'API_TESTING_HISTORY_BODY_DIR', 'request_history_bodies'))
+
+
+def _body_path(body_ref):
+    return os.path.join(_body_store_root(), body_ref[:2], f'{body_ref}.gz')
+
+
+def store_body(content):
+    """按内容哈希保存响应体(bytes)，返回引用；相同内容只写入一次"""
+    body_ref = hashlib.sha256(content).hexdigest()
+    path = _body_path(body_ref)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再重命名，避免并发写入时读到不完整的文件
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw_file, gzip.GzipFile(fileobj=raw_file, mode='wb') as gzip_file:
+                gzip_file.write(content)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return body_ref
+
+
+def load_body(body_ref):
+    """读取外部存储的响应体"""
+    with gzip.open(_body_path(body_ref), 'rb') as gzip_file:
+        return gzip_file.read().decode('utf-8', errors='replace')
+
+
+def remove_unreferenced_bodies(body_refs):
+    """删除不再被请求历史引用的外部响应体文件，返回释放的字节数"""
+    # 一次查询找出仍被引用的响应体（body_ref 列有索引）
+    referenced = set(
+        RequestHistory.objects.filter(body_ref__in=list(body_refs)).values_list('body_ref', flat=True).distinct()
+    )
+    released = 0
+    for body_ref in set(body_refs) - referenced:
+        path = _body_path(body_ref)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            released += size
+        except FileNotFoundError:
+            continue
+    return released
+
+
+def build_response_data(response):
+    """按存储策略提取响应数据用于保存请求历史"""
+    body = response.text or ''
+    encoded = body.encode('utf-8')
+    response_data = {
+        'headers': dict(response.headers),
+        'body': body,
+        'body_size': len(encoded)
+    }
+
+    inline_limit = getattr(settings, 'API_TESTING_HISTORY_INLINE_BODY_LIMIT', 64 * 1024)
+    if len(encoded) > inline_limit:
+        preview_size = getattr(settings, 'API_TESTING_HISTORY_BODY_PREVIEW', 4096)
+        response_data['body'] = body[:preview_size]
+        response_data['body_truncated'] = True
+        if getattr(settings, 'API_TESTING_HISTORY_BODY_STORE', True):
+            try:
+                response_data['body_ref'] = store_body(encoded)
+            except OSError as e:
+                logger.error(f"保存响应体失败，仅保留预览: {e}")
+    return response_data
+
+
+def get_full_body(response_data):
+    """获取请求历史中的完整响应体"""
+    response_data = response_data or {}
+    body_ref = response_data.get('body_ref')
+    if body_ref:
+        return load_body(body_ref)
+    return response_data.get('body') or ''
+
+
+def parse_json_body(body, headers):
+    """响应为JSON时解析响应体，否则返回 None"""
+    content_type = ''
+    for key, value in (headers or {}).items():
+        if key.lower() == 'content-type':
+            content_type = value
+            break
+    if not content_type.startswith('application/json'):
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class RequestHistoryWriter:
+    """请求历史批量写入器
+
+    用法:
+        with RequestHistoryWriter() as writer:
+            writer.add(RequestHistory(...))
+    """
+
+    def __init__(self, flush_size=None):
+        if flush_size is None:
+            flush_size = getattr(settings, 'API_TESTING_HISTORY_FLUSH_SIZE', 50)
+        self.flush_size = max(1, int(flush_size))
+        self.buffer = []
+        self.written_count = 0
+        self.flush_time_ms = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.flush()
+        except Exception as e:
+            if exc_type is None:
+                raise
+            # 已有异常在传播时只记录写入失败，不覆盖原始异常
+            logger.error(f"写入请求历史失败，丢失 {len(self.buffer)} 条记录: {e}", exc_info=True)
+        return False
+
+    def add(self, history):
+        """缓存一条未保存的请求历史，缓存数达到 flush_size 时写入数据库"""
+        self.buffer.append(history)
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """把缓存的请求历史写入数据库"""
+        if not self.buffer:
+            return
+        started = time.perf_counter()
+        RequestHistory.objects.bulk_create(self.buffer, batch_size=self.flush_size)
+        self.flush_time_ms += (time.perf_counter() - started) * 1000
+        self.written_count += len(self.buffer)
+        self.buffer = []
@@ -142,6 +142,8 @@ class RequestHistory(models.Model):
                                     verbose_name='使用环境')
     request_data = models.JSONField(verbose_name='请求数据')
     response_data = models.JSONField(null=True, blank=True, verbose_name='响应数据')
+    # 与 response_data['body_ref'] 相同，单独保存并建索引，清理外部响应体时按引用查询
+    body_ref = models.CharField(max_length=64, blank=True, default='', db_index=True, verbose_name='外部响应体引用')
     status_code = models.IntegerField(null=True, blank=True, verbose_name='状态码')
     response_time = models.FloatField(null=True, blank=True, verbose_name='响应时间(ms)')
     error_message = models.TextField(blank=True, verbose_name='错误信息')
@@ -154,6 +156,9 @@ class RequestHistory(models.Model):
         verbose_name = '请求历史'
         verbose_name_plural = '请求历史'
         ordering = ['-executed_at']
+        indexes = [
+            models.Index(fields=['executed_at']),
+        ]
 
     def __str__(self):
         return f"{self.request.name} - {self.executed_at}"
@@ -168,6 +173,8 @@ class TestSuite(models.Model):
     requests = models.ManyToManyField(ApiRequest, through='TestSuiteRequest', verbose_name='包含请求')
     environment = models.ForeignKey(Environment, on_delete=models.SET_NULL, null=True, blank=True,
                                     verbose_name='执行环境')
+    max_concurrency = models.IntegerField(default=1, verbose_name='最大并发数',
+                                          help_text='套件内相互独立的请求可同时执行的数量，1表示顺序执行')
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_test_suites',
                                    verbose_name='创建者')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
@@ -190,6 +197,8 @@ class TestSuiteRequest(models.Model):
     order = models.IntegerField(default=0, verbose_name='执行顺序')
     assertions = models.JSONField(default=list, verbose_name='断言规则')
     enabled = models.BooleanField(default=True, verbose_name='是否启用')
+    depends_on_previous = models.BooleanField(default=False, verbose_name='依赖前序请求',
+                                              help_text='开启后需等待之前的请求全部执行完成后再执行')
 
     class Meta:
         db_table = 'api_test_suite_requests'
@@ -371,6 +380,8 @@ class TaskExecutionLog(models.Model):
     result = models.JSONField(default=dict, verbose_name='执行结果')
     error_message = models.TextField(blank=True, verbose_name='错误信息')
     executed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name='执行者')
+    queue_depth = models.IntegerField(null=True, blank=True, verbose_name='入队时队列深度')
+    queue_wait = models.FloatField(null=True, blank=True, verbose_name='排队等待时长(秒)')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
 
     class Meta:
@@ -378,6 +389,9 @@ class TaskExecutionLog(models.Model):
         verbose_name = '任务执行日志'
         verbose_name_plural = '任务执行日志'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"{self.task.name} - {self.created_at}"
@@ -169,7 +169,7 @@ class TestSuiteRequestSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TestSuiteRequest
-        fields = ['id', 'request', 'order', 'assertions', 'enabled']
+        fields = ['id', 'request', 'order', 'assertions', 'enabled', 'depends_on_previous']
 
 
 class TestSuiteSerializer(serializers.ModelSerializer):
@@ -179,11 +179,16 @@ class TestSuiteSerializer(serializers.ModelSerializer):
     class Meta:
         model = TestSuite
         fields = [
-            'id', 'name', 'description', 'project', 'environment',
+            'id', 'name', 'description', 'project', 'environment', 'max_concurrency',
             'suite_requests', 'created_by', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    def validate_max_concurrency(self, value):
+        if value < 1:
+            raise serializers.ValidationError('最大并发数不能小于1')
+        return value
+
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
         return super().create(validated_data)
@@ -431,9 +436,9 @@ class TaskExecutionLogSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'task', 'task_name', 'status', 'start_time', 'end_time',
             'result', 'error_message', 'executed_by', 'executed_by_name',
-            'created_at'
+            'queue_depth', 'queue_wait', 'created_at'
         ]
-        read_only_fields = ['created_at']
+        read_only_fields = ['queue_depth', 'queue_wait', 'created_at']
 
 
 # ================ 通知管理序列化器 ================
@@ -0,0 +1,172 @@
+"""
+变量模板编译
+把请求的 URL、请求头、参数和请求体中的 {{变量}} 预先解析为片段列表并缓存，
+执行时只需对扁平化后的环境变量表做一次遍历渲染。
+
+缓存以 (主键, updated_at) 为键，ApiRequest 或 Environment 保存后 updated_at 改变，
+旧的缓存项不再命中，并按 LRU 规则淘汰。
+"""
+import re
+import threading
+from collections import OrderedDict
+
+VARIABLE_PATTERN = re.compile(r'\{\{([^{}]+)\}\}')
+BODY_METHODS = ('POST', 'PUT', 'PATCH')
+
+_CACHE_SIZE = 2048
+
+
+class CompiledTemplate:
+    """编译后的字符串模板，literals 与 names 交替排列"""
+    __slots__ = ('literals', 'names')
+
+    def __init__(self, text):
+        self.literals = []
+        self.names = []
+        position = 0
+        for match in VARIABLE_PATTERN.finditer(text):
+            self.literals.append(text[position:match.start()])
+            self.names.append(match.group(1))
+            position = match.end()
+        self.literals.append(text[position:])
+
+    def render(self, variables):
+        if not self.names:
+            return self.literals[0]
+        parts = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            value = variables.get(name)
+            # 未定义的变量保持原样
+            parts.append(value if value is not None else f'{{{{{name}}}}}')
+            parts.append(literal)
+        return ''.join(parts)
+
+
+def compile_value(data):
+    """递归编译字典、列表和字符串中的模板，其他类型原样保留"""
+    if isinstance(data, dict):
+        return {k: compile_value(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [compile_value(item) for item in data]
+    elif isinstance(data, str):
+        template = CompiledTemplate(data)
+        return template if template.names else data
+    else:
+        return data
+
+
+def render_value(compiled, variables):
+    """渲染 compile_value 的结果"""
+    if isinstance(compiled, CompiledTemplate):
+        return compiled.render(variables)
+    elif isinstance(compiled, dict):
+        return {k: render_value(v, variables) for k, v in compiled.items()}
+    elif isinstance(compiled, list):
+        return [render_value(item, variables) for item in compiled]
+    else:
+        return compiled
+
+
+class CompiledRequest:
+    """编译后的API请求"""
+
+    def __init__(self, api_request):
+        self.method = api_request.method
+        self.url = CompiledTemplate(api_request.url or '')
+
+        # 请求头支持数组格式和旧的对象格式
+        if isinstance(api_request.headers, list):
+            header_items = [
+                (item['key'], item.get('value', ''))
+                for item in api_request.headers
+                if item.get('enabled', True) and item.get('key')
+            ]
+        else:
+            header_items = list((api_request.headers or {}).items())
+        self.headers = [(key, CompiledTemplate(str(value))) for key, value in header_items]
+
+        self.params = [
+            (key, CompiledTemplate(str(value))) for key, value in (api_request.params or {}).items()
+        ]
+
+        self.body = None
+        if api_request.body and api_request.method in BODY_METHODS:
+            if api_request.body.get('type') == 'json':
+                self.body = compile_value(api_request.body.get('data', {}))
+            else:
+                self.body = compile_value(api_request.body.get('data'))
+
+    def render(self, variables):
+        """渲染请求，返回值与 RequestHistory.request_data 的结构一致"""
+        return {
+            'url': self.url.render(variables),
+            'method': self.method,
+            'headers': {key: value.render(variables) for key, value in self.headers},
+            'params': {key: value.render(variables) for key, value in self.params},
+            'body': render_value(self.body, variables)
+        }
+
+
+def flatten_variables(variables):
+    """把环境变量转换为 {变量名: 替换文本}"""
+    flattened = {}
+    for key, value in (variables or {}).items():
+        if isinstance(value, dict):
+            flattened[key] = str(value.get('currentValue', '') or value.get('initialValue', ''))
+        else:
+            flattened[key] = str(value) if value is not None else ''
+    return flattened
+
+
+class _LRUCache:
+    """线程安全的 LRU 缓存"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, factory):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        value = factory()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_request_cache = _LRUCache(_CACHE_SIZE)
+_environment_cache = _LRUCache(_CACHE_SIZE)
+
+
+def get_compiled_request(api_request):
+    """获取请求的编译结果，未保存的请求不缓存"""
+    if api_request.pk is None or api_request.updated_at is None:
+        return CompiledRequest(api_request)
+    key = (api_request.pk, api_request.updated_at)
+    return _request_cache.get_or_create(key, lambda: CompiledRequest(api_request))
+
+
+def get_environment_variables(environment):
+    """获取环境的扁平化变量表"""
+    if environment is None:
+        return {}
+    if environment.pk is None or environment.updated_at is None:
+        return flatten_variables(environment.variables)
+    key = (environment.pk, environment.updated_at)
+    return _environment_cache.get_or_create(key, lambda: flatten_variables(environment.variables))
+
+
+def clear_template_cache():
+    """清空模板和环境变量缓存"""
+    _request_cache.clear()
+    _environment_cache.clear()
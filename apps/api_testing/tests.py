@@ -0,0 +1,198 @@
+import json
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from .templating import CompiledRequest, CompiledTemplate, compile_value, flatten_variables, render_value
+from .utils import evaluate_json_paths, execute_assertions
+
+
+class CompiledTemplateTestCase(SimpleTestCase):
+    def test_render_variables(self):
+        """测试变量替换"""
+        template = CompiledTemplate('{{host}}/api/{{version}}/users?id={{id}}')
+        self.assertEqual(template.names, ['host', 'version', 'id'])
+        self.assertEqual(
+            template.render({'host': 'http://x', 'version': 'v1', 'id': '7'}),
+            'http://x/api/v1/users?id=7'
+        )
+
+    def test_undefined_variable_kept(self):
+        """测试未定义的变量保持原样"""
+        template = CompiledTemplate('Bearer {{token}} {{missing}}')
+        self.assertEqual(template.render({'token': 'abc'}), 'Bearer abc {{missing}}')
+
+    def test_plain_text(self):
+        """测试不含变量的文本"""
+        template = CompiledTemplate('no variables {here}')
+        self.assertEqual(template.names, [])
+        self.assertEqual(template.render({'here': 'x'}), 'no variables {here}')
+
+    def test_rendered_value_not_rendered_again(self):
+        """测试变量值中的 {{...}} 不会被再次替换"""
+        template = CompiledTemplate('{{a}}')
+        self.assertEqual(template.render({'a': '{{b}}', 'b': 'x'}), '{{b}}')
+
+    def test_compile_nested_value(self):
+        """测试递归编译和渲染请求体"""
+        compiled = compile_value({'user': {'name': '{{name}}', 'tags': ['{{tag}}', 'fixed']}, 'age': 3, 'ok': None})
+        self.assertIsInstance(compiled['user']['name'], CompiledTemplate)
+        self.assertEqual(compiled['user']['tags'][1], 'fixed')
+        self.assertEqual(
+            render_value(compiled, {'name': 'tom', 'tag': 't1'}),
+            {'user': {'name': 'tom', 'tags': ['t1', 'fixed']}, 'age': 3, 'ok': None}
+        )
+
+    def test_compiled_request(self):
+        """测试编译请求: 禁用的请求头被忽略，GET 请求不带请求体"""
+        api_request = SimpleNamespace(
+            method='POST',
+            url='{{base}}/login',
+            headers=[
+                {'key': 'Authorization', 'value': 'Bearer {{token}}'},
+                {'key': 'X-Off', 'value': '1', 'enabled': False},
+            ],
+            params={'page': '{{page}}'},
+            body={'type': 'json', 'data': {'user': '{{user}}'}},
+        )
+        variables = {'base': 'http://x', 'token': 't', 'page': '2', 'user': 'u'}
+        self.assertEqual(CompiledRequest(api_request).render(variables), {
+            'url': 'http://x/login',
+            'method': 'POST',
+            'headers': {'Authorization': 'Bearer t'},
+            'params': {'page': '2'},
+            'body': {'user': 'u'},
+        })
+
+        api_request.method = 'GET'
+        self.assertIsNone(CompiledRequest(api_request).render(variables)['body'])
+
+
+class FlattenVariablesTestCase(SimpleTestCase):
+    def test_flatten(self):
+        """测试环境变量扁平化: 优先当前值，其次初始值，其他值转为字符串"""
+        self.assertEqual(flatten_variables({
+            'a': {'currentValue': 'cur', 'initialValue': 'init'},
+            'b': {'currentValue': '', 'initialValue': 'init'},
+            'c': {},
+            'd': 5,
+            'e': None,
+        }), {'a': 'cur', 'b': 'init', 'c': '', 'd': '5', 'e': ''})
+
+    def test_empty(self):
+        """测试没有环境变量"""
+        self.assertEqual(flatten_variables(None), {})
+
+
+def json_response(data, status_code=200):
+    return SimpleNamespace(
+        status_code=status_code,
+        headers={'content-type': 'application/json; charset=utf-8'},
+        text=json.dumps(data),
+    )
+
+
+class EvaluateJsonPathsTestCase(SimpleTestCase):
+    def test_simple_and_complex_paths(self):
+        """测试简单路径和一般JSONPath表达式一起求值"""
+        document = {'data': {'items': [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}], 'odd-key': 'x'}}
+        self.assertEqual(evaluate_json_paths(document, [
+            '$.data.items[0].id',
+            '$.data.items[-1].name',
+            "$.data['odd-key']",
+            '$.data.items[5].id',
+            '$.data.missing',
+            '$.data.items[*].name',
+        ]), {
+            '$.data.items[0].id': 1,
+            '$.data.items[-1].name': 'b',
+            "$.data['odd-key']": 'x',
+            '$.data.items[5].id': None,
+            '$.data.missing': None,
+            '$.data.items[*].name': 'a',
+        })
+
+    def test_root_path(self):
+        """测试根路径"""
+        self.assertEqual(evaluate_json_paths([1, 2], ['$']), {'$': [1, 2]})
+
+
+class AssertionTypesTestCase(SimpleTestCase):
+    def setUp(self):
+        self.response = json_response({
+            'code': 0,
+            'total': '12.5',
+            'message': 'order ORD-2024-001 created',
+            'items': [
+                {'id': 1, 'price': 10, 'name': 'a'},
+                {'id': 2, 'price': 20, 'name': 'b'},
+                {'id': 3, 'price': 'n/a', 'name': None},
+            ],
+        })
+
+    def check(self, assertion):
+        return execute_assertions(self.response, [assertion])[0]
+
+    def test_json_schema(self):
+        """测试 JSON Schema 断言"""
+        schema = {
+            'type': 'object',
+            'required': ['code', 'items'],
+            'properties': {'code': {'type': 'integer'}, 'items': {'type': 'array'}},
+        }
+        self.assertTrue(self.check({'type': 'json_schema', 'schema': schema})['passed'])
+        result = self.check({'type': 'json_schema', 'schema': json.dumps({'type': 'string'}), 'json_path': '$.code'})
+        self.assertFalse(result['passed'])
+        self.assertIn('Schema校验失败', result['error'])
+
+    def test_numeric(self):
+        """测试数值比较断言，字符串数值按数值比较"""
+        self.assertTrue(self.check({'type': 'numeric', 'json_path': '$.total', 'operator': 'gt', 'expected': 12})['passed'])
+        self.assertTrue(self.check({
+            'type': 'numeric', 'json_path': '$.total', 'operator': 'between', 'expected': [10, 13]
+        })['passed'])
+        self.assertFalse(self.check({'type': 'numeric', 'json_path': '$.code', 'operator': 'ne', 'expected': 0})['passed'])
+        result = self.check({'type': 'numeric', 'json_path': '$.message', 'operator': 'eq', 'expected': 1})
+        self.assertFalse(result['passed'])
+        self.assertIn('不是数值', result['error'])
+
+    def test_regex(self):
+        """测试正则断言: 指定 json_path 时匹配该值，否则匹配响应体"""
+        self.assertTrue(self.check({'type': 'regex', 'json_path': '$.message', 'expected': r'ORD-\d{4}-\d{3}'})['passed'])
+        self.assertTrue(self.check({'type': 'regex', 'expected': r'"code": 0'})['passed'])
+        self.assertFalse(self.check({'type': 'regex', 'json_path': '$.message', 'expected': '^created'})['passed'])
+
+    def test_array_length(self):
+        """测试数组长度断言"""
+        self.assertTrue(self.check({'type': 'array_length', 'json_path': '$.items', 'operator': 'eq', 'expected': 3})['passed'])
+        self.assertFalse(self.check({'type': 'array_length', 'json_path': '$.items', 'operator': 'lt', 'expected': 3})['passed'])
+        result = self.check({'type': 'array_length', 'json_path': '$.code', 'operator': 'eq', 'expected': 1})
+        self.assertFalse(result['passed'])
+        self.assertIn('不是数组', result['error'])
+
+    def test_all_match(self):
+        """测试数组元素全部满足条件的断言，报告不满足条件的元素下标"""
+        self.assertTrue(self.check({
+            'type': 'all_match', 'json_path': '$.items', 'item_path': '$.id', 'operator': 'type', 'expected': 'integer'
+        })['passed'])
+        result = self.check({
+            'type': 'all_match', 'json_path': '$.items', 'item_path': '$.price', 'operator': 'gte', 'expected': 10
+        })
+        self.assertFalse(result['passed'])
+        self.assertEqual(result['actual'], '2/3 个元素满足条件')
+        self.assertIn('[2]', result['error'])
+        result = self.check({'type': 'all_match', 'json_path': '$.items', 'item_path': '$.name', 'operator': 'exists'})
+        self.assertIn('[2]', result['error'])
+
+    def test_unsupported_type(self):
+        """测试不支持的断言类型报告错误"""
+        result = self.check({'type': 'unknown'})
+        self.assertFalse(result['passed'])
+        self.assertIn('不支持的断言类型', result['error'])
+
+    def test_non_json_response(self):
+        """测试响应不是JSON时JSON断言失败"""
+        response = SimpleNamespace(status_code=200, headers={'content-type': 'text/html'}, text='<html></html>')
+        result = execute_assertions(response, [{'type': 'numeric', 'json_path': '$.a', 'operator': 'eq', 'expected': 1}])[0]
+        self.assertFalse(result['passed'])
+        self.assertIn('不是JSON格式', result['error'])
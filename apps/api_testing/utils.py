@@ -1,13 +1,216 @@
 import json
-import time
-from django.utils import timezone
-from .models import RequestHistory
+import operator
+import re
+from functools import lru_cache
+
+
+_UNPARSED = object()
+_PATH_VALUES = object()
+_SIMPLE_JSON_PATH = re.compile(r"^\$(?:\.[A-Za-z_][\w-]*|\[-?\d+\]|\['[^']*'\])*$")
+_JSON_PATH_SEGMENT = re.compile(r"\.([A-Za-z_][\w-]*)|\[(-?\d+)\]|\['([^']*)'\]")
+
+
+@lru_cache(maxsize=1024)
+def compile_json_path(expression):
+    """编译JSONPath表达式，结果按表达式缓存"""
+    from jsonpath_ng import parse
+    return parse(expression)
+
+
+def _split_simple_json_path(expression):
+    """把 $.a.b[0]['c'] 形式的简单路径拆成键列表，其他表达式返回 None"""
+    if not _SIMPLE_JSON_PATH.match(expression):
+        return None
+    keys = []
+    for name, index, quoted in _JSON_PATH_SEGMENT.findall(expression[1:]):
+        if index:
+            keys.append(int(index))
+        else:
+            keys.append(name or quoted)
+    return keys
+
+
+def _walk_json_paths(node, trie, values):
+    for path in trie.get(_PATH_VALUES, ()):
+        values[path] = node
+    for key, child in trie.items():
+        if key is _PATH_VALUES:
+            continue
+        if isinstance(key, int):
+            if isinstance(node, list) and -len(node) <= key < len(node):
+                _walk_json_paths(node[key], child, values)
+        elif isinstance(node, dict) and key in node:
+            _walk_json_paths(node[key], child, values)
+
+
+def evaluate_json_paths(document, paths):
+    """计算多个JSONPath表达式的第一个匹配值，返回 {表达式: 值}，无匹配时为 None
+
+    简单路径（字段名和数组下标组成）合并为前缀树后在一次遍历中求值，
+    其他表达式通过 compile_json_path 的缓存编译后逐个求值。
+    """
+    values = {}
+    trie = {}
+    for path in paths:
+        keys = _split_simple_json_path(path)
+        if keys is None:
+            matches = compile_json_path(path).find(document)
+            values[path] = matches[0].value if matches else None
+            continue
+        values[path] = None
+        node = trie
+        for key in keys:
+            node = node.setdefault(key, {})
+        node.setdefault(_PATH_VALUES, []).append(path)
+    if trie:
+        _walk_json_paths(document, trie, values)
+    return values
+
+
+# 需要解析JSON响应体的断言类型
+JSON_ASSERTION_TYPES = ('json_path', 'json_schema', 'numeric', 'array_length', 'all_match')
+
+COMPARE_OPERATORS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+JSON_TYPES = {
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+    'object': dict,
+    'array': list,
+    'null': type(None),
+}
+
+
+@lru_cache(maxsize=256)
+def _compile_json_schema(schema_text):
+    from jsonschema.validators import validator_for
+
+    schema = json.loads(schema_text)
+    validator_class = validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def get_schema_validator(schema):
+    """获取JSON Schema校验器，schema 可以是对象或JSON字符串，编译结果按内容缓存"""
+    if isinstance(schema, str):
+        schema = json.loads(schema)
+    return _compile_json_schema(json.dumps(schema, sort_keys=True))
+
+
+@lru_cache(maxsize=512)
+def compile_regex(pattern):
+    """编译正则表达式，结果按表达式缓存"""
+    return re.compile(pattern)
+
+
+def _to_number(value):
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f"不是数值: {value}")
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"不是数值: {value}")
+
+
+def compare_values(actual, op, expected):
+    """按比较运算符比较数值，between 的期望值为 [最小值, 最大值]"""
+    if op == 'between':
+        low, high = expected
+        return _to_number(low) <= _to_number(actual) <= _to_number(high)
+    if op not in COMPARE_OPERATORS:
+        raise ValueError(f"不支持的比较运算符: {op}")
+    return COMPARE_OPERATORS[op](_to_number(actual), _to_number(expected))
+
+
+def match_item(value, op, expected):
+    """判断数组元素是否满足条件，无法比较的元素视为不满足"""
+    try:
+        return _match_item(value, op, expected)
+    except (TypeError, ValueError):
+        return False
+
+
+def _match_item(value, op, expected):
+    if op == 'exists':
+        return value is not None
+    if op == 'equals':
+        return str(value) == str(expected)
+    if op == 'regex':
+        return value is not None and compile_regex(str(expected)).search(str(value)) is not None
+    if op == 'type':
+        # 布尔值不视为数值
+        if expected in ('number', 'integer') and isinstance(value, bool):
+            return False
+        return isinstance(value, JSON_TYPES[expected])
+    return compare_values(value, op, expected)
 
 
 def execute_assertions(response, assertions):
-    """执行断言验证"""
+    """执行断言验证
+
+    响应体最多解析一次；所有简单JSONPath断言在一次遍历中求值。
+    支持的断言类型:
+    - status_code / response_time / contains / header / equals
+    - json_path: JSONPath取值与期望值按字符串比较
+    - json_schema: 按 schema 校验 json_path（默认 $）对应的数据
+    - numeric: json_path 对应的数值按 operator（eq/ne/gt/gte/lt/lte/between）与期望值比较
+    - regex: 正则匹配 json_path 对应的值，未指定 json_path 时匹配响应体
+    - array_length: json_path 对应数组的长度按 operator 与期望值比较
+    - all_match: json_path 对应数组的每个元素，取 item_path（相对元素的JSONPath，默认 $）后
+      按 operator（exists/equals/regex/type 或比较运算符）与期望值比较
+    """
     results = []
-    
+    response_json = _UNPARSED
+    json_error = None
+    json_path_values = {}
+
+    json_paths = [
+        assertion.get('json_path') or ('$' if assertion.get('type') == 'json_schema' else '')
+        for assertion in assertions
+        if assertion.get('type') in JSON_ASSERTION_TYPES
+        or (assertion.get('type') == 'regex' and assertion.get('json_path'))
+    ]
+    json_paths = [path for path in json_paths if path]
+    if json_paths and 'application/json' in response.headers.get('content-type', '').lower():
+        try:
+            response_json = json.loads(response.text)
+            json_path_values = evaluate_json_paths(
+                response_json, [path for path in json_paths if _split_simple_json_path(path) is not None]
+            )
+        except json.JSONDecodeError as e:
+            json_error = e
+
+    def resolve_json_path(json_path):
+        # 检查响应是否为JSON格式
+        content_type = response.headers.get('content-type', '').lower()
+        if 'application/json' not in content_type:
+            raise ValueError(f"响应不是JSON格式，Content-Type: {content_type}")
+
+        if json_error is not None:
+            raise json_error
+
+        # 检查JSONPath表达式是否为空
+        if not json_path:
+            raise ValueError("JSON路径表达式不能为空")
+
+        if json_path in json_path_values:
+            return json_path_values[json_path]
+        matches = compile_json_path(json_path).find(response_json)
+        return matches[0].value if matches else None
+
+
     for assertion in assertions:
         result = {
             'name': assertion.get('name', '未命名断言'),
@@ -46,20 +249,7 @@ def execute_assertions(response, assertions):
                 passed = False
                 
                 try:
-                    # 检查响应是否为JSON格式
-                    content_type = response.headers.get('content-type', '').lower()
-                    if 'application/json' not in content_type:
-                        raise ValueError(f"响应不是JSON格式，Content-Type: {content_type}")
-                    
-                    response_json = json.loads(response.text)
-                    
-                    # 检查JSONPath表达式是否为空
-                    if not json_path:
-                        raise ValueError("JSON路径表达式不能为空")
-                    
-                    from jsonpath_ng import parse
-                    matches = parse(json_path).find(response_json)
-                    actual = matches[0].value if matches else None
+                    actual = resolve_json_path(json_path)
                     passed = str(actual) == str(expected_value)
                     
                     # 确保actual值被正确设置到result中
@@ -89,6 +279,58 @@ def execute_assertions(response, assertions):
             elif assertion_type == 'equals':
                 actual = response.text.strip()
                 passed = actual == str(expected).strip()
+
+            elif assertion_type == 'json_schema':
+                data = resolve_json_path(assertion.get('json_path') or '$')
+                validator = get_schema_validator(assertion.get('schema'))
+                errors = [
+                    f"{'/'.join(str(p) for p in error.absolute_path) or '$'}: {error.message}"
+                    for error in validator.iter_errors(data)
+                ]
+                passed = not errors
+                actual = 'valid' if passed else errors[:5]
+                if errors:
+                    result['error'] = f"Schema校验失败: {errors[0]}"
+
+            elif assertion_type == 'numeric':
+                actual = resolve_json_path(assertion.get('json_path', ''))
+                passed = compare_values(actual, assertion.get('operator', 'eq'), expected)
+
+            elif assertion_type == 'regex':
+                if assertion.get('json_path'):
+                    actual = resolve_json_path(assertion['json_path'])
+                    text = '' if actual is None else str(actual)
+                else:
+                    text = response.text or ''
+                    actual = text[:200] + '...' if len(text) > 200 else text
+                passed = compile_regex(str(expected)).search(text) is not None
+
+            elif assertion_type == 'array_length':
+                data = resolve_json_path(assertion.get('json_path', ''))
+                if not isinstance(data, list):
+                    raise ValueError(f"JSON路径对应的值不是数组: {type(data).__name__}")
+                actual = len(data)
+                passed = compare_values(actual, assertion.get('operator', 'eq'), expected)
+
+            elif assertion_type == 'all_match':
+                data = resolve_json_path(assertion.get('json_path', ''))
+                if not isinstance(data, list):
+                    raise ValueError(f"JSON路径对应的值不是数组: {type(data).__name__}")
+                item_path = assertion.get('item_path') or '$'
+                op = assertion.get('operator', 'exists')
+                if op == 'type' and expected not in JSON_TYPES:
+                    raise ValueError(f"不支持的数据类型: {expected}")
+                failed_indexes = [
+                    index for index, item in enumerate(data)
+                    if not match_item(evaluate_json_paths(item, [item_path])[item_path], op, expected)
+                ]
+                passed = not failed_indexes
+                actual = f"{len(data) - len(failed_indexes)}/{len(data)} 个元素满足条件"
+                if failed_indexes:
+                    result['error'] = f"不满足条件的元素下标: {failed_indexes[:10]}"
+            
+            else:
+                raise ValueError(f"不支持的断言类型: {assertion_type}")
             
             # 确保在所有情况下都设置actual值
             if 'actual' not in result or result['actual'] is None:
@@ -104,307 +346,53 @@ def execute_assertions(response, assertions):
     return results
 
 
-def execute_test_suite(test_suite, environment, executed_by):
-    """执行测试套件并返回结果"""
-    from .models import TestExecution, RequestHistory
-    import requests
-    import time
-    
+def execute_test_suite(test_suite, environment, executed_by, concurrency=None, transport=None, profile=None):
+    """执行测试套件并返回结果
+
+    concurrency 为并发数，未传时使用套件配置的 max_concurrency；
+    transport 为传输方式(sync/pooled/async)，未传时使用 API_TESTING_DEFAULT_TRANSPORT。
+    """
+    from .engine import ApiExecutionEngine, resolve_concurrency
+
+    concurrency = resolve_concurrency(concurrency, default=test_suite.max_concurrency)
     try:
-        # 创建执行记录
-        execution = TestExecution.objects.create(
-            test_suite=test_suite,
-            status='RUNNING',
-            start_time=timezone.now(),
-            executed_by=executed_by
-        )
-        
-        # 获取套件中的请求
-        suite_requests = test_suite.testsuiterequest_set.filter(enabled=True).order_by('order')
-        
-        execution.total_requests = suite_requests.count()
-        execution.save()
-        
-        results = []
-        passed_count = 0
-        failed_count = 0
-        
-        # 执行每个请求
-        for suite_request in suite_requests:
-            api_request = suite_request.request
-            
-            try:
-                # 解析环境变量
-                variables = {}
-                if environment:
-                    variables.update(environment.variables)
-                
-                # 替换URL中的变量
-                url = _replace_variables(api_request.url, variables)
-                
-                # 准备请求头
-                headers = {}
-                if isinstance(api_request.headers, list):
-                    for header_item in api_request.headers:
-                        if header_item.get('enabled', True) and header_item.get('key'):
-                            key = header_item['key']
-                            value = _replace_variables(str(header_item.get('value', '')), variables)
-                            headers[key] = value
-                else:
-                    headers = api_request.headers.copy()
-                    for key, value in headers.items():
-                        headers[key] = _replace_variables(str(value), variables)
-                
-                # 准备请求参数
-                params = api_request.params.copy() if api_request.params else {}
-                for key, value in params.items():
-                    params[key] = _replace_variables(str(value), variables)
-                
-                # 准备请求体
-                body_data = None
-                if api_request.body and api_request.method in ['POST', 'PUT', 'PATCH']:
-                    if api_request.body.get('type') == 'json':
-                        body_data = api_request.body.get('data', {})
-                        body_data = _replace_variables_in_dict(body_data, variables)
-                
-                # 执行请求
-                start_time = time.time()
-                response = requests.request(
-                    method=api_request.method,
-                    url=url,
-                    headers=headers,
-                    params=params,
-                    json=body_data,
-                    timeout=30
-                )
-                end_time = time.time()
-                response_time = (end_time - start_time) * 1000
-                
-                # 执行断言验证
-                assertions = api_request.assertions or []
-                for assertion in assertions:
-                    if assertion.get('type') == 'response_time':
-                        assertion['actual_time'] = response_time
-                
-                assertions_results = execute_assertions(response, assertions)
-                
-                # 检查所有断言是否通过
-                passed = True
-                error_message = ''
-                
-                # 检查套件请求的断言
-                for assertion in suite_request.assertions:
-                    if assertion.get('type') == 'status_code':
-                        expected = assertion.get('value')
-                        if response.status_code != expected:
-                            passed = False
-                            error_message = f'状态码断言失败: 期望 {expected}, 实际 {response.status_code}'
-                            break
-                
-                # 检查接口自身的断言
-                if passed and assertions_results:
-                    for assertion_result in assertions_results:
-                        if not assertion_result.get('passed', True):
-                            passed = False
-                            error_message = f"断言失败: {assertion_result.get('name', '未命名断言')} - {assertion_result.get('error', '断言不通过')}"
-                            break
-                
-                if passed:
-                    passed_count += 1
-                else:
-                    failed_count += 1
-                
-                results.append({
-                    'name': api_request.name,
-                    'method': api_request.method,
-                    'url': url,
-                    'status_code': response.status_code,
-                    'response_time': response_time,
-                    'passed': passed,
-                    'error': error_message,
-                    'assertions_results': assertions_results
-                })
-                
-                # 保存请求历史
-                RequestHistory.objects.create(
-                    request=api_request,
-                    environment=environment,
-                    request_data={
-                        'url': url,
-                        'method': api_request.method,
-                        'headers': headers,
-                        '极速版params': params,
-                        'body': body_data
-                    },
-                    response_data={
-                        'headers': dict(response.headers),
-                        'body': response.text,
-                        'json': response.json() if response.headers.get('content-type', '').startswith('application/json') else None
-                    },
-                    status_code=response.status_code,
-                    response_time=response_time,
-                    assertions_results=assertions_results,
-                    executed_by=executed_by
-                )
-                
-            except Exception as e:
-                failed_count += 1
-                results.append({
-                    'name': api_request.name,
-                    'method': api_request.method,
-                    'url': api_request.url,
-                    'passed': False,
-                    'error': str(e)
-                })
-        
-        # 更新执行结果
-        execution.end_time = timezone.now()
-        execution.passed_requests = passed_count
-        execution.failed_requests = failed_count
-        execution.status = 'COMPLETED' if failed_count == 0 else 'FAILED'
-        execution.results = results
-        execution.save()
-        
-        return {
-            'success': True,
-            'execution_id': execution.id,
-            'passed_count': passed_count,
-            'failed_count': failed_count,
-            'total_count': execution.total_requests,
-            'results': results
-        }
-        
+        engine = ApiExecutionEngine(environment, executed_by, transport=transport,
+                                    concurrency=concurrency, profile=profile)
     except Exception as e:
         return {
             'success': False,
             'error': str(e)
         }
+    with engine:
+        return engine.run_suite(test_suite)
 
 
-def execute_api_request(api_request, environment, executed_by):
+def execute_api_request(api_request, environment, executed_by, transport=None, profile=None):
     """执行单个API请求并返回结果"""
-    import requests
-    import time
-    
+    from .engine import ApiExecutionEngine
+
     try:
-        # 解析环境变量
-        variables = {}
-        if environment:
-            variables.update(environment.variables)
-        
-        # 替换URL中的变量
-        url = _replace_variables(api_request.url, variables)
-        
-        # 准备请求头
-        headers = {}
-        if isinstance(api_request.headers, list):
-            for header_item in api_request.headers:
-                if header_item.get('enabled', True) and header_item.get('key'):
-                    key = header_item['key']
-                    value = _replace_variables(str(header_item.get('value', '')), variables)
-                    headers[key] = value
-        else:
-            headers = api_request.headers.copy()
-            for key, value in headers.items():
-                headers[key] = _replace_variables(str(value), variables)
-        
-        # 准备请求参数
-        params = api_request.params.copy() if api_request.params else {}
-        for key, value in params.items():
-            params[key] = _replace_variables(str(value), variables)
-        
-        # 准备请求体
-        body_data = None
-        if api_request.body and api_request.method in ['POST', 'PUT', 'PATCH']:
-            if api_request.body.get('type') == 'json':
-                body_data = api_request.body.get('data', {})
-                body_data = _replace_variables_in_dict(body_data, variables)
-        
-        # 执行请求
-        start_time = time.time()
-        response = requests.request(
-            method=api_request.method,
-            url=url,
-            headers=headers,
-            params=params,
-            json=body_data,
-            timeout=30
-        )
-        end_time = time.time()
-        response_time = (end_time - start_time) * 1000
-        
-        # 执行断言验证
-        assertions = api_request.assertions or []
-        for assertion in assertions:
-            if assertion.get('type') == 'response_time':
-                assertion['actual_time'] = response_time
-        
-        assertions_results = execute_assertions(response, assertions)
-        
-        # 保存请求历史
-        history = RequestHistory.objects.create(
-            request=api_request,
-            environment=environment,
-            request_data={
-                'url': url,
-                'method': api_request.method,
-                'headers': headers,
-                'params': params,
-                'body': body_data
-            },
-            response_data={
-                'headers': dict(response.headers),
-                'body': response.text,
-                'json': response.json() if response.headers.get('content-type', '').startswith('application/json') else None
-            },
-            status_code=response.status_code,
-            response_time=response_time,
-            assertions_results=assertions_results,
-            executed_by=executed_by
-        )
-        
-        return {
+        with ApiExecutionEngine(environment, executed_by, transport=transport, profile=profile) as engine:
+            outcome = engine.execute(api_request)
+            if outcome['response'] is None:
+                raise outcome['exception']
+            history = engine.save_history(outcome)
+
+        response = outcome['response']
+        result = {
             'success': True,
             'history_id': history.id,
             'status_code': response.status_code,
-            'response_time': response_time,
-            'assertions_results': assertions_results,
-            'response_data': {
-                'headers': dict(response.headers),
-                'body': response.text,
-                'json': response.json() if response.headers.get('content-type', '').startswith('application/json') else None
-            }
+            'response_time': outcome['response_time'],
+            'assertions_results': outcome['assertions_results'],
+            'response_data': history.response_data
         }
-        
+        if engine.profile:
+            result['profile'] = engine.profile_summary()
+        return result
+
     except Exception as e:
         return {
             'success': False,
             'error': str(e)
         }
-
-
-def _replace_variables(text, variables):
-    """替换文本中的变量"""
-    if not isinstance(text, str):
-        return text
-    
-    result = text
-    for key, value in (variables or {}).items():
-        if isinstance(value, dict):
-            replacement = str(value.get('currentValue', '') or value.get('initialValue', ''))
-        else:
-            replacement = str(value) if value is not None else ''
-        result = result.replace(f'{{{{{key}}}}}', replacement)
-    return result
-
-
-def _replace_variables_in_dict(data, variables):
-    """递归替换字典中的变量"""
-    if isinstance(data, dict):
-        return {k: _replace_variables_in_dict(v, variables) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [_replace_variables_in_dict(item, variables) for item in data]
-    elif isinstance(data, str):
-        return _replace_variables(data, variables)
-    else:
-        return data
@@ -40,7 +40,9 @@ from .serializers import (
 
 logger = logging.getLogger(__name__)
 
-from .utils import execute_assertions
+from .engine import ApiExecutionEngine, parse_bool
+from .history import get_full_body, parse_json_body
+from .utils import execute_test_suite
 from .operation_logger import log_operation
 from .serializers import (
     ApiProjectSerializer, ApiCollectionSerializer, ApiRequestSerializer,
@@ -329,143 +331,39 @@ class ApiRequestViewSet(viewsets.ModelViewSet):
         """执行API请求"""
         api_request = self.get_object()
         environment_id = request.data.get('environment_id')
-        
-        try:
-            # 解析环境变量
-            variables = {}
-            if environment_id:
-                env = Environment.objects.get(id=environment_id)
-                variables.update(env.variables)
-            
-            # 替换URL中的变量
-            url = self._replace_variables(api_request.url or '', variables)
-            
-            # 准备请求头
-            headers = {}
-            if isinstance(api_request.headers, list):
-                for header_item in api_request.headers:
-                    if header_item.get('enabled', True) and header_item.get('key'):
-                        key = header_item['key']
-                        value = self._replace_variables(str(header_item.get('value', '')), variables)
-                        headers[key] = value
-            else:
-                headers = api_request.headers.copy()
-                for key, value in headers.items():
-                    headers[key] = self._replace_variables(str(value), variables)
-            
-            # 准备请求参数
-            params = api_request.params.copy() if api_request.params else {}
-            for key, value in params.items():
-                params[key] = self._replace_variables(str(value), variables)
-            
-            # 准备请求体
-            body_data = None
-            if api_request.body and api_request.method in ['POST', 'PUT', 'PATCH']:
-                if api_request.body.get('type') == 'json':
-                    body_data = api_request.body.get('data', {})
-                    body_data = self._replace_variables_in_dict(body_data, variables)
-                else:
-                    body_data = self._replace_variables_in_dict(api_request.body.get('data'), variables)
-            
-            # 执行请求
-            start_time = time.time()
-            response = requests.request(
-                method=api_request.method,
-                url=url,
-                headers=headers,
-                params=params,
-                json=body_data,
-                timeout=30
-            )
-            end_time = time.time()
-            
-            response_time = (end_time - start_time) * 1000  # 转换为毫秒
-            
-            # 执行断言验证
-            assertions = api_request.assertions or []
-            for assertion in assertions:
-                if assertion.get('type') == 'response_time':
-                    assertion['actual_time'] = response_time
-            assertions_results = execute_assertions(response, assertions)
-            
-            # 保存请求历史
-            history = RequestHistory.objects.create(
-                request=api_request,
-                environment_id=environment_id,
-                request_data={
-                    'url': url,
-                    'method': api_request.method,
-                    'headers': headers,
-                    'params': params,
-                    'body': body_data
-                },
-                response_data={
-                    'headers': dict(response.headers),
-                    'body': response.text,
-                    'json': response.json() if response.headers.get('content-type', '').startswith('application/json') else None
-                },
-                status_code=response.status_code,
-                response_time=response_time,
-                executed_by=request.user
-            )
-            
-            # 记录执行操作
-            log_operation(
-                operation_type='execute',
-                resource_type='request',
-                resource_id=api_request.id,
-                resource_name=api_request.name,
-                user=request.user
-            )
-            
-            # 返回包含断言结果的数据
-            history_data = RequestHistorySerializer(history).data
-            history_data['assertions_results'] = assertions_results
-            
-            return Response(history_data)
-            
-        except Exception as e:
-            # 保存错误历史
-            history = RequestHistory.objects.create(
-                request=api_request,
-                environment_id=environment_id,
-                request_data={
-                    'url': api_request.url,
-                    'method': api_request.method,
-                    'headers': api_request.headers,
-                    'params': api_request.params,
-                    'body': api_request.body
-                },
-                error_message=str(e),
-                executed_by=request.user
-            )
-            
+        environment = get_object_or_404(Environment, id=environment_id) if environment_id else None
+
+        with ApiExecutionEngine(environment, request.user, profile=parse_bool(request.data.get('profile'))) as engine:
+            outcome = engine.execute(api_request)
+            history = engine.save_history(outcome)
+
+        if outcome['response'] is None:
+            # 请求发送失败，返回记录了错误信息的请求历史
             return Response(RequestHistorySerializer(history).data, status=status.HTTP_400_BAD_REQUEST)
-    
-    def _replace_variables(self, text, variables):
-        """替换文本中的变量"""
-        if not isinstance(text, str):
-            return text
-        
-        result = text
-        for key, value in (variables or {}).items():
-            if isinstance(value, dict):
-                replacement = str(value.get('currentValue', '') or value.get('initialValue', ''))
-            else:
-                replacement = str(value) if value is not None else ''
-            result = result.replace(f'{{{{{key}}}}}', replacement)
-        return result
-    
-    def _replace_variables_in_dict(self, data, variables):
-        """递归替换字典中的变量"""
-        if isinstance(data, dict):
-            return {k: self._replace_variables_in_dict(v, variables) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._replace_variables_in_dict(item, variables) for item in data]
-        elif isinstance(data, str):
-            return self._replace_variables(data, variables)
-        else:
-            return data
+
+        # 记录执行操作
+        log_operation(
+            operation_type='execute',
+            resource_type='request',
+            resource_id=api_request.id,
+            resource_name=api_request.name,
+            user=request.user
+        )
+
+        # 返回包含断言结果的数据，调试时直接返回完整响应体和解析后的JSON
+        history_data = RequestHistorySerializer(history).data
+        history_data['assertions_results'] = outcome['assertions_results']
+        response = outcome['response']
+        history_data['response_data'] = dict(
+            history_data['response_data'],
+            body=response.text,
+            json=parse_json_body(response.text, response.headers),
+            body_truncated=False
+        )
+        if engine.profile:
+            history_data['profile'] = engine.profile_summary()
+
+        return Response(history_data)
 
 
 class EnvironmentViewSet(viewsets.ModelViewSet):
@@ -579,6 +477,22 @@ class RequestHistoryViewSet(viewsets.ModelViewSet):
         
         return Response({'message': f'成功删除 {deleted_count} 条记录'})
 
+    @action(detail=True, methods=['get'])
+    def body(self, request, pk=None):
+        """获取完整响应体，超过存储阈值的响应体从外部存储中读取"""
+        history = self.get_object()
+        response_data = history.response_data or {}
+        try:
+            body = get_full_body(response_data)
+        except FileNotFoundError:
+            return Response({'error': '响应体文件不存在或已被清理'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'body': body,
+            'json': parse_json_body(body, response_data.get('headers')),
+            'body_size': response_data.get('body_size', len(body.encode('utf-8')))
+        })
+
 
 class TestSuiteViewSet(viewsets.ModelViewSet):
     queryset = TestSuite.objects.all()
@@ -597,187 +511,35 @@ class TestSuiteViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def execute(self, request, pk=None):
-        """执行测试套件"""
+        """执行测试套件
+
+        可通过 concurrency 参数覆盖套件配置的最大并发数，
+        transport 参数指定传输方式(sync/pooled/async)，profile 参数开启耗时分析。
+        """
         test_suite = self.get_object()
-        
-        try:
-            # 创建执行记录
-            execution = TestExecution.objects.create(
-                test_suite=test_suite,
-                status='RUNNING',
-                start_time=timezone.now(),
-                executed_by=request.user
-            )
-            
-            # 获取套件中的请求
-            suite_requests = TestSuiteRequest.objects.filter(
-                test_suite=test_suite,
-                enabled=True
-            ).order_by('order')
-            
-            execution.total_requests = suite_requests.count()
-            execution.save()
-            
-            results = []
-            passed_count = 0
-            failed_count = 0
-            
-            # 执行每个请求
-            for suite_request in suite_requests:
-                api_request = suite_request.request
-                
-                try:
-                    # 解析环境变量
-                    variables = {}
-                    if test_suite.environment:
-                        variables.update(test_suite.environment.variables)
-                    
-                    # 替换URL中的变量
-                    url = self._replace_variables(api_request.url, variables)
-                    
-                    # 准备请求头
-                    headers = {}
-                    # 支持新的数组格式和旧的对象格式
-                    if isinstance(api_request.headers, list):
-                        # 新的数组格式 [{"key": "Authorization", "value": "Bearer {{token}}", "enabled": true, "description": "..."}]
-                        for header_item in api_request.headers:
-                            if header_item.get('enabled', True) and header_item.get('key'):
-                                key = header_item['key']
-                                value = self._replace_variables(str(header_item.get('value', '')), variables)
-                                headers[key] = value
-                    else:
-                        # 旧的对象格式 {"Authorization": "Bearer {{token}}"}
-                        headers = api_request.headers.copy()
-                        for key, value in headers.items():
-                            headers[key] = self._replace_variables(str(value), variables)
-                    
-                    params = api_request.params.copy()
-                    for key, value in params.items():
-                        params[key] = self._replace_variables(str(value), variables)
-                    
-                    body_data = None
-                    if api_request.body and api_request.method in ['POST', 'PUT', 'PATCH']:
-                        if api_request.body.get('type') == 'json':
-                            body_data = api_request.body.get('data', {})
-                            body_data = self._replace_variables_in_dict(body_data, variables)
-                    
-                    # 执行请求
-                    start_time = time.time()
-                    response = requests.request(
-                        method=api_request.method,
-                        url=url,
-                        headers=headers,
-                        params=params,
-                        json=body_data,
-                        timeout=30
-                    )
-                    end_time = time.time()
-                    response_time = (end_time - start_time) * 1000
-                    
-                    # 执行断言验证
-                    assertions = api_request.assertions or []
-                    # 添加响应时间到断言中
-                    for assertion in assertions:
-                        if assertion.get('type') == 'response_time':
-                            assertion['actual_time'] = response_time
-                    
-                    # 使用共享的断言执行方法
-                    assertions_results = execute_assertions(response, assertions)
-                    
-                    # 检查所有断言是否通过
-                    passed = True
-                    error_message = ''
-                    
-                    # 检查套件请求的断言
-                    for assertion in suite_request.assertions:
-                        # 简单的状态码断言
-                        if assertion.get('type') == 'status_code':
-                            expected = assertion.get('value')
-                            if response.status_code != expected:
-                                passed = False
-                                error_message = f'状态码断言失败: 期望 {expected}, 实际 {response.status_code}'
-                                break
-                    
-                    # 检查接口自身的断言
-                    if passed and assertions_results:
-                        for assertion_result in assertions_results:
-                            if not assertion_result.get('passed', True):
-                                passed = False
-                                error_message = f"断言失败: {assertion_result.get('name', '未命名断言')} - {assertion_result.get('error', '断言不通过')}"
-                                break
-                    
-                    if passed:
-                        passed_count += 1
-                    else:
-                        failed_count += 1
-                    
-                    results.append({
-                        'name': api_request.name,
-                        'method': api_request.method,
-                        'url': url,
-                        'status_code': response.status_code,
-                        'response_time': response_time,
-                        'passed': passed,
-                        'error': error_message,
-                        'assertions_results': assertions_results
-                    })
-                    
-                    # 保存请求历史
-                    RequestHistory.objects.create(
-                        request=api_request,
-                        environment=test_suite.environment,
-                        request_data={
-                            'url': url,
-                            'method': api_request.method,
-                            'headers': headers,
-                            'params': params,
-                            'body': body_data
-                        },
-                        response_data={
-                            'headers': dict(response.headers),
-                            'body': response.text,
-                            'json': response.json() if response.headers.get('content-type', '').startswith('application/json') else None
-                        },
-                        status_code=response.status_code,
-                        response_time=response_time,
-                        assertions_results=assertions_results,
-                        executed_by=request.user
-                    )
-                    
-                except Exception as e:
-                    failed_count += 1
-                    results.append({
-                        'name': api_request.name,
-                        'method': api_request.method,
-                        'url': api_request.url,
-                        'passed': False,
-                        'error': str(e)
-                    })
-            
-            # 更新执行结果
-            execution.end_time = timezone.now()
-            execution.passed_requests = passed_count
-            execution.failed_requests = failed_count
-            execution.status = 'COMPLETED' if failed_count == 0 else 'FAILED'
-            execution.results = results
-            execution.save()
-            
-            # 记录执行操作
-            log_operation(
-                operation_type='execute',
-                resource_type='suite',
-                resource_id=test_suite.id,
-                resource_name=test_suite.name,
-                user=request.user
-            )
-            
-            return Response(TestExecutionSerializer(execution).data)
-            
-        except Exception as e:
-            execution.status = 'FAILED'
-            execution.end_time = timezone.now()
-            execution.save()
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = execute_test_suite(
+            test_suite,
+            test_suite.environment,
+            request.user,
+            concurrency=request.data.get('concurrency'),
+            transport=request.data.get('transport'),
+            profile=parse_bool(request.data.get('profile'))
+        )
+        if not result.get('success'):
+            return Response({'error': result.get('error')}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 记录执行操作
+        log_operation(
+            operation_type='execute',
+            resource_type='suite',
+            resource_id=test_suite.id,
+            resource_name=test_suite.name,
+            user=request.user
+        )
+
+        execution = TestExecution.objects.get(id=result['execution_id'])
+        return Response(TestExecutionSerializer(execution).data)
 
     def perform_create(self, serializer):
         """创建测试套件时记录日志"""
@@ -835,31 +597,6 @@ class TestSuiteViewSet(viewsets.ModelViewSet):
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-    
-    def _replace_variables(self, text, variables):
-        """替换文本中的变量"""
-        if not isinstance(text, str):
-            return text
-        
-        result = text
-        for key, value in (variables or {}).items():
-            if isinstance(value, dict):
-                replacement = str(value.get('currentValue', '') or value.get('initialValue', ''))
-            else:
-                replacement = str(value) if value is not None else ''
-            result = result.replace(f'{{{{{key}}}}}', replacement)
-        return result
-    
-    def _replace_variables_in_dict(self, data, variables):
-        """递归替换字典中的变量"""
-        if isinstance(data, dict):
-            return {k: self._replace_variables_in_dict(v, variables) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._replace_variables_in_dict(item, variables) for item in data]
-        elif isinstance(data, str):
-            return self._replace_variables(data, variables)
-        else:
-            return data
 
 
 class TestSuiteRequestViewSet(viewsets.ModelViewSet):
@@ -1390,6 +1127,7 @@ class ScheduledTaskViewSet(viewsets.ModelViewSet):
     def run_now(self, request, pk=None):
         """立即执行定时任务"""
         import logging
+        import queue
         logger = logging.getLogger(__name__)
         logger.info("=== run_now 方法被调用 ===")
         
@@ -1423,6 +1161,11 @@ class ScheduledTaskViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_200_OK
             )
             
+        except queue.Full as e:
+            return Response(
+                {'error': f'执行任务失败: {str(e)}，请稍后重试'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         except Exception as e:
             return Response(
                 {'error': f'执行任务失败: {str(e)}'},
@@ -1492,9 +1235,13 @@ class ScheduledTaskViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     def _execute_task_async(self, task, execution_log):
-        """异步执行任务"""
-        import threading
-        from datetime import datetime
+        """提交任务到API执行池排队执行
+
+        待执行(PENDING)的执行日志即持久化的队列，开始执行时以状态更新的方式认领，
+        同一条日志不会被多个进程重复执行。队列已满时把执行日志标记为已取消并抛出 queue.Full。
+        """
+        import queue
+        from apps.core.workers import get_worker_pool
         
         # 添加测试日志
         import logging
@@ -1503,10 +1250,18 @@ class ScheduledTaskViewSet(viewsets.ModelViewSet):
         
         def execute():
             try:
-                # 更新执行状态
+                # 认领执行日志并记录排队等待时长
+                start_time = timezone.now()
+                queue_wait = (start_time - execution_log.created_at).total_seconds()
+                claimed = TaskExecutionLog.objects.filter(pk=execution_log.pk, status='PENDING').update(
+                    status='RUNNING', start_time=start_time, queue_wait=queue_wait
+                )
+                if not claimed:
+                    logger.info(f"执行日志 {execution_log.pk} 已被其他进程认领或取消，跳过")
+                    return
                 execution_log.status = 'RUNNING'
-                execution_log.start_time = timezone.now()
-                execution_log.save()
+                execution_log.start_time = start_time
+                execution_log.queue_wait = queue_wait
                 
                 # 执行任务
                 if task.task_type == 'TEST_SUITE':
@@ -1599,10 +1354,18 @@ class ScheduledTaskViewSet(viewsets.ModelViewSet):
                     logger.info("通知设置未启用或不存在，跳过失败通知")
                 logger.info("=== 结束检查发送失败通知 ===")
         
-        # 在新线程中执行
-        thread = threading.Thread(target=execute)
-        thread.daemon = True
-        thread.start()
+        # 在执行池中排队执行
+        pool = get_worker_pool('api')
+        execution_log.queue_depth = pool.depth
+        execution_log.save(update_fields=['queue_depth'])
+        try:
+            pool.submit(execute)
+        except queue.Full as e:
+            execution_log.status = 'CANCELLED'
+            execution_log.end_time = timezone.now()
+            execution_log.error_message = str(e)
+            execution_log.save()
+            raise
     
     def _execute_test_suite(self, task):
         """执行测试套件"""
@@ -0,0 +1,73 @@
+"""
+Django管理命令：按保留策略归档并清理执行历史数据
+用法：python manage.py cleanup_execution_history [--tables request_history operation_log] [--dry-run]
+保留策略在 settings.HISTORY_RETENTION 中配置，也可以用 --days/--max-rows 临时覆盖。
+"""
+from django.core.management.base import BaseCommand
+
+from apps.core.retention import RETENTION_TABLES, enforce_all
+
+
+def format_bytes(size):
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+
+class Command(BaseCommand):
+    help = '按保留策略归档并清理执行历史数据（请求历史、任务执行日志、通知日志、操作日志、UI用例执行记录、测试执行历史）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tables',
+            nargs='+',
+            choices=list(RETENTION_TABLES),
+            help='指定要清理的表，默认清理所有表'
+        )
+        parser.add_argument('--days', type=int, help='覆盖保留天数')
+        parser.add_argument('--max-rows', type=int, help='覆盖最大保留行数')
+        parser.add_argument('--batch-size', type=int, help='每批删除的行数')
+        parser.add_argument('--sleep', type=float, default=0, help='每批之间暂停的秒数，降低数据库压力')
+        parser.add_argument('--no-archive', action='store_true', help='删除前不归档')
+        parser.add_argument('--dry-run', action='store_true', help='只统计将被清理的行数，不做任何修改')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        self.stdout.write(self.style.SUCCESS('开始执行数据保留策略' + ('（试运行）' if dry_run else '')))
+
+        results = enforce_all(
+            tables=options['tables'],
+            days=options['days'],
+            max_rows=options['max_rows'],
+            batch_size=options['batch_size'],
+            archive=not options['no_archive'],
+            dry_run=dry_run,
+            sleep_seconds=options['sleep'],
+        )
+
+        total_rows = 0
+        total_bytes = 0
+        for result in results:
+            if result.get('error'):
+                self.stdout.write(self.style.ERROR(f"✗ {result['table']}: {result['error']}"))
+                continue
+            if not result.get('days') and not result.get('max_rows'):
+                self.stdout.write(f"  {result['table']}: 未配置保留策略，跳过")
+                continue
+
+            total_rows += result['rows']
+            total_bytes += result['bytes_reclaimed']
+            if dry_run:
+                self.stdout.write(f"  {result['table']}: 将清理 {result['rows']} 行")
+            else:
+                line = f"✓ {result['table']}: 清理 {result['rows']} 行, 回收约 {format_bytes(result['bytes_reclaimed'])}"
+                if result['archive_file']:
+                    line += f", 归档 {result['archive_file']} ({format_bytes(result['archive_bytes'])})"
+                self.stdout.write(self.style.SUCCESS(line))
+
+        summary = f"合计 {total_rows} 行"
+        if not dry_run:
+            summary += f", 回收约 {format_bytes(total_bytes)}"
+        self.stdout.write(self.style.SUCCESS(summary))
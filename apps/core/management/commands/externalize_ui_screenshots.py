@@ -0,0 +1,57 @@
+"""
+Django管理命令：把历史执行记录中以 base64 data URL 保存的UI截图转存为文件
+用法：python manage.py externalize_ui_screenshots [--batch-size 200] [--dry-run]
+转存后执行记录中只保存截图引用，文件位置见 settings.UI_AUTOMATION_SCREENSHOT_DIR。
+"""
+from django.core.management.base import BaseCommand
+
+from apps.ui_automation.models import TestCaseExecution, TestExecution
+from apps.ui_automation.screenshot_store import externalize_screenshots
+
+
+class Command(BaseCommand):
+    help = '把UI用例执行记录和测试执行报告中的 base64 截图转存为文件，执行记录中只保留引用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='每批处理的记录数')
+        parser.add_argument('--dry-run', action='store_true', help='只统计需要转存的记录数，不做任何修改')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        case_executions = TestCaseExecution.objects.filter(screenshots__icontains='data:image').only('id', 'screenshots')
+        executions = TestExecution.objects.filter(result_data__icontains='data:image').only('id', 'result_data')
+        if dry_run:
+            self.stdout.write(f"  用例执行记录: {case_executions.count()} 条需要转存")
+            self.stdout.write(f"  测试执行报告: {executions.count()} 条需要转存")
+            return
+
+        converted = 0
+        last_id = 0
+        while True:
+            # 转存失败的记录仍包含 data URL，按主键向后推进避免重复处理
+            batch = list(case_executions.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not batch:
+                break
+            for case_execution in batch:
+                case_execution.screenshots = externalize_screenshots(case_execution.screenshots)
+                case_execution.save(update_fields=['screenshots'])
+                converted += 1
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f"✓ 用例执行记录: 转存 {converted} 条"))
+
+        converted = 0
+        last_id = 0
+        while True:
+            batch = list(executions.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not batch:
+                break
+            for execution in batch:
+                for case_result in (execution.result_data or {}).get('test_cases', []):
+                    if isinstance(case_result, dict) and case_result.get('screenshots'):
+                        case_result['screenshots'] = externalize_screenshots(case_result['screenshots'])
+                execution.save(update_fields=['result_data'])
+                converted += 1
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f"✓ 测试执行报告: 转存 {converted} 条"))
@@ -2,8 +2,13 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 import time
 import logging
+import queue
 import sys
 
+from apps.core.scheduler import TaskScheduler
+from apps.core.workers import get_worker_pool
+from apps.ui_automation.browser_pool import get_thread_browser_pool
+
 logger = logging.getLogger(__name__)
 
 
@@ -13,476 +18,532 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
             '--interval',
-            type=int,
-            default=60,
-            help='检查间隔（秒），默认60秒'
+            type=float,
+            default=5,
+            help='检查其他进程中任务变更的间隔（秒），默认5秒；任务按下次运行时间准时触发，不受此间隔影响'
         )
         parser.add_argument(
             '--once',
             action='store_true',
             help='只执行一次检查，不循环'
         )
+        parser.add_argument(
+            '--retention-interval',
+            type=float,
+            default=0,
+            help='按 HISTORY_RETENTION 归档清理执行历史的间隔（小时），默认0表示不执行'
+        )
 
     def handle(self, *args, **options):
         interval = options['interval']
         run_once = options['once']
+        self.retention_interval = options['retention_interval']
+        self.last_retention_run = None
+        self.retention_thread = None
 
         self.stdout.write(self.style.SUCCESS(f"{'='*60}"))
         self.stdout.write(self.style.SUCCESS("启动统一定时任务调度器"))
-        self.stdout.write(self.style.SUCCESS(f"检查间隔: {interval}秒"))
+        self.stdout.write(self.style.SUCCESS(f"任务变更检查间隔: {interval}秒"))
         self.stdout.write(self.style.SUCCESS(f"调度模块: API测试 + UI自动化"))
+        self.stdout.write(self.style.SUCCESS(
+            f"执行池: API {get_worker_pool('api').workers} 个并发, UI {get_worker_pool('ui').workers} 个并发"))
         self.stdout.write(self.style.SUCCESS(f"{'='*60}"))
 
-        while True:
-            try:
-                now = timezone.now()
-                self.stdout.write(f"\n[{now.strftime('%Y-%m-%d %H:%M:%S')}] 开始检查任务...")
-
-                # 调度 API 测试模块的定时任务
-                api_count = self.schedule_api_tasks()
+        self.recover_pending_api_tasks()
 
-                # 调度 UI 自动化模块的定时任务
-                ui_count = self.schedule_ui_tasks()
+        scheduler = TaskScheduler()
+        scheduler.start()
+        try:
+            while True:
+                try:
+                    # 只在任务表有变化时重新加载
+                    loaded = scheduler.refresh()
+                    if loaded:
+                        logger.debug(f"定时任务调度器重新加载了 {loaded} 个任务")
+
+                    due_tasks = scheduler.pop_due()
+                    if due_tasks:
+                        now = timezone.now()
+                        self.stdout.write(f"\n[{now.strftime('%Y-%m-%d %H:%M:%S')}] {len(due_tasks)} 个任务到期")
+                        api_count, ui_count = self.run_due_tasks(scheduler, due_tasks)
+                        self.stdout.write(self.style.SUCCESS(f"✓ 本次调度执行了 {api_count + ui_count} 个任务 (API: {api_count}, UI: {ui_count})"))
+
+                    # 按间隔执行执行历史的保留策略
+                    self.run_retention_if_due()
+
+                    if run_once:
+                        self.stdout.write(self.style.WARNING("单次执行模式，调度器退出"))
+                        break
+
+                    # 睡眠到最早的任务到期，或本进程内任务变更，或到达检查间隔
+                    scheduler.wait(interval)
+
+                except KeyboardInterrupt:
+                    self.stdout.write(self.style.WARNING("\n\n调度器已停止"))
+                    break
+                except Exception as e:
+                    logger.error(f"调度器运行出错: {e}", exc_info=True)
+                    self.stdout.write(self.style.ERROR(f"调度器运行出错: {e}"))
+                    if run_once:
+                        break
+                    self.stdout.write(f"等待 {interval} 秒后重试...")
+                    time.sleep(interval)
+        finally:
+            scheduler.stop()
+
+    def run_due_tasks(self, scheduler, due_tasks):
+        """执行到期的任务，返回 (API任务数, UI任务数)
+
+        启动时出错的任务按退避时间重试；无需执行的任务按数据库中的下次运行时间重新调度。
+        """
+        from apps.api_testing.models import ScheduledTask
+        from apps.ui_automation.models import UiScheduledTask
+
+        runners = {
+            'api': (ScheduledTask, self.run_api_task),
+            'ui': (UiScheduledTask, self.run_ui_task),
+        }
+        counts = {'api': 0, 'ui': 0}
+        for kind, task_id in due_tasks:
+            model, runner = runners[kind]
+            key = (kind, task_id)
+            try:
+                task = model.objects.filter(pk=task_id).first()
+                # 堆中的时间可能已过期，以数据库中的状态为准
+                if not task or not task.should_run_now():
+                    active = task is not None and task.status == 'ACTIVE'
+                    scheduler.release(key, task.next_run_time if active else None)
+                    continue
+                # 返回 False 的任务（跳过、配置错误）已自行重新计算下次运行时间
+                started = runner(task)
+            except Exception as e:
+                delay = scheduler.retry_later(key)
+                logger.error(f"启动{kind.upper()}任务 {task_id} 时出错，{delay} 秒后重试: {e}", exc_info=True)
+                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task_id} 启动失败，{delay} 秒后重试: {e}"))
+                continue
+            scheduler.mark_started(key)
+            if started:
+                counts[kind] += 1
+                self.stdout.write(self.style.SUCCESS(f"    ✓ 任务 {task.name} 已启动"))
+        return counts['api'], counts['ui']
+
+    def run_retention_if_due(self):
+        """到达间隔时在后台线程中执行数据保留策略，上一次未完成时跳过"""
+        if not self.retention_interval:
+            return
+        now = timezone.now()
+        if self.last_retention_run and (now - self.last_retention_run).total_seconds() < self.retention_interval * 3600:
+            return
+        if self.retention_thread and self.retention_thread.is_alive():
+            return
+
+        import threading
+        from apps.core.retention import enforce_all
+
+        def run_retention():
+            try:
+                results = enforce_all()
+                total_rows = sum(result['rows'] for result in results)
+                total_bytes = sum(result['bytes_reclaimed'] for result in results)
+                logger.info(f"数据保留策略执行完成: 清理 {total_rows} 行, 回收约 {total_bytes} 字节")
+            except Exception as e:
+                logger.error(f"执行数据保留策略时出错: {e}", exc_info=True)
 
-                total_count = api_count + ui_count
-                if total_count > 0:
-                    self.stdout.write(self.style.SUCCESS(f"✓ 本次调度执行了 {total_count} 个任务 (API: {api_count}, UI: {ui_count})"))
-                else:
-                    self.stdout.write("  没有需要执行的任务")
+        self.last_retention_run = now
+        self.stdout.write("  开始执行数据保留策略...")
+        self.retention_thread = threading.Thread(target=run_retention, daemon=True)
+        self.retention_thread.start()
 
-                if run_once:
-                    self.stdout.write(self.style.WARNING("单次执行模式，调度器退出"))
-                    break
+    def run_api_task(self, task):
+        """启动 API 测试模块的定时任务"""
+        from apps.api_testing.models import TaskExecutionLog
+        from apps.api_testing.views import ScheduledTaskViewSet
 
-                self.stdout.write(f"等待 {interval} 秒后进行下一次检查...")
-                time.sleep(interval)
+        self.stdout.write(f"  [API] 执行任务: {task.name}")
+        self.stdout.write(f"       类型: {task.get_task_type_display()}, 触发方式: {task.get_trigger_type_display()}")
 
-            except KeyboardInterrupt:
-                self.stdout.write(self.style.WARNING("\n\n调度器已停止"))
-                break
-            except Exception as e:
-                logger.error(f"调度器运行出错: {e}", exc_info=True)
-                self.stdout.write(self.style.ERROR(f"调度器运行出错: {e}"))
-                if run_once:
-                    break
-                self.stdout.write(f"等待 {interval} 秒后重试...")
-                time.sleep(interval)
+        # 创建执行日志
+        execution_log = TaskExecutionLog.objects.create(
+            task=task,
+            status='PENDING'
+        )
 
-    def schedule_api_tasks(self):
-        """调度 API 测试模块的定时任务"""
+        # 提交到执行池，队列已满时跳过本次触发
+        view = ScheduledTaskViewSet()
         try:
-            from apps.api_testing.models import ScheduledTask
-            from apps.api_testing.views import ScheduledTaskViewSet
-
-            # 获取所有活跃的定时任务
-            active_tasks = ScheduledTask.objects.filter(status='ACTIVE')
-            executed_count = 0
-
-            # 显示所有活跃任务的调试信息
-            if active_tasks.exists():
-                now = timezone.now()
-                self.stdout.write(f"  [API] 活跃任务数: {active_tasks.count()}")
-                for task in active_tasks:
-                    if task.next_run_time:
-                        time_diff = (task.next_run_time - now).total_seconds()
-                        if time_diff > 0:
-                            self.stdout.write(f"        - {task.name}: 距下次执行还有 {int(time_diff)} 秒")
+            view._execute_task_async(task, execution_log)
+        except queue.Full as e:
+            self.skip_task(task, str(e))
+            return False
+        return True
+
+    def recover_pending_api_tasks(self):
+        """把上次退出时未开始执行的API任务重新放入执行池"""
+        from apps.api_testing.models import TaskExecutionLog
+        from apps.api_testing.views import ScheduledTaskViewSet
+
+        view = ScheduledTaskViewSet()
+        recovered = 0
+        for execution_log in TaskExecutionLog.objects.filter(status='PENDING').select_related('task').order_by('created_at'):
+            try:
+                view._execute_task_async(execution_log.task, execution_log)
+            except queue.Full:
+                break
+            recovered += 1
+        if recovered:
+            self.stdout.write(f"  恢复了 {recovered} 个待执行的API任务")
+
+    def skip_task(self, task, reason):
+        """执行池已满时跳过本次触发，直接计算下次运行时间"""
+        logger.warning(f"定时任务 {task.name} 本次触发被跳过: {reason}")
+        self.stdout.write(self.style.WARNING(f"    - 任务 {task.name} 本次触发被跳过: {reason}"))
+        task.last_result = {'status': 'skipped', 'error': reason}
+        task.next_run_time = task.calculate_next_run()
+        task.save()
+
+    def run_ui_task(self, task):
+        """启动 UI 自动化模块的定时任务"""
+        self.stdout.write(f"  [UI]  执行任务: {task.name}")
+        self.stdout.write(f"       类型: {task.get_task_type_display()}, 触发方式: {task.get_trigger_type_display()}")
+
+        # 浏览器执行池队列已满时跳过本次触发，并撤销对运行时间和次数的修改
+        pool = get_worker_pool('ui')
+        previous_run = (task.last_run_time, task.total_runs)
+
+        # 更新任务执行时间和次数
+        task.last_run_time = timezone.now()
+        task.total_runs += 1
+        # 先保存，确保last_run_time被更新
+        task.save()
+
+        # 根据任务类型执行不同的逻辑
+        if task.task_type == 'TEST_SUITE':
+            # 执行测试套件
+            if not task.test_suite:
+                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 未配置测试套件"))
+                # 即使失败也要重新计算下次运行时间
+                task.refresh_from_db()
+                task.next_run_time = task.calculate_next_run()
+                task.save()
+                return False
+
+            test_suite = task.test_suite
+            test_case_count = test_suite.suite_test_cases.count()
+
+            if test_case_count == 0:
+                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 的测试套件没有用例"))
+                # 即使失败也要重新计算下次运行时间
+                task.refresh_from_db()
+                task.next_run_time = task.calculate_next_run()
+                task.save()
+                return False
+
+            # 更新套件执行状态
+            previous_suite_status = test_suite.execution_status
+            test_suite.execution_status = 'running'
+            test_suite.save()
+
+            # 在执行池中执行测试
+            from apps.ui_automation.test_executor import TestExecutor
+
+            def run_test():
+                try:
+                    executor = TestExecutor(
+                        test_suite=test_suite,
+                        engine=task.engine,
+                        browser=task.browser,
+                        headless=task.headless,
+                        executed_by=task.created_by,
+                        # 执行池的工作线程长期运行，浏览器在多次执行之间复用
+                        browser_pool=get_thread_browser_pool()
+                    )
+                    executor.run()
+
+                    # 测试完成后，重新加载任务并更新结果和下次运行时间
+                    task.refresh_from_db()
+                    task.successful_runs += 1
+                    task.last_result = {
+                        'status': 'success',
+                        'test_case_count': test_case_count
+                    }
+                    # 重新计算下次运行时间
+                    task.next_run_time = task.calculate_next_run()
+                    task.save()
+
+                    logger.info(f"UI定时任务 {task.name} 执行成功")
+
+                    # 发送成功通知
+                    print("       === 开始检查发送成功通知 ===")
+                    notification_setting = None
+                    if hasattr(task, 'notification_settings'):
+                        try:
+                            notification_setting = task.notification_settings.first()
+                            print(f"       获取到通知设置: {notification_setting}")
+                            if notification_setting:
+                                print(f"       通知设置详情 - ID: {notification_setting.id}, 是否启用: {notification_setting.is_enabled}, 成功通知: {notification_setting.notify_on_success}")
+                            else:
+                                print("       没有找到通知设置")
+                        except Exception as e:
+                            print(f"       获取任务通知设置时出错: {e}", file=sys.stderr)
+                            import traceback
+                            traceback.print_exc()
+                    else:
+                        print("       任务没有notification_settings属性")
+
+                    if notification_setting and notification_setting.is_enabled:
+                        print("       通知设置已启用，准备发送成功通知")
+                        if notification_setting.notify_on_success:
+                            print("       调用 _send_task_notification 方法发送成功通知")
+                            try:
+                                from apps.ui_automation.views import UiScheduledTaskViewSet
+                                viewset = UiScheduledTaskViewSet()
+                                viewset._send_task_notification(task, success=True)
+                                print("       ✓ 成功通知已发送")
+                            except Exception as e:
+                                print(f"       ✗ 发送UI定时任务 {task.name} 成功通知失败: {e}", file=sys.stderr)
                         else:
-                            self.stdout.write(f"        - {task.name}: 应该立即执行！")
+                            print("       通知设置中未启用成功通知")
                     else:
-                        self.stdout.write(f"        - {task.name}: 未设置下次执行时间")
+                        print("       通知设置未启用或不存在，跳过成功通知")
+                    print("       === 结束检查发送成功通知 ===")
+
+                except Exception as e:
+                    logger.error(f"UI定时任务 {task.name} 执行失败: {e}", exc_info=True)
+                    task.refresh_from_db()
+                    task.failed_runs += 1
+                    task.error_message = str(e)
+                    task.last_result = {
+                        'status': 'failed',
+                        'error': str(e)
+                    }
+                    # 即使失败也要重新计算下次运行时间
+                    task.next_run_time = task.calculate_next_run()
+                    task.save()
+
+                    # 发送失败通知
+                    print("       === 开始检查发送失败通知 ===")
+                    notification_setting = None
+                    if hasattr(task, 'notification_settings'):
+                        try:
+                            notification_setting = task.notification_settings.first()
+                            print(f"       获取到通知设置（失败情况）: {notification_setting}")
+                            if notification_setting:
+                                print(f"       通知设置详情（失败情况） - ID: {notification_setting.id}, 是否启用: {notification_setting.is_enabled}, 失败通知: {notification_setting.notify_on_failure}")
+                            else:
+                                print("       没有找到通知设置（失败情况）")
+                        except Exception as notify_error:
+                            print(f"       获取任务通知设置时出错（失败情况）: {notify_error}", file=sys.stderr)
+                            import traceback
+                            traceback.print_exc()
+                    else:
+                        print("       任务没有notification_settings属性（失败情况）")
+
+                    if notification_setting and notification_setting.is_enabled:
+                        print("       通知设置已启用，准备发送失败通知")
+                        if notification_setting.notify_on_failure:
+                            print("       调用 _send_task_notification 方法发送失败通知")
+                            try:
+                                from apps.ui_automation.views import UiScheduledTaskViewSet
+                                viewset = UiScheduledTaskViewSet()
+                                viewset._send_task_notification(task, success=False)
+                                print("       ✓ 失败通知已发送")
+                            except Exception as notify_error:
+                                print(f"       ✗ 发送UI定时任务 {task.name} 失败通知失败: {notify_error}", file=sys.stderr)
+                        else:
+                            print("       通知设置中未启用失败通知")
+                    else:
+                        print("       通知设置未启用或不存在，跳过失败通知")
+                    print("       === 结束检查发送失败通知 ===")
 
-            for task in active_tasks:
-                if task.should_run_now():
-                    self.stdout.write(f"  [API] 执行任务: {task.name}")
-                    self.stdout.write(f"       类型: {task.get_task_type_display() if hasattr(task, 'get_task_type_display') else task.task_type}, 触发方式: {task.get_trigger_type_display() if hasattr(task, 'get_trigger_type_display') else task.trigger_type}")
+            try:
+                pool.submit(run_test)
+            except queue.Full as e:
+                test_suite.execution_status = previous_suite_status
+                test_suite.save()
+                task.last_run_time, task.total_runs = previous_run
+                self.skip_task(task, str(e))
+                return False
+
+        elif task.task_type == 'TEST_CASE':
+            # 执行单个或多个测试用例
+            if not task.test_cases:
+                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 未配置测试用例"))
+                # 即使失败也要重新计算下次运行时间
+                task.refresh_from_db()
+                task.next_run_time = task.calculate_next_run()
+                task.save()
+                return False
+
+            # 获取测试用例
+            from apps.ui_automation.models import TestCase as UiTestCase
+            test_cases_list = UiTestCase.objects.filter(id__in=task.test_cases)
+
+            if not test_cases_list.exists():
+                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 的测试用例不存在"))
+                # 即使失败也要重新计算下次运行时间
+                task.refresh_from_db()
+                task.next_run_time = task.calculate_next_run()
+                task.save()
+                return False
+
+            test_case_count = test_cases_list.count()
+            self.stdout.write(f"    准备执行 {test_case_count} 个测试用例")
+
+            # 为每个测试用例创建一个临时的测试套件来执行
+            from apps.ui_automation.models import TestSuite
+            from apps.ui_automation.test_executor import TestExecutor
+
+            def run_test_cases():
+                success_count = 0
+                failed_count = 0
+                results = []
+
+                for test_case in test_cases_list:
+                    temp_suite = None
                     try:
-                        # 创建执行日志
-                        from apps.api_testing.models import TaskExecutionLog
-                        execution_log = TaskExecutionLog.objects.create(
-                            task=task,
-                            status='PENDING'
+                        # 创建临时测试套件
+                        temp_suite = TestSuite.objects.create(
+                            project=task.project,
+                            name=f"[临时] {test_case.name}"
                         )
 
-                        # 调用任务执行方法
-                        view = ScheduledTaskViewSet()
-                        view._execute_task_async(task, execution_log)
-
-                        executed_count += 1
-                        self.stdout.write(self.style.SUCCESS(f"    ✓ 任务 {task.name} 已启动"))
+                        # 添加测试用例到临时套件
+                        temp_suite.test_cases.add(test_case)
+
+                        # 更新套件执行状态
+                        temp_suite.execution_status = 'running'
+                        temp_suite.save()
+
+                        # 使用 TestExecutor 执行
+                        executor = TestExecutor(
+                            test_suite=temp_suite,
+                            engine=task.engine,
+                            browser=task.browser,
+                            headless=task.headless,
+                            executed_by=task.created_by,
+                            # 执行池的工作线程长期运行，浏览器在多次执行之间复用
+                            browser_pool=get_thread_browser_pool()
+                        )
+                        executor.run()
+
+                        # 检查执行结果
+                        temp_suite.refresh_from_db()
+                        suite_executions = temp_suite.executions.all()
+
+                        if suite_executions.exists():
+                            last_execution = suite_executions.first()
+
+                            if last_execution.status == 'SUCCESS':
+                                success_count += 1
+                                results.append({
+                                    'case_id': test_case.id,
+                                    'case_name': test_case.name,
+                                    'status': 'success'
+                                })
+                            else:
+                                failed_count += 1
+                                results.append({
+                                    'case_id': test_case.id,
+                                    'case_name': test_case.name,
+                                    'status': 'failed',
+                                    'error': last_execution.error_message
+                                })
 
                     except Exception as e:
-                        logger.error(f"执行API任务 {task.name} 时出错: {e}", exc_info=True)
-                        self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 执行失败: {e}"))
-
-            return executed_count
-
-        except Exception as e:
-            logger.error(f"调度API任务时出错: {e}", exc_info=True)
-            self.stdout.write(self.style.ERROR(f"[API] 调度失败: {e}"))
-            return 0
+                        logger.error(f"执行测试用例 {test_case.name} 失败: {e}")
+                        failed_count += 1
+                        results.append({
+                            'case_id': test_case.id,
+                            'case_name': test_case.name,
+                            'status': 'failed',
+                            'error': str(e)
+                        })
+                    finally:
+                        # 删除临时测试套件
+                        if temp_suite:
+                            temp_suite.delete()
+
+                # 更新任务执行结果
+                task.refresh_from_db()
+                task.successful_runs += 1
+                task.last_result = {
+                    'status': 'success' if failed_count == 0 else 'partial_success',
+                    'test_case_count': test_case_count,
+                    'success_count': success_count,
+                    'failed_count': failed_count,
+                    'results': results
+                }
+                # 重新计算下次运行时间
+                task.next_run_time = task.calculate_next_run()
+                task.save()
+
+                logger.info(f"UI定时任务 {task.name} 执行完成: 成功{success_count}, 失败{failed_count}")
+
+                # 发送通知
+                success = (failed_count == 0)
+                if success:
+                    print("       === 开始检查发送成功通知 ===")
+                else:
+                    print("       === 开始检查发送失败通知 ===")
 
-    def schedule_ui_tasks(self):
-        """调度 UI 自动化模块的定时任务"""
-        try:
-            from apps.ui_automation.models import UiScheduledTask
-
-            # 获取所有活跃的定时任务
-            active_tasks = UiScheduledTask.objects.filter(status='ACTIVE')
-            executed_count = 0
-
-            # 显示所有活跃任务的调试信息
-            if active_tasks.exists():
-                now = timezone.now()
-                self.stdout.write(f"  [UI]  活跃任务数: {active_tasks.count()}")
-                for task in active_tasks:
-                    if task.next_run_time:
-                        time_diff = (task.next_run_time - now).total_seconds()
-                        if time_diff > 0:
-                            self.stdout.write(f"        - {task.name}: 距下次执行还有 {int(time_diff)} 秒")
+                notification_setting = None
+                if hasattr(task, 'notification_settings'):
+                    try:
+                        notification_setting = task.notification_settings.first()
+                        print(f"       获取到通知设置: {notification_setting}")
+                        if notification_setting:
+                            if success:
+                                print(f"       通知设置详情 - ID: {notification_setting.id}, 是否启用: {notification_setting.is_enabled}, 成功通知: {notification_setting.notify_on_success}")
+                            else:
+                                print(f"       通知设置详情 - ID: {notification_setting.id}, 是否启用: {notification_setting.is_enabled}, 失败通知: {notification_setting.notify_on_failure}")
                         else:
-                            self.stdout.write(f"        - {task.name}: 应该立即执行！")
+                            print("       没有找到通知设置")
+                    except Exception as e:
+                        print(f"       获取任务通知设置时出错: {e}", file=sys.stderr)
+                        import traceback
+                        traceback.print_exc()
+                else:
+                    print("       任务没有notification_settings属性")
+
+                if notification_setting and notification_setting.is_enabled:
+                    print("       通知设置已启用，准备发送通知")
+                    if success and notification_setting.notify_on_success:
+                        print("       调用 _send_task_notification 方法发送成功通知")
+                        try:
+                            from apps.ui_automation.views import UiScheduledTaskViewSet
+                            viewset = UiScheduledTaskViewSet()
+                            viewset._send_task_notification(task, success=True)
+                            print(f"       ✓ 成功通知已发送 (成功:{success_count}, 失败:{failed_count})")
+                        except Exception as e:
+                            print(f"       ✗ 发送UI定时任务 {task.name} 成功通知失败: {e}", file=sys.stderr)
+                    elif not success and notification_setting.notify_on_failure:
+                        print("       调用 _send_task_notification 方法发送失败通知")
+                        try:
+                            from apps.ui_automation.views import UiScheduledTaskViewSet
+                            viewset = UiScheduledTaskViewSet()
+                            viewset._send_task_notification(task, success=False)
+                            print(f"       ✓ 失败通知已发送 (成功:{success_count}, 失败:{failed_count})")
+                        except Exception as e:
+                            print(f"       ✗ 发送UI定时任务 {task.name} 失败通知失败: {e}", file=sys.stderr)
                     else:
-                        self.stdout.write(f"        - {task.name}: 未设置下次执行时间")
-
-            for task in active_tasks:
-                if task.should_run_now():
-                    self.stdout.write(f"  [UI]  执行任务: {task.name}")
-                    self.stdout.write(f"       类型: {task.get_task_type_display()}, 触发方式: {task.get_trigger_type_display()}")
-                    try:
-                        # 更新任务执行时间和次数
-                        task.last_run_time = timezone.now()
-                        task.total_runs += 1
-                        # 先保存，确保last_run_time被更新
-                        task.save()
-
-                        # 根据任务类型执行不同的逻辑
-                        if task.task_type == 'TEST_SUITE':
-                            # 执行测试套件
-                            if not task.test_suite:
-                                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 未配置测试套件"))
-                                # 即使失败也要重新计算下次运行时间
-                                task.refresh_from_db()
-                                task.next_run_time = task.calculate_next_run()
-                                task.save()
-                                continue
-
-                            test_suite = task.test_suite
-                            test_case_count = test_suite.suite_test_cases.count()
-
-                            if test_case_count == 0:
-                                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 的测试套件没有用例"))
-                                # 即使失败也要重新计算下次运行时间
-                                task.refresh_from_db()
-                                task.next_run_time = task.calculate_next_run()
-                                task.save()
-                                continue
-
-                            # 更新套件执行状态
-                            test_suite.execution_status = 'running'
-                            test_suite.save()
-
-                            # 在后台线程中执行测试
-                            import threading
-                            from apps.ui_automation.test_executor import TestExecutor
-
-                            def run_test():
-                                try:
-                                    executor = TestExecutor(
-                                        test_suite=test_suite,
-                                        engine=task.engine,
-                                        browser=task.browser,
-                                        headless=task.headless,
-                                        executed_by=task.created_by
-                                    )
-                                    executor.run()
-
-                                    # 测试完成后，重新加载任务并更新结果和下次运行时间
-                                    task.refresh_from_db()
-                                    task.successful_runs += 1
-                                    task.last_result = {
-                                        'status': 'success',
-                                        'test_case_count': test_case_count
-                                    }
-                                    # 重新计算下次运行时间
-                                    task.next_run_time = task.calculate_next_run()
-                                    task.save()
-
-                                    logger.info(f"UI定时任务 {task.name} 执行成功")
-
-                                    # 发送成功通知
-                                    print("       === 开始检查发送成功通知 ===")
-                                    notification_setting = None
-                                    if hasattr(task, 'notification_settings'):
-                                        try:
-                                            notification_setting = task.notification_settings.first()
-                                            print(f"       获取到通知设置: {notification_setting}")
-                                            if notification_setting:
-                                                print(f"       通知设置详情 - ID: {notification_setting.id}, 是否启用: {notification_setting.is_enabled}, 成功通知: {notification_setting.notify_on_success}")
-                                            else:
-                                                print("       没有找到通知设置")
-                                        except Exception as e:
-                                            print(f"       获取任务通知设置时出错: {e}", file=sys.stderr)
-                                            import traceback
-                                            traceback.print_exc()
-                                    else:
-                                        print("       任务没有notification_settings属性")
-
-                                    if notification_setting and notification_setting.is_enabled:
-                                        print("       通知设置已启用，准备发送成功通知")
-                                        if notification_setting.notify_on_success:
-                                            print("       调用 _send_task_notification 方法发送成功通知")
-                                            try:
-                                                from apps.ui_automation.views import UiScheduledTaskViewSet
-                                                viewset = UiScheduledTaskViewSet()
-                                                viewset._send_task_notification(task, success=True)
-                                                print("       ✓ 成功通知已发送")
-                                            except Exception as e:
-                                                print(f"       ✗ 发送UI定时任务 {task.name} 成功通知失败: {e}", file=sys.stderr)
-                                        else:
-                                            print("       通知设置中未启用成功通知")
-                                    else:
-                                        print("       通知设置未启用或不存在，跳过成功通知")
-                                    print("       === 结束检查发送成功通知 ===")
-
-                                except Exception as e:
-                                    logger.error(f"UI定时任务 {task.name} 执行失败: {e}", exc_info=True)
-                                    task.refresh_from_db()
-                                    task.failed_runs += 1
-                                    task.error_message = str(e)
-                                    task.last_result = {
-                                        'status': 'failed',
-                                        'error': str(e)
-                                    }
-                                    # 即使失败也要重新计算下次运行时间
-                                    task.next_run_time = task.calculate_next_run()
-                                    task.save()
-
-                                    # 发送失败通知
-                                    print("       === 开始检查发送失败通知 ===")
-                                    notification_setting = None
-                                    if hasattr(task, 'notification_settings'):
-                                        try:
-                                            notification_setting = task.notification_settings.first()
-                                            print(f"       获取到通知设置（失败情况）: {notification_setting}")
-                                            if notification_setting:
-                                                print(f"       通知设置详情（失败情况） - ID: {notification_setting.id}, 是否启用: {notification_setting.is_enabled}, 失败通知: {notification_setting.notify_on_failure}")
-                                            else:
-                                                print("       没有找到通知设置（失败情况）")
-                                        except Exception as notify_error:
-                                            print(f"       获取任务通知设置时出错（失败情况）: {notify_error}", file=sys.stderr)
-                                            import traceback
-                                            traceback.print_exc()
-                                    else:
-                                        print("       任务没有notification_settings属性（失败情况）")
-
-                                    if notification_setting and notification_setting.is_enabled:
-                                        print("       通知设置已启用，准备发送失败通知")
-                                        if notification_setting.notify_on_failure:
-                                            print("       调用 _send_task_notification 方法发送失败通知")
-                                            try:
-                                                from apps.ui_automation.views import UiScheduledTaskViewSet
-                                                viewset = UiScheduledTaskViewSet()
-                                                viewset._send_task_notification(task, success=False)
-                                                print("       ✓ 失败通知已发送")
-                                            except Exception as notify_error:
-                                                print(f"       ✗ 发送UI定时任务 {task.name} 失败通知失败: {notify_error}", file=sys.stderr)
-                                        else:
-                                            print("       通知设置中未启用失败通知")
-                                    else:
-                                        print("       通知设置未启用或不存在，跳过失败通知")
-                                    print("       === 结束检查发送失败通知 ===")
-
-                            thread = threading.Thread(target=run_test, daemon=True)
-                            thread.start()
-
-                        elif task.task_type == 'TEST_CASE':
-                            # 执行单个或多个测试用例
-                            if not task.test_cases:
-                                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 未配置测试用例"))
-                                # 即使失败也要重新计算下次运行时间
-                                task.refresh_from_db()
-                                task.next_run_time = task.calculate_next_run()
-                                task.save()
-                                continue
-
-                            # 获取测试用例
-                            from apps.ui_automation.models import TestCase as UiTestCase
-                            test_cases_list = UiTestCase.objects.filter(id__in=task.test_cases)
-
-                            if not test_cases_list.exists():
-                                self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 的测试用例不存在"))
-                                # 即使失败也要重新计算下次运行时间
-                                task.refresh_from_db()
-                                task.next_run_time = task.calculate_next_run()
-                                task.save()
-                                continue
-
-                            test_case_count = test_cases_list.count()
-                            self.stdout.write(f"    准备执行 {test_case_count} 个测试用例")
-
-                            # 为每个测试用例创建一个临时的测试套件来执行
-                            import threading
-                            from apps.ui_automation.models import TestSuite
-                            from apps.ui_automation.test_executor import TestExecutor
-
-                            def run_test_cases():
-                                success_count = 0
-                                failed_count = 0
-                                results = []
-
-                                for test_case in test_cases_list:
-                                    temp_suite = None
-                                    try:
-                                        # 创建临时测试套件
-                                        temp_suite = TestSuite.objects.create(
-                                            project=task.project,
-                                            name=f"[临时] {test_case.name}"
-                                        )
-
-                                        # 添加测试用例到临时套件
-                                        temp_suite.test_cases.add(test_case)
-
-                                        # 更新套件执行状态
-                                        temp_suite.execution_status = 'running'
-                                        temp_suite.save()
-
-                                        # 使用 TestExecutor 执行
-                                        executor = TestExecutor(
-                                            test_suite=temp_suite,
-                                            engine=task.engine,
-                                            browser=task.browser,
-                                            headless=task.headless,
-                                            executed_by=task.created_by
-                                        )
-                                        executor.run()
-
-                                        # 检查执行结果
-                                        temp_suite.refresh_from_db()
-                                        suite_executions = temp_suite.executions.all()
-
-                                        if suite_executions.exists():
-                                            last_execution = suite_executions.first()
-
-                                            if last_execution.status == 'SUCCESS':
-                                                success_count += 1
-                                                results.append({
-                                                    'case_id': test_case.id,
-                                                    'case_name': test_case.name,
-                                                    'status': 'success'
-                                                })
-                                            else:
-                                                failed_count += 1
-                                                results.append({
-                                                    'case_id': test_case.id,
-                                                    'case_name': test_case.name,
-                                                    'status': 'failed',
-                                                    'error': last_execution.error_message
-                                                })
-
-                                    except Exception as e:
-                                        logger.error(f"执行测试用例 {test_case.name} 失败: {e}")
-                                        failed_count += 1
-                                        results.append({
-                                            'case_id': test_case.id,
-                                            'case_name': test_case.name,
-                                            'status': 'failed',
-                                            'error': str(e)
-                                        })
-                                    finally:
-                                        # 删除临时测试套件
-                                        if temp_suite:
-                                            temp_suite.delete()
-
-                                # 更新任务执行结果
-                                task.refresh_from_db()
-                                task.successful_runs += 1
-                                task.last_result = {
-                                    'status': 'success' if failed_count == 0 else 'partial_success',
-                                    'test_case_count': test_case_count,
-                                    'success_count': success_count,
-                                    'failed_count': failed_count,
-                                    'results': results
-                                }
-                                # 重新计算下次运行时间
-                                task.next_run_time = task.calculate_next_run()
-                                task.save()
-
-                                logger.info(f"UI定时任务 {task.name} 执行完成: 成功{success_count}, 失败{failed_count}")
-
-                                # 发送通知
-                                success = (failed_count == 0)
-                                if success:
-                                    print("       === 开始检查发送成功通知 ===")
-                                else:
-                                    print("       === 开始检查发送失败通知 ===")
-
-                                notification_setting = None
-                                if hasattr(task, 'notification_settings'):
-                                    try:
-                                        notification_setting = task.notification_settings.first()
-                                        print(f"       获取到通知设置: {notification_setting}")
-                                        if notification_setting:
-                                            if success:
-                                                print(f"       通知设置详情 - ID: {notification_setting.id}, 是否启用: {notification_setting.is_enabled}, 成功通知: {notification_setting.notify_on_success}")
-                                            else:
-                                                print(f"       通知设置详情 - ID: {notification_setting.id}, 是否启用: {notification_setting.is_enabled}, 失败通知: {notification_setting.notify_on_failure}")
-                                        else:
-                                            print("       没有找到通知设置")
-                                    except Exception as e:
-                                        print(f"       获取任务通知设置时出错: {e}", file=sys.stderr)
-                                        import traceback
-                                        traceback.print_exc()
-                                else:
-                                    print("       任务没有notification_settings属性")
-
-                                if notification_setting and notification_setting.is_enabled:
-                                    print("       通知设置已启用，准备发送通知")
-                                    if success and notification_setting.notify_on_success:
-                                        print("       调用 _send_task_notification 方法发送成功通知")
-                                        try:
-                                            from apps.ui_automation.views import UiScheduledTaskViewSet
-                                            viewset = UiScheduledTaskViewSet()
-                                            viewset._send_task_notification(task, success=True)
-                                            print(f"       ✓ 成功通知已发送 (成功:{success_count}, 失败:{failed_count})")
-                                        except Exception as e:
-                                            print(f"       ✗ 发送UI定时任务 {task.name} 成功通知失败: {e}", file=sys.stderr)
-                                    elif not success and notification_setting.notify_on_failure:
-                                        print("       调用 _send_task_notification 方法发送失败通知")
-                                        try:
-                                            from apps.ui_automation.views import UiScheduledTaskViewSet
-                                            viewset = UiScheduledTaskViewSet()
-                                            viewset._send_task_notification(task, success=False)
-                                            print(f"       ✓ 失败通知已发送 (成功:{success_count}, 失败:{failed_count})")
-                                        except Exception as e:
-                                            print(f"       ✗ 发送UI定时任务 {task.name} 失败通知失败: {e}", file=sys.stderr)
-                                    else:
-                                        if success:
-                                            print("       通知设置中未启用成功通知")
-                                        else:
-                                            print("       通知设置中未启用失败通知")
-                                else:
-                                    print("       通知设置未启用或不存在，跳过通知")
-
-                                if success:
-                                    print("       === 结束检查发送成功通知 ===")
-                                else:
-                                    print("       === 结束检查发送失败通知 ===")
-
-                            # 在后台线程中执行
-                            thread = threading.Thread(target=run_test_cases, daemon=True)
-                            thread.start()
-
-                        executed_count += 1
-                        self.stdout.write(self.style.SUCCESS(f"    ✓ 任务 {task.name} 已启动"))
+                        if success:
+                            print("       通知设置中未启用成功通知")
+                        else:
+                            print("       通知设置中未启用失败通知")
+                else:
+                    print("       通知设置未启用或不存在，跳过通知")
 
-                    except Exception as e:
-                        logger.error(f"执行UI任务 {task.name} 时出错: {e}", exc_info=True)
-                        self.stdout.write(self.style.ERROR(f"    ✗ 任务 {task.name} 执行失败: {e}"))
+                if success:
+                    print("       === 结束检查发送成功通知 ===")
+                else:
+                    print("       === 结束检查发送失败通知 ===")
 
-            return executed_count
+            # 在执行池中执行
+            try:
+                pool.submit(run_test_cases)
+            except queue.Full as e:
+                task.last_run_time, task.total_runs = previous_run
+                self.skip_task(task, str(e))
+                return False
 
-        except Exception as e:
-            logger.error(f"调度UI任务时出错: {e}", exc_info=True)
-            self.stdout.write(self.style.ERROR(f"[UI] 调度失败: {e}"))
-            return 0
+        return True
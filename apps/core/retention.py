@@ -0,0 +1,192 @@
+"""
+执行历史数据保留策略
+按表配置保留天数和最大保留行数，超出的记录先归档到 gzip 压缩的 JSONL 文件，再分批删除。
+每批只按主键删除 batch_size 条记录，避免长时间锁表。
+
+配置示例 (settings.HISTORY_RETENTION):
+    {
+        'request_history': {'days': 30, 'max_rows': 200000},
+        'operation_log': {'days': 180},
+    }
+未配置 days/max_rows 的表对应条件不生效。
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 表标识 -> (模型, 时间字段)
+RETENTION_TABLES = {
+    'request_history': ('api_testing.RequestHistory', 'executed_at'),
+    'task_execution_log': ('api_testing.TaskExecutionLog', 'created_at'),
+    'notification_log': ('api_testing.NotificationLog', 'created_at'),
+    'operation_log': ('api_testing.OperationLog', 'created_at'),
+    'ui_case_execution': ('ui_automation.TestCaseExecution', 'created_at'),
+    'test_run_case_history': ('executions.TestRunCaseHistory', 'executed_at'),
+}
+
+
+def get_retention_policy(table):
+    """获取表的保留策略"""
+    return (getattr(settings, 'HISTORY_RETENTION', {}) or {}).get(table) or {}
+
+
+def _expired_filter(queryset, date_field, days=None, max_rows=None, now=None):
+    """构造过期记录的过滤条件，没有过期条件时返回 None"""
+    conditions = Q()
+    has_condition = False
+
+    if days:
+        cutoff = (now or timezone.now()) - timedelta(days=days)
+        conditions |= Q(**{f'{date_field}__lt': cutoff})
+        has_condition = True
+
+    if max_rows:
+        # 找到第 max_rows 条最新记录之后的第一条记录作为边界，边界及更早的记录都超出保留行数
+        boundary = queryset.order_by(f'-{date_field}', '-pk').values_list(date_field, 'pk')[max_rows:max_rows + 1]
+        boundary = list(boundary)
+        if boundary:
+            boundary_date, boundary_pk = boundary[0]
+            conditions |= Q(**{f'{date_field}__lt': boundary_date})
+            conditions |= Q(**{date_field: boundary_date, 'pk__lte': boundary_pk})
+            has_condition = True
+
+    return conditions if has_condition else None
+
+
+def _archive_path(table, now):
+    archive_dir = getattr(settings, 'HISTORY_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives'))
+    table_dir = os.path.join(archive_dir, table)
+    os.makedirs(table_dir, exist_ok=True)
+    return os.path.join(table_dir, f"{table}-{now.strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+
+
+def enforce_retention(table, days=None, max_rows=None, batch_size=None, archive=True,
+                      dry_run=False, sleep_seconds=0, now=None):
+    """对单个表执行保留策略
+
+    返回统计信息: 删除行数、归档文件、归档字节数（压缩后）、回收字节数（序列化后的原始数据大小）。
+    """
+    model_label, date_field = RETENTION_TABLES[table]
+    model = apps.get_model(model_label)
+    policy = get_retention_policy(table)
+    days = days if days is not None else policy.get('days')
+    max_rows = max_rows if max_rows is not None else policy.get('max_rows')
+    batch_size = batch_size or getattr(settings, 'HISTORY_RETENTION_BATCH_SIZE', 1000)
+    now = now or timezone.now()
+
+    stats = {
+        'table': table,
+        'days': days,
+        'max_rows': max_rows,
+        'rows': 0,
+        'bytes_reclaimed': 0,
+        'archive_file': None,
+        'archive_bytes': 0,
+        'dry_run': dry_run,
+    }
+
+    queryset = model.objects.all()
+    expired = _expired_filter(queryset, date_field, days, max_rows, now)
+    if expired is None:
+        return stats
+
+    expired_queryset = queryset.filter(expired)
+    if dry_run:
+        stats['rows'] = expired_queryset.count()
+        return stats
+
+    archive_file = None
+    try:
+        while True:
+            # 每批按主键取出并删除，删除语句只涉及少量行
+            rows = list(expired_queryset.order_by('pk')[:batch_size])
+            if not rows:
+                break
+
+            lines = [
+                json.dumps({field.attname: field.value_from_object(row) for field in model._meta.concrete_fields},
+                           cls=DjangoJSONEncoder, ensure_ascii=False)
+                for row in rows
+            ]
+            if archive:
+                if archive_file is None:
+                    stats['archive_file'] = _archive_path(table, now)
+                    archive_file = gzip.open(stats['archive_file'], 'at', encoding='utf-8')
+                archive_file.write('\n'.join(lines) + '\n')
+                archive_file.flush()
+
+            model.objects.filter(pk__in=[row.pk for row in rows]).delete()
+            stats['rows'] += len(rows)
+            stats['bytes_reclaimed'] += sum(len(line.encode('utf-8')) for line in lines)
+
+            after_delete = AFTER_DELETE_HOOKS.get(table)
+            if after_delete:
+                stats['bytes_reclaimed'] += after_delete(rows)
+
+            if len(rows) < batch_size:
+                break
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+            stats['archive_bytes'] = os.path.getsize(stats['archive_file'])
+
+    logger.info(f"数据保留策略 {table}: 删除 {stats['rows']} 行, 回收约 {stats['bytes_reclaimed']} 字节")
+    return stats
+
+
+def _cleanup_request_history_bodies(rows):
+    """删除不再被任何请求历史引用的外部响应体文件，返回释放的字节数"""
+    from apps.api_testing.history import remove_unreferenced_bodies
+
+    body_refs = {row.body_ref for row in rows}
+    body_refs.discard('')
+    if not body_refs:
+        return 0
+    return remove_unreferenced_bodies(body_refs)
+
+
+def _cleanup_ui_case_screenshots(rows):
+    """删除不再被任何执行记录引用的截图文件，返回释放的字节数"""
+    from apps.ui_automation.screenshot_store import remove_unreferenced_screenshots
+
+    refs = {
+        screenshot.get('ref')
+        for row in rows
+        for screenshot in (row.screenshots or [])
+        if isinstance(screenshot, dict)
+    }
+    refs.discard(None)
+    if not refs:
+        return 0
+    return remove_unreferenced_screenshots(refs)
+
+
+AFTER_DELETE_HOOKS = {
+    'request_history': _cleanup_request_history_bodies,
+    'ui_case_execution': _cleanup_ui_case_screenshots,
+}
+
+
+def enforce_all(tables=None, **options):
+    """对配置了保留策略的表执行清理，返回每个表的统计信息"""
+    results = []
+    for table in tables or RETENTION_TABLES:
+        try:
+            results.append(enforce_retention(table, **options))
+        except Exception as e:
+            logger.error(f"执行数据保留策略 {table} 时出错: {e}", exc_info=True)
+            results.append({'table': table, 'error': str(e), 'rows': 0, 'bytes_reclaimed': 0})
+    return results
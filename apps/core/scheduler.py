@@ -0,0 +1,199 @@
+"""
+定时任务调度
+内存中维护按 next_run_time 排序的最小堆，调度器只需睡眠到最早的任务到期，不再每个周期扫描全表。
+
+任务变更的感知方式:
+- 本进程内的保存/删除（例如任务执行完成后更新 next_run_time）通过 post_save/post_delete 信号立即唤醒调度器；
+- 其他进程（Web 服务）的创建、修改、暂停通过定期比较 (行数, 最大 updated_at) 指纹发现，
+  指纹未变化时不加载任何任务；行数不变时只增量加载 updated_at 不早于上次最大值的任务。
+
+已触发的任务在其 next_run_time 被执行结果更新之前不会再次入堆，避免长时间运行的任务被重复触发；
+启动失败的任务按退避时间重新入堆（retry_later），到期时发现无需执行的任务按数据库中的状态重新调度（release）。
+"""
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.apps import apps
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 任务类型 -> 模型
+TASK_SOURCES = {
+    'api': 'api_testing.ScheduledTask',
+    'ui': 'ui_automation.UiScheduledTask',
+}
+
+
+class TaskScheduler:
+    """基于最小堆的定时任务调度器
+
+    用法:
+        scheduler = TaskScheduler()
+        scheduler.start()
+        while True:
+            scheduler.refresh()
+            for kind, task_id in scheduler.pop_due():
+                ...
+            scheduler.wait(max_seconds=5)
+    """
+
+    # 启动失败的任务重试间隔（秒），连续失败时翻倍，最长 RETRY_MAX_SECONDS
+    RETRY_BASE_SECONDS = 30
+    RETRY_MAX_SECONDS = 1800
+
+    def __init__(self, sources=None):
+        self.sources = dict(sources or TASK_SOURCES)
+        self.heap = []
+        # (类型, 任务ID) -> 堆中有效的 next_run_time，堆中其他同键条目视为已失效
+        self.entries = {}
+        # (类型, 任务ID) -> 已触发但尚未更新的 next_run_time
+        self.fired = {}
+        # (类型, 任务ID) -> 连续启动失败次数
+        self.failures = {}
+        self.fingerprints = {}
+        self.wake_event = threading.Event()
+        self._lock = threading.Lock()
+        self._dirty = set(self.sources)
+
+    def start(self):
+        """连接模型信号，本进程内的任务变更会立即唤醒调度器"""
+        for kind, label in self.sources.items():
+            model = apps.get_model(label)
+            post_save.connect(self._on_change, sender=model, weak=False, dispatch_uid=f'task_scheduler_{kind}_save')
+            post_delete.connect(self._on_change, sender=model, weak=False, dispatch_uid=f'task_scheduler_{kind}_delete')
+
+    def stop(self):
+        for kind, label in self.sources.items():
+            model = apps.get_model(label)
+            post_save.disconnect(sender=model, dispatch_uid=f'task_scheduler_{kind}_save')
+            post_delete.disconnect(sender=model, dispatch_uid=f'task_scheduler_{kind}_delete')
+
+    def _on_change(self, sender, **kwargs):
+        with self._lock:
+            for kind, label in self.sources.items():
+                if apps.get_model(label) is sender:
+                    self._dirty.add(kind)
+        self.wake_event.set()
+
+    def refresh(self, force=False):
+        """比较任务表指纹，有变化时更新堆，返回重新加载的任务数"""
+        with self._lock:
+            dirty = set(self._dirty)
+            self._dirty.clear()
+
+        loaded = 0
+        for kind, label in self.sources.items():
+            model = apps.get_model(label)
+            fingerprint = model.objects.aggregate(count=Count('pk'), latest=Max('updated_at'))
+            previous = self.fingerprints.get(kind)
+            if not force and kind not in dirty and previous == fingerprint:
+                continue
+
+            queryset = model.objects.all()
+            full_reload = force or previous is None or previous['count'] != fingerprint['count']
+            if not full_reload and previous['latest'] is not None:
+                queryset = queryset.filter(updated_at__gte=previous['latest'])
+
+            rows = list(queryset.values_list('pk', 'status', 'next_run_time'))
+            if full_reload:
+                self._drop_kind(kind, keep={pk for pk, _, _ in rows})
+            for pk, status, next_run_time in rows:
+                self._update_entry((kind, pk), next_run_time if status == 'ACTIVE' else None)
+            self.fingerprints[kind] = fingerprint
+            loaded += len(rows)
+
+        self._compact()
+        return loaded
+
+    def _drop_kind(self, kind, keep):
+        for key in [key for key in self.entries if key[0] == kind and key[1] not in keep]:
+            del self.entries[key]
+        for key in [key for key in self.fired if key[0] == kind and key[1] not in keep]:
+            del self.fired[key]
+        for key in [key for key in self.failures if key[0] == kind and key[1] not in keep]:
+            del self.failures[key]
+
+    def _update_entry(self, key, next_run_time):
+        if next_run_time is None:
+            self.entries.pop(key, None)
+            self.fired.pop(key, None)
+            self.failures.pop(key, None)
+            return
+        if key in self.fired:
+            if self.fired[key] == next_run_time:
+                # 任务仍在执行，等待执行结果更新下次运行时间
+                return
+            del self.fired[key]
+        if self.entries.get(key) != next_run_time:
+            self.entries[key] = next_run_time
+            heapq.heappush(self.heap, (next_run_time, key))
+
+    def _compact(self):
+        # 失效条目过多时重建堆
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(next_run_time, key) for key, next_run_time in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def _is_valid(self, item):
+        next_run_time, key = item
+        return self.entries.get(key) == next_run_time
+
+    def pop_due(self, now=None):
+        """弹出所有已到期的任务，返回 [(类型, 任务ID)]"""
+        now = now or timezone.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            item = heapq.heappop(self.heap)
+            if not self._is_valid(item):
+                continue
+            next_run_time, key = item
+            del self.entries[key]
+            self.fired[key] = next_run_time
+            due.append(key)
+        return due
+
+    def mark_started(self, key):
+        """任务已启动，下次运行时间由执行结果更新"""
+        self.failures.pop(key, None)
+
+    def retry_later(self, key, now=None):
+        """任务启动失败（例如数据库暂时不可用）时按退避时间重新入堆，返回重试间隔（秒）"""
+        attempts = self.failures.get(key, 0)
+        self.failures[key] = attempts + 1
+        delay = min(self.RETRY_BASE_SECONDS * 2 ** attempts, self.RETRY_MAX_SECONDS)
+        self.fired.pop(key, None)
+        retry_at = (now or timezone.now()) + timedelta(seconds=delay)
+        self.entries[key] = retry_at
+        heapq.heappush(self.heap, (retry_at, key))
+        return delay
+
+    def release(self, key, next_run_time):
+        """到期的任务无需执行（已暂停、已删除或下次运行时间已变化）时，按数据库中的下次运行时间重新调度"""
+        self.fired.pop(key, None)
+        self.failures.pop(key, None)
+        self._update_entry(key, next_run_time)
+
+    def next_run_time(self):
+        """最早的下次运行时间，没有任务时返回 None"""
+        while self.heap and not self._is_valid(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def seconds_until_next(self, now=None):
+        next_run_time = self.next_run_time()
+        if next_run_time is None:
+            return None
+        return max(0.0, (next_run_time - (now or timezone.now())).total_seconds())
+
+    def wait(self, max_seconds):
+        """睡眠到最早的任务到期、本进程内任务变更或 max_seconds 秒后"""
+        timeout = self.seconds_until_next()
+        timeout = max_seconds if timeout is None else min(timeout, max_seconds)
+        if timeout > 0:
+            self.wake_event.wait(timeout)
+        self.wake_event.clear()
@@ -0,0 +1,354 @@
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.api_testing.history import store_body
+from apps.api_testing.models import ApiCollection, ApiProject, ApiRequest, RequestHistory, ScheduledTask
+from apps.ui_automation.models import TestCase as UiTestCase, TestCaseExecution, TestExecution, UiProject
+from apps.users.models import User
+
+from . import retention, workers
+from .retention import enforce_retention
+from .scheduler import TaskScheduler
+from .workers import WorkerPool, get_worker_pool
+
+
+class TaskSchedulerHeapTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.scheduler = TaskScheduler(sources={})
+
+    def at(self, seconds):
+        return self.now + timedelta(seconds=seconds)
+
+    def test_pop_due_in_order(self):
+        """测试按下次运行时间顺序弹出已到期的任务"""
+        self.scheduler._update_entry(('api', 2), self.at(-5))
+        self.scheduler._update_entry(('api', 1), self.at(-10))
+        self.scheduler._update_entry(('ui', 1), self.at(60))
+        self.assertEqual(self.scheduler.pop_due(self.now), [('api', 1), ('api', 2)])
+        self.assertEqual(self.scheduler.pop_due(self.now), [])
+        self.assertEqual(self.scheduler.next_run_time(), self.at(60))
+        self.assertEqual(self.scheduler.seconds_until_next(self.now), 60)
+
+    def test_stale_entries_skipped(self):
+        """测试下次运行时间变化或任务暂停后，堆中的旧条目不再触发"""
+        self.scheduler._update_entry(('api', 1), self.at(-10))
+        self.scheduler._update_entry(('api', 1), self.at(30))
+        self.scheduler._update_entry(('api', 2), self.at(-10))
+        self.scheduler._update_entry(('api', 2), None)
+        self.assertEqual(self.scheduler.pop_due(self.now), [])
+        self.assertEqual(self.scheduler.pop_due(self.at(30)), [('api', 1)])
+        self.assertIsNone(self.scheduler.next_run_time())
+
+    def test_fired_task_not_requeued(self):
+        """测试已触发的任务在下次运行时间更新之前不会再次入堆"""
+        key = ('api', 1)
+        self.scheduler._update_entry(key, self.at(-1))
+        self.assertEqual(self.scheduler.pop_due(self.now), [key])
+        self.scheduler.mark_started(key)
+
+        # 任务仍在执行，数据库中的下次运行时间未变化
+        self.scheduler._update_entry(key, self.at(-1))
+        self.assertEqual(self.scheduler.pop_due(self.now), [])
+
+        # 执行结果更新了下次运行时间
+        self.scheduler._update_entry(key, self.at(60))
+        self.assertNotIn(key, self.scheduler.fired)
+        self.assertEqual(self.scheduler.pop_due(self.at(60)), [key])
+
+    def test_retry_later_backoff(self):
+        """测试启动失败的任务按指数退避重新入堆，启动成功后清除失败次数"""
+        key = ('ui', 3)
+        self.scheduler._update_entry(key, self.at(-1))
+        self.scheduler.pop_due(self.now)
+
+        self.assertEqual(self.scheduler.retry_later(key, now=self.now), 30)
+        self.assertEqual(self.scheduler.pop_due(self.at(29)), [])
+        self.assertEqual(self.scheduler.pop_due(self.at(30)), [key])
+        self.assertEqual(self.scheduler.retry_later(key, now=self.now), 60)
+        self.assertEqual(self.scheduler.retry_later(key, now=self.now), 120)
+
+        self.scheduler.failures[key] = 10
+        self.assertEqual(self.scheduler.retry_later(key, now=self.now), TaskScheduler.RETRY_MAX_SECONDS)
+
+        self.scheduler.pop_due(self.at(TaskScheduler.RETRY_MAX_SECONDS))
+        self.scheduler.mark_started(key)
+        self.assertNotIn(key, self.scheduler.failures)
+        self.assertEqual(self.scheduler.retry_later(key, now=self.now), 30)
+
+    def test_release(self):
+        """测试到期无需执行的任务按数据库中的下次运行时间重新调度"""
+        key = ('api', 1)
+        self.scheduler._update_entry(key, self.at(-1))
+        self.scheduler.pop_due(self.now)
+        self.scheduler.failures[key] = 2
+
+        self.scheduler.release(key, self.at(-1))
+        self.assertNotIn(key, self.scheduler.failures)
+        self.assertEqual(self.scheduler.pop_due(self.now), [key])
+
+        self.scheduler.release(key, None)
+        self.assertEqual(self.scheduler.entries, {})
+        self.assertEqual(self.scheduler.fired, {})
+
+    def test_compact(self):
+        """测试失效条目过多时重建堆"""
+        key = ('api', 1)
+        for seconds in range(100):
+            self.scheduler._update_entry(key, self.at(seconds))
+        self.scheduler._compact()
+        self.assertEqual(self.scheduler.heap, [(self.at(99), key)])
+
+
+class TaskSchedulerRefreshTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='scheduler')
+        self.now = timezone.now()
+        self.scheduler = TaskScheduler(sources={'api': 'api_testing.ScheduledTask'})
+
+    def create_task(self, name, seconds, status='ACTIVE'):
+        return ScheduledTask.objects.create(
+            name=name,
+            task_type='TEST_SUITE',
+            trigger_type='INTERVAL',
+            interval_seconds=60,
+            status=status,
+            next_run_time=self.now + timedelta(seconds=seconds),
+            created_by=self.user,
+        )
+
+    def test_refresh(self):
+        """测试首次加载、指纹未变化时跳过、暂停和删除的任务移出堆"""
+        first = self.create_task('first', -10)
+        second = self.create_task('second', 30)
+        self.create_task('paused', -10, status='PAUSED')
+
+        self.assertEqual(self.scheduler.refresh(), 3)
+        self.assertEqual(set(self.scheduler.entries), {('api', first.pk), ('api', second.pk)})
+        self.assertEqual(self.scheduler.refresh(), 0)
+
+        second.status = 'PAUSED'
+        second.save()
+        # 行数不变时只增量加载 updated_at 不早于上次最大值的任务
+        self.assertLess(self.scheduler.refresh(), 3)
+        self.assertEqual(set(self.scheduler.entries), {('api', first.pk)})
+
+        self.assertEqual(self.scheduler.pop_due(self.now), [('api', first.pk)])
+        first.delete()
+        self.scheduler.refresh()
+        self.assertEqual(self.scheduler.fired, {})
+        self.assertIsNone(self.scheduler.next_run_time())
+
+    def test_signal_marks_dirty(self):
+        """测试本进程内保存任务时通过信号唤醒调度器"""
+        self.scheduler.refresh()
+        self.scheduler.start()
+        try:
+            task = self.create_task('new', -10)
+            self.assertTrue(self.scheduler.wake_event.is_set())
+            self.assertEqual(self.scheduler.refresh(), 1)
+            self.assertEqual(self.scheduler.pop_due(self.now), [('api', task.pk)])
+        finally:
+            self.scheduler.stop()
+
+
+class RetentionTestCase(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.temp_dir,
+            HISTORY_ARCHIVE_DIR=os.path.join(self.temp_dir, 'archives'),
+            HISTORY_RETENTION={},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.now = timezone.now()
+        self.user = User.objects.create(username='retention')
+        project = ApiProject.objects.create(name='p', project_type='HTTP', status='IN_PROGRESS', owner=self.user)
+        collection = ApiCollection.objects.create(name='c', project=project)
+        self.api_request = ApiRequest.objects.create(
+            collection=collection, name='r', url='http://example.com', created_by=self.user
+        )
+
+    def history(self, days, body_ref=''):
+        row = RequestHistory.objects.create(
+            request=self.api_request, request_data={}, body_ref=body_ref, executed_by=self.user
+        )
+        RequestHistory.objects.filter(pk=row.pk).update(executed_at=self.now - timedelta(days=days))
+        return row.pk
+
+    def remaining(self):
+        return set(RequestHistory.objects.values_list('pk', flat=True))
+
+    def test_max_rows_boundary(self):
+        """测试超出最大保留行数时删除最早的记录，时间相同的记录按主键划分边界"""
+        # 后三条记录的时间相同，按主键从新到旧保留
+        pks = [self.history(days) for days in [5, 4, 3, 3, 3, 1]]
+        stats = enforce_retention('request_history', max_rows=3, archive=False, now=self.now)
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(self.remaining(), set(pks[3:]))
+
+        # 没有超出最大保留行数时不删除
+        self.assertEqual(enforce_retention('request_history', max_rows=3, now=self.now)['rows'], 0)
+        self.assertEqual(self.remaining(), set(pks[3:]))
+
+    def test_days_and_max_rows(self):
+        """测试保留天数和最大保留行数任一条件超出即删除"""
+        pks = [self.history(days) for days in [10, 6, 4, 2, 1]]
+        enforce_retention('request_history', days=5, max_rows=4, archive=False, now=self.now)
+        self.assertEqual(self.remaining(), set(pks[2:]))
+        enforce_retention('request_history', days=3, max_rows=10, archive=False, now=self.now)
+        self.assertEqual(self.remaining(), set(pks[3:]))
+
+    def test_no_policy(self):
+        """测试没有配置保留策略时不删除"""
+        self.history(400)
+        self.assertEqual(enforce_retention('request_history', now=self.now)['rows'], 0)
+        self.assertEqual(len(self.remaining()), 1)
+
+    def test_batches(self):
+        """测试按 batch_size 分批删除"""
+        for days in [9, 8, 7, 6, 5]:
+            self.history(days)
+        kept = self.history(1)
+        batches = []
+
+        def record_batch(rows):
+            batches.append(len(rows))
+            return 0
+
+        with mock.patch.dict(retention.AFTER_DELETE_HOOKS, {'request_history': record_batch}):
+            stats = enforce_retention('request_history', days=2, batch_size=2, archive=False, now=self.now)
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertEqual(stats['rows'], 5)
+        self.assertEqual(self.remaining(), {kept})
+
+    def test_dry_run(self):
+        """测试 dry_run 只统计不删除，不写归档文件"""
+        pks = {self.history(days) for days in [9, 8, 1]}
+        stats = enforce_retention('request_history', days=2, dry_run=True, now=self.now)
+        self.assertEqual(stats['rows'], 2)
+        self.assertIsNone(stats['archive_file'])
+        self.assertEqual(self.remaining(), pks)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'archives')))
+
+    def test_archive(self):
+        """测试删除的记录按行归档到 gzip 压缩的 JSONL 文件"""
+        expired = {self.history(days) for days in [9, 8, 7]}
+        kept = self.history(1)
+        stats = enforce_retention('request_history', days=2, batch_size=2, now=self.now)
+        self.assertEqual(stats['rows'], 3)
+        self.assertTrue(stats['archive_file'].startswith(os.path.join(self.temp_dir, 'archives', 'request_history')))
+        self.assertEqual(stats['archive_bytes'], os.path.getsize(stats['archive_file']))
+        with gzip.open(stats['archive_file'], 'rt', encoding='utf-8') as archive_file:
+            lines = archive_file.read().splitlines()
+        self.assertEqual(len(lines), stats['rows'])
+        self.assertEqual({json.loads(line)['id'] for line in lines}, expired)
+        self.assertEqual(self.remaining(), {kept})
+
+    def test_remove_unreferenced_bodies(self):
+        """测试只删除不再被请求历史引用的外部响应体文件"""
+        unused_ref = store_body(b'expired body')
+        shared_ref = store_body(b'shared body')
+        self.history(9, body_ref=unused_ref)
+        self.history(9, body_ref=shared_ref)
+        self.history(1, body_ref=shared_ref)
+
+        stats = enforce_retention('request_history', days=2, archive=False, now=self.now)
+        body_dir = os.path.join(self.temp_dir, 'request_history_bodies')
+        self.assertFalse(os.path.exists(os.path.join(body_dir, unused_ref[:2], f'{unused_ref}.gz')))
+        self.assertTrue(os.path.exists(os.path.join(body_dir, shared_ref[:2], f'{shared_ref}.gz')))
+        self.assertGreater(stats['bytes_reclaimed'], 0)
+
+    def test_remove_unreferenced_screenshots(self):
+        """测试只删除不再被任何执行记录引用的截图及缩略图文件"""
+        ui_project = UiProject.objects.create(name='ui', base_url='http://example.com', owner=self.user)
+        test_case = UiTestCase.objects.create(name='case', project=ui_project, created_by=self.user)
+        unused_ref, shared_ref, report_ref = ('a' * 64, 'b' * 64, 'c' * 64)
+        screenshot_dir = os.path.join(self.temp_dir, 'ui_step_screenshots')
+        paths = {}
+        for ref in [unused_ref, shared_ref, report_ref]:
+            paths[ref] = [os.path.join(screenshot_dir, ref[:2], f'{ref}{suffix}') for suffix in ['.webp', '.thumb.webp']]
+            os.makedirs(os.path.dirname(paths[ref][0]), exist_ok=True)
+            for path in paths[ref]:
+                with open(path, 'wb') as image_file:
+                    image_file.write(b'image')
+
+        def case_execution(days, refs):
+            row = TestCaseExecution.objects.create(
+                test_case=test_case, project=ui_project, created_by=self.user,
+                screenshots=[{'ref': ref, 'url': f'/media/{ref}.webp'} for ref in refs]
+            )
+            TestCaseExecution.objects.filter(pk=row.pk).update(created_at=self.now - timedelta(days=days))
+
+        case_execution(9, [unused_ref, shared_ref, report_ref])
+        case_execution(1, [shared_ref])
+        # 套件执行记录的结果中仍引用的截图
+        TestExecution.objects.create(project=ui_project, result_data={'test_cases': [{'screenshots': [{'ref': report_ref}]}]})
+
+        stats = enforce_retention('ui_case_execution', days=2, archive=False, now=self.now)
+        self.assertEqual(stats['rows'], 1)
+        self.assertFalse(any(os.path.exists(path) for path in paths[unused_ref]))
+        self.assertTrue(all(os.path.exists(path) for path in paths[shared_ref] + paths[report_ref]))
+
+
+class WorkerPoolTestCase(SimpleTestCase):
+    def test_bounded_queue(self):
+        """测试工作线程都在执行时任务排队，队列已满时 submit 抛出 queue.Full"""
+        pool = WorkerPool('test', workers=1, max_queue=2)
+        started = threading.Event()
+        release = threading.Event()
+        pool.submit(lambda: (started.set(), release.wait(5)))
+        self.assertTrue(started.wait(5))
+
+        self.assertEqual(pool.submit(release.wait, 5), 1)
+        self.assertEqual(pool.submit(release.wait, 5), 2)
+        self.assertEqual(pool.depth, 3)
+        self.assertTrue(pool.full())
+        with self.assertRaisesMessage(queue.Full, '最多排队 2 个任务'):
+            pool.submit(release.wait, 5)
+
+        release.set()
+        pool.queue.join()
+        self.assertEqual(pool.depth, 0)
+
+    def test_task_error(self):
+        """测试任务抛出异常时工作线程继续执行后续任务"""
+        pool = WorkerPool('test', workers=1, max_queue=5)
+        done = threading.Event()
+
+        def fail():
+            raise RuntimeError('boom')
+
+        with self.assertLogs('apps.core.workers', level='ERROR') as logs:
+            pool.submit(fail)
+            pool.submit(done.set)
+            self.assertTrue(done.wait(5))
+        self.assertIn('boom', logs.output[0])
+        self.assertEqual(len(pool._threads), 1)
+        self.assertTrue(pool._threads[0].is_alive())
+
+    @override_settings(SCHEDULER_WORKER_POOLS={'api': {'max_queue': 5}, 'report': {'workers': 3}})
+    def test_get_worker_pool(self):
+        """测试配置覆盖默认的执行池参数，同一类型返回同一个执行池"""
+        with mock.patch.dict(workers._pools, clear=True):
+            api_pool = get_worker_pool('api')
+            self.assertEqual((api_pool.workers, api_pool.max_queue), (4, 5))
+            self.assertIs(get_worker_pool('api'), api_pool)
+            ui_pool = get_worker_pool('ui')
+            self.assertEqual((ui_pool.workers, ui_pool.max_queue), (2, 20))
+            report_pool = get_worker_pool('report')
+            self.assertEqual((report_pool.workers, report_pool.max_queue), (3, 10))
+            self.assertEqual(api_pool._threads, [])
@@ -0,0 +1,95 @@
+"""
+定时任务执行池
+按任务类型限制并发：每种类型有固定数量的工作线程和有界的等待队列，
+例如 API 测试任务与占用浏览器的 UI 自动化任务分别计数，同一时刻到期的大量任务只会排队而不会同时启动。
+队列已满时 submit 抛出 queue.Full，由调用方决定跳过或拒绝（背压）。
+
+配置示例 (settings.SCHEDULER_WORKER_POOLS):
+    {
+        'api': {'workers': 4, 'max_queue': 100},
+        'ui': {'workers': 2, 'max_queue': 20},
+    }
+"""
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOLS = {
+    'api': {'workers': 4, 'max_queue': 100},
+    'ui': {'workers': 2, 'max_queue': 20},
+}
+
+
+class WorkerPool:
+    """固定数量工作线程 + 有界队列"""
+
+    def __init__(self, name, workers, max_queue):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.queue = queue.Queue(maxsize=self.max_queue)
+        self.running = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'{self.name}-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    @property
+    def depth(self):
+        """排队中和执行中的任务数"""
+        return self.queue.qsize() + self.running
+
+    def full(self):
+        return self.queue.full()
+
+    def submit(self, func, *args):
+        """提交任务，返回提交前的队列深度；队列已满时抛出 queue.Full"""
+        self._ensure_started()
+        depth = self.depth
+        try:
+            self.queue.put_nowait((func, args))
+        except queue.Full:
+            raise queue.Full(f'{self.name} 执行队列已满（最多排队 {self.max_queue} 个任务）')
+        return depth
+
+    def _work(self):
+        while True:
+            func, args = self.queue.get()
+            with self._lock:
+                self.running += 1
+            close_old_connections()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error(f"{self.name} 执行池任务出错: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                close_old_connections()
+                self.queue.task_done()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_worker_pool(kind):
+    """获取指定任务类型的执行池（进程内单例）"""
+    with _pools_lock:
+        if kind not in _pools:
+            config = dict(DEFAULT_POOLS.get(kind, {'workers': 1, 'max_queue': 10}))
+            config.update((getattr(settings, 'SCHEDULER_WORKER_POOLS', {}) or {}).get(kind, {}))
+            _pools[kind] = WorkerPool(kind, config['workers'], config['max_queue'])
+        return _pools[kind]
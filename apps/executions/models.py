@@ -122,4 +122,7 @@ class TestRunCaseHistory(models.Model):
         db_table = 'test_run_case_history'
         verbose_name = '测试执行历史'
         verbose_name_plural = '测试执行历史'
-        ordering = ['-executed_at']
\ No newline at end of file
+        ordering = ['-executed_at']
+        indexes = [
+            models.Index(fields=['executed_at']),
+        ]
\ No newline at end of file
@@ -107,7 +107,82 @@ class AdvancedTestRequirementAnalyzer:
                 break
         
         return sections
-    
+
+    # 章节标题行: Markdown 标题、"第一章"、"一、"、"1." / "1、" / "1.2.1." 或 "1.2 " 开头的短行；
+    # 编号后必须有分隔符，"2024年…"、"3个用户…"、"1.5元…" 这类以数字开头的正文不是标题
+    HEADING_PATTERN = re.compile(
+        r'^\s*(?:#{1,6}\s+\S.*'
+        r'|第[一二三四五六七八九十百零\d]+[章节部分篇].{0,40}'
+        r'|[一二三四五六七八九十]+[、.．].{0,40}'
+        r'|\d+(?:\.\d+)*[、.．]\s*[^\d\s|].{0,40}'
+        r'|\d+(?:\.\d+)+\s+[^\d\s|].{0,40})\s*$'
+    )
+
+    def split_document_sections(self, text: str, max_chars: int = 6000) -> List[Dict[str, str]]:
+        """
+        按章节标题把文档切分为首尾相连的章节（不丢弃任何内容），用于分章节生成测试用例
+        相邻的短章节合并到 max_chars 以内，超过 max_chars 的章节按段落继续切分
+
+        Returns:
+            [{"title": 章节标题, "content": 章节内容}, ...]，按文档顺序排列
+        """
+        sections = []
+        title, lines, has_body = "", [], False
+        for line in text.split('\n'):
+            if self.HEADING_PATTERN.match(line):
+                # 连续的多级标题归入同一章节，标题取第一个
+                if has_body:
+                    sections.append({"title": title, "content": '\n'.join(lines)})
+                    title, lines, has_body = "", [], False
+                title = title or line.strip().lstrip('#').strip()
+            elif line.strip():
+                has_body = True
+            lines.append(line)
+        if lines:
+            sections.append({"title": title, "content": '\n'.join(lines)})
+
+        pieces = []
+        for section in sections:
+            pieces.extend(self._split_long_section(section, max_chars))
+
+        # 合并相邻的短章节
+        merged = []
+        for piece in pieces:
+            if merged and len(merged[-1]["content"]) + len(piece["content"]) + 1 <= max_chars:
+                merged[-1]["content"] += '\n' + piece["content"]
+            else:
+                merged.append(dict(piece))
+        for index, section in enumerate(merged, 1):
+            section["title"] = section["title"] or f"第{index}部分"
+        return merged
+
+    def _split_long_section(self, section: Dict[str, str], max_chars: int) -> List[Dict[str, str]]:
+        """超长章节按段落（空行，其次换行）切分，单个段落仍超长时按长度截断"""
+        content = section["content"]
+        if len(content) <= max_chars:
+            return [section]
+        separator = '\n\n' if '\n\n' in content else '\n'
+        pieces, current = [], ""
+        for paragraph in content.split(separator):
+            while len(paragraph) > max_chars:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(paragraph[:max_chars])
+                paragraph = paragraph[max_chars:]
+            if current and len(current) + len(separator) + len(paragraph) > max_chars:
+                pieces.append(current)
+                current = paragraph
+            else:
+                current = current + separator + paragraph if current else paragraph
+        if current:
+            pieces.append(current)
+        total = len(pieces)
+        return [
+            {"title": f"{section['title']}（{index}/{total}）" if section["title"] else "", "content": piece}
+            for index, piece in enumerate(pieces, 1)
+        ]
+
     async def _generate_comprehensive_analysis(self, text: str, title: str) -> str:
         """生成全面的测试需求分析报告"""
         
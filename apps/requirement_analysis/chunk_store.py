@@ -0,0 +1,89 @@
+"""
+生成任务流式输出的分块存储
+流式回调原来把内存中不断增长的完整文本周期性整体 save()（stream_buffer、review_feedback、final_test_cases），
+长时间生成写入的数据量是输出长度的平方级。现在:
+- 每段流式输出追加到 GenerationChunk（只追加，带起止位置），每个字符只写入一次；
+  回调中的输出先在内存中累积，超过 FLUSH_CHARS 个字符或距上次写入超过 FLUSH_INTERVAL 秒时用 bulk_create 批量写入；
+- 完整文本只在各阶段结束时写入任务字段（generated_test_cases、review_feedback、final_test_cases 等），
+  任务完成后删除分块；
+- read_chunks 按位置读取某个位置之后的内容，只查询结束位置大于该位置的分块。
+"""
+import time
+
+from .models import GenerationChunk
+
+STREAMS = ('content', 'review_content', 'final_content')
+# 内存中累积多少字符或多长时间（秒）写入一次分块
+FLUSH_CHARS = 1000
+FLUSH_INTERVAL = 1.0
+
+
+class ChunkWriter:
+    """单个生成任务的分块写入器，在生成线程中使用"""
+
+    def __init__(self, task):
+        self.task = task
+        self.parts = {stream: [] for stream in STREAMS}
+        self.positions = dict.fromkeys(STREAMS, 0)
+        self.flushed = dict.fromkeys(STREAMS, 0)
+        # 每路输出第一个尚未写入的分段下标
+        self.flushed_parts = dict.fromkeys(STREAMS, 0)
+        self.seqs = dict.fromkeys(STREAMS, 0)
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+
+    def append(self, stream, chunk):
+        """追加一段输出，返回是否需要写入数据库"""
+        if not chunk:
+            return False
+        self.parts[stream].append(chunk)
+        self.positions[stream] += len(chunk)
+        self.pending_chars += len(chunk)
+        return self.pending_chars >= FLUSH_CHARS or time.monotonic() - self.last_flush >= FLUSH_INTERVAL
+
+    def text(self, stream):
+        """内存中某一路输出的完整文本"""
+        return ''.join(self.parts[stream])
+
+    def flush(self):
+        """把尚未写入的输出按每路一个分块写入数据库"""
+        rows = []
+        for stream in STREAMS:
+            start, end = self.flushed[stream], self.positions[stream]
+            if end > start:
+                rows.append(GenerationChunk(
+                    task=self.task, stream=stream, seq=self.seqs[stream], start=start, end=end,
+                    content=''.join(self.parts[stream][self.flushed_parts[stream]:])
+                ))
+        if rows:
+            GenerationChunk.objects.bulk_create(rows)
+        # 写入成功后再移动位置，写入失败的输出在下次写入时重试
+        for row in rows:
+            self.seqs[row.stream] += 1
+            self.flushed[row.stream] = row.end
+            self.flushed_parts[row.stream] = len(self.parts[row.stream])
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+        return len(rows)
+
+
+def read_chunks(task_pk, offsets):
+    """读取各路输出在 offsets（{输出类型: 位置}）之后的内容，返回 {输出类型: 内容}"""
+    from django.db.models import Q
+
+    condition = Q()
+    for stream, offset in offsets.items():
+        condition |= Q(stream=stream, end__gt=offset)
+    result = dict.fromkeys(offsets, '')
+    parts = {stream: [] for stream in offsets}
+    for stream, start, content in GenerationChunk.objects.filter(condition, task_id=task_pk).order_by(
+            'stream', 'start').values_list('stream', 'start', 'content'):
+        parts[stream].append(content[max(0, offsets[stream] - start):])
+    for stream, texts in parts.items():
+        result[stream] = ''.join(texts)
+    return result
+
+
+def clear_chunks(task):
+    """完整文本写入任务后删除分块"""
+    return GenerationChunk.objects.filter(task=task).delete()[0]
@@ -0,0 +1,331 @@
+"""
+大模型 API 的共享 HTTP 连接池
+AIModelService 原来每次调用都新建 httpx.AsyncClient，生成、评审、改进和每次续写都要重新建立 TCP/TLS 连接。
+现在所有调用通过进程内共享的客户端发送:
+- 客户端运行在一个常驻的后台事件循环中（生成任务各自的事件循环用完即关闭，连接无法跨任务复用），
+  调用方的协程把请求提交到后台事件循环并等待结果，流式响应按行转发回调用方的事件循环；
+- 每个 AIModelConfig 一个客户端，保持 keep-alive 连接，连接数上限、空闲连接保持时间和 HTTP/2 由 AI_HTTP_* 配置，
+  配置的 base_url 修改后关闭旧客户端重新创建；
+- 每次调用记录建立连接耗时（复用连接时为 0）、排队耗时和首字节耗时，以及响应缓存的命中次数，
+  调用方通过 track_call_metrics() 汇总到任务指标（TestCaseGenerationTask.metrics）；
+- 进程退出时关闭所有客户端。
+"""
+import asyncio
+import atexit
+import contextvars
+import logging
+import os
+import threading
+import time
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 大模型生成耗时较长，读取超时 900 秒（15分钟），支持大文档生成
+DEFAULT_TIMEOUT = httpx.Timeout(connect=60.0, read=900.0, write=60.0, pool=60.0)
+# 流式调用方提前结束读取时，等待读完剩余响应以复用连接的最长时间（秒）
+DRAIN_TIMEOUT = 2.0
+# 任务指标中保留的单次调用明细数量
+MAX_CALL_RECORDS = 50
+
+
+class CallMetrics:
+    """一个任务内所有大模型调用的连接与耗时统计"""
+
+    def __init__(self):
+        self.calls = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record(self, call):
+        self.calls.append(call)
+
+    def record_cache(self, hit):
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    def summary(self):
+        calls = self.calls
+        new_connections = [call for call in calls if not call['reused']]
+        ttfb = [call['ttfb_ms'] for call in calls if call.get('ttfb_ms') is not None]
+        return {
+            'calls': len(calls),
+            'errors': sum(1 for call in calls if call.get('error') or (call.get('status_code') or 0) >= 400),
+            'new_connections': len(new_connections),
+            'reused_connections': len(calls) - len(new_connections),
+            'connect_ms': round(sum(call['connect_ms'] for call in calls), 1),
+            'max_connect_ms': max((call['connect_ms'] for call in calls), default=0),
+            # 每次调用在发送请求之前的额外开销: 提交到连接池事件循环的排队时间 + 建立连接时间
+            'overhead_ms': round(sum(call['queue_ms'] + call['connect_ms'] for call in calls), 1),
+            'avg_ttfb_ms': round(sum(ttfb) / len(ttfb), 1) if ttfb else None,
+            'total_ms': round(sum(call['total_ms'] for call in calls), 1),
+            # 响应缓存（response_cache）命中的调用不发送请求，不计入 calls
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'details': calls[-MAX_CALL_RECORDS:],
+        }
+
+
+_current_metrics = contextvars.ContextVar('llm_call_metrics', default=None)
+
+
+def track_call_metrics():
+    """在当前上下文（线程）中开始统计大模型调用，之后在该上下文中创建的协程的调用都记录到返回的 CallMetrics"""
+    metrics = CallMetrics()
+    _current_metrics.set(metrics)
+    return metrics
+
+
+def current_call_metrics():
+    """当前上下文的 CallMetrics，没有调用 track_call_metrics() 时为 None"""
+    return _current_metrics.get()
+
+
+class _RequestTrace:
+    """通过 httpx 的 trace 扩展记录单次请求的连接和首字节耗时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.connect_started = None
+        self.connect_ms = 0.0
+        self.ttfb_ms = None
+
+    async def __call__(self, event_name, info):
+        now = time.perf_counter()
+        if event_name == 'connection.connect_tcp.started':
+            self.connect_started = now
+        elif event_name in ('connection.connect_tcp.complete', 'connection.start_tls.complete') \
+                and self.connect_started is not None:
+            self.connect_ms = (now - self.connect_started) * 1000
+        elif event_name.endswith('.receive_response_headers.complete'):
+            self.ttfb_ms = (now - self.started) * 1000
+
+    def info(self, submitted, response):
+        return {
+            'status_code': response.status_code,
+            'queue_ms': round((self.started - submitted) * 1000, 1),
+            'connect_ms': round(self.connect_ms, 1),
+            'reused': self.connect_started is None,
+            'ttfb_ms': round(self.ttfb_ms, 1) if self.ttfb_ms is not None else None,
+        }
+
+
+def _record_call(config, url, submitted, info, error=None):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+    call = {
+        'model_config': config.pk,
+        'url': url,
+        'total_ms': round((time.perf_counter() - submitted) * 1000, 1),
+        'queue_ms': 0.0,
+        'connect_ms': 0.0,
+        'reused': True,
+        'ttfb_ms': None,
+    }
+    call.update(info or {})
+    if error is not None:
+        call['error'] = type(error).__name__
+    metrics.record(call)
+
+
+class _StreamResponse:
+    """流式响应在调用方事件循环中的代理，接口与 httpx.Response 的流式用法一致"""
+
+    def __init__(self, response, queue):
+        self._response = response
+        self._queue = queue
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    def raise_for_status(self):
+        return self._response.raise_for_status()
+
+    async def aread(self):
+        # 非 2xx 的响应体在连接池事件循环中已读取
+        return self._response.content
+
+    async def aiter_lines(self):
+        while True:
+            kind, value = await self._queue.get()
+            if kind == 'line':
+                yield value
+            elif kind == 'error':
+                raise value
+            else:
+                return
+
+
+class _StreamContext:
+    def __init__(self, pool, config, method, url, kwargs):
+        self._pool = pool
+        self._config = config
+        self._method = method
+        self._url = url
+        self._kwargs = kwargs
+        self._future = None
+        self._info = None
+        self._submitted = None
+
+    async def __aenter__(self):
+        caller_loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def put(item):
+            caller_loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        self._submitted = time.perf_counter()
+        self._future = self._pool.submit(
+            self._pool._stream(self._config, self._method, self._url, self._kwargs, self._submitted, put)
+        )
+        kind, value = await queue.get()
+        if kind == 'error':
+            _record_call(self._config, self._url, self._submitted, None, value)
+            raise value
+        response, self._info = value
+        return _StreamResponse(response, queue)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._future is not None and not self._future.done():
+            # 调用方读到结束标记（data: [DONE]）后不再读取，等待连接池读完剩余的响应，连接才能放回连接池复用；
+            # 出现异常或超过 DRAIN_TIMEOUT 时取消读取，连接随之关闭
+            try:
+                if exc_type is not None:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(asyncio.wrap_future(self._future), DRAIN_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._future.cancel()
+            except Exception:
+                pass
+        _record_call(self._config, self._url, self._submitted, self._info, exc_val)
+        return False
+
+
+class LLMClientPool:
+    """进程内共享的大模型 HTTP 客户端，每个 AIModelConfig 一个 httpx.AsyncClient"""
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=getattr(settings, 'AI_HTTP_MAX_CONNECTIONS', 20),
+            max_keepalive_connections=getattr(settings, 'AI_HTTP_MAX_KEEPALIVE', 10),
+            keepalive_expiry=getattr(settings, 'AI_HTTP_KEEPALIVE_EXPIRY', 60.0),
+        )
+
+    def _http2(self):
+        if not getattr(settings, 'AI_HTTP_HTTP2', False):
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("AI_HTTP_HTTP2 已开启但未安装 h2（pip install httpx[http2]），使用 HTTP/1.1")
+            return False
+        return True
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return self._loop
+            # 首次使用，或 fork 后的子进程（父进程的事件循环线程不会被继承）
+            self._clients = {}
+            self._pid = os.getpid()
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name='llm-http-pool', daemon=True)
+            self._thread.start()
+            return self._loop
+
+    def submit(self, coro):
+        """把协程提交到连接池的事件循环，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _client(self, config):
+        # 只在连接池的事件循环中调用，不需要加锁
+        # 未保存的配置（如保存前测试连接）按 base_url 共用客户端
+        key = config.pk or ('base_url', config.base_url)
+        entry = self._clients.get(key)
+        if entry is not None and entry[0] == config.base_url:
+            return entry[1]
+        if entry is not None:
+            # base_url 已修改，关闭旧客户端
+            asyncio.ensure_future(entry[1].aclose())
+        client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=self._limits(), http2=self._http2())
+        self._clients[key] = (config.base_url, client)
+        return client
+
+    async def _send(self, config, method, url, kwargs, submitted):
+        trace = _RequestTrace()
+        extensions = dict(kwargs.pop('extensions', None) or {}, trace=trace)
+        response = await self._client(config).request(method, url, extensions=extensions, **kwargs)
+        return response, trace.info(submitted, response)
+
+    async def _stream(self, config, method, url, kwargs, submitted, put):
+        trace = _RequestTrace()
+        extensions = dict(kwargs.pop('extensions', None) or {}, trace=trace)
+        try:
+            async with self._client(config).stream(method, url, extensions=extensions, **kwargs) as response:
+                if not response.is_success:
+                    await response.aread()
+                put(('response', (response, trace.info(submitted, response))))
+                if response.is_success:
+                    async for line in response.aiter_lines():
+                        put(('line', line))
+            put(('end', None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            put(('error', e))
+
+    async def request(self, config, method, url, **kwargs):
+        """在调用方的事件循环中等待请求完成，返回已读取响应体的 httpx.Response"""
+        submitted = time.perf_counter()
+        try:
+            response, info = await asyncio.wrap_future(self.submit(self._send(config, method, url, kwargs, submitted)))
+        except Exception as e:
+            _record_call(config, url, submitted, None, e)
+            raise
+        _record_call(config, url, submitted, info)
+        return response
+
+    async def post(self, config, url, **kwargs):
+        return await self.request(config, 'POST', url, **kwargs)
+
+    def stream(self, config, method, url, **kwargs):
+        """流式请求: async with pool.stream(...) as response: async for line in response.aiter_lines()"""
+        return _StreamContext(self, config, method, url, kwargs)
+
+    async def _aclose_all(self):
+        clients, self._clients = self._clients, {}
+        for _, client in clients.values():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭大模型 HTTP 客户端失败: {e}")
+
+    def close(self):
+        """关闭所有客户端并停止事件循环"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or self._pid != os.getpid():
+                return
+            self._loop = self._thread = None
+        try:
+            asyncio.run_coroutine_threadsafe(self._aclose_all(), loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"关闭大模型 HTTP 连接池失败: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+
+llm_client_pool = LLMClientPool()
+atexit.register(llm_client_pool.close)
@@ -8,6 +8,9 @@ import asyncio
 from typing import Dict, Any, List, AsyncIterator
 import logging
 
+from .llm_client import llm_client_pool
+from .response_cache import response_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -397,6 +400,8 @@ class TestCaseGenerationTask(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
     is_saved_to_records = models.BooleanField(default=False, verbose_name='是否已保存到记录')
     saved_at = models.DateTimeField(null=True, blank=True, verbose_name='保存到记录时间')
+    # 任务执行指标，llm: 大模型调用次数、建立连接耗时、首字节耗时等（见 llm_client.CallMetrics）
+    metrics = models.JSONField(default=dict, blank=True, verbose_name='任务指标')
     
     class Meta:
         db_table = 'testcase_generation_task'
@@ -407,6 +412,43 @@ class TestCaseGenerationTask(models.Model):
     def __str__(self):
         return f"{self.title} - {self.get_status_display()}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # 状态和进度推送给正在订阅该任务的 SSE 连接（没有进度通道时忽略）
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'status', 'progress'} & set(update_fields):
+            from .progress_broker import progress_broker
+            progress_broker.publish_state(self.task_id, self.status, self.progress)
+
+
+class GenerationChunk(models.Model):
+    """生成任务流式输出的分块（只追加），每段输出只写入一次，完整文本在阶段结束时写入任务"""
+    STREAM_CHOICES = [
+        ('content', '生成内容'),
+        ('review_content', '评审内容'),
+        ('final_content', '最终用例'),
+    ]
+
+    task = models.ForeignKey(TestCaseGenerationTask, on_delete=models.CASCADE, related_name='chunks', verbose_name='生成任务')
+    stream = models.CharField(max_length=20, choices=STREAM_CHOICES, verbose_name='输出类型')
+    seq = models.PositiveIntegerField(verbose_name='序号')
+    start = models.PositiveIntegerField(verbose_name='起始位置')
+    end = models.PositiveIntegerField(verbose_name='结束位置')
+    content = models.TextField(verbose_name='内容')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+
+    class Meta:
+        db_table = 'testcase_generation_chunk'
+        verbose_name = '生成任务输出分块'
+        verbose_name_plural = '生成任务输出分块'
+        unique_together = ['task', 'stream', 'seq']
+        indexes = [
+            models.Index(fields=['task', 'stream', 'end']),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} {self.stream} [{self.start}, {self.end})"
+
 
 class AIModelService:
     """AI模型服务类"""
@@ -415,7 +457,8 @@ class AIModelService:
     async def call_openai_compatible_api(
         config: AIModelConfig,
         messages: List[Dict[str, str]],
-        max_tokens: int = None
+        max_tokens: int = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         调用OpenAI兼容格式的API
@@ -424,6 +467,7 @@ class AIModelService:
             config: AI模型配置
             messages: 消息列表
             max_tokens: 可选的最大token数，如果不指定则使用config.max_tokens
+            use_cache: 开启 AI_RESPONSE_CACHE_ENABLED 时是否使用响应缓存（测试连接时不使用）
 
         Returns:
             API响应字典
@@ -436,6 +480,12 @@ class AIModelService:
         # 使用传入的max_tokens或默认使用config.max_tokens
         actual_max_tokens = max_tokens if max_tokens is not None else config.max_tokens
 
+        cache_key = response_cache.key('chat', config, messages, actual_max_tokens) if use_cache else None
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"命中大模型响应缓存: {cache_key[:12]}")
+            return cached
+
         data = {
             'model': config.model_name,
             'messages': messages,
@@ -465,33 +515,26 @@ class AIModelService:
         logger.info(f"请求参数: max_tokens={actual_max_tokens}, temperature={config.temperature}, top_p={config.top_p}")
 
         try:
-            # 增加HTTP超时时间到900秒（15分钟），支持大文档生成
-            # 禁用HTTP/2，使用HTTP/1.1以提高兼容性
-            # 显式设置所有超时参数，避免默认的连接超时导致请求失败
-            timeout_config = httpx.Timeout(
-                connect=60.0,      # 连接超时：60秒
-                read=900.0,        # 读取超时：900秒（15分钟）
-                write=60.0,        # 写入超时：60秒
-                pool=60.0          # 连接池超时：60秒
+            # 通过共享连接池发送，复用到模型服务的 keep-alive 连接（超时设置见 llm_client.DEFAULT_TIMEOUT）
+            logger.info(f"发送POST请求到: {url}")
+            response = await llm_client_pool.post(
+                config,
+                url,
+                headers=headers,
+                json=data
             )
-            async with httpx.AsyncClient(timeout=timeout_config, http2=False) as client:
-                logger.info(f"发送POST请求到: {url}")
-                response = await client.post(
-                    url,
-                    headers=headers,
-                    json=data
-                )
-
-                logger.info(f"收到响应: status_code={response.status_code}")
-
-                if response.status_code != 200:
-                    error_detail = response.text
-                    logger.error(f"API调用返回错误: Status={response.status_code}, Body={error_detail}")
-
-                response.raise_for_status()
-                result = response.json()
-                logger.info(f"API调用成功，响应内容: {str(result)[:200]}...")
-                return result
+
+            logger.info(f"收到响应: status_code={response.status_code}")
+
+            if response.status_code != 200:
+                error_detail = response.text
+                logger.error(f"API调用返回错误: Status={response.status_code}, Body={error_detail}")
+
+            response.raise_for_status()
+            result = response.json()
+            logger.info(f"API调用成功，响应内容: {str(result)[:200]}...")
+            response_cache.put(cache_key, result)
+            return result
         except httpx.HTTPStatusError as e:
             provider_name = config.get_model_type_display()
             error_msg = f"{provider_name} API返回错误 {e.response.status_code}: {e.response.text}"
@@ -522,10 +565,14 @@ class AIModelService:
         config: AIModelConfig,
         messages: List[Dict[str, str]],
         callback=None,
-        max_tokens: int = None
+        max_tokens: int = None,
+        use_cache: bool = True,
+        before_request=None
     ) -> AsyncIterator[str]:
         """
         流式调用OpenAI兼容格式的API，支持自动续写
+        开启 AI_RESPONSE_CACHE_ENABLED 时，命中响应缓存则一次性输出缓存的完整内容
+        before_request: 可选的异步函数，每次向模型服务发起请求（包括自动续写）前调用，用于限速
         """
         headers = {
             'Authorization': f'Bearer {config.api_key}',
@@ -545,6 +592,17 @@ class AIModelService:
         else:
             url = base_url
 
+        cache_key = response_cache.key('stream', config, messages, actual_max_tokens) if use_cache else None
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"命中大模型响应缓存: {cache_key[:12]}")
+            if callback:
+                await callback(cached)
+            yield cached
+            return
+        # 所有请求（包括续写）输出的完整内容，正常结束时写入缓存
+        total_content = ""
+
         # 续写控制
         current_messages = list(messages)  # 浅拷贝
         continuation_count = 0
@@ -560,56 +618,52 @@ class AIModelService:
                 'stream': True
             }
 
+            if before_request is not None:
+                await before_request()
             logger.info(f"发起流式请求 (第{continuation_count+1}次), messages数量: {len(current_messages)}")
 
             chunk_content_buffer = ""  # 本次请求生成的完整内容缓存
             finish_reason = None
             
             try:
-                # 显式设置所有超时参数
-                timeout_config = httpx.Timeout(
-                    connect=60.0,      # 连接超时：60秒
-                    read=900.0,        # 读取超时：900秒（15分钟）
-                    write=60.0,        # 写入超时：60秒
-                    pool=60.0          # 连接池超时：60秒
-                )
-                async with httpx.AsyncClient(timeout=timeout_config, http2=False) as client:
-                    async with client.stream('POST', url, headers=headers, json=data) as response:
-                        if response.status_code != 200:
-                            error_detail = await response.aread()
-                            error_msg = error_detail.decode('utf-8')
-                            logger.error(f"流式API调用返回错误: Status={response.status_code}, Body={error_msg}")
-                            response.raise_for_status()
-
-                        async for line in response.aiter_lines():
-                            if not line.strip():
-                                continue
-
-                            if line.startswith('data: '):
-                                data_str = line[6:]
-                                if data_str.strip() == '[DONE]':
-                                    break
-
-                                try:
-                                    chunk_data = json.loads(data_str)
-                                    if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
-                                        choice = chunk_data['choices'][0]
-                                        delta = choice.get('delta', {})
-                                        finish_reason = choice.get('finish_reason', None)
-                                        content = delta.get('content', '')
-
-                                        if content:
-                                            chunk_content_buffer += content
-                                            if callback:
-                                                await callback(content)
-                                            yield content
+                # 通过共享连接池发送，续写请求复用同一连接
+                async with llm_client_pool.stream(config, 'POST', url, headers=headers, json=data) as response:
+                    if response.status_code != 200:
+                        error_detail = await response.aread()
+                        error_msg = error_detail.decode('utf-8')
+                        logger.error(f"流式API调用返回错误: Status={response.status_code}, Body={error_msg}")
+                        response.raise_for_status()
+
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+
+                        if line.startswith('data: '):
+                            data_str = line[6:]
+                            if data_str.strip() == '[DONE]':
+                                break
+
+                            try:
+                                chunk_data = json.loads(data_str)
+                                if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
+                                    choice = chunk_data['choices'][0]
+                                    delta = choice.get('delta', {})
+                                    finish_reason = choice.get('finish_reason', None)
+                                    content = delta.get('content', '')
+
+                                    if content:
+                                        chunk_content_buffer += content
+                                        total_content += content
+                                        if callback:
+                                            await callback(content)
+                                        yield content
                                             
-                                        # 如果在中途就收到了finish_reason（有些流式实现会在最后一条数据带上finish_reason）
-                                        if finish_reason:
-                                            pass 
+                                    # 如果在中途就收到了finish_reason（有些流式实现会在最后一条数据带上finish_reason）
+                                    if finish_reason:
+                                        pass 
 
-                                except json.JSONDecodeError:
-                                    continue
+                            except json.JSONDecodeError:
+                                continue
             
                 # 本次请求结束
                 # 检查 finish_reason
@@ -634,6 +688,7 @@ class AIModelService:
                     continue
                 else:
                     logger.info(f"流式生成正常结束 (finish_reason={finish_reason})")
+                    response_cache.put(cache_key, total_content)
                     break
 
             except Exception as e:
@@ -0,0 +1,259 @@
+"""
+用例生成任务的进度推送通道
+SSE 进度接口原来每 0.3 秒 refresh_from_db() 一次，每次都读取 stream_buffer、review_feedback、final_test_cases
+三个大文本字段再在 Python 中截取增量，多人同时观看长时间生成时数据库压力很大。
+现在生成线程把流式内容和状态发布到进程内的任务通道，SSE 订阅者只接收增量:
+- 通道在内存中保存三路流式内容（content / review_content / final_content）的分块和当前状态，
+  订阅者按各自的读取位置取增量，没有变化时在条件变量上等待，不读数据库；
+- 每条 SSE 事件的 id 为三路内容已发送的长度（"内容-评审-最终用例"），浏览器重连时通过 Last-Event-ID
+  从断开的位置继续；
+- 当前进程没有该任务的通道时（任务已结束被清理、重启后或生成任务在其他进程中执行），
+  从数据库快照续传: 进行中的任务读取位置之后的输出分块（chunk_store），按 DB_POLL_INTERVAL 轮询；
+  已结束的任务用 SUBSTRING 只读取完整文本中读取位置之后的内容。
+
+状态与进度由 TestCaseGenerationTask.save() 发布，结束的通道保留 CHANNEL_TTL 秒供断线重连。
+"""
+import bisect
+import json
+import threading
+import time
+
+# SSE 消息类型，同时是三路流式内容的名称
+STREAMS = ('content', 'review_content', 'final_content')
+# 结束状态
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+# 结束的通道在内存中保留的时间（秒）
+CHANNEL_TTL = 300
+# 没有新内容时发送心跳注释的间隔（秒），防止代理断开空闲连接
+KEEPALIVE_INTERVAL = 15
+# 浏览器断线后重连的等待时间（毫秒）
+RETRY_MS = 3000
+# 没有本进程通道时轮询数据库的间隔（秒）
+DB_POLL_INTERVAL = 1.0
+
+
+class _Buffer:
+    """只追加的分块缓冲，按位置读取增量"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offsets = []
+        self.length = 0
+
+    def append(self, chunk):
+        self.offsets.append(self.length)
+        self.chunks.append(chunk)
+        self.length += len(chunk)
+
+    def read(self, offset):
+        if offset >= self.length:
+            return ''
+        index = bisect.bisect_right(self.offsets, offset) - 1
+        return ''.join(self.chunks[index:])[offset - self.offsets[index]:]
+
+
+class TaskChannel:
+    """单个生成任务的进度通道"""
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.buffers = {stream: _Buffer() for stream in STREAMS}
+        self.status = None
+        self.progress = 0
+        self.version = 0
+        self.finished_at = None
+        self._cond = threading.Condition()
+
+    def _changed(self):
+        self.version += 1
+        self._cond.notify_all()
+
+    def append(self, stream, chunk):
+        if not chunk:
+            return
+        with self._cond:
+            self.buffers[stream].append(chunk)
+            self._changed()
+
+    def set_state(self, status, progress):
+        with self._cond:
+            if self.finished_at is not None or (status, progress) == (self.status, self.progress):
+                return
+            self.status, self.progress = status, progress
+            if status in TERMINAL_STATUSES:
+                self.finished_at = time.monotonic()
+            self._changed()
+
+    def wait(self, version, timeout):
+        """等待通道版本超过 version，返回最新版本"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > version, timeout)
+            return self.version
+
+    def read(self, stream, offset):
+        with self._cond:
+            return self.buffers[stream].read(offset)
+
+    def remaining(self, stream, text):
+        """
+        完整文本 text 中订阅者尚未收到的部分: 已推送的内容是 text 的前缀时返回剩余部分；
+        内容不一致时（如改进超时后改用原始用例）另起一段返回完整文本，已推送过完整文本时返回空字符串
+        """
+        sent = self.read(stream, 0)
+        if not text or sent.endswith(text):
+            return ''
+        if text.startswith(sent):
+            return text[len(sent):]
+        return '\n\n' + text
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+
+class ProgressBroker:
+    """进程内的任务通道注册表"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        now = time.monotonic()
+        for task_id in [task_id for task_id, channel in self._channels.items()
+                        if channel.finished and now - channel.finished_at > CHANNEL_TTL]:
+            del self._channels[task_id]
+
+    def open(self, task_id):
+        """生成任务开始时创建通道（重新执行同一任务时替换旧通道）"""
+        with self._lock:
+            self._evict()
+            channel = self._channels[task_id] = TaskChannel(task_id)
+            return channel
+
+    def get(self, task_id):
+        with self._lock:
+            self._evict()
+            return self._channels.get(task_id)
+
+    def publish(self, task_id, stream, chunk):
+        channel = self.get(task_id)
+        if channel is not None:
+            channel.append(stream, chunk)
+
+    def publish_state(self, task_id, status, progress):
+        channel = self.get(task_id)
+        if channel is not None:
+            channel.set_state(status, progress)
+
+
+progress_broker = ProgressBroker()
+
+
+def parse_event_id(value):
+    """解析 Last-Event-ID（"内容-评审-最终用例" 已发送长度），格式不正确时从头开始"""
+    try:
+        offsets = [int(part) for part in (value or '').split('-')]
+    except ValueError:
+        offsets = []
+    if len(offsets) != len(STREAMS) or any(offset < 0 for offset in offsets):
+        offsets = [0] * len(STREAMS)
+    return dict(zip(STREAMS, offsets))
+
+
+def _event(cursor, payload):
+    event_id = '-'.join(str(cursor[stream]) for stream in STREAMS)
+    return f"id: {event_id}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _finish_events(cursor, status, progress):
+    yield _event(cursor, {'type': 'status', 'status': status, 'progress': progress})
+    yield _event(cursor, {'type': 'done'})
+
+
+def _channel_events(channel, cursor):
+    version = -1
+    state = None
+    while True:
+        current = channel.wait(version, KEEPALIVE_INTERVAL)
+        if current == version:
+            yield ': keepalive\n\n'
+            continue
+        version = current
+        # 先取结束标记再读取内容: 生成线程在结束前追加完所有内容，结束时不会漏发最后的增量
+        finished = channel.finished
+        for stream in STREAMS:
+            delta = channel.read(stream, cursor[stream])
+            if delta:
+                cursor[stream] += len(delta)
+                yield _event(cursor, {'type': stream, 'content': delta})
+        if finished:
+            yield from _finish_events(cursor, channel.status, channel.progress)
+            return
+        if (channel.status, channel.progress) != state and channel.status is not None:
+            state = (channel.status, channel.progress)
+            yield _event(cursor, {'type': 'progress', 'status': channel.status, 'progress': channel.progress})
+
+
+# 三路流式内容在数据库中对应的字段
+STREAM_FIELDS = {
+    'content': 'stream_buffer',
+    'review_content': 'review_feedback',
+    'final_content': 'final_test_cases',
+}
+
+
+def _db_events(task_id, cursor):
+    """当前进程没有任务通道时从数据库续传: 进行中的任务读取分块，已结束的任务读取完整文本中读取位置之后的部分"""
+    from django.db.models.functions import Substr
+
+    from .chunk_store import read_chunks
+    from .models import TestCaseGenerationTask
+
+    queryset = TestCaseGenerationTask.objects.filter(task_id=task_id)
+    state = None
+    last_sent = time.monotonic()
+    while True:
+        row = queryset.values('id', 'status', 'progress').first()
+        if row is None:
+            return
+        terminal = row['status'] in TERMINAL_STATUSES
+        if terminal:
+            deltas = queryset.values(
+                **{stream: Substr(field, cursor[stream] + 1) for stream, field in STREAM_FIELDS.items()}
+            ).first()
+        else:
+            deltas = read_chunks(row['id'], cursor)
+        for stream in STREAMS:
+            delta = deltas[stream]
+            if delta:
+                cursor[stream] += len(delta)
+                last_sent = time.monotonic()
+                yield _event(cursor, {'type': stream, 'content': delta})
+        if terminal:
+            yield from _finish_events(cursor, row['status'], row['progress'])
+            return
+        if (row['status'], row['progress']) != state:
+            state = (row['status'], row['progress'])
+            last_sent = time.monotonic()
+            yield _event(cursor, {'type': 'progress', 'status': row['status'], 'progress': row['progress']})
+        elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+            last_sent = time.monotonic()
+            yield ': keepalive\n\n'
+        # 生成任务可能在轮询期间于本进程开始（重新执行），此时切换到通道
+        channel = progress_broker.get(task_id)
+        if channel is not None:
+            yield from _channel_events(channel, cursor)
+            return
+        time.sleep(DB_POLL_INTERVAL)
+
+
+def task_event_stream(task_id, last_event_id=None):
+    """SSE 事件流: 有本进程通道时推送内存中的增量，否则从数据库快照续传"""
+    cursor = parse_event_id(last_event_id)
+    yield f"retry: {RETRY_MS}\n\n"
+    channel = progress_broker.get(task_id)
+    if channel is not None:
+        yield from _channel_events(channel, cursor)
+    else:
+        yield from _db_events(task_id, cursor)
@@ -0,0 +1,110 @@
+"""
+大模型响应缓存
+同一需求文档用同样的提示词和模型配置重复生成、评审时，每次都重新调用模型服务。
+开启 AI_RESPONSE_CACHE_ENABLED 后，AIModelService 的调用按内容寻址缓存响应:
+- 只缓存 temperature 为 0 的确定性调用，temperature 大于 0 时每次生成的结果本来就不同，不读取也不写入缓存；
+- 缓存键为模型服务地址、模型名称、max_tokens、temperature、top_p 和规范化后的消息（统一换行、去掉行尾空白）的 SHA-256，
+  提示词或模型参数任何改动都会得到新的键；
+- 缓存保存在进程内存中，超过 AI_RESPONSE_CACHE_TTL 秒过期，
+  条目数超过 AI_RESPONSE_CACHE_SIZE 或总字符数超过 AI_RESPONSE_CACHE_MAX_CHARS 时淘汰最久未使用的条目；
+- 流式调用只缓存正常结束的完整输出（包括自动续写的部分），出错或调用方提前停止读取时不缓存；
+- 命中和未命中次数记录到当前任务的调用统计（llm_client.track_call_metrics），保存在 TestCaseGenerationTask.metrics['llm']。
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .llm_client import current_call_metrics
+
+
+def _normalize_messages(messages):
+    normalized = []
+    for message in messages:
+        content = str(message.get('content') or '').replace('\r\n', '\n').replace('\r', '\n')
+        content = '\n'.join(line.rstrip() for line in content.split('\n')).strip()
+        normalized.append([message.get('role'), content])
+    return normalized
+
+
+def _size(value):
+    return len(value) if isinstance(value, str) else len(json.dumps(value, ensure_ascii=False))
+
+
+class ResponseCache:
+    """带过期时间的 LRU 响应缓存，线程安全"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return getattr(settings, 'AI_RESPONSE_CACHE_ENABLED', False)
+
+    def key(self, kind, config, messages, max_tokens):
+        """计算缓存键，未开启缓存或调用不是确定性的（temperature 不为 0）时返回 None；kind 区分流式（缓存文本）和非流式（缓存响应字典）"""
+        if not self.enabled() or config.temperature:
+            return None
+        payload = {
+            'kind': kind,
+            'base_url': config.base_url.rstrip('/'),
+            'model': config.model_name,
+            'max_tokens': max_tokens,
+            'temperature': config.temperature,
+            'top_p': config.top_p,
+            'messages': _normalize_messages(messages),
+        }
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """读取缓存并记录命中情况，key 为 None 时返回 None"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics = current_call_metrics()
+        if metrics is not None:
+            metrics.record_cache(entry is not None)
+        if entry is None:
+            return None
+        # 非流式调用缓存的是响应字典，返回副本避免调用方修改缓存
+        return copy.deepcopy(entry[1]) if isinstance(entry[1], dict) else entry[1]
+
+    def put(self, key, value):
+        if key is None or not value:
+            return
+        size = _size(value)
+        max_chars = getattr(settings, 'AI_RESPONSE_CACHE_MAX_CHARS', 10000000)
+        if size > max_chars:
+            return
+        expires_at = time.monotonic() + getattr(settings, 'AI_RESPONSE_CACHE_TTL', 86400)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires_at, value, size)
+            self._chars += size
+            max_entries = getattr(settings, 'AI_RESPONSE_CACHE_SIZE', 256)
+            while self._entries and (len(self._entries) > max_entries or self._chars > max_chars):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._chars -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,232 @@
+"""
+大需求文档的分章节生成
+generate_test_cases_stream 把整篇需求放在一个提示词中，大文档容易超出模型上下文，或生成十几分钟后整体失败。
+需求文档超过 AI_SECTION_SPLIT_CHARS 个字符时改为分章节生成:
+- 按章节标题切分（AdvancedTestRequirementAnalyzer.split_document_sections），相邻短章节合并到 AI_SECTION_MAX_CHARS 以内；
+- 各章节并发生成，同时最多 AI_SECTION_CONCURRENCY 个请求，同一模型配置的请求（包括自动续写）按 AI_PROVIDER_RPM 限速
+  （进程内所有任务共用限速）；
+- 每个章节完成后更新进度，并按文档顺序通过回调输出（前面的章节未完成时暂存），
+  全部完成后按文档顺序合并表格，按用例内容去重，再用 renumber_test_cases 连续编号；
+- 单个章节失败不影响其他章节，结果记录在 task.metrics['sections']，所有章节都失败时抛出异常。
+文档较短时仍整篇生成。
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 提示词中列出的章节标题数量上限
+MAX_OUTLINE_TITLES = 30
+
+
+class ProviderRateLimiter:
+    """按模型配置限制每分钟发起的请求数，各任务线程的事件循环共用"""
+
+    def __init__(self):
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    async def acquire(self, config):
+        rpm = getattr(settings, 'AI_PROVIDER_RPM', 30)
+        if rpm <= 0:
+            return
+        key = config.pk or config.base_url
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(key, now))
+            self._next_slot[key] = slot + 60.0 / rpm
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+provider_rate_limiter = ProviderRateLimiter()
+
+
+def split_requirement(text):
+    """需求文档超过 AI_SECTION_SPLIT_CHARS 时按章节切分，否则返回只有一个章节的列表"""
+    from .advanced_analyzer import advanced_analyzer
+
+    text = text or ''
+    if len(text) <= getattr(settings, 'AI_SECTION_SPLIT_CHARS', 12000):
+        return [{'title': '', 'content': text}]
+    return advanced_analyzer.split_document_sections(text, getattr(settings, 'AI_SECTION_MAX_CHARS', 6000))
+
+
+def _section_message(task, sections, index):
+    section = sections[index]
+    titles = [f"{i}. {s['title']}" for i, s in enumerate(sections[:MAX_OUTLINE_TITLES], 1)]
+    if len(sections) > MAX_OUTLINE_TITLES:
+        titles.append('...')
+    outline = '\n'.join(titles)
+    return (
+        f"以下是需求文档《{task.title}》共 {len(sections)} 部分中的第 {index + 1} 部分「{section['title']}」。"
+        f"其他部分由其他请求分别生成，请只针对本部分的内容设计测试用例。\n\n"
+        f"【文档结构】\n{outline}\n\n"
+        f"【生成指令】\n"
+        f"1. 务必覆盖本部分的所有功能点、异常场景和边界条件，不设数量上限，应写尽写。\n"
+        f"2. 对每个功能点，必须设计：1个正常场景 + 2-3个异常/边界场景。\n"
+        f"3. 严禁将多个验证点合并在一条用例中。\n"
+        f"4. 按要求的表格格式输出，用例编号从001开始连续编号（合并各部分时会统一重新编号）。\n\n"
+        f"【本部分需求内容】\n{section['content']}"
+    )
+
+
+async def _generate_section(task, sections, index):
+    from .models import AIModelService
+
+    config = task.writer_model_config
+    messages = [
+        {"role": "system", "content": task.writer_prompt_config.content},
+        {"role": "user", "content": _section_message(task, sections, index)}
+    ]
+    # 使用流式接口读取，长输出时自动续写，每次请求前都按模型配置限速
+    generator = AIModelService.call_openai_compatible_api_stream(
+        config, messages, before_request=lambda: provider_rate_limiter.acquire(config)
+    )
+    parts = []
+    try:
+        async for chunk in generator:
+            parts.append(chunk)
+    finally:
+        await generator.aclose()
+    return AIModelService.fix_incomplete_last_case(''.join(parts))
+
+
+def _cells(line):
+    return [cell.strip() for cell in line.strip().strip('|').split('|')]
+
+
+def merge_section_cases(contents):
+    """
+    按顺序合并各章节的用例表格: 使用第一个表格的表头，丢弃各章节重复的表头，
+    按编号以外的列去重，再用 renumber_test_cases 连续编号
+
+    Returns:
+        (合并后的内容, 去掉的重复用例数)
+    """
+    from .models import AIModelService
+
+    header = None
+    rows = []
+    seen = set()
+    duplicates = 0
+    for content in contents:
+        lines = content.split('\n')
+        separators = {i for i, line in enumerate(lines) if line.strip().startswith('|') and '---' in line}
+        if not separators:
+            continue
+        first = min(separators)
+        if header is None and first > 0:
+            header = lines[first - 1:first + 1]
+        if header is None:
+            continue
+        columns = header[1].count('|')
+        header_lines = separators | {i - 1 for i in separators}
+        for i, line in enumerate(lines):
+            if i in header_lines or not line.strip().startswith('|'):
+                continue
+            if line.count('|') != columns:
+                logger.warning(f"章节用例列数与表头不一致，已跳过: {line[:80]}")
+                continue
+            key = tuple(re.sub(r'\s+', '', cell).lower() for cell in _cells(line)[1:])
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            rows.append(line)
+
+    if header is None:
+        # 模型没有按表格输出，按顺序拼接
+        return '\n\n'.join(content for content in contents if content), 0
+    return AIModelService.renumber_test_cases('\n'.join(header + rows)), duplicates
+
+
+async def generate_test_cases_by_sections(task, callback=None):
+    """
+    生成测试用例，大文档按章节并发生成后合并
+
+    Args:
+        task: 生成任务对象
+        callback: 可选的异步回调；文档未切分时为流式回调，切分后按文档顺序输出各章节的用例（标题带有章节序号）
+
+    Returns:
+        str: 完整的测试用例内容
+    """
+    from asgiref.sync import sync_to_async
+
+    from .models import AIModelService
+
+    sections = split_requirement(task.requirement_text)
+    if len(sections) <= 1:
+        if callback is None:
+            return await AIModelService.generate_test_cases(task)
+        return await AIModelService.generate_test_cases_stream(task, callback=callback)
+
+    total = len(sections)
+    logger.info(f"任务 {task.task_id} 需求文档 {len(task.requirement_text)} 字符，分 {total} 个章节生成")
+    semaphore = asyncio.Semaphore(max(1, getattr(settings, 'AI_SECTION_CONCURRENCY', 3)))
+    save_progress = sync_to_async(task.save)
+    start_progress = task.progress
+    done = 0
+    # 已结束但尚未输出的章节（失败的章节为 None），emitted 为下一个要输出的章节
+    finished = {}
+    emitted = 0
+    emit_lock = asyncio.Lock()
+
+    async def emit_ready():
+        nonlocal emitted
+        async with emit_lock:
+            while emitted in finished:
+                content = finished.pop(emitted)
+                emitted += 1
+                if content is not None:
+                    await callback(f"\n\n### {emitted}/{total} {sections[emitted - 1]['title']}\n\n{content}\n")
+
+    async def run(index):
+        nonlocal done
+        content = None
+        try:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    content = await _generate_section(task, sections, index)
+                finally:
+                    done += 1
+                    logger.info(f"任务 {task.task_id} 章节 {index + 1}/{total} 结束，耗时 {time.perf_counter() - started:.1f}s")
+        finally:
+            if callback is not None:
+                finished[index] = content
+                await emit_ready()
+        # 章节生成占 start_progress 到 60 的进度
+        task.progress = start_progress + (60 - start_progress) * done // total
+        try:
+            await save_progress(update_fields=['progress'])
+        except Exception as e:
+            logger.warning(f"更新任务进度失败: {e}")
+        return content
+
+    results = await asyncio.gather(*(run(index) for index in range(total)), return_exceptions=True)
+
+    failed = [
+        {'index': index + 1, 'title': sections[index]['title'], 'error': str(result)[:200]}
+        for index, result in enumerate(results) if isinstance(result, BaseException)
+    ]
+    contents = [result for result in results if not isinstance(result, BaseException)]
+    if not contents:
+        raise results[0]
+    for item in failed:
+        logger.error(f"任务 {task.task_id} 章节 {item['index']}「{item['title']}」生成失败: {item['error']}")
+
+    merged, duplicates = merge_section_cases(contents)
+    task.metrics = dict(task.metrics or {}, sections={
+        'total': total,
+        'succeeded': len(contents),
+        'failed': failed,
+        'duplicates': duplicates,
+    })
+    return merged
@@ -243,10 +243,10 @@ class TestCaseGenerationTaskSerializer(serializers.ModelSerializer):
                  'reviewer_model_config', 'reviewer_model_name', 'writer_prompt_config', 'writer_prompt_name',
                  'reviewer_prompt_config', 'reviewer_prompt_name', 'generated_test_cases',
                  'review_feedback', 'final_test_cases', 'generation_log', 'error_message',
-                 'created_by', 'created_by_name', 'created_at', 'updated_at', 'completed_at']
+                 'metrics', 'created_by', 'created_by_name', 'created_at', 'updated_at', 'completed_at']
         read_only_fields = ['task_id', 'status', 'progress', 'generated_test_cases', 
                           'review_feedback', 'final_test_cases', 'generation_log', 
-                          'error_message', 'created_by', 'completed_at']
+                          'error_message', 'metrics', 'created_by', 'completed_at']
     
     def create(self, validated_data):
         # 自动设置创建者和任务ID
@@ -1,7 +1,20 @@
-from django.test import TestCase
+import contextvars
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.contrib.auth import get_user_model
 from apps.projects.models import Project
-from .models import RequirementDocument, RequirementAnalysis, BusinessRequirement, GeneratedTestCase
+from . import chunk_store
+from .chunk_store import ChunkWriter, clear_chunks, read_chunks
+from .models import (
+    RequirementDocument, RequirementAnalysis, BusinessRequirement, GeneratedTestCase, GenerationChunk,
+    TestCaseGenerationTask
+)
+from .advanced_analyzer import advanced_analyzer
+from .llm_client import track_call_metrics
+from .progress_broker import TaskChannel, _Buffer, parse_event_id
+from .response_cache import ResponseCache
+from .section_generation import merge_section_cases
 
 User = get_user_model()
 
@@ -102,4 +115,258 @@ class RequirementAnalysisTestCase(TestCase):
             expected_result='Test result'
         )
         self.assertEqual(test_case.case_id, 'TC-001')
-        self.assertEqual(test_case.status, 'generated')
\ No newline at end of file
+        self.assertEqual(test_case.status, 'generated')
+
+
+class ProgressBufferTestCase(SimpleTestCase):
+    def test_read_from_offset(self):
+        """测试从任意位置读取增量，包括分块内部的位置"""
+        buffer = _Buffer()
+        for chunk in ['abc', 'de', '', 'fghij']:
+            buffer.append(chunk)
+        self.assertEqual(buffer.length, 10)
+        self.assertEqual(buffer.read(0), 'abcdefghij')
+        self.assertEqual(buffer.read(3), 'defghij')
+        self.assertEqual(buffer.read(4), 'efghij')
+        self.assertEqual(buffer.read(9), 'j')
+        self.assertEqual(buffer.read(10), '')
+        self.assertEqual(buffer.read(50), '')
+
+    def test_read_empty(self):
+        """测试空缓冲"""
+        self.assertEqual(_Buffer().read(0), '')
+
+
+class ParseEventIdTestCase(SimpleTestCase):
+    def test_valid(self):
+        """测试解析三路内容的已发送长度"""
+        self.assertEqual(parse_event_id('12-0-345'), {'content': 12, 'review_content': 0, 'final_content': 345})
+
+    def test_invalid_starts_from_beginning(self):
+        """测试格式不正确时从头开始"""
+        start = {'content': 0, 'review_content': 0, 'final_content': 0}
+        for value in [None, '', '12', '1-2', '1-2-3-4', 'a-b-c', '1--2', '-1-2-3']:
+            self.assertEqual(parse_event_id(value), start, value)
+
+
+class TaskChannelTestCase(SimpleTestCase):
+    def test_read_and_version(self):
+        """测试追加内容后版本递增，空内容和重复状态不通知订阅者"""
+        channel = TaskChannel('t1')
+        channel.append('content', 'abc')
+        channel.append('content', '')
+        channel.append('review_content', 'x')
+        self.assertEqual(channel.version, 2)
+        self.assertEqual(channel.read('content', 1), 'bc')
+        channel.set_state('generating', 10)
+        channel.set_state('generating', 10)
+        self.assertEqual(channel.wait(2, timeout=0), 3)
+        channel.set_state('completed', 100)
+        self.assertTrue(channel.finished)
+        channel.set_state('failed', 100)
+        self.assertEqual(channel.status, 'completed')
+
+    def test_remaining(self):
+        """测试完整文本中订阅者尚未收到的部分"""
+        channel = TaskChannel('t1')
+        self.assertEqual(channel.remaining('final_content', 'abc'), 'abc')
+        channel.append('final_content', 'ab')
+        self.assertEqual(channel.remaining('final_content', 'abcd'), 'cd')
+        self.assertEqual(channel.remaining('final_content', 'xyz'), '\n\nxyz')
+        channel.append('final_content', '\n\nxyz')
+        self.assertEqual(channel.remaining('final_content', 'xyz'), '')
+        self.assertEqual(channel.remaining('final_content', ''), '')
+
+
+class ChunkStoreTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='chunkuser', password='testpass123')
+        self.task = TestCaseGenerationTask.objects.create(
+            task_id='chunk-task', title='分块任务', requirement_text='需求', created_by=user
+        )
+
+    def test_append_and_flush(self):
+        """测试输出累积到阈值时才需要写入，每次写入每路一个分块"""
+        writer = ChunkWriter(self.task)
+        self.assertFalse(writer.append('content', 'ab'))
+        self.assertFalse(writer.append('content', ''))
+        self.assertFalse(writer.append('review_content', 'x'))
+        self.assertTrue(writer.append('content', 'c' * chunk_store.FLUSH_CHARS))
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual(writer.flush(), 0)
+
+        writer.append('content', 'de')
+        self.assertEqual(writer.flush(), 1)
+        chunks = list(GenerationChunk.objects.filter(task=self.task, stream='content').order_by('seq').values_list(
+            'seq', 'start', 'end', 'content'))
+        length = 2 + chunk_store.FLUSH_CHARS
+        self.assertEqual(chunks, [(0, 0, length, 'ab' + 'c' * chunk_store.FLUSH_CHARS), (1, length, length + 2, 'de')])
+        self.assertEqual(writer.text('content'), 'ab' + 'c' * chunk_store.FLUSH_CHARS + 'de')
+        self.assertEqual(writer.text('final_content'), '')
+
+    def test_read_chunks_from_offset(self):
+        """测试按位置读取各路输出的增量，包括分块内部的位置"""
+        writer = ChunkWriter(self.task)
+        writer.append('content', 'hello ')
+        writer.append('final_content', 'final')
+        writer.flush()
+        writer.append('content', 'world')
+        writer.flush()
+
+        self.assertEqual(read_chunks(self.task.pk, {'content': 0, 'review_content': 0, 'final_content': 0}), {
+            'content': 'hello world', 'review_content': '', 'final_content': 'final'
+        })
+        self.assertEqual(read_chunks(self.task.pk, {'content': 8, 'review_content': 0, 'final_content': 5}), {
+            'content': 'rld', 'review_content': '', 'final_content': ''
+        })
+        self.assertEqual(read_chunks(self.task.pk, {'content': 6, 'review_content': 0, 'final_content': 0}), {
+            'content': 'world', 'review_content': '', 'final_content': 'final'
+        })
+
+    def test_clear_chunks(self):
+        """测试删除任务的分块"""
+        writer = ChunkWriter(self.task)
+        writer.append('content', 'abc')
+        writer.append('review_content', 'def')
+        writer.flush()
+        self.assertEqual(clear_chunks(self.task), 2)
+        self.assertEqual(read_chunks(self.task.pk, {'content': 0})['content'], '')
+
+
+class SplitDocumentSectionsTestCase(SimpleTestCase):
+    def test_split_by_heading(self):
+        """测试按章节标题切分，章节首尾相连不丢失内容，连续标题归入同一章节"""
+        text = '\n'.join([
+            '前言说明',
+            '# 登录',
+            '## 账号登录',
+            '输入账号和密码' * 5,
+            '第二章 注册',
+            '填写手机号' * 5,
+            '三、找回密码',
+            '通过邮箱找回' * 5,
+        ])
+        sections = advanced_analyzer.split_document_sections(text, max_chars=50)
+        self.assertEqual([section['title'] for section in sections], ['第1部分', '登录', '第二章 注册', '三、找回密码'])
+        self.assertEqual('\n'.join(section['content'] for section in sections), text)
+
+    def test_numbered_headings(self):
+        """测试编号标题需要分隔符，以数字开头的正文不作为标题"""
+        for line in ['1. 登录', '2、注册', '3.1.2. 找回密码', '1.2 账号登录', '4．退出']:
+            self.assertTrue(advanced_analyzer.HEADING_PATTERN.match(line), line)
+        body = ['2024年1月起所有订单需审核', '3个用户同时登录时提示冲突', '100元以下免运费', '1.5元以下免运费', '10 个以内']
+        for line in body:
+            self.assertFalse(advanced_analyzer.HEADING_PATTERN.match(line), line)
+
+        text = '\n'.join(['1. 订单', *body, '2. 支付', '支付成功后发送通知'])
+        sections = advanced_analyzer.split_document_sections(text, max_chars=70)
+        self.assertEqual([section['title'] for section in sections], ['1. 订单', '2. 支付'])
+        self.assertEqual('\n'.join(section['content'] for section in sections), text)
+
+    def test_merge_short_sections(self):
+        """测试相邻的短章节合并到 max_chars 以内"""
+        text = '# A\na\n# B\nb\n# C\n' + 'c' * 20
+        sections = advanced_analyzer.split_document_sections(text, max_chars=30)
+        self.assertEqual([section['title'] for section in sections], ['A', 'C'])
+        self.assertEqual(sections[0]['content'], '# A\na\n# B\nb')
+        self.assertEqual('\n'.join(section['content'] for section in sections), text)
+
+    def test_split_long_section(self):
+        """测试超长章节按段落切分，单个段落仍超长时按长度截断"""
+        text = '# 订单\n' + '\n\n'.join(['段落一' * 4, '段落二' * 4, 'x' * 45])
+        sections = advanced_analyzer.split_document_sections(text, max_chars=20)
+        self.assertTrue(all(len(section['content']) <= 20 for section in sections))
+        self.assertEqual(sections[0]['title'], f'订单（1/{len(sections)}）')
+        self.assertEqual(''.join(section['content'] for section in sections).count('x'), 45)
+
+
+class MergeSectionCasesTestCase(SimpleTestCase):
+    HEADER = '| 用例编号 | 标题 | 预期结果 |\n|---|---|---|'
+
+    def test_merge(self):
+        """测试合并时丢弃重复表头、按编号以外的列去重并连续编号"""
+        first = f'登录部分\n{self.HEADER}\n| TC001 | 正确密码登录 | 登录成功 |\n| TC002 | 错误密码登录 | 提示错误 |'
+        second = f'{self.HEADER}\n| TC001 | 正确密码  登录 | 登录成功 |\n| TC002 | 注册新用户 | 注册成功 |\n| TC003 | 列数不一致 |'
+        merged, duplicates = merge_section_cases([first, second])
+        self.assertEqual(duplicates, 1)
+        self.assertEqual(merged.split('\n'), [
+            '| 用例编号 | 标题 | 预期结果 |',
+            '|---|---|---|',
+            '| TC001 | 正确密码登录 | 登录成功 |',
+            '| TC002 | 错误密码登录 | 提示错误 |',
+            '| TC003 | 注册新用户 | 注册成功 |',
+        ])
+
+    def test_without_table(self):
+        """测试模型没有按表格输出时按顺序拼接"""
+        self.assertEqual(merge_section_cases(['第一部分', '', '第二部分']), ('第一部分\n\n第二部分', 0))
+
+
+@override_settings(AI_RESPONSE_CACHE_ENABLED=True, AI_RESPONSE_CACHE_TTL=3600,
+                   AI_RESPONSE_CACHE_SIZE=3, AI_RESPONSE_CACHE_MAX_CHARS=100)
+class ResponseCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.cache = ResponseCache()
+        self.config = SimpleNamespace(
+            base_url='http://llm.example.com/v1/', model_name='model', temperature=0, top_p=1.0
+        )
+        self.messages = [{'role': 'user', 'content': '生成用例\r\n需求  \n'}]
+
+    def test_key(self):
+        """测试缓存键: 消息规范化后相同的调用得到同一个键，参数变化得到新的键"""
+        key = self.cache.key('stream', self.config, self.messages, 4096)
+        self.assertEqual(key, self.cache.key('stream', self.config, [{'role': 'user', 'content': '生成用例\n需求'}], 4096))
+        self.assertNotEqual(key, self.cache.key('chat', self.config, self.messages, 4096))
+        self.assertNotEqual(key, self.cache.key('stream', self.config, self.messages, 8192))
+
+    def test_nondeterministic_call_not_cached(self):
+        """测试 temperature 不为 0 或未开启缓存时不计算缓存键"""
+        self.config.temperature = 0.7
+        self.assertIsNone(self.cache.key('stream', self.config, self.messages, 4096))
+        self.config.temperature = 0
+        with override_settings(AI_RESPONSE_CACHE_ENABLED=False):
+            self.assertIsNone(self.cache.key('stream', self.config, self.messages, 4096))
+
+    def test_evict_least_recently_used(self):
+        """测试条目数超过上限时淘汰最久未使用的条目"""
+        for key in ['a', 'b', 'c']:
+            self.cache.put(key, key * 10)
+        self.assertEqual(self.cache.get('a'), 'a' * 10)
+        self.cache.put('d', 'd' * 10)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual([self.cache.get(key) for key in ['a', 'c', 'd']], ['a' * 10, 'c' * 10, 'd' * 10])
+
+    def test_evict_by_chars(self):
+        """测试总字符数超过上限时淘汰，单个超长的响应不缓存"""
+        self.cache.put('a', 'a' * 60)
+        self.cache.put('b', 'b' * 50)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 'b' * 50)
+        self.cache.put('c', 'c' * 101)
+        self.assertIsNone(self.cache.get('c'))
+        self.assertEqual(self.cache._chars, 50)
+
+    def test_expired(self):
+        """测试过期的条目不再返回"""
+        with override_settings(AI_RESPONSE_CACHE_TTL=0):
+            self.cache.put('a', 'text')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache._chars, 0)
+
+    def test_dict_copied(self):
+        """测试非流式调用缓存的响应字典返回副本"""
+        self.cache.put('a', {'choices': [{'message': {'content': 'x'}}]})
+        self.cache.get('a')['choices'].clear()
+        self.assertEqual(self.cache.get('a'), {'choices': [{'message': {'content': 'x'}}]})
+
+    def test_records_hits(self):
+        """测试命中和未命中次数记录到当前任务的调用统计"""
+        def run():
+            metrics = track_call_metrics()
+            self.cache.put('a', 'text')
+            self.cache.get('a')
+            self.cache.get('b')
+            self.cache.get(None)
+            return metrics.cache_hits, metrics.cache_misses
+
+        self.assertEqual(contextvars.copy_context().run(run), (1, 1))
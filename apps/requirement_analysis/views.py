@@ -42,6 +42,10 @@ from .serializers import (
     GenerationConfigSerializer
 )
 from .services import RequirementAnalysisService, DocumentProcessor
+from .llm_client import track_call_metrics
+from .progress_broker import STREAM_FIELDS, progress_broker, task_event_stream
+from .chunk_store import ChunkWriter, clear_chunks
+from .section_generation import generate_test_cases_by_sections
 
 logger = logging.getLogger(__name__)
 
@@ -953,7 +957,7 @@ class AIModelConfigViewSet(viewsets.ModelViewSet):
                         # 设置60秒超时，统一使用OpenAI兼容API
                         result = loop.run_until_complete(
                             asyncio.wait_for(
-                                AIModelService.call_openai_compatible_api(config, test_messages),
+                                AIModelService.call_openai_compatible_api(config, test_messages, use_cache=False),
                                 timeout=60.0
                             )
                         )
@@ -1346,6 +1350,31 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                         import threading
                         
                         def execute_task():
+                            # 统计本任务的大模型调用（连接耗时、首字节耗时等），保存到 task.metrics
+                            call_metrics = track_call_metrics()
+                            # 流式内容和状态发布到进度通道，SSE 订阅者从通道接收增量
+                            channel = progress_broker.open(task.task_id)
+                            # 流式输出只追加写入分块，完整文本在各阶段结束时写入任务
+                            chunks = ChunkWriter(task)
+                            async_flush_chunks = sync_to_async(chunks.flush)
+
+                            async def publish_chunk(stream, chunk):
+                                """推送给 SSE 订阅者并追加到分块存储"""
+                                channel.append(stream, chunk)
+                                if chunks.append(stream, chunk):
+                                    try:
+                                        await async_flush_chunks()
+                                    except Exception as save_error:
+                                        logger.warning(f"保存流式输出分块失败: {save_error}")
+
+                            def publish_text(stream, text):
+                                """在流式回调之外写入评审意见或最终用例时，把订阅者尚未收到的部分推送到通道并追加到分块存储"""
+                                remaining = channel.remaining(stream, text)
+                                if remaining:
+                                    channel.append(stream, remaining)
+                                    chunks.append(stream, remaining)
+                                    chunks.flush()
+
                             try:
                                 # 更新任务状态
                                 task.status = 'generating'
@@ -1374,43 +1403,23 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                         task.stream_position = 0
                                         task.save()
 
-                                        # 定义同步保存函数
-                                        def save_stream_buffer(content):
-                                            """同步保存流式内容到数据库"""
-                                            task.stream_buffer = content
-                                            task.stream_position = len(content)
-                                            task.last_stream_update = timezone.now()
-                                            task.save(update_fields=['stream_buffer', 'stream_position', 'last_stream_update'])
-
-                                        # 转换为异步函数
-                                        async_save_stream_buffer = sync_to_async(save_stream_buffer)
-
                                         async def stream_callback(chunk):
-                                            """流式回调：实时保存每个chunk到数据库"""
-                                            # 先追加到内存中的buffer
-                                            task.stream_buffer += chunk
-                                            task.stream_position = len(task.stream_buffer)
-                                            task.last_stream_update = timezone.now()
-
-                                            # 每10个chunk或当chunk较大时保存一次
-                                            if task.stream_position % 500 < 20 or len(chunk) > 100:
-                                                try:
-                                                    await async_save_stream_buffer(task.stream_buffer)
-                                                except Exception as save_error:
-                                                    logger.warning(f"保存流式内容失败: {save_error}")
+                                            """流式回调：推送并追加到分块存储"""
+                                            await publish_chunk('content', chunk)
 
                                         # 生成测试用例
                                         task.progress = 30
                                         task.save()
 
                                         generated_cases = loop.run_until_complete(
-                                            AIModelService.generate_test_cases_stream(task, callback=stream_callback)
+                                            generate_test_cases_by_sections(task, callback=stream_callback)
                                         )
 
-                                        # 生成完成后，确保最终的流式内容被保存
-                                        if task.stream_buffer:
-                                            save_stream_buffer(task.stream_buffer)
-
+                                        # 生成完成后写入完整的流式内容
+                                        chunks.flush()
+                                        task.stream_buffer = chunks.text('content')
+                                        task.stream_position = len(task.stream_buffer)
+                                        task.last_stream_update = timezone.now()
                                         task.generated_test_cases = generated_cases
                                         task.progress = 60
                                         task.save()
@@ -1424,28 +1433,9 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
 
                                                 logger.info(f"开始流式评审任务 {task.task_id}")
 
-                                                # 评审内容缓存
-                                                review_buffer = []
-
-                                                def save_review_buffer(content):
-                                                    """同步保存评审内容"""
-                                                    task.review_feedback = content
-                                                    task.save(update_fields=['review_feedback'])
-
-                                                async_save_review = sync_to_async(save_review_buffer)
-
                                                 async def review_stream_callback(chunk):
                                                     """流式评审回调"""
-                                                    review_buffer.append(chunk)
-                                                    current_length = sum(len(c) for c in review_buffer)
-
-                                                    # 每100字符保存一次
-                                                    if current_length % 100 < 20 or len(chunk) > 50:
-                                                        try:
-                                                            content = ''.join(review_buffer)
-                                                            await async_save_review(content)
-                                                        except Exception as save_error:
-                                                            logger.warning(f"保存评审内容失败: {save_error}")
+                                                    await publish_chunk('review_content', chunk)
 
                                                 try:
                                                     # 移除超时限制，允许大文档完整评审
@@ -1455,8 +1445,9 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                         )
                                                     )
                                                     # 保存最终评审内容
-                                                    if review_buffer:
-                                                        task.review_feedback = ''.join(review_buffer)
+                                                    chunks.flush()
+                                                    if chunks.text('review_content'):
+                                                        task.review_feedback = chunks.text('review_content')
                                                         task.save(update_fields=['review_feedback'])
                                                     logger.info(f"任务 {task.task_id} 流式评审完成")
 
@@ -1468,30 +1459,13 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                     task.save()
 
                                                     try:
-                                                        # 定义同步保存函数
-                                                        def save_final_buffer(content):
-                                                            """同步保存最终用例内容"""
-                                                            task.final_test_cases = content
-                                                            task.save(update_fields=['final_test_cases'])
-
-                                                        # 转换为异步函数
-                                                        async_save_final = sync_to_async(save_final_buffer)
-
-                                                        # 创建流式回调函数，实时更新final_test_cases
+                                                        # 创建流式回调函数，最终用例追加到分块存储
                                                         async def final_callback(chunk):
-                                                            """流式回调：实时保存最终用例到数据库"""
-                                                            # 实时追加到final_test_cases并保存
-                                                            task.final_test_cases = (task.final_test_cases or '') + chunk
-
-                                                            # 每100字符或chunk较大时保存一次
-                                                            current_length = len(task.final_test_cases)
-                                                            if current_length % 100 < 20 or len(chunk) > 50:
-                                                                try:
-                                                                    await async_save_final(task.final_test_cases)
-                                                                except Exception as save_error:
-                                                                    logger.warning(f"保存最终用例失败: {save_error}")
+                                                            """流式回调：推送并追加到分块存储"""
+                                                            await publish_chunk('final_content', chunk)
 
                                                         # 添加超时保护，避免任务一直卡住（使用配置的超时时间）
+                                                        timed_out = False
                                                         try:
                                                             revised_cases = loop.run_until_complete(
                                                                 asyncio.wait_for(
@@ -1506,6 +1480,7 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                             logger.error(f"任务 {task.task_id} 改进阶段超时（{review_timeout}秒），使用原始用例")
                                                             # 超时时使用原始生成的用例，不再抛出异常
                                                             revised_cases = generated_cases
+                                                            timed_out = True
                                                         # 始终使用返回的完整内容，避免流式输出被截断导致数据丢失
                                                         # revised_cases 是完整的返回值，task.final_test_cases 只是流式回调的中间状态
                                                         if revised_cases and len(revised_cases) > 0:
@@ -1518,15 +1493,19 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                             renumbered_cases = AIModelService.renumber_test_cases(sorted_cases)
                                                             task.final_test_cases = renumbered_cases
                                                             logger.info(f"任务 {task.task_id} 测试用例改进完成 (revised_cases长度: {len(revised_cases)}, 最终保存长度: {len(task.final_test_cases)})")
+                                                            if timed_out:
+                                                                publish_text('final_content', task.final_test_cases)
                                                         else:
-                                                            # 如果返回为空，保留流式回调保存的内容
-                                                            logger.warning(f"任务 {task.task_id} 改进返回为空，使用流式回调保存的内容 (长度: {len(task.final_test_cases) if task.final_test_cases else 0})")
+                                                            # 如果返回为空，使用流式输出的内容
+                                                            task.final_test_cases = chunks.text('final_content')
+                                                            logger.warning(f"任务 {task.task_id} 改进返回为空，使用流式输出的内容 (长度: {len(task.final_test_cases)})")
                                                     except Exception as revise_error:
                                                         logger.warning(f"任务 {task.task_id} 改进测试用例失败: {revise_error}，使用原始用例")
                                                         # 按用例编号排序后再保存
                                                         sorted_cases = AIModelService.sort_test_cases_by_id(generated_cases)
                                                         # 重新编号使编号连续
                                                         task.final_test_cases = AIModelService.renumber_test_cases(sorted_cases)
+                                                        publish_text('final_content', task.final_test_cases)
                                                         task.save()
 
                                                 except Exception as inner_error:
@@ -1536,6 +1515,8 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                     sorted_cases = AIModelService.sort_test_cases_by_id(generated_cases)
                                                     # 重新编号使编号连续
                                                     task.final_test_cases = AIModelService.renumber_test_cases(sorted_cases)
+                                                    publish_text('review_content', task.review_feedback)
+                                                    publish_text('final_content', task.final_test_cases)
                                                     task.save()
 
                                             except Exception as review_error:
@@ -1544,6 +1525,8 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                 sorted_cases = AIModelService.sort_test_cases_by_id(generated_cases)
                                                 task.final_test_cases = AIModelService.renumber_test_cases(sorted_cases)
                                                 task.review_feedback = f"评审失败: {str(review_error)}\n\n建议：测试用例结构完整，可以使用。"
+                                                publish_text('review_content', task.review_feedback)
+                                                publish_text('final_content', task.final_test_cases)
                                                 task.save()
                                         else:
                                             # 按用例编号排序后再保存
@@ -1551,6 +1534,7 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                             # 重新编号使编号连续
                                             task.final_test_cases = AIModelService.renumber_test_cases(sorted_cases)
                                             logger.info(f"任务 {task.task_id} 跳过评审，直接使用生成的测试用例")
+                                            publish_text('final_content', task.final_test_cases)
                                             task.save()
 
                                     else:
@@ -1559,7 +1543,7 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                         task.save()
 
                                         generated_cases = loop.run_until_complete(
-                                            AIModelService.generate_test_cases(task)
+                                            generate_test_cases_by_sections(task)
                                         )
 
                                         task.generated_test_cases = generated_cases
@@ -1581,6 +1565,7 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                         AIModelService.review_test_cases(task, generated_cases)
                                                     )
                                                     task.review_feedback = review_feedback
+                                                    publish_text('review_content', task.review_feedback)
                                                     logger.info(f"任务 {task.task_id} 评审完成")
 
                                                     # 根据评审意见改进测试用例（自动执行）
@@ -1591,30 +1576,13 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                     task.save()
 
                                                     try:
-                                                        # 定义同步保存函数
-                                                        def save_final_buffer_full(content):
-                                                            """同步保存最终用例内容"""
-                                                            task.final_test_cases = content
-                                                            task.save(update_fields=['final_test_cases'])
-
-                                                        # 转换为异步函数
-                                                        async_save_final_full = sync_to_async(save_final_buffer_full)
-
-                                                        # 创建流式回调函数，实时更新final_test_cases
+                                                        # 创建流式回调函数，最终用例追加到分块存储
                                                         async def final_callback_full(chunk):
-                                                            """流式回调：实时保存最终用例到数据库"""
-                                                            # 实时追加到final_test_cases并保存
-                                                            task.final_test_cases = (task.final_test_cases or '') + chunk
-
-                                                            # 每100字符或chunk较大时保存一次
-                                                            current_length = len(task.final_test_cases)
-                                                            if current_length % 100 < 20 or len(chunk) > 50:
-                                                                try:
-                                                                    await async_save_final_full(task.final_test_cases)
-                                                                except Exception as save_error:
-                                                                    logger.warning(f"保存最终用例失败: {save_error}")
+                                                            """流式回调：推送并追加到分块存储"""
+                                                            await publish_chunk('final_content', chunk)
 
                                                         # 添加超时保护，避免任务一直卡住（使用配置的超时时间）
+                                                        timed_out = False
                                                         try:
                                                             revised_cases = loop.run_until_complete(
                                                                 asyncio.wait_for(
@@ -1629,6 +1597,7 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                             logger.error(f"任务 {task.task_id} 改进阶段超时（{review_timeout}秒），使用原始用例")
                                                             # 超时时使用原始生成的用例，不再抛出异常
                                                             revised_cases = generated_cases
+                                                            timed_out = True
                                                         # 始终使用返回的完整内容，避免流式输出被截断导致数据丢失
                                                         # revised_cases 是完整的返回值，task.final_test_cases 只是流式回调的中间状态
                                                         if revised_cases and len(revised_cases) > 0:
@@ -1641,15 +1610,19 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                             renumbered_cases = AIModelService.renumber_test_cases(sorted_cases)
                                                             task.final_test_cases = renumbered_cases
                                                             logger.info(f"任务 {task.task_id} 测试用例改进完成 (revised_cases长度: {len(revised_cases)}, 最终保存长度: {len(task.final_test_cases)})")
+                                                            if timed_out:
+                                                                publish_text('final_content', task.final_test_cases)
                                                         else:
-                                                            # 如果返回为空，保留流式回调保存的内容
-                                                            logger.warning(f"任务 {task.task_id} 改进返回为空，使用流式回调保存的内容 (长度: {len(task.final_test_cases) if task.final_test_cases else 0})")
+                                                            # 如果返回为空，使用流式输出的内容
+                                                            task.final_test_cases = chunks.text('final_content')
+                                                            logger.warning(f"任务 {task.task_id} 改进返回为空，使用流式输出的内容 (长度: {len(task.final_test_cases)})")
                                                     except Exception as revise_error:
                                                         logger.warning(f"任务 {task.task_id} 改进测试用例失败: {revise_error}，使用原始用例")
                                                         # 按用例编号排序后再保存
                                                         sorted_cases = AIModelService.sort_test_cases_by_id(generated_cases)
                                                         # 重新编号使编号连续
                                                         task.final_test_cases = AIModelService.renumber_test_cases(sorted_cases)
+                                                        publish_text('final_content', task.final_test_cases)
                                                         task.save()
 
                                                 except Exception as inner_error:
@@ -1659,6 +1632,8 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                     sorted_cases = AIModelService.sort_test_cases_by_id(generated_cases)
                                                     # 重新编号使编号连续
                                                     task.final_test_cases = AIModelService.renumber_test_cases(sorted_cases)
+                                                    publish_text('review_content', task.review_feedback)
+                                                    publish_text('final_content', task.final_test_cases)
                                                     task.save()
 
                                             except Exception as review_error:
@@ -1668,6 +1643,8 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                                 sorted_cases = AIModelService.sort_test_cases_by_id(generated_cases)
                                                 task.final_test_cases = AIModelService.renumber_test_cases(sorted_cases)
                                                 task.review_feedback = f"评审失败: {str(review_error)}\n\n建议：测试用例结构完整，可以使用。"
+                                                publish_text('review_content', task.review_feedback)
+                                                publish_text('final_content', task.final_test_cases)
                                                 task.save()
                                         else:
                                             # 按用例编号排序后再保存
@@ -1675,17 +1652,16 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                             # 重新编号使编号连续
                                             task.final_test_cases = AIModelService.renumber_test_cases(sorted_cases)
                                             logger.info(f"任务 {task.task_id} 跳过评审，直接使用生成的测试用例")
+                                            publish_text('final_content', task.final_test_cases)
                                             task.save()
 
-                                    # 完成任务
-                                    # 注意：不要直接调用task.save()，因为这会覆盖流式回调保存的final_test_cases
-                                    # 从数据库重新获取最新的任务对象
-                                    task.refresh_from_db()
-
+                                    # 完成任务：最终用例在此写入（流式过程中只写分块），写入后删除分块
                                     task.status = 'completed'
                                     task.progress = 100
                                     task.completed_at = timezone.now()
-                                    task.save(update_fields=['status', 'progress', 'completed_at', 'final_test_cases'])
+                                    task.metrics = dict(task.metrics or {}, llm=call_metrics.summary())
+                                    task.save(update_fields=['status', 'progress', 'completed_at', 'final_test_cases', 'metrics'])
+                                    clear_chunks(task)
                                     logger.info(f"任务 {task.task_id} 已完成")
                                     
                                 finally:
@@ -1699,9 +1675,15 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                                     
                             except Exception as e:
                                 logger.error(f"生成任务执行失败: {e}")
+                                # 已输出但尚未写入任务的部分写入对应字段，结束的任务从完整文本续传，之后删除分块
+                                for stream, field in STREAM_FIELDS.items():
+                                    if chunks.text(stream) and not getattr(task, field):
+                                        setattr(task, field, chunks.text(stream))
                                 task.status = 'failed'
                                 task.error_message = str(e)
+                                task.metrics = dict(task.metrics or {}, llm=call_metrics.summary())
                                 task.save()
+                                clear_chunks(task)
                         
                         # 在新线程中执行任务
                         thread = threading.Thread(target=execute_task)
@@ -1804,9 +1786,8 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                 response['Access-Control-Max-Age'] = '86400'
                 return response
 
-            # 获取任务对象
-            task = TestCaseGenerationTask.objects.filter(task_id=task_id).first()
-            if not task:
+            # 获取任务对象（只判断是否存在，不读取大文本字段）
+            if not TestCaseGenerationTask.objects.filter(task_id=task_id).exists():
                 logger.warning(f"SSE连接失败: 任务未找到, task_id={task_id}")
                 # 返回JSON错误而不是SSE
                 from django.http import HttpResponse
@@ -1818,128 +1799,15 @@ class TestCaseGenerationTaskViewSet(viewsets.ModelViewSet):
                 response['Access-Control-Allow-Origin'] = cors_origin
                 response['Access-Control-Allow-Credentials'] = 'true'
                 return response
-    
-            # 记录上次发送的stream_position
-            last_sent_position = 0
-            loop_count = 0  # 循环计数器
-            last_review_length = 0  # 记录上次发送的评审内容长度
-            last_final_length = 0  # 记录上次发送的最终用例长度
-            last_status = ''  # 记录上次的任务状态
-    
-            def event_stream():
-                nonlocal last_sent_position, loop_count, last_review_length, last_final_length, last_status
-    
-                while True:
-                    loop_count += 1
-    
-                    # 从数据库重新获取任务状态
-                    task.refresh_from_db()
-    
-                    # 检测状态变化，如果进入revising阶段，重置last_final_length
-                    if task.status != last_status:
-                        logger.info(f"SSE检测到状态变化: {last_status} -> {task.status}")
-                        if task.status == 'revising':
-                            logger.info(f"SSE: 进入revising阶段，重置last_final_length")
-                            last_final_length = 0
-                        last_status = task.status
-    
-                    # 每10次循环记录一次日志
-                    if loop_count % 10 == 0:
-                        logger.info(f"SSE stream loop #{loop_count}: task_status={task.status}, progress={task.progress}%, buffer_len={len(task.stream_buffer) if task.stream_buffer else 0}")
-    
-                    # 检查任务是否已完成或失败
-                    if task.status in ['completed', 'failed', 'cancelled']:
-                        logger.info(f"SSE任务结束: status={task.status}")
-                        # 发送最终状态
-                        final_status = json.dumps({'type': 'status', 'status': task.status, 'progress': task.progress}, ensure_ascii=False)
-                        logger.info(f"SSE发送最终状态: {final_status}")
-                        yield f"data: {final_status}\n\n"
-    
-                        # 如果是流式模式且有缓冲区内容，发送剩余内容
-                        if task.output_mode == 'stream' and task.stream_buffer:
-                            if last_sent_position < len(task.stream_buffer):
-                                new_content = task.stream_buffer[last_sent_position:]
-                                content_data = json.dumps({'type': 'content', 'content': new_content}, ensure_ascii=False)
-                                logger.info(f"SSE发送剩余内容: {len(new_content)} 字符")
-                                yield f"data: {content_data}\n\n"
-                                last_sent_position = len(task.stream_buffer)
-    
-                        # 发送剩余的评审内容
-                        if task.review_feedback:
-                            if len(task.review_feedback) > last_review_length:
-                                remaining_review = task.review_feedback[last_review_length:]
-                                if remaining_review:
-                                    review_data = json.dumps({'type': 'review_content', 'content': remaining_review}, ensure_ascii=False)
-                                    logger.info(f"SSE发送剩余评审内容: {len(remaining_review)} 字符, 总长度: {len(task.review_feedback)}")
-                                    yield f"data: {review_data}\n\n"
-                                    last_review_length = len(task.review_feedback)
-    
-                        # 发送剩余的最终用例内容
-                        if task.final_test_cases:
-                            if len(task.final_test_cases) > last_final_length:
-                                remaining_final = task.final_test_cases[last_final_length:]
-                                if remaining_final:
-                                    final_data = json.dumps({'type': 'final_content', 'content': remaining_final}, ensure_ascii=False)
-                                    logger.info(f"SSE发送剩余最终用例: {len(remaining_final)} 字符, 总长度: {len(task.final_test_cases)}")
-                                    yield f"data: {final_data}\n\n"
-                                    last_final_length = len(task.final_test_cases)
-    
-                        # 发送完成信号
-                        yield f"data: {json.dumps({'type': 'done'}, ensure_ascii=False)}\n\n"
-                        logger.info(f"SSE流结束，总循环次数: {loop_count}")
-    
-                        # 添加短暂延迟，确保done信号被发送
-                        time.sleep(0.1)
-                        break
-    
-                    # 如果是流式模式，发送新增的内容
-                    if task.output_mode == 'stream' and task.stream_buffer:
-                        current_position = task.stream_position
-                        if current_position > last_sent_position:
-                            # 提取新增内容
-                            new_content = task.stream_buffer[last_sent_position:current_position]
-                            if new_content:
-                                content_data = json.dumps({'type': 'content', 'content': new_content}, ensure_ascii=False)
-                                logger.info(f"SSE发送新增内容: {len(new_content)} 字符, 总位置: {current_position}")
-                                yield f"data: {content_data}\n\n"
-                                last_sent_position = current_position
-    
-                    # 如果是评审阶段，发送评审内容
-                    if task.status == 'reviewing' and task.review_feedback:
-                        review_feedback = task.review_feedback
-                        if review_feedback:
-                            # 计算评审内容的增量
-                            if len(review_feedback) > last_review_length:
-                                new_review = review_feedback[last_review_length:]
-                                if new_review:
-                                    review_data = json.dumps({'type': 'review_content', 'content': new_review}, ensure_ascii=False)
-                                    logger.info(f"SSE发送评审内容: {len(new_review)} 字符")
-                                    yield f"data: {review_data}\n\n"
-                                    last_review_length = len(review_feedback)
-    
-                    # 如果有最终用例，发送最终用例内容（在reviewing、revising或completed阶段）
-                    if task.status in ['reviewing', 'revising', 'completed'] and task.final_test_cases:
-                        final_cases = task.final_test_cases
-                        if final_cases:
-                            # 计算最终用例的增量
-                            if len(final_cases) > last_final_length:
-                                new_final = final_cases[last_final_length:]
-                                if new_final:
-                                    final_data = json.dumps({'type': 'final_content', 'content': new_final}, ensure_ascii=False)
-                                    logger.info(f"SSE发送最终用例: {len(new_final)} 字符, 总长度: {len(final_cases)}, 阶段: {task.status}")
-                                    yield f"data: {final_data}\n\n"
-                                    last_final_length = len(final_cases)
-    
-                    # 发送进度更新
-                    progress_data = json.dumps({'type': 'progress', 'status': task.status, 'progress': task.progress}, ensure_ascii=False)
-                    yield f"data: {progress_data}\n\n"
-    
-                    # 短暂休眠，避免过度消耗资源
-                    time.sleep(0.3)
-    
+
+            # 断线重连时浏览器通过 Last-Event-ID 请求头带上已接收的位置，手动重连可使用 last_event_id 参数
+            last_event_id = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id')
+            if last_event_id:
+                logger.info(f"SSE断线重连: task_id={task_id}, last_event_id={last_event_id}")
+
             # 返回SSE流式响应
             response = StreamingHttpResponse(
-                event_stream(),
+                task_event_stream(task_id, last_event_id),
                 content_type='text/event-stream'
             )
     
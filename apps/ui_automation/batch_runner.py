@@ -0,0 +1,203 @@
+"""
+UI 测试用例批量执行
+批量运行的用例进入 UI 执行池（apps.core.workers，工作线程数即浏览器槽位数），不再每个用例单独启动线程和浏览器:
+- 用例按历史执行时长分配到不超过槽位数的分片（与套件并行执行相同的 LPT 策略），每个分片占用一个工作线程；
+- 工作线程使用线程内的浏览器池（get_thread_browser_pool），分片内的用例复用同一个浏览器，每个用例使用独立的 BrowserContext；
+- 提交后立即返回批次ID，通过 batch_snapshot(批次记录) 查询进度和汇总结果。
+
+批次保存在 UiCaseBatch，各用例的执行记录（TestCaseExecution）带有批次ID，
+进度由这些记录得出，任意进程都可以查询，服务重启后仍可查看已执行的结果。
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from django.utils import timezone
+
+from .browser_pool import get_thread_browser_pool
+from .models import TestCase, TestCaseExecution, UiCaseBatch
+from .test_executor import ShardExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class CaseBatch:
+    """一次批量执行：用例、分片执行器和进度"""
+
+    def __init__(self, project, test_cases, engine='playwright', browser='chrome', headless=False, executed_by=None):
+        self.id = uuid.uuid4().hex
+        self.project = project
+        self.test_cases = list(test_cases)
+        self.engine = engine
+        self.browser = browser
+        self.headless = headless
+        self.executed_by = executed_by
+        # 以下属性供 ShardExecutor 从父执行器复制: 批量执行不属于套件，也没有套件执行记录
+        self.test_suite = None
+        self.execution = None
+        self.browser_pool = None
+        self.storage_state = None
+        self.plan = None
+        self.executors = []
+        self.record = None
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def prepare(self, slots):
+        """编译执行计划并按历史执行时长把用例分配到 slots 个分片"""
+        from .execution_plan import compile_plan, plan_version
+        from .sharding import estimate_case_durations, shard_test_cases
+
+        case_ids = [test_case.id for test_case in self.test_cases]
+        version, strategies = plan_version(case_ids)
+        self.plan = compile_plan(None, self.test_cases, version, strategies)
+        durations = estimate_case_durations(case_ids)
+        shards = shard_test_cases(self.test_cases, slots, durations)
+        self.executors = [BatchShardExecutor(self, cases, index) for index, cases in enumerate(shards)]
+        return self.executors
+
+    def create_record(self):
+        return UiCaseBatch.objects.create(
+            batch_id=self.id,
+            project=self.project,
+            test_case_ids=[test_case.id for test_case in self.test_cases],
+            engine=self.engine,
+            browser=self.browser,
+            headless=self.headless,
+            slots=len(self.executors),
+            created_by=self.executed_by,
+        )
+
+    def shard_started(self, executor):
+        UiCaseBatch.objects.filter(batch_id=self.id, started_at__isnull=True).update(started_at=timezone.now())
+
+    def shard_finished(self, executor):
+        with self._lock:
+            if executor.summary['error_msg']:
+                self.errors.append(f"分片 {executor.index + 1}: {executor.summary['error_msg']}")
+            fields = {'error_message': '\n'.join(self.errors)}
+            if all(item.state == 'finished' for item in self.executors):
+                fields['finished_at'] = timezone.now()
+            UiCaseBatch.objects.filter(batch_id=self.id).update(**fields)
+
+
+def batch_snapshot(record):
+    """批次进度和汇总结果，由批次记录和带有批次ID的用例执行记录得出"""
+    executions = {
+        execution['test_case_id']: execution
+        for execution in TestCaseExecution.objects.filter(batch_id=record.batch_id).values(
+            'id', 'test_case_id', 'status', 'error_message'
+        )
+    }
+    names = dict(TestCase.objects.filter(id__in=record.test_case_ids).values_list('id', 'name'))
+
+    cases = []
+    for test_case_id in record.test_case_ids:
+        execution = executions.get(test_case_id)
+        case_status = 'queued' if execution is None or execution['status'] == 'pending' else execution['status']
+        if record.finished_at is not None and case_status in ('queued', 'running'):
+            # 批次已结束但没有结果的用例（分片未能启动或异常退出）
+            case_status = 'skipped'
+        cases.append({
+            'test_case_id': test_case_id,
+            'test_case_name': names.get(test_case_id, ''),
+            'status': case_status,
+            'error': execution['error_message'] if execution else None,
+            'execution_id': execution['id'] if execution else None,
+        })
+
+    total = len(cases)
+    passed = sum(1 for case in cases if case['status'] == 'passed')
+    failed = sum(1 for case in cases if case['status'] == 'failed')
+    completed = sum(1 for case in cases if case['status'] not in ('queued', 'running'))
+    if record.finished_at is not None:
+        batch_status = 'passed' if passed == total else 'failed'
+    elif record.started_at is not None:
+        batch_status = 'running'
+    else:
+        batch_status = 'queued'
+
+    if record.started_at is None:
+        duration = 0
+    else:
+        duration = ((record.finished_at or timezone.now()) - record.started_at).total_seconds()
+    return {
+        'batch_id': record.batch_id,
+        'status': batch_status,
+        'engine': record.engine,
+        'browser': record.browser,
+        'headless': record.headless,
+        'slots': record.slots,
+        'total': total,
+        'completed': completed,
+        'passed': passed,
+        'failed': failed,
+        'skipped': completed - passed - failed,
+        'progress': round(completed / total * 100, 2) if total else 100,
+        'duration': round(duration, 2),
+        'created_at': record.created_at,
+        'started_at': record.started_at,
+        'finished_at': record.finished_at,
+        'error_message': record.error_message,
+        'results': cases,
+    }
+
+
+class BatchShardExecutor(ShardExecutor):
+    """批量执行的分片：在执行池的工作线程中执行，复用工作线程的浏览器"""
+
+    execution_source = 'manual'
+
+    def __init__(self, batch, test_cases, index):
+        super().__init__(batch, test_cases, index)
+        self.batch = batch
+        self.state = 'queued'
+
+    @property
+    def project(self):
+        return self.batch.project
+
+    def case_writer_defaults(self):
+        return dict(super().case_writer_defaults(), batch_id=self.batch.id)
+
+    def run_shard(self):
+        self.state = 'running'
+        self.batch.shard_started(self)
+        try:
+            if self.engine == 'playwright':
+                # 浏览器池属于执行池的工作线程，多个批次之间保持浏览器运行
+                self.browser_pool = get_thread_browser_pool()
+            super().run_shard()
+        finally:
+            self.state = 'finished'
+            self.batch.shard_finished(self)
+
+
+def submit_batch(project, test_cases, engine='playwright', browser='chrome', headless=False, executed_by=None):
+    """把用例提交到 UI 执行池，返回批次（batch.record 为批次记录）；执行池排队已满时抛出 queue.Full"""
+    from apps.core.workers import get_worker_pool
+
+    pool = get_worker_pool('ui')
+    # Safari 同一时间只允许一个 WebDriver 会话
+    slots = 1 if browser == 'safari' else min(pool.workers, len(test_cases))
+    if pool.max_queue - pool.queue.qsize() < slots:
+        raise queue.Full(f'UI自动化执行队列已满（最多排队 {pool.max_queue} 个任务），请稍后重试')
+
+    batch = CaseBatch(project, test_cases, engine, browser, headless, executed_by)
+    # 访问项目以便分片线程只读取已缓存的数据
+    batch.project.base_url
+    start = time.time()
+    executors = batch.prepare(slots)
+    logger.info(f"批量执行 {batch.id}: {len(batch.test_cases)} 个用例分配到 {len(executors)} 个浏览器槽位 "
+                f"(准备耗时 {time.time() - start:.2f}秒)")
+    batch.record = batch.create_record()
+    for executor in executors:
+        try:
+            pool.submit(executor.run_shard)
+        except queue.Full as e:
+            executor.summary['error_msg'] = str(e)
+            executor.state = 'finished'
+            batch.shard_finished(executor)
+    return batch
@@ -0,0 +1,163 @@
+"""
+Playwright 浏览器池
+同一个浏览器进程被多个用例复用，每个用例使用独立的 BrowserContext（Cookie、存储、缓存互相隔离），
+省去每个用例 1~3 秒的浏览器启动时间。
+
+Playwright 同步 API 的对象只能在创建它的线程中使用，所以浏览器池属于创建它的线程:
+- TestExecutor 未传入浏览器池时，为本次套件执行创建一个临时的池，执行结束后关闭；
+- 长期运行的工作线程可以通过 get_thread_browser_pool() 获取线程内的池并传给 TestExecutor，
+  浏览器在多次套件执行之间保持运行，线程退出前调用 close_thread_browser_pool() 释放。
+
+浏览器断开连接（崩溃）或使用次数达到 UI_AUTOMATION_BROWSER_MAX_USES 时会被回收并重新启动。
+"""
+import logging
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 新建 BrowserContext 的默认参数（User Agent、Viewport，忽略HTTPS证书错误）
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'ignore_https_errors': True,
+}
+
+# 浏览器崩溃或被关闭时 Playwright 异常中的特征信息
+CRASH_MARKERS = (
+    'Target closed',
+    'Target page, context or browser has been closed',
+    'Browser has been closed',
+    'Browser closed',
+    'browser has disconnected',
+    'Connection closed',
+)
+
+
+def is_browser_crash(error):
+    """判断异常是否由浏览器崩溃或断开引起"""
+    message = str(error)
+    return any(marker.lower() in message.lower() for marker in CRASH_MARKERS)
+
+
+class PlaywrightBrowserPool:
+    """线程内的 Playwright 浏览器池，按 (浏览器, 是否无头) 各保留一个浏览器进程"""
+
+    def __init__(self, max_uses=None):
+        if max_uses is None:
+            max_uses = getattr(settings, 'UI_AUTOMATION_BROWSER_MAX_USES', 50)
+        self.max_uses = max_uses
+        self.playwright = None
+        self.browsers = {}
+        self.uses = {}
+        self.launch_count = 0
+        self.owner = threading.get_ident()
+
+    def _launch(self, browser_name, headless):
+        if self.playwright is None:
+            from playwright.sync_api import sync_playwright
+            self.playwright = sync_playwright().start()
+
+        # 选择浏览器并配置忽略证书错误
+        if browser_name == 'firefox':
+            browser = self.playwright.firefox.launch(
+                headless=headless,
+                args=['--ignore-certificate-errors']
+            )
+        elif browser_name == 'safari':
+            browser = self.playwright.webkit.launch(
+                headless=headless,
+                args=['--ignore-certificate-errors']
+            )
+        else:  # chrome or edge
+            # 添加防检测参数和忽略证书错误
+            browser = self.playwright.chromium.launch(
+                headless=headless,
+                args=[
+                    '--disable-blink-features=AutomationControlled',
+                    '--ignore-certificate-errors',
+                    '--ignore-ssl-errors',
+                    '--ignore-certificate-errors-spki-list',
+                ]
+            )
+        self.launch_count += 1
+        return browser
+
+    def acquire(self, browser_name, headless):
+        """获取可用的浏览器，不存在、已断开或达到复用上限时重新启动"""
+        if threading.get_ident() != self.owner:
+            raise RuntimeError('Playwright 浏览器池只能在创建它的线程中使用')
+
+        key = (browser_name, headless)
+        browser = self.browsers.get(key)
+        if browser is not None and not browser.is_connected():
+            logger.warning(f"浏览器 {browser_name} 已断开连接，重新启动")
+            self.discard(browser_name, headless)
+            browser = None
+        if browser is not None and self.max_uses and self.uses.get(key, 0) >= self.max_uses:
+            logger.info(f"浏览器 {browser_name} 已复用 {self.uses[key]} 次，回收后重新启动")
+            self.discard(browser_name, headless)
+            browser = None
+
+        if browser is None:
+            browser = self._launch(browser_name, headless)
+            self.browsers[key] = browser
+            self.uses[key] = 0
+        self.uses[key] += 1
+        return browser
+
+    def new_context(self, browser_name, headless, storage_state=None):
+        """在池中的浏览器上创建隔离的 BrowserContext
+
+        storage_state 可以是 Playwright storage_state 字典或文件路径，用于恢复已登录状态。
+        """
+        browser = self.acquire(browser_name, headless)
+        options = dict(CONTEXT_OPTIONS)
+        if storage_state:
+            options['storage_state'] = storage_state
+        return browser.new_context(**options)
+
+    def snapshot_storage_state(self, context, path=None):
+        """保存上下文的存储状态（Cookie、localStorage），用于后续用例直接以已登录状态开始"""
+        return context.storage_state(path=path) if path else context.storage_state()
+
+    def discard(self, browser_name, headless):
+        """关闭并移除浏览器（例如崩溃后），下次获取时重新启动"""
+        browser = self.browsers.pop((browser_name, headless), None)
+        self.uses.pop((browser_name, headless), None)
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """关闭所有浏览器和 Playwright 驱动进程"""
+        for browser_name, headless in list(self.browsers):
+            self.discard(browser_name, headless)
+        if self.playwright is not None:
+            try:
+                self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
+
+
+_local = threading.local()
+
+
+def get_thread_browser_pool():
+    """获取当前线程的浏览器池，供长期运行的工作线程在多次执行之间复用浏览器"""
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        pool = _local.pool = PlaywrightBrowserPool()
+    return pool
+
+
+def close_thread_browser_pool():
+    """关闭当前线程的浏览器池"""
+    pool = getattr(_local, 'pool', None)
+    if pool is not None:
+        pool.close()
+        _local.pool = None
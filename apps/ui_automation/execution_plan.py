@@ -0,0 +1,215 @@
+"""
+UI 测试套件执行计划
+执行器原来逐个用例查询步骤（test_case.steps.select_related(...)），查询次数随用例数增长。
+执行计划把套件中所有用例的步骤、元素、定位策略和备用定位器编译成不可变的结构:
+- 版本指纹: 1 次聚合查询（用例最大 updated_at、步骤数、最大步骤ID、元素最大 updated_at）+ 1 次定位策略查询；
+- 编译: 1 次查询加载全部步骤及其元素，与用例数量无关。
+
+编译结果按套件缓存，版本指纹未变化时（用例、步骤、元素、定位策略和套件中的用例顺序均未修改）
+直接复用上次的计划，不再编译。执行时通过 case_data() 为每个用例生成独立的字典，执行过程中的修改不影响缓存。
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.db.models import Count, Max
+
+# 缓存的套件执行计划数量上限
+PLAN_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class ElementPlan:
+    id: int
+    name: str
+    locator_strategy: str
+    locator_value: str
+    # ((策略, 定位表达式), ...)
+    backup_locators: Tuple[Tuple[str, str], ...] = ()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'locator_value': self.locator_value,
+            'locator_strategy': self.locator_strategy,
+            'backup_locators': [
+                {'strategy': strategy, 'value': value} for strategy, value in self.backup_locators
+            ],
+        }
+
+
+@dataclass(frozen=True)
+class StepPlan:
+    id: int
+    step_number: int
+    action_type: str
+    description: str
+    input_value: str
+    wait_time: int
+    assert_type: str
+    assert_value: str
+    element: Optional[ElementPlan] = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'step_number': self.step_number,
+            'action_type': self.action_type,
+            'description': self.description,
+            'input_value': self.input_value,
+            'wait_time': self.wait_time,
+            'assert_type': self.assert_type,
+            'assert_value': self.assert_value,
+            'element': self.element.to_dict() if self.element else None,
+        }
+
+
+@dataclass(frozen=True)
+class CasePlan:
+    id: int
+    name: str
+    steps: Tuple[StepPlan, ...] = ()
+
+
+class ExecutionPlan:
+    """套件的执行计划（编译后不再修改）"""
+
+    def __init__(self, suite_id, version, cases):
+        self.suite_id = suite_id
+        self.version = version
+        # 用例ID -> CasePlan
+        self.cases = cases
+
+    def case_data(self, case_id, project_id):
+        """生成执行器使用的用例数据字典（每次调用返回新的字典）"""
+        case = self.cases[case_id]
+        return {
+            'id': case.id,
+            'name': case.name,
+            'project_id': project_id,
+            'steps': [step.to_dict() for step in case.steps],
+        }
+
+
+def _normalize_backup_locators(backup_locators):
+    if not isinstance(backup_locators, list):
+        return ()
+    return tuple(
+        (str(backup.get('strategy') or 'css'), str(backup.get('value')))
+        for backup in backup_locators
+        if isinstance(backup, dict) and backup.get('value')
+    )
+
+
+def plan_version(case_ids):
+    """计算用例集合的版本指纹，返回 (版本, {定位策略ID: 名称})"""
+    from .models import LocatorStrategy, TestCase
+
+    aggregates = TestCase.objects.filter(id__in=case_ids).aggregate(
+        cases_updated=Max('updated_at'),
+        step_count=Count('steps'),
+        last_step=Max('steps__id'),
+        elements_updated=Max('steps__element__updated_at'),
+    )
+    strategies = dict(LocatorStrategy.objects.values_list('id', 'name'))
+    version = (
+        tuple(case_ids),
+        aggregates['cases_updated'],
+        aggregates['step_count'],
+        aggregates['last_step'],
+        aggregates['elements_updated'],
+        tuple(sorted(strategies.items())),
+    )
+    return version, strategies
+
+
+def compile_plan(suite_id, test_cases, version, strategies):
+    """一次查询加载所有用例的步骤和元素，编译为执行计划"""
+    from .models import TestCaseStep
+
+    steps = {test_case.id: [] for test_case in test_cases}
+    elements = {}
+    rows = TestCaseStep.objects.filter(test_case_id__in=list(steps)).order_by('test_case_id', 'step_number').values(
+        'id', 'test_case_id', 'step_number', 'action_type', 'description', 'input_value', 'wait_time',
+        'assert_type', 'assert_value', 'element_id', 'element__name', 'element__locator_value',
+        'element__locator_strategy_id', 'element__backup_locators',
+    )
+    for row in rows:
+        element = None
+        element_id = row['element_id']
+        if element_id is not None:
+            element = elements.get(element_id)
+            if element is None:
+                element = elements[element_id] = ElementPlan(
+                    id=element_id,
+                    name=row['element__name'],
+                    locator_strategy=strategies.get(row['element__locator_strategy_id']) or 'css',
+                    locator_value=row['element__locator_value'],
+                    backup_locators=_normalize_backup_locators(row['element__backup_locators']),
+                )
+        steps[row['test_case_id']].append(StepPlan(
+            id=row['id'],
+            step_number=row['step_number'],
+            action_type=row['action_type'],
+            description=row['description'],
+            input_value=row['input_value'],
+            wait_time=row['wait_time'],
+            assert_type=row['assert_type'],
+            assert_value=row['assert_value'],
+            element=element,
+        ))
+
+    cases = {
+        test_case.id: CasePlan(id=test_case.id, name=test_case.name, steps=tuple(steps[test_case.id]))
+        for test_case in test_cases
+    }
+    return ExecutionPlan(suite_id, version, cases)
+
+
+class _PlanCache:
+    """按套件缓存最近的执行计划（LRU）"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, suite_id, version):
+        with self._lock:
+            plan = self._plans.get(suite_id)
+            if plan is None or plan.version != version:
+                return None
+            self._plans.move_to_end(suite_id)
+            return plan
+
+    def put(self, plan):
+        with self._lock:
+            self._plans[plan.suite_id] = plan
+            self._plans.move_to_end(plan.suite_id)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+_plan_cache = _PlanCache(PLAN_CACHE_SIZE)
+
+
+def get_execution_plan(test_suite, test_cases):
+    """获取套件的执行计划，返回 (计划, 是否复用了缓存)；test_cases 为套件中按顺序排列的用例"""
+    version, strategies = plan_version([test_case.id for test_case in test_cases])
+    plan = _plan_cache.get(test_suite.id, version)
+    if plan is not None:
+        return plan, True
+    plan = compile_plan(test_suite.id, test_cases, version, strategies)
+    _plan_cache.put(plan)
+    return plan, False
+
+
+def clear_plan_cache():
+    """清空执行计划缓存"""
+    _plan_cache.clear()
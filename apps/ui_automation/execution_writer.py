@@ -0,0 +1,179 @@
+"""
+UI 用例执行状态写入器
+套件执行时每个用例的执行记录原来需要 3 次同步写入（创建、开始、结束），且都发生在浏览器线程中。
+写入器改为:
+- 执行前用 bulk_create 一次性创建所有 pending 记录（数据库不支持返回主键时在一个事务中逐条创建）；
+- 开始/结束只在内存中记录状态变化，同一用例尚未写入的多次变化合并为一次（开始后很快结束的用例只写一次）；
+- 后台线程每隔 flush_interval 秒用 bulk_update 批量写入，浏览器线程不等待数据库；
+- 结束的用例的步骤耗时同时写入 StepTiming（step_timings.save_step_timings）。
+
+用法:
+    with CaseExecutionWriter(defaults) as writer:
+        writer.create_pending(case_ids)
+        writer.start(case_id)
+        writer.finish(case_id, 'passed', execution_logs=...)
+退出时停止后台线程并写入剩余的状态。
+"""
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import StepTiming, TestCaseExecution
+
+logger = logging.getLogger(__name__)
+
+
+class CaseExecutionWriter:
+    """批量、异步写入 TestCaseExecution 的状态变化"""
+
+    def __init__(self, defaults, flush_interval=None):
+        # defaults: 创建 pending 记录时的公共字段（project_id、test_suite、engine、browser 等）
+        self.defaults = defaults
+        if flush_interval is None:
+            flush_interval = getattr(settings, 'UI_AUTOMATION_CASE_FLUSH_INTERVAL', 1.0)
+        self.flush_interval = max(0.05, float(flush_interval))
+        self.executions = {}
+        self.started_at = {}
+        self.changes = {}
+        self.flush_count = 0
+        self.written_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.close()
+        except Exception as e:
+            if exc_type is None:
+                raise
+            # 已有异常在传播时只记录写入失败，不覆盖原始异常
+            logger.error(f"写入用例执行状态失败，丢失 {len(self.changes)} 条状态变化: {e}", exc_info=True)
+        return False
+
+    def create_pending(self, case_ids):
+        """批量创建 pending 状态的执行记录（不设置 started_at，等用例实际开始执行时再设置）"""
+        rows = [
+            TestCaseExecution(test_case_id=case_id, status='pending', **self.defaults)
+            for case_id in case_ids
+        ]
+        if not rows:
+            return
+        if connection.features.can_return_rows_from_bulk_insert:
+            created = TestCaseExecution.objects.bulk_create(rows)
+        else:
+            # MySQL 的 bulk_create 不返回主键，按条件查回会与同时进行的其他执行混淆，
+            # 改为在一个事务中逐条插入
+            with transaction.atomic():
+                for row in rows:
+                    row.save(force_insert=True)
+            created = rows
+        self.executions = {row.test_case_id: row.pk for row in created}
+        self._start_thread()
+
+    def _start_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ui-case-writer', daemon=True)
+            self._thread.start()
+
+    def _record(self, case_id, **fields):
+        with self._lock:
+            self.changes.setdefault(case_id, {}).update(fields)
+
+    def start(self, case_id):
+        """记录用例开始执行"""
+        started_at = timezone.now()
+        self.started_at[case_id] = started_at
+        self._record(case_id, status='running', started_at=started_at)
+        return started_at
+
+    def finish(self, case_id, status, **fields):
+        """记录用例执行结束，fields 为 execution_logs、error_message、screenshots 等，返回执行时长（秒）"""
+        finished_at = timezone.now()
+        started_at = self.started_at.get(case_id)
+        execution_time = (finished_at - started_at).total_seconds() if started_at else 0
+        self._record(case_id, status=status, finished_at=finished_at, execution_time=execution_time, **fields)
+        self._wake.set()
+        return execution_time
+
+    def flush(self):
+        """把尚未写入的状态变化批量写入数据库"""
+        with self._flush_lock:
+            with self._lock:
+                changes, self.changes = self.changes, {}
+            if not changes:
+                return
+
+            # 按变更字段分组，每组一次 bulk_update
+            groups = {}
+            timings = []
+            for case_id, fields in changes.items():
+                pk = self.executions.get(case_id)
+                if pk is None:
+                    continue
+                if isinstance(fields.get('execution_logs'), list):
+                    timings.append((pk, case_id, fields['execution_logs']))
+                    # 执行日志在写入线程中序列化，不占用浏览器线程
+                    fields = dict(fields, execution_logs=json.dumps(fields['execution_logs'], ensure_ascii=False))
+                groups.setdefault(tuple(sorted(fields)), []).append(TestCaseExecution(pk=pk, **fields))
+            try:
+                for field_names, rows in groups.items():
+                    TestCaseExecution.objects.bulk_update(rows, list(field_names), batch_size=100)
+                    self.written_count += len(rows)
+                self.flush_count += 1
+            except Exception:
+                # 写入失败时放回，下次重试（已有更新的变化优先）
+                with self._lock:
+                    for case_id, fields in changes.items():
+                        merged = dict(fields)
+                        merged.update(self.changes.get(case_id, {}))
+                        self.changes[case_id] = merged
+                raise
+            self._save_timings(timings)
+
+    def _save_timings(self, timings):
+        """一次 bulk_create 写入本批结束用例的步骤耗时，失败时只记录日志（不影响执行状态的写入）"""
+        from .step_timings import timing_rows
+
+        rows = []
+        for pk, case_id, steps in timings:
+            rows.extend(timing_rows(pk, self.defaults.get('project_id'), case_id, steps))
+        if not rows:
+            return
+        try:
+            StepTiming.objects.bulk_create(rows, batch_size=500)
+        except Exception as e:
+            logger.error(f"写入步骤耗时失败，丢失 {len(rows)} 条记录: {e}", exc_info=True)
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                # 合并短时间内的多次变化
+                time.sleep(0.05)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"写入用例执行状态失败，稍后重试: {e}", exc_info=True)
+        finally:
+            connection.close()
+
+    def close(self):
+        """停止后台线程并写入剩余的状态变化"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
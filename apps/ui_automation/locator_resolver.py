@@ -0,0 +1,131 @@
+"""
+UI 元素定位器自愈
+元素可以配置备用定位器（Element.backup_locators），原来执行时只使用主定位器，主定位器失效时要等满超时时间才失败。
+定位器解析:
+- 元素有备用定位器时，在 PROBE_TIMEOUT_MS 内轮询探测所有候选定位器（每轮依次做一次不等待的存在性检查），
+  最先匹配到元素的定位器胜出，步骤使用胜出的定位器执行；
+- 每个元素每个定位器的命中/未命中次数和命中耗时记录在进程内的统计中，之后的执行优先探测稳定且最快的定位器；
+- 所有候选都未在探测时间内出现时（页面仍在加载等），使用当前排名第一的定位器按步骤原有的超时时间等待。
+
+没有备用定位器的元素不做探测，与原来的执行方式相同。
+"""
+import threading
+import time
+
+# 探测所有候选定位器的最长时间（毫秒）和轮询间隔（秒）
+PROBE_TIMEOUT_MS = 1500
+POLL_INTERVAL = 0.1
+# 命中次数达到 RELIABLE_MIN_HITS 且命中率不低于 RELIABLE_RATE 的定位器视为稳定，优先使用
+RELIABLE_MIN_HITS = 2
+RELIABLE_RATE = 0.8
+
+
+def locator_key(strategy, value):
+    return f'{(strategy or "css").lower()}={value}'
+
+
+class LocatorStats:
+    """元素定位器的命中统计（进程内）"""
+
+    def __init__(self):
+        # 元素ID -> {定位器: {'hits': 命中次数, 'misses': 未命中次数, 'total_ms': 命中耗时合计}}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, element_id, key, found, elapsed_ms=0.0):
+        with self._lock:
+            stats = self._stats.setdefault(element_id, {}).setdefault(key, {'hits': 0, 'misses': 0, 'total_ms': 0.0})
+            if found:
+                stats['hits'] += 1
+                stats['total_ms'] += elapsed_ms
+            else:
+                stats['misses'] += 1
+
+    def order(self, element_id, candidates):
+        """按统计结果排序候选定位器: 稳定的定位器按平均命中耗时在前，其余保持配置顺序（主定位器优先）"""
+        with self._lock:
+            stats = dict(self._stats.get(element_id, {}))
+
+        def rank(item):
+            position, (strategy, value) = item
+            entry = stats.get(locator_key(strategy, value))
+            if entry and entry['hits'] >= RELIABLE_MIN_HITS and \
+                    entry['hits'] / (entry['hits'] + entry['misses']) >= RELIABLE_RATE:
+                return (0, entry['total_ms'] / entry['hits'], position)
+            return (1, 0, position)
+
+        return [candidate for _, candidate in sorted(enumerate(candidates), key=rank)]
+
+    def snapshot(self, element_id):
+        with self._lock:
+            return {key: dict(entry) for key, entry in self._stats.get(element_id, {}).items()}
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+locator_stats = LocatorStats()
+
+
+def candidate_locators(element):
+    """元素的主定位器和备用定位器（去重），返回 [(策略, 定位表达式), ...]"""
+    candidates = [(element['locator_strategy'], element['locator_value'])]
+    for backup in element.get('backup_locators') or []:
+        candidate = (backup.get('strategy') or 'css', backup.get('value'))
+        if candidate[1] and candidate not in candidates:
+            candidates.append(candidate)
+    return candidates
+
+
+def resolve_locator(element, probe, timeout_ms=PROBE_TIMEOUT_MS):
+    """选择步骤使用的定位器
+
+    probe(策略, 定位表达式) 做一次不等待的检查，返回页面上是否存在匹配的元素。
+    返回 (策略, 定位表达式, 解析信息)，解析信息记录在步骤结果中。
+    """
+    candidates = candidate_locators(element)
+    primary = candidates[0]
+    if len(candidates) == 1:
+        return primary[0], primary[1], None
+
+    element_id = element.get('id')
+    ordered = locator_stats.order(element_id, candidates)
+    start = time.perf_counter()
+    deadline = start + timeout_ms / 1000
+    rounds = 0
+    while True:
+        rounds += 1
+        for index, (strategy, value) in enumerate(ordered):
+            try:
+                found = probe(strategy, value)
+            except Exception:
+                found = False
+            if not found:
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            locator_stats.record(element_id, locator_key(strategy, value), True, elapsed_ms)
+            # 排在胜出者之前、同一时刻仍未匹配的定位器记为未命中
+            for missed in ordered[:index]:
+                locator_stats.record(element_id, locator_key(*missed), False)
+            return strategy, value, {
+                'strategy': strategy,
+                'value': value,
+                'healed': (strategy, value) != primary,
+                'probe_ms': round(elapsed_ms, 1),
+                'rounds': rounds,
+            }
+        if time.perf_counter() >= deadline:
+            break
+        time.sleep(POLL_INTERVAL)
+
+    # 探测时间内都未出现，使用排名第一的定位器按原有超时等待
+    strategy, value = ordered[0]
+    return strategy, value, {
+        'strategy': strategy,
+        'value': value,
+        'healed': (strategy, value) != primary,
+        'probe_ms': round((time.perf_counter() - start) * 1000, 1),
+        'rounds': rounds,
+        'timeout': True,
+    }
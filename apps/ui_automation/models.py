@@ -675,6 +675,7 @@ class TestCaseExecution(models.Model):
     project = models.ForeignKey(UiProject, on_delete=models.CASCADE, related_name='test_case_executions', verbose_name='项目')
     test_suite = models.ForeignKey('TestSuite', on_delete=models.CASCADE, null=True, blank=True, related_name='case_executions', verbose_name='所属测试套件')
     execution_source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='manual', verbose_name='执行来源')
+    batch_id = models.CharField(max_length=32, blank=True, default='', db_index=True, verbose_name='批量执行批次')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='执行状态')
     engine = models.CharField(max_length=20, choices=ENGINE_CHOICES, default='playwright', verbose_name='测试引擎')
     browser = models.CharField(max_length=50, default='chrome', verbose_name='浏览器')
@@ -693,11 +694,69 @@ class TestCaseExecution(models.Model):
         verbose_name = 'UI测试用例执行记录'
         verbose_name_plural = 'UI测试用例执行记录'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"{self.test_case.name} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
 
 
+class UiCaseBatch(models.Model):
+    """用例批量执行批次，各用例的执行状态见 batch_id 相同的 TestCaseExecution"""
+    batch_id = models.CharField(max_length=32, unique=True, verbose_name='批次ID')
+    project = models.ForeignKey(UiProject, on_delete=models.CASCADE, related_name='case_batches', verbose_name='项目')
+    test_case_ids = models.JSONField(default=list, verbose_name='用例ID列表')
+    engine = models.CharField(max_length=20, default='playwright', verbose_name='测试引擎')
+    browser = models.CharField(max_length=50, default='chrome', verbose_name='浏览器')
+    headless = models.BooleanField(default=False, verbose_name='无头模式')
+    slots = models.PositiveIntegerField(default=1, verbose_name='浏览器槽位数')
+    error_message = models.TextField(blank=True, default='', verbose_name='错误信息')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ui_case_batches', verbose_name='执行人')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+
+    class Meta:
+        db_table = 'ui_case_batches'
+        verbose_name = 'UI用例批量执行'
+        verbose_name_plural = 'UI用例批量执行'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.batch_id} - {len(self.test_case_ids)} 个用例"
+
+
+class StepTiming(models.Model):
+    """用例步骤耗时（毫秒），每个执行步骤一行，用于按元素、操作类型统计耗时"""
+    execution = models.ForeignKey(TestCaseExecution, on_delete=models.CASCADE, related_name='step_timings', verbose_name='用例执行记录')
+    project = models.ForeignKey(UiProject, on_delete=models.CASCADE, related_name='step_timings', verbose_name='项目')
+    test_case = models.ForeignKey(TestCase, on_delete=models.CASCADE, related_name='step_timings', verbose_name='测试用例')
+    element = models.ForeignKey(Element, on_delete=models.SET_NULL, null=True, blank=True, related_name='step_timings', verbose_name='目标元素')
+    step_number = models.IntegerField(verbose_name='步骤序号')
+    action_type = models.CharField(max_length=20, verbose_name='操作类型')
+    success = models.BooleanField(default=True, verbose_name='是否成功')
+    instrumented = models.BooleanField(default=True, verbose_name='是否记录了阶段耗时')
+    total_ms = models.PositiveIntegerField(default=0, verbose_name='总耗时')
+    locate_ms = models.PositiveIntegerField(default=0, verbose_name='定位元素耗时')
+    wait_ms = models.PositiveIntegerField(default=0, verbose_name='等待耗时')
+    action_ms = models.PositiveIntegerField(default=0, verbose_name='执行操作耗时')
+    assertion_ms = models.PositiveIntegerField(default=0, verbose_name='断言耗时')
+    screenshot_ms = models.PositiveIntegerField(default=0, verbose_name='截图耗时')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+
+    class Meta:
+        db_table = 'ui_step_timings'
+        verbose_name = 'UI步骤耗时'
+        verbose_name_plural = 'UI步骤耗时'
+        indexes = [
+            models.Index(fields=['project', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.execution_id} - 步骤{self.step_number}: {self.total_ms}ms"
+
+
 class OperationRecord(models.Model):
     """操作记录模型"""
     OPERATION_TYPE_CHOICES = [
@@ -0,0 +1,202 @@
+"""
+UI 自动化截图存储
+截图压缩后（默认 WebP，可选按最大宽度缩小）按内容 sha256 存放在 MEDIA_ROOT/UI_AUTOMATION_SCREENSHOT_DIR 下，
+相同截图只存一份；执行记录的 screenshots 中只保存引用和访问地址，不再嵌入 base64 data URL。
+缩略图在第一次被请求时生成（ScreenshotViewSet.thumbnail），供列表界面使用。
+
+截图条目格式:
+    {
+        'ref': 'sha256', 'url': '/media/...', 'thumbnail_url': '/api/ui-automation/screenshots/thumbnails/<ref>/',
+        'format': 'webp', 'width': 1920, 'height': 1080, 'size': 字节数,
+        'description': ..., 'step_number': ..., 'timestamp': ...
+    }
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {'webp': 'webp', 'png': 'png', 'jpeg': 'jpg'}
+REF_PATTERN = re.compile(r'[0-9a-f]{64}')
+# 清理截图时每条查询检查的引用数
+REF_QUERY_BATCH = 200
+
+
+def _store_root():
+    return os.path.join(settings.MEDIA_ROOT, getattr(settings, 'UI_AUTOMATION_SCREENSHOT_DIR', 'ui_step_screenshots'))
+
+
+def _image_format():
+    image_format = str(getattr(settings, 'UI_AUTOMATION_SCREENSHOT_FORMAT', 'webp')).lower()
+    return image_format if image_format in FORMAT_EXTENSIONS else 'webp'
+
+
+def _relative_path(ref, image_format, suffix=''):
+    return os.path.join(ref[:2], f'{ref}{suffix}.{FORMAT_EXTENSIONS[image_format]}')
+
+
+def _encode(image, image_format, max_width=None):
+    """按格式压缩图片，max_width 大于 0 时等比缩小到该宽度以内"""
+    from PIL import Image
+
+    if max_width and image.width > max_width:
+        height = max(1, round(image.height * max_width / image.width))
+        image = image.resize((max_width, height), Image.LANCZOS)
+    if image_format == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    if image_format == 'png':
+        image.save(buffer, format='PNG', optimize=True)
+    else:
+        quality = getattr(settings, 'UI_AUTOMATION_SCREENSHOT_QUALITY', 80)
+        image.save(buffer, format=image_format.upper(), quality=quality)
+    return buffer.getvalue(), image.size
+
+
+def _write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 先写临时文件再重命名，避免并发写入时读到不完整的文件
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            output.write(content)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def thumbnail_url(ref):
+    from django.urls import reverse
+    return reverse('screenshot-thumbnail', kwargs={'ref': ref})
+
+
+def store_screenshot(content):
+    """按内容哈希保存截图（PNG 等原始图片字节），返回截图引用信息；相同截图只写入一次"""
+    from PIL import Image
+
+    ref = hashlib.sha256(content).hexdigest()
+    image_format = _image_format()
+    relative_path = _relative_path(ref, image_format)
+    path = os.path.join(_store_root(), relative_path)
+
+    if os.path.exists(path):
+        with Image.open(path) as image:
+            size = image.size
+    else:
+        with Image.open(io.BytesIO(content)) as image:
+            encoded, size = _encode(image, image_format, getattr(settings, 'UI_AUTOMATION_SCREENSHOT_MAX_WIDTH', 0))
+        _write_atomic(path, encoded)
+
+    store_dir = getattr(settings, 'UI_AUTOMATION_SCREENSHOT_DIR', 'ui_step_screenshots')
+    return {
+        'ref': ref,
+        'url': f"{settings.MEDIA_URL}{store_dir}/{relative_path.replace(os.sep, '/')}",
+        'thumbnail_url': thumbnail_url(ref),
+        'format': image_format,
+        'width': size[0],
+        'height': size[1],
+        'size': os.path.getsize(path),
+    }
+
+
+def screenshot_entry(content, **fields):
+    """保存截图并返回执行记录中的截图条目，fields 为描述、步骤号、时间等附加字段"""
+    entry = store_screenshot(content)
+    entry.update(fields)
+    return entry
+
+
+def find_screenshot(ref):
+    """查找引用对应的截图文件（与当前配置的格式无关），不存在时返回 None"""
+    for image_format in FORMAT_EXTENSIONS:
+        path = os.path.join(_store_root(), _relative_path(ref, image_format))
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def get_thumbnail(ref):
+    """获取截图的缩略图文件路径，第一次请求时生成；截图不存在时返回 None"""
+    from PIL import Image
+
+    path = os.path.join(_store_root(), _relative_path(ref, 'webp', suffix='.thumb'))
+    if os.path.exists(path):
+        return path
+
+    source = find_screenshot(ref)
+    if source is None:
+        return None
+    with Image.open(source) as image:
+        encoded, _ = _encode(image, 'webp', getattr(settings, 'UI_AUTOMATION_SCREENSHOT_THUMBNAIL_WIDTH', 320))
+    _write_atomic(path, encoded)
+    return path
+
+
+def externalize_screenshots(screenshots):
+    """把截图列表中的 base64 data URL 转存为文件引用，其他条目保持不变"""
+    result = []
+    for screenshot in screenshots or []:
+        url = screenshot.get('url') if isinstance(screenshot, dict) else None
+        if isinstance(url, str) and url.startswith('data:image') and ';base64,' in url:
+            try:
+                content = base64.b64decode(url.split(';base64,', 1)[1])
+                fields = {key: value for key, value in screenshot.items() if key != 'url'}
+                screenshot = screenshot_entry(content, **fields)
+            except Exception as e:
+                logger.error(f"保存截图文件失败，保留原始数据: {e}")
+        result.append(screenshot)
+    return result
+
+
+def _referenced_refs(queryset, field, refs):
+    """
+    按批查询仍被引用的截图: 每批 REF_QUERY_BATCH 个引用合成一条 OR 查询，
+    再从查到的记录中提取 sha256 引用，排除恰好包含引用字符串的其他内容
+    """
+    from django.db.models import Q
+
+    refs = list(refs)
+    referenced = set()
+    for start in range(0, len(refs), REF_QUERY_BATCH):
+        batch = refs[start:start + REF_QUERY_BATCH]
+        condition = Q()
+        for ref in batch:
+            condition |= Q(**{f'{field}__icontains': ref})
+        for value in queryset.filter(condition).values_list(field, flat=True).iterator():
+            text = value if isinstance(value, str) else json.dumps(value)
+            referenced.update(REF_PATTERN.findall(text))
+    return referenced & set(refs)
+
+
+def remove_unreferenced_screenshots(refs):
+    """删除不再被任何执行记录引用的截图及缩略图文件，返回释放的字节数"""
+    from .models import TestCaseExecution, TestExecution
+
+    pending = set(refs)
+    pending -= _referenced_refs(TestCaseExecution.objects.all(), 'screenshots', pending)
+    if pending:
+        pending -= _referenced_refs(TestExecution.objects.all(), 'result_data', pending)
+
+    released = 0
+    for ref in pending:
+        paths = [os.path.join(_store_root(), _relative_path(ref, 'webp', suffix='.thumb'))]
+        paths += [os.path.join(_store_root(), _relative_path(ref, image_format)) for image_format in FORMAT_EXTENSIONS]
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                released += size
+            except FileNotFoundError:
+                continue
+    return released
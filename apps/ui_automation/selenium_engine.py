@@ -108,13 +108,11 @@ class SeleniumTestEngine:
     def start(self):
         """启动浏览器"""
         try:
-            import os
-            # 配置webdriver_manager使用本地缓存，避免每次下载
-            os.environ['WDM_LOG_LEVEL'] = '0'  # 减少日志输出
-            os.environ['WDM_PRINT_FIRST_LINE'] = 'False'  # 不打印首行信息
-            
+            # 浏览器可用性检查和驱动路径解析结果在进程内缓存，不再每次启动都检查和解析
+            from .selenium_pool import probe_browser, resolve_driver_path
+
             # 先检查浏览器是否可用
-            is_available, error_msg = self.check_browser_available(self.browser_type)
+            is_available, error_msg = probe_browser(self.browser_type)
             if not is_available:
                 logger.error(f"浏览器不可用: {error_msg}")
                 # 提供安装建议
@@ -129,7 +127,6 @@ class SeleniumTestEngine:
             if self.browser_type == 'chrome':
                 from selenium.webdriver.chrome.options import Options
                 from selenium.webdriver.chrome.service import Service
-                from webdriver_manager.chrome import ChromeDriverManager
 
                 options = Options()
                 if self.headless:
@@ -171,13 +168,12 @@ class SeleniumTestEngine:
                 options.add_argument('--disable-notifications')  # 禁用所有通知
 
                 # 使用缓存优先策略
-                service = Service(ChromeDriverManager().install())
+                service = Service(resolve_driver_path('chrome'))
                 self.driver = webdriver.Chrome(service=service, options=options)
 
             elif self.browser_type == 'firefox':
                 from selenium.webdriver.firefox.options import Options
                 from selenium.webdriver.firefox.service import Service
-                from webdriver_manager.firefox import GeckoDriverManager
 
                 options = Options()
                 if self.headless:
@@ -201,13 +197,12 @@ class SeleniumTestEngine:
                 options.set_preference('extensions.update.autoUpdateDefault', False)
 
                 # 使用缓存优先策略
-                service = Service(GeckoDriverManager().install())
+                service = Service(resolve_driver_path('firefox'))
                 self.driver = webdriver.Firefox(service=service, options=options)
 
             elif self.browser_type == 'edge':
                 from selenium.webdriver.edge.options import Options
                 from selenium.webdriver.edge.service import Service
-                from webdriver_manager.microsoft import EdgeChromiumDriverManager
 
                 options = Options()
                 if self.headless:
@@ -216,7 +211,7 @@ class SeleniumTestEngine:
                 options.add_argument('--window-size=1920,1080')
 
                 # 使用缓存优先策略，7天内不重新下载
-                service = Service(EdgeChromiumDriverManager().install())
+                service = Service(resolve_driver_path('edge'))
                 self.driver = webdriver.Edge(service=service, options=options)
 
             elif self.browser_type == 'safari':
@@ -243,7 +238,6 @@ class SeleniumTestEngine:
                 # 默认使用Chrome
                 from selenium.webdriver.chrome.options import Options
                 from selenium.webdriver.chrome.service import Service
-                from webdriver_manager.chrome import ChromeDriverManager
 
                 options = Options()
                 if self.headless:
@@ -274,7 +268,7 @@ class SeleniumTestEngine:
                 options.add_argument('--disable-features=TranslateUI')  # 禁用翻译提示
                 options.add_argument('--disable-infobars')  # 禁用信息栏
 
-                service = Service(ChromeDriverManager().install())
+                service = Service(resolve_driver_path('chrome'))
                 self.driver = webdriver.Chrome(service=service, options=options)
 
             # 设置隐式等待
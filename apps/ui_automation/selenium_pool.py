@@ -0,0 +1,357 @@
+"""
+Selenium WebDriver 会话池
+原来每次创建 WebDriver 都要检查浏览器是否安装、通过 webdriver_manager 解析驱动路径并重新构造浏览器参数，
+每个用例额外花费数秒。会话池:
+- 驱动路径每个进程每种浏览器只解析一次，浏览器可用性检查结果缓存 PROBE_TTL 秒；
+- 用例结束后会话归还到池中，重置（关闭多余窗口、清除 Cookie 和 localStorage/sessionStorage、回到空白页）后供下一个用例使用；
+- 会话使用次数达到 UI_AUTOMATION_SELENIUM_MAX_USES、用例执行出错或重置失败时关闭会话，下次重新创建；
+- 每种浏览器最多保留 UI_AUTOMATION_SELENIUM_MAX_IDLE 个空闲会话，进程退出时关闭。
+
+WebDriver 会话可以在不同线程中使用（同一时间只被一个用例占用），所以会话池是进程内共享的。
+Safari 同一时间只允许一个会话且不支持复用，不进入会话池。
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 浏览器可用性检查结果的缓存时间（秒）
+PROBE_TTL = 300
+
+# 浏览器未安装时的安装建议
+INSTALL_TIPS = {
+    'chrome': 'brew install --cask google-chrome',
+    'firefox': 'brew install --cask firefox',
+    'edge': 'brew install --cask microsoft-edge',
+}
+
+# 重置会话时清除当前页面的存储
+CLEAR_STORAGE_JS = """
+try { window.localStorage.clear(); } catch (e) {}
+try { window.sessionStorage.clear(); } catch (e) {}
+"""
+
+_driver_paths = {}
+_driver_paths_lock = threading.Lock()
+_probes = {}
+_probes_lock = threading.Lock()
+
+
+def _driver_manager(browser):
+    if browser == 'firefox':
+        from webdriver_manager.firefox import GeckoDriverManager
+        return GeckoDriverManager()
+    if browser == 'edge':
+        from webdriver_manager.microsoft import EdgeChromiumDriverManager
+        return EdgeChromiumDriverManager()
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager()
+
+
+def resolve_driver_path(browser):
+    """解析浏览器驱动路径（webdriver_manager 使用 ~/.wdm 缓存），每个进程每种浏览器只解析一次"""
+    key = browser if browser in ('firefox', 'edge') else 'chrome'
+    with _driver_paths_lock:
+        if key not in _driver_paths:
+            # 减少 webdriver_manager 的日志输出
+            os.environ['WDM_LOG_LEVEL'] = '0'
+            os.environ['WDM_PRINT_FIRST_LINE'] = 'False'
+            _driver_paths[key] = _driver_manager(key).install()
+        return _driver_paths[key]
+
+
+def probe_browser(browser):
+    """检查浏览器是否可用，返回 (是否可用, 错误信息)；结果缓存 PROBE_TTL 秒"""
+    from .selenium_engine import SeleniumTestEngine
+
+    now = time.monotonic()
+    with _probes_lock:
+        cached = _probes.get(browser)
+        if cached and now - cached[0] < PROBE_TTL:
+            return cached[1]
+    result = SeleniumTestEngine.check_browser_available(browser)
+    with _probes_lock:
+        _probes[browser] = (now, result)
+    return result
+
+
+def _chrome_options(headless):
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+
+    options = ChromeOptions()
+    if headless:
+        options.add_argument('--headless')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--window-size=1920,1080')
+
+    # 禁用自动化特征检测
+    options.add_experimental_option('excludeSwitches', ['enable-automation', 'enable-logging'])
+    options.add_experimental_option('useAutomationExtension', False)
+
+    # 禁用密码保存和泄露提醒（解决弹框遮挡元素的问题）
+    prefs = {
+        'credentials_enable_service': False,  # 禁用密码保存服务
+        'profile.password_manager_enabled': False,  # 禁用密码管理器
+        'profile.default_content_setting_values.notifications': 2,  # 禁用通知
+        'autofill.profile_enabled': False,  # 禁用自动填充
+        'profile.default_content_setting_values.automatic_downloads': 1,  # 允许自动下载
+        'password_manager_leak_detection': False,  # 禁用密码泄露检测（prefs级别）
+        'safebrowsing.enabled': False,  # 禁用安全浏览
+        'safebrowsing.disable_download_protection': True,
+        'intl.accept_languages': 'zh-CN,zh,en-US,en',  # 设置语言
+        'profile.exit_type': 'Normal',  # 避免"Chrome未正常关闭"提示
+    }
+    options.add_experimental_option('prefs', prefs)
+
+    # 禁用密码泄露检查和其他安全警告，所有 disable-features 合并为一个参数，避免覆盖
+    disabled_features = [
+        'PasswordLeakDetection',
+        'PrivacySandboxSettings4',
+        'TranslateUI',
+        'SavePasswordBubble',
+        'AutofillServerCommunication',
+        'CreditCardSave',
+        'HeaderUI',
+        'AccountConsistency',
+    ]
+    options.add_argument(f'--disable-features={",".join(disabled_features)}')
+
+    options.add_argument('--disable-infobars')  # 禁用信息栏
+    options.add_argument('--disable-save-password-bubble')  # 禁用保存密码气泡
+    options.add_argument('--disable-password-generation')  # 禁用密码生成
+    options.add_argument('--disable-password-manager-reauthentication')  # 禁用密码管理器重新认证
+    options.add_argument('--disable-popup-blocking')  # 禁用弹窗拦截
+    options.add_argument('--disable-notifications')  # 禁用所有通知
+    options.add_argument('--no-default-browser-check')  # 禁用默认浏览器检查
+    options.add_argument('--no-first-run')  # 禁用首次运行界面
+
+    # 针对密码弹窗的额外参数
+    options.add_argument('--password-store=basic')
+    options.add_argument('--use-mock-keychain')
+    options.add_argument('--disable-background-timer-throttling')
+    options.add_argument('--disable-renderer-backgrounding')
+    options.add_argument('--disable-device-discovery-notifications')
+    return options
+
+
+def _firefox_options(headless):
+    from selenium.webdriver.firefox.options import Options as FirefoxOptions
+
+    options = FirefoxOptions()
+    if headless:
+        options.add_argument('--headless')
+    options.add_argument('--width=1920')
+    options.add_argument('--height=1080')
+
+    # 性能优化：禁用不必要的功能加快启动速度
+    options.set_preference('browser.cache.disk.enable', False)
+    options.set_preference('browser.cache.memory.enable', True)
+    options.set_preference('browser.cache.offline.enable', False)
+    options.set_preference('network.http.use-cache', False)
+    options.set_preference('browser.startup.homepage', 'about:blank')
+    options.set_preference('startup.homepage_welcome_url', 'about:blank')
+    options.set_preference('startup.homepage_welcome_url.additional', 'about:blank')
+    # 禁用自动更新检查
+    options.set_preference('app.update.auto', False)
+    options.set_preference('app.update.enabled', False)
+    # 禁用扩展和插件检查
+    options.set_preference('extensions.update.enabled', False)
+    options.set_preference('extensions.update.autoUpdateDefault', False)
+    return options
+
+
+def _edge_options(headless):
+    from selenium.webdriver.edge.options import Options as EdgeOptions
+
+    options = EdgeOptions()
+    if headless:
+        options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--window-size=1920,1080')
+    return options
+
+
+def build_options(browser, headless):
+    """构造浏览器启动参数；Options 是可变对象，每次创建新的对象，避免一个会话对参数的修改影响其他会话"""
+    if browser == 'firefox':
+        return _firefox_options(headless)
+    if browser == 'edge':
+        return _edge_options(headless)
+    return _chrome_options(headless)
+
+
+def _create_safari_driver():
+    from selenium import webdriver
+
+    # Safari 不支持 headless 模式
+    # 需要先启用：sudo safaridriver --enable
+    # 并在 Safari 设置 -> 开发菜单中启用"允许远程自动化"
+    try:
+        driver = webdriver.Safari()
+        driver.set_window_size(1920, 1080)
+        return driver
+    except Exception as e:
+        error_msg = str(e)
+        if 'Could not create a session' in error_msg or 'InvalidSessionIdException' in error_msg:
+            raise Exception(
+                "Safari 远程自动化未启用。\n\n"
+                "请按以下步骤配置：\n"
+                "1. 在终端执行: sudo safaridriver --enable\n"
+                "2. 打开 Safari → 设置 → 高级 → 勾选'在菜单栏中显示开发菜单'\n"
+                "3. Safari 菜单栏 → 开发 → 勾选'允许远程自动化'\n\n"
+                f"原始错误: {error_msg}"
+            )
+        raise
+
+
+def create_driver(browser, headless):
+    """创建新的 WebDriver 会话（使用缓存的可用性检查、驱动路径和启动参数）"""
+    from selenium import webdriver
+
+    is_available, error_msg = probe_browser(browser)
+    if not is_available:
+        tip = INSTALL_TIPS.get(browser, '')
+        raise Exception(f"{error_msg}\n\n💡 安装命令（macOS）：{tip}" if tip else error_msg)
+
+    if browser == 'safari':
+        return _create_safari_driver()
+    if browser == 'firefox':
+        from selenium.webdriver.firefox.service import Service as FirefoxService
+        return webdriver.Firefox(service=FirefoxService(resolve_driver_path(browser)), options=build_options(browser, headless))
+    if browser == 'edge':
+        from selenium.webdriver.edge.service import Service as EdgeService
+        return webdriver.Edge(service=EdgeService(resolve_driver_path(browser)), options=build_options(browser, headless))
+    # 默认使用Chrome
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    return webdriver.Chrome(service=ChromeService(resolve_driver_path('chrome')), options=build_options('chrome', headless))
+
+
+class SeleniumDriverPool:
+    """进程内共享的 WebDriver 会话池，按 (浏览器, 是否无头) 保留空闲会话"""
+
+    def __init__(self, max_uses=None, max_idle=None):
+        if max_uses is None:
+            max_uses = getattr(settings, 'UI_AUTOMATION_SELENIUM_MAX_USES', 20)
+        if max_idle is None:
+            max_idle = getattr(settings, 'UI_AUTOMATION_SELENIUM_MAX_IDLE', 2)
+        self.max_uses = max_uses
+        self.max_idle = max(0, int(max_idle))
+        self.idle = {}
+        self.uses = {}
+        self.launch_count = 0
+        self.reuse_count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, browser, headless):
+        """获取会话：优先复用空闲会话，没有可用会话时创建新的会话"""
+        key = (browser, headless)
+        while True:
+            with self._lock:
+                driver = self.idle[key].pop() if self.idle.get(key) else None
+            if driver is None:
+                break
+            if self._alive(driver):
+                with self._lock:
+                    self.reuse_count += 1
+                return driver
+            logger.warning(f"空闲的 {browser} 会话已失效，关闭后重新获取")
+            self._quit(driver)
+
+        driver = create_driver(browser, headless)
+        with self._lock:
+            self.uses[driver] = 0
+            self.launch_count += 1
+        return driver
+
+    def release(self, driver, browser, headless, broken=False):
+        """归还会话：重置后放回池中；出错、达到复用上限或空闲会话已满时关闭"""
+        if driver is None:
+            return
+        key = (browser, headless)
+        with self._lock:
+            uses = self.uses.get(driver, 0) + 1
+            self.uses[driver] = uses
+
+        if broken or browser == 'safari' or (self.max_uses and uses >= self.max_uses):
+            if not broken and browser != 'safari':
+                logger.info(f"{browser} 会话已复用 {uses} 次，回收")
+            self._quit(driver)
+            return
+        try:
+            self.reset(driver)
+        except Exception as e:
+            logger.warning(f"重置 {browser} 会话失败，关闭会话: {e}")
+            self._quit(driver)
+            return
+
+        with self._lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(driver)
+                return
+        self._quit(driver)
+
+    def reset(self, driver):
+        """清除会话状态: 关闭多余窗口，清除 Cookie、localStorage/sessionStorage，回到空白页"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        # 存储只能在所属页面清除，先清除当前页面的存储再离开
+        driver.execute_script(CLEAR_STORAGE_JS)
+        driver.delete_all_cookies()
+        if hasattr(driver, 'execute_cdp_cmd'):
+            # Chrome/Edge 清除所有域名的 Cookie（delete_all_cookies 只清除当前域名）
+            try:
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            except Exception:
+                pass
+        driver.get('about:blank')
+
+    def _alive(self, driver):
+        try:
+            driver.current_window_handle
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        with self._lock:
+            self.uses.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"关闭 WebDriver 会话时出错: {e}")
+
+    def close(self):
+        """关闭所有空闲会话"""
+        with self._lock:
+            drivers = [driver for idle in self.idle.values() for driver in idle]
+            self.idle = {}
+        for driver in drivers:
+            self._quit(driver)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_selenium_pool():
+    """获取进程内的 WebDriver 会话池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SeleniumDriverPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -587,6 +587,28 @@ class TestCaseExecutionSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class TestCaseExecutionListSerializer(TestCaseExecutionSerializer):
+    """测试用例执行记录列表序列化器，不包含执行日志和截图详情，只返回截图数量和缩略图地址"""
+    screenshot_count = serializers.SerializerMethodField()
+    thumbnail_urls = serializers.SerializerMethodField()
+
+    class Meta(TestCaseExecutionSerializer.Meta):
+        fields = [
+            'id', 'test_case', 'test_case_name', 'project', 'project_name',
+            'test_suite', 'test_suite_name', 'execution_source', 'status',
+            'engine', 'browser', 'headless', 'error_message',
+            'screenshot_count', 'thumbnail_urls', 'execution_time', 'started_at', 'finished_at',
+            'created_by', 'created_by_name', 'created_at'
+        ]
+
+    def get_screenshot_count(self, obj):
+        return len(obj.screenshots or [])
+
+    def get_thumbnail_urls(self, obj):
+        return [screenshot['thumbnail_url'] for screenshot in obj.screenshots or []
+                if isinstance(screenshot, dict) and screenshot.get('thumbnail_url')]
+
+
 class TestCaseRunSerializer(serializers.Serializer):
     """测试用例运行序列化器"""
     test_case_id = serializers.IntegerField()
@@ -0,0 +1,61 @@
+"""
+UI 测试套件分片执行
+把套件中的用例按历史执行时长分配到多个执行分片，每个分片使用独立的浏览器并行执行，
+结果合并到同一条 TestExecution 记录中。
+
+分配使用最长处理时间优先（LPT）策略：按预计时长从长到短依次放入当前总时长最小的分片，
+分片内部仍按套件中的原始顺序执行。
+"""
+import heapq
+from datetime import timedelta
+from statistics import median
+
+from django.db.models import Avg
+from django.utils import timezone
+
+# 参与估算的历史记录时间范围（天）
+HISTORY_DAYS = 30
+# 没有任何历史记录时的默认用例时长（秒）
+DEFAULT_CASE_DURATION = 10.0
+
+
+def estimate_case_durations(test_case_ids, days=HISTORY_DAYS):
+    """根据最近的 TestCaseExecution.execution_time 估算每个用例的执行时长，返回 {用例ID: 秒}
+
+    没有历史记录的用例使用其他用例时长的中位数，全部没有记录时使用 DEFAULT_CASE_DURATION。
+    """
+    from .models import TestCaseExecution
+
+    since = timezone.now() - timedelta(days=days)
+    rows = TestCaseExecution.objects.filter(
+        test_case_id__in=test_case_ids,
+        status__in=['passed', 'failed'],
+        execution_time__isnull=False,
+        finished_at__gte=since,
+    ).values('test_case_id').annotate(avg_time=Avg('execution_time'))
+    known = {row['test_case_id']: row['avg_time'] for row in rows}
+
+    fallback = median(known.values()) if known else DEFAULT_CASE_DURATION
+    return {case_id: known.get(case_id, fallback) for case_id in test_case_ids}
+
+
+def shard_test_cases(test_cases, workers, durations):
+    """把用例分配到最多 workers 个分片，返回 [[用例, ...], ...]（不含空分片）
+
+    durations 为 {用例ID: 预计秒数}，每个分片内的用例保持原始顺序。
+    """
+    workers = max(1, min(int(workers), len(test_cases)))
+    indexed = sorted(
+        enumerate(test_cases),
+        key=lambda item: (-durations.get(item[1].id, DEFAULT_CASE_DURATION), item[0])
+    )
+
+    # (分片预计总时长, 分片序号)
+    loads = [(0.0, index) for index in range(workers)]
+    shards = [[] for _ in range(workers)]
+    for position, test_case in indexed:
+        load, index = heapq.heappop(loads)
+        shards[index].append((position, test_case))
+        heapq.heappush(loads, (load + durations.get(test_case.id, DEFAULT_CASE_DURATION), index))
+
+    return [[test_case for _, test_case in sorted(shard, key=lambda item: item[0])] for shard in shards if shard]
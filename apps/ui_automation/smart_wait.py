@@ -0,0 +1,203 @@
+"""
+UI 自动化智能等待
+用页面状态判断代替步骤之间的固定等待（sleep / wait_for_timeout）:
+- 元素可操作性: 操作前显式等待元素可见/挂载，等待时间计入步骤的等待耗时；
+- 页面稳定: 注入脚本监听 DOM 变化（MutationObserver）和资源请求完成（PerformanceObserver），
+  连续 QUIET_MS 毫秒没有变化即认为页面已稳定，页面跳转时改为等待新页面加载；
+- 自适应超时: 每类等待记录最近实际稳定所需时间，超时取其若干倍，上限为原来的固定等待时间，
+  持续动画的页面最坏情况与原来一致，普通页面只需等待一百多毫秒。
+
+StepTimer 记录单个步骤的耗时构成，step_result['timing'] 中区分等待与执行操作的时间，
+spans 按阶段（定位、等待、操作、断言、截图）汇总为整数毫秒，写入 StepTiming 用于统计。
+"""
+import time
+from contextlib import contextmanager
+
+# 连续多少毫秒没有 DOM 变化/请求完成视为页面已稳定
+QUIET_MS = 100
+
+# 等待类型 -> (最短超时, 最长超时) 毫秒，最长超时即原来的固定等待时间
+SETTLE_LIMITS = {
+    'click': (200, 800),
+    'fill': (150, 300),
+    'hover': (150, 300),
+    'dropdown': (200, 800),
+    'tab': (200, 1500),
+    'navigation': (300, 3000),
+}
+
+# 步骤耗时阶段；StepTimer.waiting 的等待类型归入的阶段（其余等待类型归入 wait），
+# 以及等待以外的时间按操作类型归入的阶段（其余操作类型归入 action）
+SPAN_NAMES = ('locate', 'wait', 'action', 'assertion', 'screenshot')
+WAIT_SPANS = {
+    'locator': 'locate',
+    'actionable': 'locate',
+    'screenshot': 'screenshot',
+}
+ACTION_SPANS = {
+    'assert': 'assertion',
+    'screenshot': 'screenshot',
+    'wait': 'wait',
+    'waitFor': 'wait',
+}
+
+# Playwright page.evaluate 使用: 返回 true 表示已稳定，false 表示超时
+DOM_QUIET_JS = """
+({quiet, timeout}) => new Promise(resolve => {
+    const start = performance.now();
+    let last = start;
+    const mark = () => { last = performance.now(); };
+    const observer = new MutationObserver(mark);
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    let resources = null;
+    try {
+        resources = new PerformanceObserver(mark);
+        resources.observe({type: 'resource'});
+    } catch (e) {}
+    const finish = quietReached => {
+        observer.disconnect();
+        if (resources) resources.disconnect();
+        resolve(quietReached);
+    };
+    const check = () => {
+        const now = performance.now();
+        if (now - last >= quiet) return finish(true);
+        if (now - start >= timeout) return finish(false);
+        setTimeout(check, Math.min(quiet, 50));
+    };
+    setTimeout(check, quiet);
+})
+"""
+
+# Selenium execute_async_script 使用: 最后一个参数是回调
+SELENIUM_DOM_QUIET_JS = """
+const quiet = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+const waitQuiet = %s;
+waitQuiet({quiet, timeout}).then(done);
+""" % DOM_QUIET_JS.strip()
+
+
+class AdaptiveTimeout:
+    """根据最近实际稳定所需时间调整等待上限"""
+
+    def __init__(self, floor_ms, ceiling_ms, factor=3, alpha=0.3):
+        self.floor_ms = floor_ms
+        self.ceiling_ms = ceiling_ms
+        self.factor = factor
+        self.alpha = alpha
+        self.average_ms = None
+
+    def current(self):
+        if self.average_ms is None:
+            return self.ceiling_ms
+        return int(min(self.ceiling_ms, max(self.floor_ms, self.average_ms * self.factor)))
+
+    def observe(self, elapsed_ms):
+        """记录一次在超时前达到稳定所用的时间（超时的情况不记录，避免上限被持续动画拉高）"""
+        if self.average_ms is None:
+            self.average_ms = elapsed_ms
+        else:
+            self.average_ms = self.alpha * elapsed_ms + (1 - self.alpha) * self.average_ms
+
+
+class StepTimer:
+    """
+    记录单个步骤的等待与执行耗时
+    instrumented=False 表示执行步骤时没有记录等待（只有总耗时，全部计入执行操作），统计阶段耗时时排除
+    """
+
+    def __init__(self, instrumented=True):
+        self.started = time.perf_counter()
+        self.waits = {}
+        self.instrumented = instrumented
+
+    @contextmanager
+    def waiting(self, kind):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.waits[kind] = self.waits.get(kind, 0) + (time.perf_counter() - start) * 1000
+
+    def spans(self, total_ms, action_type=None):
+        """按阶段汇总耗时: 定位元素、等待、执行操作、断言、截图（整数毫秒）"""
+        spans = dict.fromkeys(SPAN_NAMES, 0.0)
+        for kind, ms in self.waits.items():
+            spans[WAIT_SPANS.get(kind, 'wait')] += ms
+        # 等待以外的时间按操作类型归入对应阶段
+        remainder = max(0.0, total_ms - sum(self.waits.values()))
+        spans[ACTION_SPANS.get(action_type, 'action')] += remainder
+        return {name: int(round(ms)) for name, ms in spans.items()}
+
+    def breakdown(self, action_type=None):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        wait_ms = sum(self.waits.values())
+        return {
+            'total_ms': round(total_ms, 1),
+            'wait_ms': round(wait_ms, 1),
+            'action_ms': round(max(0.0, total_ms - wait_ms), 1),
+            'waits': {kind: round(ms, 1) for kind, ms in self.waits.items()},
+            'spans': self.spans(total_ms, action_type),
+            'instrumented': self.instrumented,
+        }
+
+
+class SmartWaiter:
+    """执行器内的智能等待，每种等待类型单独维护自适应超时"""
+
+    def __init__(self, quiet_ms=QUIET_MS):
+        self.quiet_ms = quiet_ms
+        self.timeouts = {kind: AdaptiveTimeout(floor, ceiling) for kind, (floor, ceiling) in SETTLE_LIMITS.items()}
+
+    def _timeout(self, kind):
+        if kind not in self.timeouts:
+            self.timeouts[kind] = AdaptiveTimeout(*SETTLE_LIMITS['click'])
+        return self.timeouts[kind]
+
+    def settle_playwright(self, page, kind, timer=None):
+        """等待 Playwright 页面稳定，返回是否在超时前稳定"""
+        adaptive = self._timeout(kind)
+        limit = adaptive.current()
+        start = time.perf_counter()
+        with timer.waiting(kind) if timer else _noop():
+            try:
+                quiet = page.evaluate(DOM_QUIET_JS, {'quiet': self.quiet_ms, 'timeout': limit})
+            except Exception:
+                # 操作触发了页面跳转，执行上下文已销毁，改为等待新页面加载
+                quiet = False
+                try:
+                    page.wait_for_load_state('domcontentloaded', timeout=limit)
+                except Exception:
+                    pass
+        if quiet:
+            adaptive.observe((time.perf_counter() - start) * 1000)
+        return quiet
+
+    def settle_selenium(self, driver, kind, timer=None):
+        """等待 Selenium 页面稳定，返回是否在超时前稳定"""
+        adaptive = self._timeout(kind)
+        limit = adaptive.current()
+        start = time.perf_counter()
+        with timer.waiting(kind) if timer else _noop():
+            try:
+                driver.set_script_timeout(limit / 1000 + 1)
+                quiet = bool(driver.execute_async_script(SELENIUM_DOM_QUIET_JS, self.quiet_ms, limit))
+            except Exception:
+                # 页面跳转导致脚本中断，等待新页面加载完成
+                quiet = False
+                deadline = time.time() + limit / 1000
+                while time.time() < deadline:
+                    try:
+                        if driver.execute_script('return document.readyState') == 'complete':
+                            break
+                    except Exception:
+                        pass
+                    time.sleep(0.05)
+        if quiet:
+            adaptive.observe((time.perf_counter() - start) * 1000)
+        return quiet
+
+
+@contextmanager
+def _noop():
+    yield
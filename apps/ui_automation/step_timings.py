@@ -0,0 +1,101 @@
+"""
+UI 步骤耗时统计
+执行记录原来只有用例总耗时（execution_time），步骤日志中的耗时无法跨执行汇总。
+每个步骤的耗时按阶段（StepTimer.spans: 定位元素、等待、执行操作、断言、截图）写入 StepTiming，每步一行整数毫秒:
+- save_step_timings 从步骤执行结果（step_result['timing']）生成记录并用 bulk_create 写入，
+  套件/批量执行由 CaseExecutionWriter 在写入线程中批量写入，单用例执行在保存执行记录后写入；
+- slowest_steps 按元素、步骤、操作类型聚合最近一段时间的耗时，返回平均耗时最长的若干项；
+  单用例执行和定时任务执行的引擎不记录等待（instrumented=False），只计入总耗时，阶段耗时的平均值只统计记录了等待的步骤。
+
+StepTiming 随执行记录级联删除，执行记录的保留策略同样适用于步骤耗时。
+"""
+import logging
+from datetime import timedelta
+
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from .models import StepTiming
+
+logger = logging.getLogger(__name__)
+
+SPAN_FIELDS = ('locate_ms', 'wait_ms', 'action_ms', 'assertion_ms', 'screenshot_ms')
+
+
+def timing_rows(execution_id, project_id, test_case_id, steps):
+    """从步骤执行结果生成 StepTiming（没有耗时信息的步骤跳过）"""
+    rows = []
+    for step in steps or []:
+        if not isinstance(step, dict):
+            continue
+        timing = step.get('timing') or {}
+        spans = timing.get('spans')
+        if not spans:
+            continue
+        rows.append(StepTiming(
+            execution_id=execution_id,
+            project_id=project_id,
+            test_case_id=test_case_id,
+            element_id=step.get('element_id'),
+            step_number=step.get('step_number') or 0,
+            action_type=step.get('action_type') or '',
+            success=bool(step.get('success')),
+            instrumented=timing.get('instrumented', True),
+            total_ms=sum(spans.values()),
+            **{field: spans.get(field[:-len('_ms')], 0) for field in SPAN_FIELDS}
+        ))
+    return rows
+
+
+def save_step_timings(execution_id, project_id, test_case_id, steps):
+    rows = timing_rows(execution_id, project_id, test_case_id, steps)
+    if rows:
+        StepTiming.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def record_execution_timings(execution, steps):
+    """用例执行记录保存后写入步骤耗时，失败时只记录日志"""
+    try:
+        return save_step_timings(execution.id, execution.project_id, execution.test_case_id, steps)
+    except Exception as e:
+        logger.error(f"写入步骤耗时失败 (执行记录 {execution.id}): {e}", exc_info=True)
+        return 0
+
+
+def _aggregate(queryset, group_by, limit):
+    annotations = {
+        'count': Count('id'),
+        'failed': Count('id', filter=Q(success=False)),
+        'avg_ms': Avg('total_ms'),
+        'max_ms': Max('total_ms'),
+        'instrumented_count': Count('id', filter=Q(instrumented=True)),
+    }
+    # 阶段耗时只统计记录了等待的步骤，未记录的步骤全部耗时都计入执行操作，会拉低等待、拉高执行操作
+    annotations.update({f'avg_{field}': Avg(field, filter=Q(instrumented=True)) for field in SPAN_FIELDS})
+    items = list(queryset.values(*group_by).annotate(**annotations).order_by('-avg_ms')[:limit])
+    for item in items:
+        for key, value in item.items():
+            if key.startswith('avg_') and value is not None:
+                item[key] = round(value, 1)
+    return items
+
+
+def slowest_steps(project_id, days=30, limit=20):
+    """项目最近 days 天内平均耗时最长的元素、步骤和操作类型"""
+    queryset = StepTiming.objects.filter(
+        project_id=project_id,
+        created_at__gte=timezone.now() - timedelta(days=days),
+    )
+    return {
+        'project_id': project_id,
+        'days': days,
+        'step_count': queryset.count(),
+        'elements': _aggregate(
+            queryset.filter(element__isnull=False), ('element_id', 'element__name'), limit
+        ),
+        'steps': _aggregate(
+            queryset, ('test_case_id', 'test_case__name', 'step_number', 'action_type'), limit
+        ),
+        'action_types': _aggregate(queryset, ('action_type',), limit),
+    }
@@ -4,7 +4,9 @@ UI自动化测试执行服务
 """
 import time
 import json
+import threading
 from datetime import datetime
+from django.conf import settings
 from django.utils import timezone
 from django.db import connection
 from playwright.sync_api import sync_playwright
@@ -12,15 +14,19 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
 from selenium.webdriver.safari.options import Options as SafariOptions
-from selenium.webdriver.edge.options import Options as EdgeOptions
 
 from .models import (
     TestSuite, TestExecution, TestCase, TestCaseStep,
     TestCaseExecution, Element
 )
+from .browser_pool import PlaywrightBrowserPool, is_browser_crash
+from .smart_wait import SmartWaiter, StepTimer
+from .screenshot_store import screenshot_entry
+from .execution_writer import CaseExecutionWriter
+from .execution_plan import get_execution_plan
+from .selenium_pool import get_selenium_pool
+from .locator_resolver import resolve_locator
 from .variable_resolver import resolve_variables
 
 
@@ -28,16 +34,40 @@ from .variable_resolver import resolve_variables
 class TestExecutor:
     """测试执行器基类"""
 
-    def __init__(self, test_suite, engine='playwright', browser='chrome', headless=False, executed_by=None):
+    # 用例执行记录的执行来源
+    execution_source = 'suite'
+
+    def __init__(self, test_suite, engine='playwright', browser='chrome', headless=False, executed_by=None,
+                 browser_pool=None, storage_state=None, workers=None):
         self.test_suite = test_suite
         self.engine = engine
         self.browser = browser
         self.headless = headless
         self.executed_by = executed_by
+        # Playwright 浏览器池，未传入时为本次执行创建临时的池
+        self.browser_pool = browser_pool
+        # 每个用例的 BrowserContext 初始存储状态（已登录的 Cookie/localStorage）
+        self.storage_state = storage_state
+        # 并行执行的分片数，每个分片使用独立的浏览器，不超过 UI_AUTOMATION_SUITE_MAX_WORKERS；
+        # Safari 同一时间只允许一个 WebDriver 会话
+        if workers is None:
+            workers = getattr(settings, 'UI_AUTOMATION_SUITE_WORKERS', 1)
+        workers = min(int(workers), getattr(settings, 'UI_AUTOMATION_SUITE_MAX_WORKERS', 4))
+        self.workers = 1 if browser == 'safari' else max(1, workers)
+        # 智能等待（代替步骤之间的固定等待），step_timer 记录当前步骤的等待/执行耗时
+        self.waiter = SmartWaiter()
+        self.step_timer = None
         self.execution = None
         self.test_cases = []
+        # 套件执行计划（预先加载的用例步骤和元素），分片共用父执行器的计划
+        self.plan = None
         self.results = []
 
+    @property
+    def project(self):
+        """执行的用例所属项目（基础URL、执行记录的项目）"""
+        return self.test_suite.project
+
     def create_execution_record(self):
         """创建测试执行记录"""
         self.execution = TestExecution.objects.create(
@@ -106,8 +136,10 @@ class TestExecutor:
             # 获取测试用例
             self.get_test_cases()
 
-            # 根据引擎选择执行方式
-            if self.engine == 'playwright':
+            # 根据引擎选择执行方式，配置了多个分片时并行执行
+            if self.workers > 1 and len(self.test_cases) > 1:
+                self.run_sharded()
+            elif self.engine == 'playwright':
                 self.run_with_playwright()
             else:
                 self.run_with_selenium()
@@ -125,6 +157,110 @@ class TestExecutor:
             # 确保关闭数据库连接
             connection.close()
 
+    def load_execution_plan(self):
+        """获取套件的执行计划（用例、步骤、元素），套件未修改时复用已编译的计划"""
+        if self.plan is None:
+            self.plan, cached = get_execution_plan(self.test_suite, self.test_cases)
+            print(f"执行计划: {'套件未修改，复用已编译的计划' if cached else '已编译'} ({len(self.plan.cases)} 个用例)")
+        return self.plan
+
+    def load_test_cases_data(self):
+        """按执行计划生成本次执行的用例数据"""
+        plan = self.load_execution_plan()
+        project_id = self.project.id
+        return [plan.case_data(test_case.id, project_id) for test_case in self.test_cases]
+
+    def case_writer_defaults(self):
+        """创建 pending 用例执行记录时的公共字段"""
+        return {
+            'project_id': self.project.id,
+            'test_suite': self.test_suite,
+            'execution_source': self.execution_source,
+            'engine': self.engine,
+            'browser': self.browser,
+            'headless': self.headless,
+            'created_by': self.executed_by,
+        }
+
+    def create_case_writer(self, test_cases_data):
+        """批量创建 pending 状态的用例执行记录，返回用例执行状态写入器"""
+        writer = CaseExecutionWriter(self.case_writer_defaults())
+        writer.create_pending([case_data['id'] for case_data in test_cases_data])
+        return writer
+
+    def case_result_fields(self, case_result):
+        """用例执行结果中需要写入执行记录的字段，执行日志在写入器线程中序列化"""
+        fields = {'execution_logs': case_result['steps']}
+        if case_result['error']:
+            fields['error_message'] = case_result['error']
+        if case_result.get('screenshots'):
+            fields['screenshots'] = case_result['screenshots']
+        return fields
+
+    def run_sharded(self):
+        """
+        按历史执行时长把用例分配到多个分片，每个分片使用独立的浏览器并行执行，结果合并到同一条执行记录
+        其他分片提交到 UI 执行池，与定时任务共用浏览器并发数；执行池队列已满或在当前分片结束时仍未开始的分片
+        由当前线程依次执行，避免执行池线程都在等待分片时死锁
+        """
+        import queue
+        from apps.core.workers import get_worker_pool
+        from .sharding import estimate_case_durations, shard_test_cases
+
+        start_time = time.time()
+        # 在启动分片线程前加载项目和执行计划，分片只读取已缓存的数据
+        self.project
+        self.load_execution_plan()
+
+        durations = estimate_case_durations([test_case.id for test_case in self.test_cases])
+        shards = shard_test_cases(self.test_cases, self.workers, durations)
+        executors = [ShardExecutor(self, cases, index) for index, cases in enumerate(shards)]
+        print(f"并行执行: {len(self.test_cases)} 个用例分配到 {len(executors)} 个分片")
+        for executor in executors:
+            estimate = sum(durations[test_case.id] for test_case in executor.test_cases)
+            print(f"  分片 {executor.index + 1}: {len(executor.test_cases)} 个用例, 预计 {estimate:.1f} 秒")
+
+        pool = get_worker_pool('ui')
+        for executor in executors[1:]:
+            try:
+                pool.submit(executor.run_once)
+            except queue.Full:
+                print(f"  分片 {executor.index + 1}: UI 执行队列已满，由当前线程执行")
+        # 第一个分片在当前线程执行，可以复用调用方传入的浏览器池
+        executors[0].run_shard()
+        for executor in executors[1:]:
+            executor.run_once()
+            executor.finished.wait()
+
+        # 按套件中的原始顺序合并各分片的结果
+        order = {test_case.id: position for position, test_case in enumerate(self.test_cases)}
+        self.results = sorted(
+            (result for executor in executors for result in executor.results),
+            key=lambda result: order.get(result['test_case_id'], len(order))
+        )
+        passed = sum(executor.summary['passed'] for executor in executors)
+        failed = sum(executor.summary['failed'] for executor in executors)
+        skipped = sum(executor.summary['skipped'] for executor in executors)
+        error_msg = '\n'.join(
+            f"分片 {executor.index + 1}: {executor.summary['error_msg']}"
+            for executor in executors if executor.summary['error_msg']
+        )
+
+        duration = time.time() - start_time
+        status = 'SUCCESS' if failed == 0 else 'FAILED'
+        self.update_execution_result(status, passed, failed, skipped, duration, error_msg)
+
+        self.execution.result_data['shards'] = [{
+            'index': executor.index + 1,
+            'test_case_ids': [test_case.id for test_case in executor.test_cases],
+            'estimated_duration': round(sum(durations[test_case.id] for test_case in executor.test_cases), 2),
+            'duration': round(executor.summary['duration'], 2),
+            'passed': executor.summary['passed'],
+            'failed': executor.summary['failed'],
+            'skipped': executor.summary['skipped'],
+        } for executor in executors]
+        self.execution.save(update_fields=['result_data'])
+
     def run_with_playwright(self):
         """使用 Playwright 执行测试（同步版本）"""
         start_time = time.time()
@@ -169,128 +305,43 @@ class TestExecutor:
             return
 
         # 预先获取所有测试用例的步骤数据，避免在Playwright上下文中访问ORM
-        test_cases_data = []
-        for test_case in self.test_cases:
-            case_data = {
-                'id': test_case.id,
-                'name': test_case.name,
-                'project_id': self.test_suite.project.id,
-                'steps': []
-            }
+        test_cases_data = self.load_test_cases_data()
 
-            # 获取步骤并预先加载所有相关数据
-            steps = test_case.steps.select_related('element', 'element__locator_strategy').order_by('step_number')
-            for step in steps:
-                step_data = {
-                    'id': step.id,
-                    'step_number': step.step_number,
-                    'action_type': step.action_type,
-                    'description': step.description,
-                    'input_value': step.input_value,
-                    'wait_time': step.wait_time,
-                    'assert_type': step.assert_type,
-                    'assert_value': step.assert_value,
-                    'element': None
-                }
-
-                # 如果有元素，预先获取元素数据
-                if step.element:
-                    step_data['element'] = {
-                        'id': step.element.id,
-                        'name': step.element.name,
-                        'locator_value': step.element.locator_value,
-                        'locator_strategy': step.element.locator_strategy.name if step.element.locator_strategy else 'css'
-                    }
-
-                case_data['steps'].append(step_data)
-
-            test_cases_data.append(case_data)
-
-        # 预先创建所有测试用例执行记录（不设置 started_at，等实际执行时再设置）
-        case_executions = {}
-        for case_data in test_cases_data:
-            case_execution = TestCaseExecution.objects.create(
-                test_case_id=case_data['id'],
-                project_id=case_data['project_id'],
-                test_suite=self.test_suite,
-                execution_source='suite',
-                status='pending',  # 初始状态为 pending
-                engine=self.engine,
-                browser=self.browser,
-                headless=self.headless,
-                created_by=self.executed_by
-                # 注意：不设置 started_at，等用例实际开始执行时再设置
-            )
-            case_executions[case_data['id']] = case_execution
+        # 预先批量创建所有测试用例执行记录，之后的状态变化由写入器在后台线程批量写入
+        writer = self.create_case_writer(test_cases_data)
 
-        # 执行每个测试用例，为每个用例单独启动和关闭浏览器
+        # 所有用例复用浏览器池中的浏览器，每个用例使用独立的 BrowserContext
         print(f"准备执行 {len(test_cases_data)} 个测试用例")
 
-        with sync_playwright() as p:
+        pool = self.browser_pool or PlaywrightBrowserPool()
+        try:
             for i, case_data in enumerate(test_cases_data, 1):
                 print(f"\n{'='*60}")
                 print(f"正在执行第 {i}/{len(test_cases_data)} 个用例: {case_data['name']}")
                 print(f"{'='*60}")
                 
                 # 记录用例实际开始执行时间
-                case_execution = case_executions[case_data['id']]
-                case_execution.started_at = timezone.now()
-                case_execution.status = 'running'
-                case_execution.save()
+                writer.start(case_data['id'])
 
-                # 为每个测试用例启动新的浏览器实例
+                # 为每个测试用例创建隔离的浏览器上下文
+                self.context = None
                 try:
-                    # 选择浏览器并配置忽略证书错误
-                    if self.browser == 'firefox':
-                        browser = p.firefox.launch(
-                            headless=self.headless,
-                            args=['--ignore-certificate-errors']
-                        )
-                    elif self.browser == 'safari':
-                        browser = p.webkit.launch(
-                            headless=self.headless,
-                            args=['--ignore-certificate-errors']
-                        )
-                    else:  # chrome or edge
-                        # 添加防检测参数和忽略证书错误
-                        browser = p.chromium.launch(
-                            headless=self.headless,
-                            args=[
-                                '--disable-blink-features=AutomationControlled',
-                                '--ignore-certificate-errors',
-                                '--ignore-ssl-errors',
-                                '--ignore-certificate-errors-spki-list',
-                            ]
-                        )
-
-                    print(f"✓ 浏览器已启动")
-
-                    # 配置上下文（User Agent 和 Viewport，忽略HTTPS证书错误）
-                    self.context = browser.new_context(
-                        viewport={'width': 1920, 'height': 1080},
-                        user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-                        ignore_https_errors=True  # 忽略 HTTPS 证书错误
-                    )
+                    self.context = pool.new_context(self.browser, self.headless, storage_state=self.storage_state)
                     self.current_page = self.context.new_page()
 
                     # 导航到项目基础URL
-                    if self.test_suite.project.base_url:
+                    if self.project.base_url:
                         try:
-                            print(f"正在导航到: {self.test_suite.project.base_url}")
-
-                            # 检测是否在Linux服务器环境
-                            import platform
-                            is_linux = platform.system() == 'Linux'
+                            print(f"正在导航到: {self.project.base_url}")
 
                             # 使用 networkidle 等待页面加载完成
-                            self.current_page.goto(self.test_suite.project.base_url, wait_until='networkidle', timeout=30000)
+                            self.current_page.goto(self.project.base_url, wait_until='networkidle', timeout=30000)
 
-                            # 额外等待，确保动态内容加载（Vue/React等SPA应用）
-                            # 服务器无头模式需要更长的等待时间
-                            extra_wait = 3 if is_linux else 2
-                            time.sleep(extra_wait)
+                            # 等待动态内容渲染稳定（Vue/React等SPA应用），不再固定等待2~3秒
+                            settle_start = time.time()
+                            self.waiter.settle_playwright(self.current_page, 'navigation')
 
-                            print(f"✓ 成功导航到: {self.test_suite.project.base_url} (已等待页面加载完成，额外{extra_wait}秒)")
+                            print(f"✓ 成功导航到: {self.project.base_url} (页面稳定耗时 {time.time() - settle_start:.2f}秒)")
                         except Exception as e:
                             print(f"✗ 导航失败: {str(e)}")
                             # 导航失败，记录错误并继续下一个用例
@@ -304,9 +355,8 @@ class TestExecutor:
                                 'end_time': datetime.now().isoformat(),
                                 'screenshots': []
                             })
+                            writer.finish(case_data['id'], 'failed', error_message=f"导航到基础URL失败: {str(e)}")
                             failed += 1
-                            browser.close()
-                            print(f"✓ 浏览器已关闭")
                             continue
 
                     # 执行测试用例（不再传递page参数，使用self.current_page）
@@ -314,19 +364,10 @@ class TestExecutor:
                     self.results.append(case_result)
                     print(f"✓ 用例执行完成，状态: {case_result['status']}")
 
-                    # 立即更新该用例的执行记录（包含准确的执行时间）
-                    case_execution = case_executions[case_data['id']]
-                    case_execution.status = case_result['status']
-                    case_execution.finished_at = timezone.now()
-                    case_execution.execution_time = (case_execution.finished_at - case_execution.started_at).total_seconds()
-                    case_execution.execution_logs = json.dumps(case_result['steps'], ensure_ascii=False)
-                    if case_result['error']:
-                        case_execution.error_message = case_result['error']
-                    if case_result.get('screenshots'):
-                        case_execution.screenshots = case_result['screenshots']
-                    case_execution.save()
+                    # 记录该用例的执行结果（包含准确的执行时间），由写入器在后台写入数据库
+                    execution_time = writer.finish(case_data['id'], case_result['status'], **self.case_result_fields(case_result))
                     
-                    print(f"⏱️  执行时长: {case_execution.execution_time:.2f}秒")
+                    print(f"⏱️  执行时长: {execution_time:.2f}秒")
 
                     if case_result['status'] == 'passed':
                         passed += 1
@@ -337,6 +378,10 @@ class TestExecutor:
 
                 except Exception as e:
                     print(f"✗ 用例执行出现异常: {str(e)}")
+                    # 浏览器崩溃时回收，下一个用例会重新启动浏览器
+                    if is_browser_crash(e):
+                        print(f"⚠️  浏览器已崩溃，回收后重新启动")
+                        pool.discard(self.browser, self.headless)
                     # 记录异常
                     self.results.append({
                         'test_case_id': case_data['id'],
@@ -351,20 +396,22 @@ class TestExecutor:
                     failed += 1
                     
                     # 更新执行记录
-                    case_execution = case_executions[case_data['id']]
-                    case_execution.status = 'failed'
-                    case_execution.finished_at = timezone.now()
-                    case_execution.execution_time = (case_execution.finished_at - case_execution.started_at).total_seconds()
-                    case_execution.error_message = f"用例执行异常: {str(e)}"
-                    case_execution.save()
+                    writer.finish(case_data['id'], 'failed', error_message=f"用例执行异常: {str(e)}")
 
                 finally:
-                    # 确保每个用例执行后都关闭浏览器
-                    try:
-                        browser.close()
-                        print(f"✓ 浏览器已关闭\n")
-                    except:
-                        pass
+                    # 关闭用例的浏览器上下文，浏览器留给下一个用例复用
+                    if self.context is not None:
+                        try:
+                            self.context.close()
+                        except Exception:
+                            pass
+                        self.context = None
+        finally:
+            if self.browser_pool is None:
+                pool.close()
+                print(f"✓ 浏览器已关闭\n")
+            # 写入剩余的用例执行状态
+            writer.close()
 
         # 注意：每个用例的执行记录已在执行过程中实时更新，不需要在这里统一更新
 
@@ -417,16 +464,10 @@ class TestExecutor:
                     del step_result['switched_page']
                     just_switched_tab = True
                 
-                # 步骤执行完后添加短暂延迟，确保页面状态稳定
-                # 特别是点击操作后，可能触发动画、下拉框展开等
+                # 步骤执行完后等待页面稳定（动画、下拉框展开、请求返回等），稳定后立即继续
                 if step_result['success'] and step_data['action_type'] in ['click', 'fill', 'hover']:
-                    import asyncio
-                    import time as sync_time
-                    # 点击操作后等待更长时间（下拉框展开动画）
-                    if step_data['action_type'] == 'click':
-                        self.current_page.wait_for_timeout(800)  # 等待800ms，确保下拉框完全展开
-                    else:
-                        self.current_page.wait_for_timeout(300)  # 其他操作等待300ms
+                    self.waiter.settle_playwright(self.current_page, step_data['action_type'], self.step_timer)
+                    step_result['timing'] = self.step_timer.breakdown(step_data['action_type'])
 
                 # 如果步骤失败，捕获失败截图
                 if not step_result['success']:
@@ -436,30 +477,29 @@ class TestExecutor:
 
                     # 捕获失败截图（改进版）
                     try:
-                        import base64
                         # 增加超时设置，避免截图等待时间过长
                         print(f"🔍 开始捕获失败截图 (步骤 {step_data['step_number']})...")
                         print(f"   当前page对象URL: {self.current_page.url}")
                         print(f"   当前page对象标题: {self.current_page.title()}")
-                        screenshot_bytes = self.current_page.screenshot(timeout=5000)  # 5秒超时
+                        # 失败截图耗时计入失败步骤的截图阶段
+                        with self.step_timer.waiting('screenshot'):
+                            screenshot_bytes = self.current_page.screenshot(timeout=5000)  # 5秒超时
                         print(f"   截图字节大小: {len(screenshot_bytes)} bytes")
 
-                        screenshot_base64 = base64.b64encode(screenshot_bytes).decode('utf-8')
-                        print(f"   Base64 编码大小: {len(screenshot_base64)} characters")
+                        # 验证截图数据是否有效
+                        if len(screenshot_bytes) < 100:
+                            raise Exception(f"截图数据异常短 ({len(screenshot_bytes)} bytes)，可能截图失败")
 
-                        # 验证 base64 编码是否有效
-                        if len(screenshot_base64) < 100:
-                            raise Exception(f"Base64 编码异常短 ({len(screenshot_base64)} chars)，可能截图失败")
-
-                        screenshot_url = f'data:image/png;base64,{screenshot_base64}'
-                        result['screenshots'].append({
-                            'url': screenshot_url,
-                            'description': f'步骤 {step_data["step_number"]} 失败截图: {step_data.get("description", "")}',
-                            'step_number': step_data['step_number'],
-                            'timestamp': datetime.now().isoformat()
-                        })
+                        # 截图压缩后保存为文件，执行记录中只保存引用
+                        screenshot = screenshot_entry(
+                            screenshot_bytes,
+                            description=f'步骤 {step_data["step_number"]} 失败截图: {step_data.get("description", "")}',
+                            step_number=step_data['step_number'],
+                            timestamp=datetime.now().isoformat()
+                        )
+                        result['screenshots'].append(screenshot)
                         print(f"✓ 失败截图已捕获 (步骤 {step_data['step_number']})")
-                        print(f"   截图 URL 长度: {len(screenshot_url)} characters")
+                        print(f"   截图文件: {screenshot['url']} ({screenshot['size']} bytes)")
                     except Exception as screenshot_error:
                         error_msg = f"捕获失败截图失败: {str(screenshot_error)}"
                         print(f"⚠️  {error_msg}")
@@ -473,6 +513,7 @@ class TestExecutor:
                             'timestamp': datetime.now().isoformat(),
                             'error': str(screenshot_error)
                         })
+                    step_result['timing'] = self.step_timer.breakdown(step_data['action_type'])
 
                     break
 
@@ -482,28 +523,25 @@ class TestExecutor:
 
             # 捕获异常截图（改进版）
             try:
-                import base64
                 # 增加超时设置，避免截图等待时间过长
                 print(f"🔍 开始捕获异常截图...")
                 screenshot_bytes = self.current_page.screenshot(timeout=5000)  # 5秒超时
                 print(f"   截图字节大小: {len(screenshot_bytes)} bytes")
 
-                screenshot_base64 = base64.b64encode(screenshot_bytes).decode('utf-8')
-                print(f"   Base64 编码大小: {len(screenshot_base64)} characters")
-
-                # 验证 base64 编码是否有效
-                if len(screenshot_base64) < 100:
-                    raise Exception(f"Base64 编码异常短 ({len(screenshot_base64)} chars)，可能截图失败")
+                # 验证截图数据是否有效
+                if len(screenshot_bytes) < 100:
+                    raise Exception(f"截图数据异常短 ({len(screenshot_bytes)} bytes)，可能截图失败")
 
-                screenshot_url = f'data:image/png;base64,{screenshot_base64}'
-                result['screenshots'].append({
-                    'url': screenshot_url,
-                    'description': f'异常截图: {str(e)}',
-                    'step_number': None,
-                    'timestamp': datetime.now().isoformat()
-                })
+                # 截图压缩后保存为文件，执行记录中只保存引用
+                screenshot = screenshot_entry(
+                    screenshot_bytes,
+                    description=f'异常截图: {str(e)}',
+                    step_number=None,
+                    timestamp=datetime.now().isoformat()
+                )
+                result['screenshots'].append(screenshot)
                 print(f"✓ 异常截图已捕获")
-                print(f"   截图 URL 长度: {len(screenshot_url)} characters")
+                print(f"   截图文件: {screenshot['url']} ({screenshot['size']} bytes)")
             except Exception as screenshot_error:
                 error_msg = f"捕获异常截图失败: {str(screenshot_error)}"
                 print(f"⚠️  {error_msg}")
@@ -582,6 +620,50 @@ class TestExecutor:
         result['end_time'] = datetime.now().isoformat()
         return result
 
+    def playwright_locator(self, locator_strategy, locator_value):
+        """根据定位策略构造当前页面的 Playwright 定位器，返回 (定位器, 是否为 get_by_* 方式)"""
+        locator_strategy = (locator_strategy or 'css').lower()
+        locator = None
+        if locator_strategy in ['css', 'css selector']:
+            selector = locator_value
+        elif locator_strategy == 'xpath':
+            selector = f'xpath={locator_value}'
+        elif locator_strategy == 'id':
+            selector = f'#{locator_value}'
+        elif locator_strategy == 'name':
+            selector = f'[name="{locator_value}"]'
+        elif locator_strategy == 'text':
+            # 使用 Playwright 的 get_by_text 方法
+            locator = self.current_page.get_by_text(locator_value, exact=False)
+            selector = None  # 不使用字符串选择器
+        elif locator_strategy == 'placeholder':
+            # 使用 Playwright 的 get_by_placeholder 方法
+            locator = self.current_page.get_by_placeholder(locator_value)
+            selector = None
+        elif locator_strategy == 'role':
+            # 使用 Playwright 的 get_by_role 方法
+            locator = self.current_page.get_by_role(locator_value)
+            selector = None
+        elif locator_strategy == 'label':
+            # 使用 Playwright 的 get_by_label 方法
+            locator = self.current_page.get_by_label(locator_value)
+            selector = None
+        elif locator_strategy == 'title':
+            # 使用 Playwright 的 get_by_title 方法
+            locator = self.current_page.get_by_title(locator_value)
+            selector = None
+        elif locator_strategy == 'test-id':
+            # 使用 Playwright 的 get_by_test_id 方法
+            locator = self.current_page.get_by_test_id(locator_value)
+            selector = None
+        else:
+            selector = locator_value
+
+        # 统一使用 locator 对象（如果有），否则使用 selector 字符串
+        if locator is not None:
+            return locator, True
+        return self.current_page.locator(selector), False
+
     def execute_step_playwright(self, step_data):
         """使用 Playwright 执行单个步骤（同步版本）
 
@@ -593,11 +675,13 @@ class TestExecutor:
         """
         import time
         start_time = time.time()
+        self.step_timer = timer = StepTimer()
 
         step_result = {
             'step_number': step_data['step_number'],
             'action_type': step_data['action_type'],
             'description': step_data['description'],
+            'element_id': step_data['element']['id'] if step_data['element'] else None,
             'success': False,
             'error': None
         }
@@ -606,49 +690,20 @@ class TestExecutor:
             # 获取元素定位器
             if step_data['element']:
                 element = step_data['element']
-                locator_value = element['locator_value']
-                locator_strategy = element['locator_strategy'].lower()
                 element_name = element.get('name', '未知元素')
 
-                # 根据定位策略构造 Playwright 选择器
-                locator = None
-                if locator_strategy in ['css', 'css selector']:
-                    selector = locator_value
-                elif locator_strategy == 'xpath':
-                    selector = f'xpath={locator_value}'
-                elif locator_strategy == 'id':
-                    selector = f'#{locator_value}'
-                elif locator_strategy == 'name':
-                    selector = f'[name="{locator_value}"]'
-                elif locator_strategy == 'text':
-                    # 使用 Playwright 的 get_by_text 方法
-                    locator = self.current_page.get_by_text(locator_value, exact=False)
-                    selector = None  # 不使用字符串选择器
-                elif locator_strategy == 'placeholder':
-                    # 使用 Playwright 的 get_by_placeholder 方法
-                    locator = self.current_page.get_by_placeholder(locator_value)
-                    selector = None
-                elif locator_strategy == 'role':
-                    # 使用 Playwright 的 get_by_role 方法
-                    locator = self.current_page.get_by_role(locator_value)
-                    selector = None
-                elif locator_strategy == 'label':
-                    # 使用 Playwright 的 get_by_label 方法
-                    locator = self.current_page.get_by_label(locator_value)
-                    selector = None
-                elif locator_strategy == 'title':
-                    # 使用 Playwright 的 get_by_title 方法
-                    locator = self.current_page.get_by_title(locator_value)
-                    selector = None
-                elif locator_strategy == 'test-id':
-                    # 使用 Playwright 的 get_by_test_id 方法
-                    locator = self.current_page.get_by_test_id(locator_value)
-                    selector = None
-                else:
-                    selector = locator_value
-                
-                # 统一使用 locator 对象（如果有），否则使用 selector 字符串
-                element_locator = locator if locator is not None else (self.current_page.locator(selector) if selector else None)
+                # 有备用定位器时探测所有候选定位器，使用最先匹配到元素的定位器
+                with timer.waiting('locator'):
+                    locator_strategy, locator_value, resolution = resolve_locator(
+                        element, lambda strategy, value: self.playwright_locator(strategy, value)[0].count() > 0
+                    )
+                locator_strategy = locator_strategy.lower()
+                if resolution:
+                    step_result['locator'] = resolution
+
+                # 根据定位策略构造 Playwright 定位器，get_by_* 方式的定位器操作前需要显式等待可见
+                element_locator, by_semantic = self.playwright_locator(locator_strategy, locator_value)
+                locator = element_locator if by_semantic else None
 
                 # 根据操作类型执行动作
                 if step_data['action_type'] == 'click':
@@ -725,7 +780,7 @@ class TestExecutor:
                         js_result = self.current_page.evaluate(js_code)
                         
                         if js_result.get('success'):
-                            self.current_page.wait_for_timeout(800)  # 等待下拉框展开
+                            self.waiter.settle_playwright(self.current_page, 'dropdown', timer)  # 等待下拉框展开
                             step_result['success'] = True
                         else:
                             step_result['error'] = f"✗ 下拉框触发器点击失败: {js_result.get('error')}"
@@ -733,24 +788,27 @@ class TestExecutor:
                     elif is_dropdown_option:
                         # 下拉框选项：使用 Playwright 原生方法（更可靠）
                         # 之前使用 JS click() 可能无法触发 Element Plus 的事件监听
-                        self.current_page.wait_for_timeout(800)  # 等待下拉框展开
-                        
                         print(f"[Playwright-调试] 下拉框选项处理: {locator_strategy}={locator_value}")
                         
                         # 构造基础定位器（移除 Playwright 特有的伪类，因为我们要手动遍历）
                         base_locator_value = locator_value.replace(' >> visible=true', '')
                         
                         try:
-                            if locator_strategy.lower() == 'xpath':
-                                if not base_locator_value.startswith('xpath='):
-                                    candidates = self.current_page.locator(f"xpath={base_locator_value}")
-                                else:
-                                    candidates = self.current_page.locator(base_locator_value)
-                            elif locator_strategy.lower() in ['css', 'css selector']:
-                                candidates = self.current_page.locator(base_locator_value)
+                            if locator_strategy.lower() == 'xpath' and not base_locator_value.startswith('xpath='):
+                                candidate_selector = f"xpath={base_locator_value}"
                             else:
-                                # 其他策略暂按 CSS 处理
-                                candidates = self.current_page.locator(base_locator_value)
+                                # CSS 及其他策略暂按 CSS 处理
+                                candidate_selector = base_locator_value
+                            candidates = self.current_page.locator(candidate_selector)
+
+                            # 等待下拉框展开：出现可见的选项即可继续，代替固定等待800ms
+                            with timer.waiting('dropdown'):
+                                try:
+                                    self.current_page.locator(f"{candidate_selector} >> visible=true").first.wait_for(
+                                        state='visible', timeout=step_data['wait_time']
+                                    )
+                                except Exception:
+                                    pass
                             
                             # 获取匹配元素数量
                             count = candidates.count()
@@ -791,7 +849,7 @@ class TestExecutor:
                                 if self.current_page.locator('.el-select-dropdown').first.is_visible():
                                     # 点击空白处关闭
                                     self.current_page.click('body', position={'x': 10, 'y': 10}, timeout=3000)
-                                    self.current_page.wait_for_timeout(500)
+                                    self.waiter.settle_playwright(self.current_page, 'dropdown', timer)
                             except:
                                 pass
                         
@@ -815,9 +873,13 @@ class TestExecutor:
                             
                             # 使用更长的超时时间（至少10秒）
                             extended_timeout = max(step_data['wait_time'], 10000)
+                            with timer.waiting('actionable'):
+                                element_locator.wait_for(state='visible', timeout=extended_timeout)
                             element_locator.click(timeout=extended_timeout)
                             print(f"  ✓ 点击成功（超时: {extended_timeout}ms）")
                         else:
+                            with timer.waiting('actionable'):
+                                element_locator.wait_for(state='visible', timeout=step_data['wait_time'])
                             element_locator.click(timeout=step_data['wait_time'])
                         step_result['success'] = True
 
@@ -827,7 +889,8 @@ class TestExecutor:
                     
                     # 等待元素可见（对于新定位方式很重要）
                     if locator is not None:
-                        element_locator.wait_for(state='visible', timeout=step_data['wait_time'])
+                        with timer.waiting('actionable'):
+                            element_locator.wait_for(state='visible', timeout=step_data['wait_time'])
                     
                     # 如果刚切换了标签页，增加超时时间
                     if step_data.get('_just_switched_tab'):
@@ -846,6 +909,8 @@ class TestExecutor:
 
 
                 elif step_data['action_type'] == 'getText':
+                    with timer.waiting('actionable'):
+                        element_locator.wait_for(state='attached', timeout=step_data['wait_time'])
                     text = element_locator.text_content(timeout=step_data['wait_time'])
                     step_result['result'] = text
                     step_result['success'] = True
@@ -859,16 +924,19 @@ class TestExecutor:
                         ('li' in locator_value.lower() and ('ul' in locator_value.lower() or 'ol' in locator_value.lower()))
                     )
                     
-                    if is_dropdown_option_wait:
-                        # 对于下拉框选项，只等待元素在DOM中（attached），不要求可见
-                        element_locator.wait_for(state='attached', timeout=step_data['wait_time'])
-                    else:
-                        # 普通元素：等待可见
-                        element_locator.wait_for(state='visible', timeout=step_data['wait_time'])
+                    with timer.waiting('waitFor'):
+                        if is_dropdown_option_wait:
+                            # 对于下拉框选项，只等待元素在DOM中（attached），不要求可见
+                            element_locator.wait_for(state='attached', timeout=step_data['wait_time'])
+                        else:
+                            # 普通元素：等待可见
+                            element_locator.wait_for(state='visible', timeout=step_data['wait_time'])
                     
                     step_result['success'] = True
 
                 elif step_data['action_type'] == 'hover':
+                    with timer.waiting('actionable'):
+                        element_locator.wait_for(state='visible', timeout=step_data['wait_time'])
                     element_locator.hover(timeout=step_data['wait_time'])
                     step_result['success'] = True
 
@@ -889,6 +957,9 @@ class TestExecutor:
                          print(f"  ✓ 断言变量解析: {step_data['assert_value']} -> {resolved_assert_value}")
 
                     # 执行断言
+                    if step_data['assert_type'] in ('textContains', 'textEquals'):
+                        with timer.waiting('actionable'):
+                            element_locator.wait_for(state='attached', timeout=step_data['wait_time'])
                     if step_data['assert_type'] == 'textContains':
                         text = element_locator.text_content(timeout=step_data['wait_time'])
                         if resolved_assert_value in text:
@@ -920,7 +991,8 @@ class TestExecutor:
                             step_result['error'] = f"✗ 断言失败: 元素 '{element_name}' 不存在"
 
                 elif step_data['action_type'] == 'wait':
-                    self.current_page.wait_for_timeout(step_data['wait_time'])
+                    with timer.waiting('fixed'):
+                        self.current_page.wait_for_timeout(step_data['wait_time'])
                     step_result['success'] = True
 
                 elif step_data['action_type'] == 'switchTab':
@@ -980,9 +1052,13 @@ class TestExecutor:
                             # 超时了
                             break
                         
-                        # 关键修改：使用 wait_for_timeout 代替 time.sleep
-                        # time.sleep 会阻塞线程，导致 Playwright 无法接收新页面事件
-                        self.current_page.wait_for_timeout(500)
+                        # 等待新标签页打开事件，新页面出现时立即返回（最多500ms后重新检查）
+                        # 不能用 time.sleep，它会阻塞线程，导致 Playwright 无法接收新页面事件
+                        with timer.waiting('tab'):
+                            try:
+                                self.current_page.context.wait_for_event('page', timeout=500)
+                            except Exception:
+                                pass
                     
                     # 获取目标页面
                     pages = self.current_page.context.pages
@@ -1010,20 +1086,21 @@ class TestExecutor:
                     
                     # 等待页面稳定
                     # 新标签页可能需要时间加载和渲染
-                    try:
-                        # 等待网络空闲状态（页面加载完成）
-                        target_page.wait_for_load_state('networkidle', timeout=10000)  # 增加到10秒
-                        print(f"  - 页面加载状态: networkidle")
-                    except Exception as e:
-                        # 如果networkidle超时，至少等待domcontentloaded
+                    with timer.waiting('tab'):
                         try:
-                            target_page.wait_for_load_state('domcontentloaded', timeout=5000)  # 增加到5秒
-                            print(f"  - 页面加载状态: domcontentloaded")
-                        except Exception as e2:
-                            print(f"  - 页面加载状态: 超时，继续执行 ({str(e2)[:50]})")
+                            # 等待网络空闲状态（页面加载完成）
+                            target_page.wait_for_load_state('networkidle', timeout=10000)  # 增加到10秒
+                            print(f"  - 页面加载状态: networkidle")
+                        except Exception as e:
+                            # 如果networkidle超时，至少等待domcontentloaded
+                            try:
+                                target_page.wait_for_load_state('domcontentloaded', timeout=5000)  # 增加到5秒
+                                print(f"  - 页面加载状态: domcontentloaded")
+                            except Exception as e2:
+                                print(f"  - 页面加载状态: 超时，继续执行 ({str(e2)[:50]})")
                     
-                    # 额外等待一小段时间，确保页面完全稳定
-                    target_page.wait_for_timeout(1500)  # 使用 wait_for_timeout 代替 sleep
+                    # 等待页面渲染稳定，代替固定等待1.5秒
+                    self.waiter.settle_playwright(target_page, 'tab', timer)
                     
                     # 验证页面确实已切换
                     print(f"  - 当前活动页面URL: {target_page.url}")
@@ -1045,7 +1122,8 @@ class TestExecutor:
             else:
                 # 没有元素的步骤（如等待、切换标签页）
                 if step_data['action_type'] == 'wait':
-                    self.current_page.wait_for_timeout(step_data['wait_time'])
+                    with timer.waiting('fixed'):
+                        self.current_page.wait_for_timeout(step_data['wait_time'])
                     step_result['success'] = True
                 
                 elif step_data['action_type'] == 'switchTab':
@@ -1105,8 +1183,12 @@ class TestExecutor:
                             # 超时了
                             break
                         
-                        # 关键修改：使用 wait_for_timeout 代替 time.sleep
-                        self.current_page.wait_for_timeout(500)
+                        # 等待新标签页打开事件，新页面出现时立即返回（最多500ms后重新检查）
+                        with timer.waiting('tab'):
+                            try:
+                                self.current_page.context.wait_for_event('page', timeout=500)
+                            except Exception:
+                                pass
                     
                     # 获取目标页面
                     pages = self.current_page.context.pages
@@ -1133,20 +1215,21 @@ class TestExecutor:
                     target_page.bring_to_front()
                     
                     # 等待页面稳定
-                    try:
-                        # 等待网络空闲状态（页面加载完成）
-                        target_page.wait_for_load_state('networkidle', timeout=10000)  # 增加到10秒
-                        print(f"  - 页面加载状态: networkidle")
-                    except Exception as e:
-                        # 如果networkidle超时，至少等待domcontentloaded
+                    with timer.waiting('tab'):
                         try:
-                            target_page.wait_for_load_state('domcontentloaded', timeout=5000)  # 增加到5秒
-                            print(f"  - 页面加载状态: domcontentloaded")
-                        except Exception as e2:
-                            print(f"  - 页面加载状态: 超时，继续执行 ({str(e2)[:50]})")
+                            # 等待网络空闲状态（页面加载完成）
+                            target_page.wait_for_load_state('networkidle', timeout=10000)  # 增加到10秒
+                            print(f"  - 页面加载状态: networkidle")
+                        except Exception as e:
+                            # 如果networkidle超时，至少等待domcontentloaded
+                            try:
+                                target_page.wait_for_load_state('domcontentloaded', timeout=5000)  # 增加到5秒
+                                print(f"  - 页面加载状态: domcontentloaded")
+                            except Exception as e2:
+                                print(f"  - 页面加载状态: 超时，继续执行 ({str(e2)[:50]})")
                     
-                    # 额外等待一小段时间，确保页面完全稳定
-                    target_page.wait_for_timeout(1500)  # 使用 wait_for_timeout 代替 sleep
+                    # 等待页面渲染稳定，代替固定等待1.5秒
+                    self.waiter.settle_playwright(target_page, 'tab', timer)
                     
                     # 验证页面确实已切换
                     print(f"  - 当前活动页面URL: {target_page.url}")
@@ -1212,6 +1295,7 @@ class TestExecutor:
             print(f"   异常类型: {error_type}")
             print(f"   错误信息: {error_str[:500]}")  # 限制长度避免刷屏
 
+        step_result['timing'] = timer.breakdown(step_data['action_type'])
         return step_result
 
     def run_with_selenium(self):
@@ -1222,73 +1306,25 @@ class TestExecutor:
         skipped = 0
 
         # 预先获取所有测试用例的步骤数据，避免在Selenium上下文中访问ORM
-        test_cases_data = []
-        for test_case in self.test_cases:
-            case_data = {
-                'id': test_case.id,
-                'name': test_case.name,
-                'project_id': self.test_suite.project.id,
-                'steps': []
-            }
-
-            # 获取步骤并预先加载所有相关数据
-            steps = test_case.steps.select_related('element', 'element__locator_strategy').order_by('step_number')
-            for step in steps:
-                step_data = {
-                    'id': step.id,
-                    'step_number': step.step_number,
-                    'action_type': step.action_type,
-                    'description': step.description,
-                    'input_value': step.input_value,
-                    'wait_time': step.wait_time,
-                    'assert_type': step.assert_type,
-                    'assert_value': step.assert_value,
-                    'element': None
-                }
+        test_cases_data = self.load_test_cases_data()
 
-                # 如果有元素，预先获取元素数据
-                if step.element:
-                    step_data['element'] = {
-                        'id': step.element.id,
-                        'name': step.element.name,
-                        'locator_value': step.element.locator_value,
-                        'locator_strategy': step.element.locator_strategy.name if step.element.locator_strategy else 'css'
-                    }
-
-                case_data['steps'].append(step_data)
-
-            test_cases_data.append(case_data)
-
-        # 预先创建所有测试用例执行记录（不设置 started_at，等实际执行时再设置）
-        case_executions = {}
-        for case_data in test_cases_data:
-            case_execution = TestCaseExecution.objects.create(
-                test_case_id=case_data['id'],
-                project_id=case_data['project_id'],
-                test_suite=self.test_suite,
-                execution_source='suite',
-                status='pending',  # 初始状态为 pending
-                engine=self.engine,
-                browser=self.browser,
-                headless=self.headless,
-                created_by=self.executed_by
-                # 注意：不设置 started_at，等用例实际开始执行时再设置
-            )
-            case_executions[case_data['id']] = case_execution
+        # 预先批量创建所有测试用例执行记录，之后的状态变化由写入器在后台线程批量写入
+        writer = self.create_case_writer(test_cases_data)
 
-        # 优化：整个测试套件共用一个浏览器实例，避免频繁启动/关闭
+        # 优化：用例从会话池获取浏览器会话，用例结束后重置会话并归还，避免频繁启动/关闭
         # 注意：Safari 不支持浏览器复用（会话管理问题），需要每个用例独立启动
         print(f"准备执行 {len(test_cases_data)} 个测试用例")
         
         # Safari 需要独立浏览器实例，其他浏览器可以复用
         use_browser_reuse = self.browser != 'safari'
+        pool = get_selenium_pool()
         
         if use_browser_reuse:
-            # 在套件开始时启动一次浏览器（Chrome/Firefox/Edge）
+            # 在套件开始时获取第一个会话（Chrome/Firefox/Edge），同时检查浏览器能否启动
             driver = None
             try:
-                driver = self.create_selenium_driver()
-                print(f"✓ 浏览器已启动（将复用于所有用例）\n")
+                driver = pool.acquire(self.browser, self.headless)
+                print(f"✓ 浏览器已就绪（会话池复用，用例之间重置会话）\n")
             except Exception as e:
                 print(f"✗ 浏览器启动失败: {str(e)}")
                 # 标记所有用例为失败
@@ -1306,12 +1342,8 @@ class TestExecutor:
                     failed += 1
                 # 更新执行记录并返回
                 for case_result in self.results:
-                    case_execution = case_executions[case_result['test_case_id']]
-                    case_execution.status = 'failed'
-                    case_execution.finished_at = timezone.now()
-                    case_execution.execution_time = 0
-                    case_execution.error_message = case_result['error']
-                    case_execution.save()
+                    writer.finish(case_result['test_case_id'], 'failed', error_message=case_result['error'])
+                writer.close()
                 duration = time.time() - start_time
                 self.update_execution_result('FAILED', 0, len(test_cases_data), 0, duration)
                 return
@@ -1327,18 +1359,18 @@ class TestExecutor:
             print(f"{'='*60}")
             
             # 记录用例实际开始执行时间
-            case_execution = case_executions[case_data['id']]
-            case_execution.started_at = timezone.now()
-            case_execution.status = 'running'
-            case_execution.save()
+            writer.start(case_data['id'])
 
-            # Safari：为每个用例启动新的浏览器
-            if not use_browser_reuse:
+            # Safari：为每个用例启动新的浏览器；其他浏览器从会话池获取会话
+            if driver is None:
                 try:
-                    driver = self.create_selenium_driver()
-                    print(f"✓ Safari 浏览器已启动")
+                    if use_browser_reuse:
+                        driver = pool.acquire(self.browser, self.headless)
+                    else:
+                        driver = self.create_selenium_driver()
+                        print(f"✓ Safari 浏览器已启动")
                 except Exception as e:
-                    print(f"✗ Safari 浏览器启动失败: {str(e)}")
+                    print(f"✗ 浏览器启动失败: {str(e)}")
                     self.results.append({
                         'test_case_id': case_data['id'],
                         'test_case_name': case_data['name'],
@@ -1351,40 +1383,23 @@ class TestExecutor:
                     })
                     failed += 1
                     # 更新执行记录
-                    case_execution.status = 'failed'
-                    case_execution.finished_at = timezone.now()
-                    case_execution.execution_time = (case_execution.finished_at - case_execution.started_at).total_seconds()
-                    case_execution.error_message = f"浏览器启动失败: {str(e)}"
-                    case_execution.save()
+                    writer.finish(case_data['id'], 'failed', error_message=f"浏览器启动失败: {str(e)}")
                     continue
 
+            # 用例执行出现异常时不再复用该会话
+            session_broken = False
             try:
-                # 在每个用例开始前清理浏览器状态（仅对复用浏览器的情况，且跳过第1个用例）
-                # 第1个用例浏览器刚启动，无需清理；从第2个用例开始才需要清理
-                if use_browser_reuse and i > 1:
-                    try:
-                        print(f"🧹 清理浏览器状态...")
-                        # 清除所有 Cookie
-                        driver.delete_all_cookies()
-                        # 清除 localStorage 和 sessionStorage
-                        driver.execute_script("window.localStorage.clear();")
-                        driver.execute_script("window.sessionStorage.clear();")
-                        print(f"✓ 浏览器状态已清理")
-                    except Exception as clean_error:
-                        print(f"⚠️  清理浏览器状态失败: {str(clean_error)}，继续执行...")
-                        pass  # 如果清理失败，继续执行
-                
                 # 导航到项目基础URL
-                if self.test_suite.project.base_url:
+                if self.project.base_url:
                     try:
-                        print(f"正在导航到: {self.test_suite.project.base_url}")
+                        print(f"正在导航到: {self.project.base_url}")
 
                         # 检测是否在Linux服务器环境
                         import platform
                         is_linux = platform.system() == 'Linux'
 
                         # 导航到URL
-                        driver.get(self.test_suite.project.base_url)
+                        driver.get(self.project.base_url)
 
                         # 等待页面基本加载完成
                         # 在服务器环境（特别是无头模式）需要更长的等待时间
@@ -1395,11 +1410,11 @@ class TestExecutor:
                         except:
                             pass  # 即使超时也继续执行
 
-                        # 额外等待，确保动态内容加载（Vue/React等SPA应用）
-                        extra_wait = 3 if is_linux else 2
-                        time.sleep(extra_wait)
+                        # 等待动态内容渲染稳定（Vue/React等SPA应用），不再固定等待2~3秒
+                        settle_start = time.time()
+                        self.waiter.settle_selenium(driver, 'navigation')
 
-                        print(f"✓ 成功导航到: {self.test_suite.project.base_url} (已等待页面加载完成，额外{extra_wait}秒)")
+                        print(f"✓ 成功导航到: {self.project.base_url} (页面稳定耗时 {time.time() - settle_start:.2f}秒)")
                     except Exception as e:
                         print(f"✗ 导航失败: {str(e)}")
                         # 导航失败，记录错误并继续下一个用例
@@ -1413,6 +1428,7 @@ class TestExecutor:
                             'end_time': datetime.now().isoformat(),
                             'screenshots': []
                         })
+                        writer.finish(case_data['id'], 'failed', error_message=f"导航到基础URL失败: {str(e)}")
                         failed += 1
                         continue
 
@@ -1421,19 +1437,10 @@ class TestExecutor:
                 self.results.append(case_result)
                 print(f"✓ 用例执行完成，状态: {case_result['status']}")
 
-                # 立即更新该用例的执行记录（包含准确的执行时间）
-                case_execution = case_executions[case_data['id']]
-                case_execution.status = case_result['status']
-                case_execution.finished_at = timezone.now()
-                case_execution.execution_time = (case_execution.finished_at - case_execution.started_at).total_seconds()
-                case_execution.execution_logs = json.dumps(case_result['steps'], ensure_ascii=False)
-                if case_result['error']:
-                    case_execution.error_message = case_result['error']
-                if case_result.get('screenshots'):
-                    case_execution.screenshots = case_result['screenshots']
-                case_execution.save()
+                # 记录该用例的执行结果（包含准确的执行时间），由写入器在后台写入数据库
+                execution_time = writer.finish(case_data['id'], case_result['status'], **self.case_result_fields(case_result))
                 
-                print(f"⏱️  执行时长: {case_execution.execution_time:.2f}秒")
+                print(f"⏱️  执行时长: {execution_time:.2f}秒")
 
                 if case_result['status'] == 'passed':
                     passed += 1
@@ -1458,16 +1465,16 @@ class TestExecutor:
                 failed += 1
                 
                 # 更新执行记录
-                case_execution = case_executions[case_data['id']]
-                case_execution.status = 'failed'
-                case_execution.finished_at = timezone.now()
-                case_execution.execution_time = (case_execution.finished_at - case_execution.started_at).total_seconds()
-                case_execution.error_message = f"用例执行异常: {str(e)}"
-                case_execution.save()
+                writer.finish(case_data['id'], 'failed', error_message=f"用例执行异常: {str(e)}")
+                session_broken = True
             
             finally:
+                if use_browser_reuse:
+                    # 重置会话后归还会话池，供下一个用例使用
+                    pool.release(driver, self.browser, self.headless, broken=session_broken)
+                    driver = None
                 # Safari：每个用例执行完都关闭浏览器
-                if not use_browser_reuse and driver:
+                elif driver:
                     try:
                         driver.quit()
                         print(f"✓ Safari 浏览器已关闭\n")
@@ -1475,206 +1482,17 @@ class TestExecutor:
                         print(f"✗ 关闭 Safari 浏览器时出错: {str(e)}\n")
                     driver = None
 
-        # 所有用例执行完毕后，关闭浏览器（仅对复用浏览器的情况）
-        if use_browser_reuse and driver:
-            try:
-                print(f"\n{'='*60}")
-                print(f"正在关闭浏览器...")
-                driver.quit()
-                print(f"✓ 浏览器已关闭")
-                print(f"{'='*60}\n")
-            except Exception as e:
-                print(f"✗ 关闭浏览器时出错: {str(e)}")
-
-        # 注意：每个用例的执行记录已在执行过程中实时更新，不需要在这里统一更新
+        # 写入剩余的用例执行状态
+        writer.close()
         
         duration = time.time() - start_time
         status = 'SUCCESS' if failed == 0 else 'FAILED'
         self.update_execution_result(status, passed, failed, skipped, duration)
 
     def create_selenium_driver(self):
-        """创建 Selenium WebDriver"""
-        from selenium.webdriver.chrome.service import Service as ChromeService
-        from selenium.webdriver.firefox.service import Service as FirefoxService
-        from selenium.webdriver.edge.service import Service as EdgeService
-        from webdriver_manager.chrome import ChromeDriverManager
-        from webdriver_manager.firefox import GeckoDriverManager
-        from webdriver_manager.microsoft import EdgeChromiumDriverManager
-        from apps.ui_automation.selenium_engine import SeleniumTestEngine
-        import os
-        
-        # 配置webdriver_manager使用本地缓存，避免每次下载
-        # 缓存目录：~/.wdm
-        os.environ['WDM_LOG_LEVEL'] = '0'  # 减少日志输出
-        os.environ['WDM_PRINT_FIRST_LINE'] = 'False'  # 不打印首行信息
-        
-        # 检查浏览器是否可用
-        is_available, error_msg = SeleniumTestEngine.check_browser_available(self.browser)
-        if not is_available:
-            # 提供安装建议
-            install_tips = {
-                'chrome': 'brew install --cask google-chrome',
-                'firefox': 'brew install --cask firefox',
-                'edge': 'brew install --cask microsoft-edge',
-            }
-            tip = install_tips.get(self.browser, '')
-            full_error = f"{error_msg}\n\n💡 安装命令（macOS）：{tip}" if tip else error_msg
-            raise Exception(full_error)
-        
-        if self.browser == 'chrome':
-            options = ChromeOptions()
-            if self.headless:
-                options.add_argument('--headless')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--window-size=1920,1080')
-            
-            # 禁用自动化特征检测
-            options.add_experimental_option('excludeSwitches', ['enable-automation', 'enable-logging'])
-            options.add_experimental_option('useAutomationExtension', False)
-            
-            # 禁用密码保存和泄露提醒（解决弹框遮挡元素的问题）
-            prefs = {
-                'credentials_enable_service': False,  # 禁用密码保存服务
-                'profile.password_manager_enabled': False,  # 禁用密码管理器
-                'profile.default_content_setting_values.notifications': 2,  # 禁用通知
-                'autofill.profile_enabled': False,  # 禁用自动填充
-                'profile.default_content_setting_values.automatic_downloads': 1,  # 允许自动下载
-                'password_manager_leak_detection': False,  # 禁用密码泄露检测（prefs级别）
-                'safebrowsing.enabled': False,  # 禁用安全浏览
-                'safebrowsing.disable_download_protection': True,
-                'intl.accept_languages': 'zh-CN,zh,en-US,en',  # 设置语言
-                'profile.exit_type': 'Normal',  # 避免"Chrome未正常关闭"提示
-            }
-            options.add_experimental_option('prefs', prefs)
-            
-            # 禁用密码泄露检查和其他安全警告（更全面的设置）
-            # 将所有 disable-features 合并为一个参数，避免覆盖
-            disabled_features = [
-                'PasswordLeakDetection',
-                'PrivacySandboxSettings4',
-                'TranslateUI',
-                'SavePasswordBubble',
-                'AutofillServerCommunication',
-                'CreditCardSave',
-                'HeaderUI',
-                'AccountConsistency',
-            ]
-            options.add_argument(f'--disable-features={",".join(disabled_features)}')
-            
-            options.add_argument('--disable-infobars')  # 禁用信息栏
-            options.add_argument('--disable-save-password-bubble')  # 禁用保存密码气泡
-            options.add_argument('--disable-password-generation')  # 禁用密码生成
-            options.add_argument('--disable-password-manager-reauthentication')  # 禁用密码管理器重新认证
-            options.add_argument('--disable-popup-blocking')  # 禁用弹窗拦截
-            options.add_argument('--disable-notifications')  # 禁用所有通知
-            options.add_argument('--no-default-browser-check') # 禁用默认浏览器检查
-            options.add_argument('--no-first-run') # 禁用首次运行界面
-            
-            # 针对密码弹窗的额外参数
-            options.add_argument('--password-store=basic')
-            options.add_argument('--use-mock-keychain')
-            options.add_argument('--disable-background-timer-throttling')
-            options.add_argument('--disable-renderer-backgrounding')
-            options.add_argument('--disable-device-discovery-notifications')
-            
-            # 使用缓存优先策略
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
-        elif self.browser == 'firefox':
-            options = FirefoxOptions()
-            if self.headless:
-                options.add_argument('--headless')
-            options.add_argument('--width=1920')
-            options.add_argument('--height=1080')
-            
-            # 性能优化：禁用不必要的功能加快启动速度
-            options.set_preference('browser.cache.disk.enable', False)
-            options.set_preference('browser.cache.memory.enable', True)
-            options.set_preference('browser.cache.offline.enable', False)
-            options.set_preference('network.http.use-cache', False)
-            options.set_preference('browser.startup.homepage', 'about:blank')
-            options.set_preference('startup.homepage_welcome_url', 'about:blank')
-            options.set_preference('startup.homepage_welcome_url.additional', 'about:blank')
-            # 禁用自动更新检查
-            options.set_preference('app.update.auto', False)
-            options.set_preference('app.update.enabled', False)
-            # 禁用扩展和插件检查
-            options.set_preference('extensions.update.enabled', False)
-            options.set_preference('extensions.update.autoUpdateDefault', False)
-            
-            # 使用缓存优先策略
-            service = FirefoxService(GeckoDriverManager().install())
-            driver = webdriver.Firefox(service=service, options=options)
-        elif self.browser == 'safari':
-            # Safari 不支持 headless 模式
-            # 需要先启用：sudo safaridriver --enable
-            # 并在 Safari 设置 -> 开发菜单中启用"允许远程自动化"
-            try:
-                driver = webdriver.Safari()
-                driver.set_window_size(1920, 1080)
-            except Exception as e:
-                error_msg = str(e)
-                if 'Could not create a session' in error_msg or 'InvalidSessionIdException' in error_msg:
-                    raise Exception(
-                        "Safari 远程自动化未启用。\n\n"
-                        "请按以下步骤配置：\n"
-                        "1. 在终端执行: sudo safaridriver --enable\n"
-                        "2. 打开 Safari → 设置 → 高级 → 勾选'在菜单栏中显示开发菜单'\n"
-                        "3. Safari 菜单栏 → 开发 → 勾选'允许远程自动化'\n\n"
-                        f"原始错误: {error_msg}"
-                    )
-                raise
-        elif self.browser == 'edge':
-            options = EdgeOptions()
-            if self.headless:
-                options.add_argument('--headless')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--window-size=1920,1080')
-            
-            # 使用缓存优先策略
-            service = EdgeService(EdgeChromiumDriverManager().install())
-            driver = webdriver.Edge(service=service, options=options)
-        else:
-            # 默认使用Chrome
-            options = ChromeOptions()
-            if self.headless:
-                options.add_argument('--headless')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--window-size=1920,1080')
-            
-            # 禁用自动化特征检测
-            options.add_experimental_option('excludeSwitches', ['enable-automation'])
-            options.add_experimental_option('useAutomationExtension', False)
-            
-            # 禁用密码保存和泄露提醒（解决弹框遮挡元素的问题）
-            prefs = {
-                'credentials_enable_service': False,  # 禁用密码保存服务
-                'profile.password_manager_enabled': False,  # 禁用密码管理器
-                'profile.default_content_setting_values.notifications': 2,  # 禁用通知
-                'autofill.profile_enabled': False,  # 禁用自动填充
-                'profile.default_content_setting_values.automatic_downloads': 1,  # 允许自动下载
-            }
-            options.add_experimental_option('prefs', prefs)
-            
-            # 禁用密码泄露检查和其他安全警告
-            options.add_argument('--disable-features=PasswordLeakDetection')  # 禁用密码泄露检测
-            options.add_argument('--disable-features=PrivacySandboxSettings4')  # 禁用隐私沙盒
-            options.add_argument('--disable-features=TranslateUI')  # 禁用翻译提示
-            options.add_argument('--disable-infobars')  # 禁用信息栏
-            
-            # 使用缓存优先策略
-            service = ChromeService(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
-
-        return driver
+        """创建 Selenium WebDriver（浏览器可用性检查、驱动路径和启动参数使用进程内缓存）"""
+        from .selenium_pool import create_driver
+        return create_driver(self.browser, self.headless)
 
     def execute_test_case_selenium_no_db(self, driver, case_data):
         """使用 Selenium 执行单个测试用例（不访问数据库）
@@ -1699,14 +1517,10 @@ class TestExecutor:
                 step_result = self.execute_step_selenium(driver, step_data)
                 result['steps'].append(step_result)
                 
-                # 步骤执行完后添加短暂延迟，确保页面状态稳定
-                # 特别是点击操作后，可能触发动画、下拉框展开等
+                # 步骤执行完后等待页面稳定（动画、下拉框展开、请求返回等），稳定后立即继续
                 if step_result['success'] and step_data['action_type'] in ['click', 'fill', 'hover']:
-                    # 点击操作后等待更长时间（下拉框展开动画）
-                    if step_data['action_type'] == 'click':
-                        time.sleep(0.8)  # 等待800ms，确保下拉框完全展开
-                    else:
-                        time.sleep(0.3)  # 其他操作等待300ms
+                    self.waiter.settle_selenium(driver, step_data['action_type'], self.step_timer)
+                    step_result['timing'] = self.step_timer.breakdown(step_data['action_type'])
 
                 # 如果步骤失败,捕获失败截图
                 if not step_result['success']:
@@ -1714,19 +1528,19 @@ class TestExecutor:
                     # 使用step的error信息作为case的error
                     result['error'] = step_result.get('error', f"步骤 {step_data['step_number']} 执行失败")
 
-                    # 捕获失败截图
+                    # 捕获失败截图，耗时计入失败步骤的截图阶段
                     try:
-                        import base64
-                        screenshot_bytes = driver.get_screenshot_as_png()
-                        screenshot_base64 = base64.b64encode(screenshot_bytes).decode()
-                        result['screenshots'].append({
-                            'url': f'data:image/png;base64,{screenshot_base64}',
-                            'description': f'步骤 {step_data["step_number"]} 失败截图: {step_data.get("description", "")}',
-                            'step_number': step_data['step_number'],
-                            'timestamp': datetime.now().isoformat()
-                        })
+                        with self.step_timer.waiting('screenshot'):
+                            screenshot_bytes = driver.get_screenshot_as_png()
+                        result['screenshots'].append(screenshot_entry(
+                            screenshot_bytes,
+                            description=f'步骤 {step_data["step_number"]} 失败截图: {step_data.get("description", "")}',
+                            step_number=step_data['step_number'],
+                            timestamp=datetime.now().isoformat()
+                        ))
                     except Exception as screenshot_error:
                         print(f"捕获失败截图失败: {str(screenshot_error)}")
+                    step_result['timing'] = self.step_timer.breakdown(step_data['action_type'])
 
                     break
 
@@ -1736,15 +1550,13 @@ class TestExecutor:
 
             # 捕获异常截图
             try:
-                import base64
                 screenshot_bytes = driver.get_screenshot_as_png()
-                screenshot_base64 = base64.b64encode(screenshot_bytes).decode()
-                result['screenshots'].append({
-                    'url': f'data:image/png;base64,{screenshot_base64}',
-                    'description': f'异常截图: {str(e)}',
-                    'step_number': None,
-                    'timestamp': datetime.now().isoformat()
-                })
+                result['screenshots'].append(screenshot_entry(
+                    screenshot_bytes,
+                    description=f'异常截图: {str(e)}',
+                    step_number=None,
+                    timestamp=datetime.now().isoformat()
+                ))
             except Exception as screenshot_error:
                 print(f"捕获异常截图失败: {str(screenshot_error)}")
 
@@ -1809,6 +1621,36 @@ class TestExecutor:
         result['end_time'] = datetime.now().isoformat()
         return result
 
+    def selenium_locator(self, locator_strategy, locator_value):
+        """根据定位策略构造 Selenium 定位器，返回 (By, 定位表达式)"""
+        locator_strategy = (locator_strategy or 'css').lower()
+
+        # 自动修正定位策略：如果值以 // 开头，强制使用 XPath
+        if locator_value.startswith('//') or locator_value.startswith('xpath='):
+            locator_strategy = 'xpath'
+            if locator_value.startswith('xpath='):
+                locator_value = locator_value[6:]
+
+        if locator_strategy in ['css', 'css selector']:
+            by = By.CSS_SELECTOR
+        elif locator_strategy == 'xpath':
+            by = By.XPATH
+        elif locator_strategy == 'id':
+            by = By.ID
+        elif locator_strategy == 'name':
+            by = By.NAME
+        elif locator_strategy in ['class', 'class name']:
+            by = By.CLASS_NAME
+        elif locator_strategy in ['tag', 'tag name']:
+            by = By.TAG_NAME
+        elif locator_strategy == 'link text':
+            by = By.LINK_TEXT
+        elif locator_strategy == 'partial link text':
+            by = By.PARTIAL_LINK_TEXT
+        else:
+            by = By.CSS_SELECTOR
+        return by, locator_value
+
     def execute_step_selenium(self, driver, step_data):
         """使用 Selenium 执行单个步骤
 
@@ -1818,11 +1660,13 @@ class TestExecutor:
         """
         from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
         start_time = time.time()
+        self.step_timer = timer = StepTimer()
 
         step_result = {
             'step_number': step_data['step_number'],
             'action_type': step_data['action_type'],
             'description': step_data['description'],
+            'element_id': step_data['element']['id'] if step_data['element'] else None,
             'success': False,
             'error': None
         }
@@ -1830,38 +1674,19 @@ class TestExecutor:
         try:
             if step_data['element']:
                 element = step_data['element']
-                locator_value = element['locator_value']
-                locator_strategy = element['locator_strategy'].lower()
                 element_name = element.get('name', '未知元素')
 
                 # 根据定位策略获取元素
                 wait = WebDriverWait(driver, step_data['wait_time'] / 1000)
 
-                # 自动修正定位策略：如果值以 // 开头，强制使用 XPath
-                if locator_value.startswith('//') or locator_value.startswith('xpath='):
-                    locator_strategy = 'xpath'
-                    if locator_value.startswith('xpath='):
-                        locator_value = locator_value[6:]
-
-                # 根据定位策略构造 Playwright 选择器
-                if locator_strategy in ['css', 'css selector']:
-                    by = By.CSS_SELECTOR
-                elif locator_strategy == 'xpath':
-                    by = By.XPATH
-                elif locator_strategy == 'id':
-                    by = By.ID
-                elif locator_strategy == 'name':
-                    by = By.NAME
-                elif locator_strategy in ['class', 'class name']:
-                    by = By.CLASS_NAME
-                elif locator_strategy in ['tag', 'tag name']:
-                    by = By.TAG_NAME
-                elif locator_strategy == 'link text':
-                    by = By.LINK_TEXT
-                elif locator_strategy == 'partial link text':
-                    by = By.PARTIAL_LINK_TEXT
-                else:
-                    by = By.CSS_SELECTOR
+                # 有备用定位器时探测所有候选定位器，使用最先匹配到元素的定位器
+                with timer.waiting('locator'):
+                    locator_strategy, locator_value, resolution = resolve_locator(
+                        element, lambda strategy, value: bool(driver.find_elements(*self.selenium_locator(strategy, value)))
+                    )
+                if resolution:
+                    step_result['locator'] = resolution
+                by, locator_value = self.selenium_locator(locator_strategy, locator_value)
 
                 # 根据操作类型选择合适的等待条件
                 if step_data['action_type'] == 'click':
@@ -1881,37 +1706,40 @@ class TestExecutor:
                         # 下拉框选项：特殊处理，遍历所有匹配元素找到可见的那个
                         print(f"  检测到下拉框选项（定位器匹配），尝试查找可见元素...")
                         
-                        # 自定义等待逻辑：轮询查找可见元素
+                        # 自定义等待逻辑：轮询查找可见元素（下拉框展开后立即继续）
                         end_time = time.time() + (step_data['wait_time'] / 1000)
                         found_visible = False
                         
-                        while time.time() < end_time:
-                            try:
-                                # 查找所有匹配元素
-                                elements = driver.find_elements(by, locator_value)
-                                for el in elements:
-                                    if el.is_displayed():
-                                        element_obj = el
-                                        found_visible = True
-                                        print(f"  ✓ 找到可见的下拉框选项")
-                                        break
-                                
-                                if found_visible:
-                                    break
+                        with timer.waiting('dropdown'):
+                            while time.time() < end_time:
+                                try:
+                                    # 查找所有匹配元素
+                                    elements = driver.find_elements(by, locator_value)
+                                    for el in elements:
+                                        if el.is_displayed():
+                                            element_obj = el
+                                            found_visible = True
+                                            print(f"  ✓ 找到可见的下拉框选项")
+                                            break
                                     
-                                time.sleep(0.5)
-                            except:
-                                time.sleep(0.5)
+                                    if found_visible:
+                                        break
+                                        
+                                    time.sleep(0.1)
+                                except:
+                                    time.sleep(0.1)
                         
-                        if not found_visible:
-                            # 如果没找到可见元素，回退到默认行为（可能会抛出超时）
-                            print(f"  ⚠️ 未找到可见的下拉框选项，尝试默认等待...")
-                            element_obj = wait.until(EC.visibility_of_element_located((by, locator_value)))
+                            if not found_visible:
+                                # 如果没找到可见元素，回退到默认行为（可能会抛出超时）
+                                print(f"  ⚠️ 未找到可见的下拉框选项，尝试默认等待...")
+                                element_obj = wait.until(EC.visibility_of_element_located((by, locator_value)))
                     else:
-                        element_obj = wait.until(EC.element_to_be_clickable((by, locator_value)))
+                        with timer.waiting('actionable'):
+                            element_obj = wait.until(EC.element_to_be_clickable((by, locator_value)))
                 else:
                     # 其他操作：等待元素出现
-                    element_obj = wait.until(EC.presence_of_element_located((by, locator_value)))
+                    with timer.waiting('actionable'):
+                        element_obj = wait.until(EC.presence_of_element_located((by, locator_value)))
 
                 # 执行操作（添加 stale element 重试机制）
                 max_retries = 3
@@ -1922,24 +1750,21 @@ class TestExecutor:
                             # 每次重试都重新查找元素（解决stale element问题）
                             if attempt > 0:
                                 print(f"⚠️  重新查找元素（Stale Element 重试）... (尝试 {attempt + 1}/{max_retries})")
-                                # 增加等待时间，让页面 DOM 稳定（对于 Vue/React 应用很重要）
-                                wait_time = 1.0 if attempt == 1 else 1.5  # 第一次重试等1秒，第二次重试等1.5秒
-                                print(f"等待 {wait_time}秒 让页面稳定...")
-                                time.sleep(wait_time)
+                                # 等待页面 DOM 稳定后再重新定位（对于 Vue/React 应用很重要）
+                                self.waiter.settle_selenium(driver, 'click', timer)
                                 # 重新定位元素
-                                if is_dropdown_option:
-                                    element_obj = wait.until(EC.visibility_of_element_located((by, locator_value)))
-                                else:
-                                    element_obj = wait.until(EC.element_to_be_clickable((by, locator_value)))
-                                # 等待元素状态稳定
-                                time.sleep(0.3)
+                                with timer.waiting('actionable'):
+                                    if is_dropdown_option:
+                                        element_obj = wait.until(EC.visibility_of_element_located((by, locator_value)))
+                                    else:
+                                        element_obj = wait.until(EC.element_to_be_clickable((by, locator_value)))
                                 print(f"✓ 元素重新定位成功")
                             
                             # 对于下拉框选项，先滚动到可视区域
                             if 'dropdown' in locator_value.lower() or 'el-select' in locator_value.lower() or '下拉' in element_name or '选项' in element_name:
                                 try:
                                     driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element_obj)
-                                    time.sleep(0.3)  # 等待滚动完成
+                                    self.waiter.settle_selenium(driver, 'hover', timer)  # 等待滚动完成
                                 except:
                                     pass
                             
@@ -1975,7 +1800,7 @@ class TestExecutor:
                                     break
                                 except:
                                     if attempt < max_retries - 1:
-                                        time.sleep(0.5)
+                                        self.waiter.settle_selenium(driver, 'click', timer)
                                         # 重新定位
                                         if 'dropdown' in locator_value.lower() or 'el-select' in locator_value.lower():
                                             element_obj = wait.until(EC.visibility_of_element_located((by, locator_value)))
@@ -2005,12 +1830,10 @@ class TestExecutor:
                         except StaleElementReferenceException:
                             if attempt < max_retries - 1:
                                 print(f"⚠️  元素过期（Stale Element），正在重试... (尝试 {attempt + 2}/{max_retries})")
-                                # 增加等待时间，让页面 DOM 稳定
-                                wait_time = 1.0 if attempt == 0 else 1.5
-                                print(f"等待 {wait_time}秒 让页面稳定...")
-                                time.sleep(wait_time)
-                                element_obj = wait.until(EC.presence_of_element_located((by, locator_value)))
-                                time.sleep(0.3)  # 确保元素状态稳定
+                                # 等待页面 DOM 稳定后再重新定位
+                                self.waiter.settle_selenium(driver, 'click', timer)
+                                with timer.waiting('actionable'):
+                                    element_obj = wait.until(EC.presence_of_element_located((by, locator_value)))
                                 print(f"✓ 元素重新定位成功")
                             else:
                                 raise
@@ -2025,12 +1848,10 @@ class TestExecutor:
                         except StaleElementReferenceException:
                             if attempt < max_retries - 1:
                                 print(f"⚠️  元素过期（Stale Element），正在重试... (尝试 {attempt + 2}/{max_retries})")
-                                # 增加等待时间，让页面 DOM 稳定
-                                wait_time = 1.0 if attempt == 0 else 1.5
-                                print(f"等待 {wait_time}秒 让页面稳定...")
-                                time.sleep(wait_time)
-                                element_obj = wait.until(EC.presence_of_element_located((by, locator_value)))
-                                time.sleep(0.3)  # 确保元素状态稳定
+                                # 等待页面 DOM 稳定后再重新定位
+                                self.waiter.settle_selenium(driver, 'click', timer)
+                                with timer.waiting('actionable'):
+                                    element_obj = wait.until(EC.presence_of_element_located((by, locator_value)))
                                 print(f"✓ 元素重新定位成功")
                             else:
                                 raise
@@ -2045,12 +1866,10 @@ class TestExecutor:
                         except StaleElementReferenceException:
                             if attempt < max_retries - 1:
                                 print(f"⚠️  元素过期（Stale Element），正在重试... (尝试 {attempt + 2}/{max_retries})")
-                                # 增加等待时间，让页面 DOM 稳定
-                                wait_time = 1.0 if attempt == 0 else 1.5
-                                print(f"等待 {wait_time}秒 让页面稳定...")
-                                time.sleep(wait_time)
-                                element_obj = wait.until(EC.presence_of_element_located((by, locator_value)))
-                                time.sleep(0.3)  # 确保元素状态稳定
+                                # 等待页面 DOM 稳定后再重新定位
+                                self.waiter.settle_selenium(driver, 'click', timer)
+                                with timer.waiting('actionable'):
+                                    element_obj = wait.until(EC.presence_of_element_located((by, locator_value)))
                                 print(f"✓ 元素重新定位成功")
                             else:
                                 raise
@@ -2097,7 +1916,8 @@ class TestExecutor:
 
             else:
                 if step_data['action_type'] == 'wait':
-                    time.sleep(step_data['wait_time'] / 1000)
+                    with timer.waiting('fixed'):
+                        time.sleep(step_data['wait_time'] / 1000)
                     step_result['success'] = True
                 
                 elif step_data['action_type'] == 'switchTab':
@@ -2305,6 +2125,7 @@ class TestExecutor:
             print(f"   异常类型: {error_type}")
             print(f"   错误信息: {error_msg[:500]}")  # 限制长度避免刷屏
 
+        step_result['timing'] = timer.breakdown(step_data['action_type'])
         return step_result
 
     def execute_test_suite_ai(self, task_description):
@@ -2428,3 +2249,70 @@ class TestExecutor:
                 'error': error_msg,
                 'duration': round(duration, 2)
             }
+
+
+class ShardExecutor(TestExecutor):
+    """套件分片执行器：执行套件中的部分用例，统计结果交给父执行器合并，不单独更新执行记录"""
+
+    def __init__(self, parent, test_cases, index):
+        super().__init__(
+            test_suite=parent.test_suite,
+            engine=parent.engine,
+            browser=parent.browser,
+            headless=parent.headless,
+            executed_by=parent.executed_by,
+            # 浏览器池只能在创建它的线程中使用，只有在当前线程执行的第一个分片复用调用方的池
+            browser_pool=parent.browser_pool if index == 0 else None,
+            storage_state=parent.storage_state,
+            workers=1
+        )
+        self.execution = parent.execution
+        self.plan = parent.plan
+        self.test_cases = test_cases
+        self.index = index
+        self.summary = {'passed': 0, 'failed': 0, 'skipped': 0, 'duration': 0, 'error_msg': ''}
+        # 分片由执行池线程或父执行器所在线程领取，只执行一次
+        self.claimed = threading.Lock()
+        self.finished = threading.Event()
+
+    def update_execution_result(self, status, passed=0, failed=0, skipped=0, duration=0, error_msg=''):
+        self.summary = {
+            'passed': passed,
+            'failed': failed,
+            'skipped': skipped,
+            'duration': duration,
+            'error_msg': error_msg,
+        }
+
+    def run_once(self):
+        """分片尚未被领取时在当前线程执行，已被其他线程领取时直接返回"""
+        if not self.claimed.acquire(blocking=False):
+            return
+        try:
+            self.run_shard()
+        finally:
+            self.finished.set()
+
+    def run_shard(self):
+        start_time = time.time()
+        try:
+            if self.engine == 'playwright':
+                self.run_with_playwright()
+            else:
+                self.run_with_selenium()
+        except Exception as e:
+            print(f"分片 {self.index + 1} 执行失败: {str(e)}")
+            # 未产生结果的用例计为失败
+            passed = sum(1 for result in self.results if result['status'] == 'passed')
+            skipped = sum(1 for result in self.results if result['status'] not in ('passed', 'failed'))
+            self.update_execution_result(
+                status='FAILED',
+                passed=passed,
+                failed=len(self.test_cases) - passed - skipped,
+                skipped=skipped,
+                duration=time.time() - start_time,
+                error_msg=f"执行失败: {str(e)}"
+            )
+        finally:
+            if self.index:
+                connection.close()
@@ -0,0 +1,288 @@
+import json
+import queue
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+
+from .execution_writer import CaseExecutionWriter
+from .models import (
+    StepTiming, UiCaseBatch, TestCase as UiTestCase, TestCaseExecution, TestExecution, TestSuite, TestSuiteTestCase, UiProject
+)
+from .sharding import DEFAULT_CASE_DURATION, estimate_case_durations, shard_test_cases
+from .test_executor import ShardExecutor, TestExecutor
+
+
+def make_cases(*ids):
+    return [SimpleNamespace(id=case_id) for case_id in ids]
+
+
+def case_ids(shards):
+    return [[test_case.id for test_case in shard] for shard in shards]
+
+
+class ShardTestCasesTestCase(SimpleTestCase):
+    def test_balance_and_order(self):
+        """测试按预计时长从长到短分配到总时长最小的分片，分片内保持套件中的原始顺序"""
+        cases = make_cases(1, 2, 3, 4, 5, 6)
+        durations = {1: 10, 2: 60, 3: 20, 4: 30, 5: 40, 6: 50}
+        shards = shard_test_cases(cases, 3, durations)
+        self.assertEqual(case_ids(shards), [[1, 2], [3, 6], [4, 5]])
+        self.assertEqual([sum(durations[case_id] for case_id in shard) for shard in case_ids(shards)], [70, 70, 70])
+
+    def test_no_empty_shards(self):
+        """测试分片数多于用例数时不产生空分片"""
+        shards = shard_test_cases(make_cases(1, 2), 5, {1: 1, 2: 1})
+        self.assertEqual(case_ids(shards), [[1], [2]])
+        self.assertEqual(case_ids(shard_test_cases(make_cases(1, 2), 0, {})), [[1, 2]])
+
+    def test_missing_duration(self):
+        """测试没有预计时长的用例按默认时长分配"""
+        durations = {1: DEFAULT_CASE_DURATION * 2}
+        shards = shard_test_cases(make_cases(1, 2, 3), 2, durations)
+        self.assertEqual(case_ids(shards), [[1], [2, 3]])
+
+
+class EstimateCaseDurationsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='shard')
+        self.project = UiProject.objects.create(name='p', base_url='http://example.com', owner=self.user)
+        self.cases = [
+            UiTestCase.objects.create(name=f'case{i}', project=self.project, created_by=self.user) for i in range(4)
+        ]
+
+    def record(self, test_case, execution_time, status='passed', days=0):
+        TestCaseExecution.objects.create(
+            test_case=test_case, project=self.project, created_by=self.user, status=status,
+            execution_time=execution_time, finished_at=timezone.now() - timedelta(days=days)
+        )
+
+    def test_history_and_median(self):
+        """测试按最近的执行时长求平均，没有历史记录的用例使用中位数"""
+        first, second, third, fourth = self.cases
+        self.record(first, 10)
+        self.record(first, 20)
+        self.record(second, 30, status='failed')
+        self.record(third, 40)
+        # 执行出错和超出时间范围的记录不参与估算
+        self.record(fourth, 500, status='error')
+        self.record(fourth, 500, days=60)
+
+        durations = estimate_case_durations([case.id for case in self.cases])
+        self.assertEqual(durations, {first.id: 15, second.id: 30, third.id: 40, fourth.id: 30})
+
+    def test_no_history(self):
+        """测试没有任何历史记录时使用 DEFAULT_CASE_DURATION"""
+        durations = estimate_case_durations([case.id for case in self.cases])
+        self.assertEqual(set(durations.values()), {DEFAULT_CASE_DURATION})
+
+
+class ImmediatePool:
+    """立即在新线程中执行提交的任务"""
+
+    def submit(self, fn):
+        threading.Thread(target=fn).start()
+
+
+class FullPool:
+    def submit(self, fn):
+        raise queue.Full
+
+
+class IdlePool:
+    """接受任务但执行池线程一直没有空闲"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append(fn)
+
+
+class RunShardedTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='shard')
+        self.project = UiProject.objects.create(name='p', base_url='http://example.com', owner=self.user)
+        self.suite = TestSuite.objects.create(project=self.project, name='suite')
+        self.cases = []
+        for i in range(5):
+            test_case = UiTestCase.objects.create(name=f'case{i}', project=self.project, created_by=self.user)
+            TestSuiteTestCase.objects.create(test_suite=self.suite, test_case=test_case, order=i)
+            self.cases.append(test_case)
+        self.failing = {self.cases[3].id}
+        self.runs = []
+        self.lock = threading.Lock()
+
+    def fake_run(self, executor):
+        """代替浏览器执行分片，按用例生成结果"""
+        with self.lock:
+            self.runs.append(executor.index)
+        executor.results = [{
+            'test_case_id': test_case.id,
+            'status': 'failed' if test_case.id in self.failing else 'passed',
+        } for test_case in executor.test_cases]
+        failed = sum(1 for result in executor.results if result['status'] == 'failed')
+        executor.update_execution_result('FAILED' if failed else 'SUCCESS', len(executor.results) - failed, failed)
+
+    def run_suite(self, pool):
+        executor = TestExecutor(self.suite, workers=3, executed_by=self.user)
+        executor.create_execution_record()
+        executor.get_test_cases()
+        fake_run = self.fake_run
+        with mock.patch.object(TestExecutor, 'load_execution_plan'), \
+                mock.patch.object(ShardExecutor, 'run_with_playwright', lambda shard: fake_run(shard)), \
+                mock.patch('apps.core.workers.get_worker_pool', return_value=pool):
+            executor.run_sharded()
+        return TestExecution.objects.get(pk=executor.execution.pk)
+
+    def assert_merged(self, execution):
+        self.assertEqual(sorted(self.runs), [0, 1, 2])
+        self.assertEqual(
+            [result['test_case_id'] for result in execution.result_data['test_cases']],
+            [test_case.id for test_case in self.cases]
+        )
+        self.assertEqual((execution.status, execution.passed_cases, execution.failed_cases), ('FAILED', 4, 1))
+        self.assertEqual(
+            sorted(case_id for shard in execution.result_data['shards'] for case_id in shard['test_case_ids']),
+            sorted(test_case.id for test_case in self.cases)
+        )
+
+    def test_merge_in_suite_order(self):
+        """测试各分片并行执行后按套件中的原始顺序合并结果"""
+        self.assert_merged(self.run_suite(ImmediatePool()))
+
+    def test_queue_full(self):
+        """测试执行池队列已满时由当前线程依次执行其他分片"""
+        self.assert_merged(self.run_suite(FullPool()))
+
+    def test_queued_shard_not_started(self):
+        """测试已提交但尚未开始的分片由当前线程领取，执行池之后再执行时直接返回"""
+        pool = IdlePool()
+        self.assert_merged(self.run_suite(pool))
+        self.assertEqual(len(pool.jobs), 2)
+        for job in pool.jobs:
+            job()
+        self.assertEqual(sorted(self.runs), [0, 1, 2])
+
+
+class CaseExecutionWriterTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='writer')
+        self.project = UiProject.objects.create(name='p', base_url='http://example.com', owner=self.user)
+        self.case_ids = [
+            UiTestCase.objects.create(name=f'case{i}', project=self.project, created_by=self.user).id for i in range(4)
+        ]
+        # 后台写入线程使用独立的数据库连接，测试中不启动，由 flush()/close() 写入
+        patcher = mock.patch.object(CaseExecutionWriter, '_start_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.writer = CaseExecutionWriter({'project_id': self.project.id, 'created_by': self.user})
+        self.writer.create_pending(self.case_ids)
+
+    def execution(self, case_id):
+        return TestCaseExecution.objects.get(pk=self.writer.executions[case_id])
+
+    def test_coalesce_and_group(self):
+        """测试开始和结束合并为一次写入，按变更字段分组批量更新"""
+        self.assertEqual(TestCaseExecution.objects.filter(status='pending').count(), 4)
+        passed, failed, running, also_passed = self.case_ids
+        steps = [{'step_number': 1, 'action_type': 'click', 'success': True, 'timing': {'spans': {'wait': 20, 'action': 5}}}]
+        for case_id in [passed, also_passed]:
+            self.writer.start(case_id)
+            self.writer.finish(case_id, 'passed', execution_logs=steps)
+        self.writer.start(failed)
+        self.writer.finish(failed, 'failed', execution_logs=[], error_message='元素未找到')
+        self.writer.start(running)
+
+        bulk_update = TestCaseExecution.objects.bulk_update
+        with mock.patch.object(TestCaseExecution.objects, 'bulk_update', wraps=bulk_update) as patched:
+            self.writer.close()
+        self.assertEqual(sorted(len(call.args[0]) for call in patched.call_args_list), [1, 1, 2])
+        self.assertEqual((self.writer.flush_count, self.writer.written_count), (1, 4))
+
+        execution = self.execution(passed)
+        self.assertEqual(execution.status, 'passed')
+        self.assertIsNotNone(execution.started_at)
+        self.assertGreaterEqual(execution.finished_at, execution.started_at)
+        self.assertEqual(json.loads(execution.execution_logs), steps)
+        execution = self.execution(failed)
+        self.assertEqual((execution.status, execution.error_message), ('failed', '元素未找到'))
+        execution = self.execution(running)
+        self.assertEqual(execution.status, 'running')
+        self.assertIsNone(execution.finished_at)
+        self.assertEqual(
+            sorted(StepTiming.objects.values_list('test_case_id', 'wait_ms', 'total_ms')),
+            sorted([(passed, 20, 25), (also_passed, 20, 25)])
+        )
+
+    def test_retry_after_failed_flush(self):
+        """测试写入失败的变化放回，之后记录的更新的变化优先"""
+        case_id = self.case_ids[0]
+        started_at = self.writer.start(case_id)
+
+        def fail(*args, **kwargs):
+            # 写入期间用例结束
+            self.writer.finish(case_id, 'passed')
+            raise OperationalError('database is locked')
+
+        with mock.patch.object(TestCaseExecution.objects, 'bulk_update', side_effect=fail):
+            with self.assertRaises(OperationalError):
+                self.writer.flush()
+        self.assertEqual(self.writer.changes[case_id]['status'], 'passed')
+        self.assertEqual(self.execution(case_id).status, 'pending')
+
+        self.writer.close()
+        execution = self.execution(case_id)
+        self.assertEqual((execution.status, execution.started_at), ('passed', started_at))
+        self.assertIsNotNone(execution.finished_at)
+        self.assertEqual(self.writer.changes, {})
+
+
+class BatchRunViewTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='batch')
+        self.project = UiProject.objects.create(name='p', base_url='http://example.com', owner=self.user)
+        self.cases = [
+            UiTestCase.objects.create(name=f'case{i}', project=self.project, created_by=self.user) for i in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # 只记录提交的分片，不实际启动浏览器
+        self.pool = IdlePool()
+        self.pool.workers, self.pool.max_queue, self.pool.queue = 1, 10, queue.Queue()
+        patcher = mock.patch('apps.core.workers.get_worker_pool', return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, data):
+        return self.client.post('/api/ui-automation/test-cases/batch-run/', data, format='json')
+
+    def test_invalid_ids(self):
+        """测试用例ID或项目ID不是整数时返回 400"""
+        for data in [
+            {'test_case_ids': ['abc']},
+            {'test_case_ids': [self.cases[0].id, None]},
+            {'test_case_ids': 'abc'},
+            {'test_case_ids': [self.cases[0].id], 'project_id': 'x'},
+        ]:
+            response = self.post(data)
+            self.assertEqual(response.status_code, 400, data)
+        self.assertEqual(self.post({'test_case_ids': []}).status_code, 400)
+        self.assertFalse(UiCaseBatch.objects.exists())
+
+    def test_submit(self):
+        """测试按提交顺序执行，字符串形式的ID按整数处理，返回不存在的ID"""
+        first, second = self.cases
+        response = self.post({'test_case_ids': [str(second.id), first.id, second.id, 99999]})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['missing_ids'], [99999])
+        record = UiCaseBatch.objects.get(batch_id=response.data['batch_id'])
+        self.assertEqual(record.test_case_ids, [second.id, first.id])
+        self.assertEqual(len(self.pool.jobs), 1)
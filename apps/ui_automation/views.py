@@ -1,8 +1,9 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
@@ -37,12 +38,16 @@ from .serializers import (
     PageObjectSerializer, PageObjectCreateSerializer, PageObjectElementSerializer,
     ScriptStepSerializer, ScriptElementUsageSerializer,
     ScriptAnalysisSerializer, ElementValidationSerializer, CodeGenerationSerializer,
-    TestCaseSerializer, TestCaseStepSerializer, TestCaseExecutionSerializer, TestCaseRunSerializer,
+    TestCaseSerializer, TestCaseStepSerializer, TestCaseExecutionSerializer, TestCaseExecutionListSerializer,
+    TestCaseRunSerializer,
     OperationRecordSerializer,
     UiScheduledTaskSerializer, UiNotificationLogSerializer, UiTaskNotificationSettingSerializer,
     AICaseSerializer, AIExecutionRecordSerializer
 )
 from .operation_logger import log_operation
+from .screenshot_store import externalize_screenshots, get_thumbnail
+from .smart_wait import StepTimer
+from .step_timings import record_execution_timings
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -775,14 +780,29 @@ class TestSuiteViewSet(viewsets.ModelViewSet):
         engine = request.data.get('engine', 'playwright')
         browser = request.data.get('browser', 'chrome')
         headless = request.data.get('headless', False)
+        # 并行分片数，不传时使用 settings.UI_AUTOMATION_SUITE_WORKERS
+        workers = request.data.get('workers')
+        if workers not in (None, ''):
+            try:
+                workers = int(workers)
+            except (TypeError, ValueError):
+                return Response({'error': 'workers 必须是正整数'}, status=status.HTTP_400_BAD_REQUEST)
+            if workers < 1:
+                return Response({'error': 'workers 必须是正整数'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            workers = getattr(settings, 'UI_AUTOMATION_SUITE_WORKERS', 1)
+        # 每个分片占用一个浏览器，不超过 UI_AUTOMATION_SUITE_MAX_WORKERS
+        workers = min(workers, getattr(settings, 'UI_AUTOMATION_SUITE_MAX_WORKERS', 4))
 
         # 更新套件执行状态为运行中
+        previous_status = test_suite.execution_status
         test_suite.execution_status = 'running'
         test_suite.save()
 
         try:
-            # 在后台线程中执行测试
-            import threading
+            # 在 UI 执行池中执行测试，与定时任务共用浏览器并发数
+            import queue
+            from apps.core.workers import get_worker_pool
             from .test_executor import TestExecutor
 
             def run_test():
@@ -791,14 +811,19 @@ class TestSuiteViewSet(viewsets.ModelViewSet):
                     engine=engine,
                     browser=browser,
                     headless=headless,
-                    executed_by=request.user
+                    executed_by=request.user,
+                    workers=workers
                 )
                 executor.run()
 
-            # 启动后台线程执行测试
-            thread = threading.Thread(target=run_test)
-            thread.daemon = True
-            thread.start()
+            try:
+                get_worker_pool('ui').submit(run_test)
+            except queue.Full as e:
+                test_suite.execution_status = previous_status
+                test_suite.save()
+                return Response({
+                    'error': f'UI自动化{e}，请稍后重试'
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
             # 记录运行操作
             log_operation('run', 'suite', test_suite.id, test_suite.name, request.user)
@@ -809,7 +834,8 @@ class TestSuiteViewSet(viewsets.ModelViewSet):
                 'test_case_count': test_case_count,
                 'engine': engine,
                 'browser': browser,
-                'headless': headless
+                'headless': headless,
+                'workers': workers
             }, status=status.HTTP_200_OK)
         except Exception as e:
             test_suite.execution_status = 'failed'
@@ -912,6 +938,22 @@ class ScreenshotViewSet(viewsets.ModelViewSet):
         executions = TestExecution.objects.filter(project__in=accessible_projects)
         return Screenshot.objects.filter(execution__in=executions)
 
+    @action(detail=False, methods=['get'], url_path=r'thumbnails/(?P<ref>[0-9a-f]{64})', url_name='thumbnail',
+            permission_classes=[AllowAny], authentication_classes=[])
+    def thumbnail(self, request, ref=None):
+        """执行截图的缩略图，第一次访问时生成
+
+        与 MEDIA_URL 下的截图原图一样不需要登录，引用是截图内容的 sha256，无法被枚举。
+        """
+        from django.http import FileResponse, Http404
+
+        path = get_thumbnail(ref)
+        if path is None:
+            raise Http404('截图不存在')
+        response = FileResponse(open(path, 'rb'), content_type='image/webp')
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
 
 class TestCaseViewSet(viewsets.ModelViewSet):
     """测试用例视图集"""
@@ -1454,6 +1496,7 @@ class TestCaseViewSet(viewsets.ModelViewSet):
                                     execution_logs.append(f"  (此步骤不需要元素)")
 
                                 try:
+                                    step_timer = StepTimer(instrumented=False)
                                     success, step_log, screenshot_base64 = engine.execute_step(step, element_data or {})
                                     execution_logs.append(f"  {step_log}")
                                     execution_logs.append("")
@@ -1463,8 +1506,10 @@ class TestCaseViewSet(viewsets.ModelViewSet):
                                         'step_number': i,
                                         'action_type': action_type,
                                         'description': description or '',
+                                        'element_id': step.element_id,
                                         'success': success,
-                                        'error': None if success else step_log
+                                        'error': None if success else step_log,
+                                        'timing': step_timer.breakdown(action_type)
                                     })
 
                                     if not success:
@@ -1639,6 +1684,7 @@ class TestCaseViewSet(viewsets.ModelViewSet):
                                     # 执行步骤
                                     try:
                                         execution_logs.append(f"  [调试] 准备执行步骤...")
+                                        step_timer = StepTimer(instrumented=False)
                                         success, step_log, screenshot_base64 = await engine.execute_step(step, element_data or {})
                                         execution_logs.append(f"  [调试] 步骤执行完成, success={success}")
 
@@ -1650,8 +1696,10 @@ class TestCaseViewSet(viewsets.ModelViewSet):
                                             'step_number': i,
                                             'action_type': action_type,
                                             'description': description or '',
+                                            'element_id': step.element_id,
                                             'success': success,
-                                            'error': None if success else step_log
+                                            'error': None if success else step_log,
+                                            'timing': step_timer.breakdown(action_type)
                                         })
 
                                         # 如果步骤失败,保存截图
@@ -1802,9 +1850,12 @@ class TestCaseViewSet(viewsets.ModelViewSet):
             execution.execution_logs = json.dumps(step_results, ensure_ascii=False)
             execution.execution_time = total_time
             execution.finished_at = timezone.now()
+            # 截图转存为文件，执行记录中只保存引用
+            screenshots = externalize_screenshots(screenshots)
             execution.screenshots = screenshots
             execution.save()
             logger.info(f"[调试] 执行结果已保存: execution.status = {execution.status}")
+            record_execution_timings(execution, step_results)
 
             serializer = TestCaseExecutionSerializer(execution)
             # 格式化错误信息为统一的对象格式
@@ -1850,35 +1901,66 @@ class TestCaseViewSet(viewsets.ModelViewSet):
                 'errors': [{'message': str(e), 'stack': traceback.format_exc()}]
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], url_path='batch-run')
     def batch_run(self, request):
-        """批量运行测试用例"""
+        """批量运行测试用例：提交到UI执行池后立即返回批次ID，通过 batch-run/<批次ID>/ 查询进度"""
+        import queue
+        from .batch_runner import batch_snapshot, submit_batch
+
         test_case_ids = request.data.get('test_case_ids', [])
         project_id = request.data.get('project_id')
 
         if not test_case_ids:
             return Response({'error': '请选择要运行的测试用例'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(test_case_ids, list):
+            return Response({'error': 'test_case_ids 必须是整数列表'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            test_case_ids = [int(test_case_id) for test_case_id in test_case_ids]
+            project_id = int(project_id) if project_id not in (None, '') else None
+        except (TypeError, ValueError):
+            return Response({'error': 'test_case_ids、project_id 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
 
-        results = []
-        for test_case_id in test_case_ids:
-            try:
-                test_case = TestCase.objects.get(id=test_case_id)
-                # 这里调用单个运行逻辑
-                # 简化处理，实际应该异步执行
-                results.append({
-                    'test_case_id': test_case_id,
-                    'test_case_name': test_case.name,
-                    'status': 'passed'
-                })
-            except TestCase.DoesNotExist:
-                results.append({
-                    'test_case_id': test_case_id,
-                    'test_case_name': '未知',
-                    'status': 'error',
-                    'error': '测试用例不存在'
-                })
+        test_cases = self.get_queryset().filter(id__in=test_case_ids)
+        if project_id:
+            test_cases = test_cases.filter(project_id=project_id)
+        # 按提交的顺序执行，重复的ID只执行一次
+        found = {test_case.id: test_case for test_case in test_cases}
+        ordered = [found.pop(test_case_id) for test_case_id in test_case_ids if test_case_id in found]
+        executed_ids = {test_case.id for test_case in ordered}
+        missing_ids = [test_case_id for test_case_id in test_case_ids if test_case_id not in executed_ids]
+
+        if not ordered:
+            return Response({'error': '测试用例不存在'}, status=status.HTTP_404_NOT_FOUND)
+        if len({test_case.project_id for test_case in ordered}) > 1:
+            return Response({'error': '批量运行的测试用例必须属于同一个项目'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            batch = submit_batch(
+                project=ordered[0].project,
+                test_cases=ordered,
+                engine=request.data.get('engine', 'playwright'),
+                browser=request.data.get('browser', 'chrome'),
+                headless=request.data.get('headless', False),
+                executed_by=request.user
+            )
+        except queue.Full as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-        return Response({'results': results})
+        data = batch_snapshot(batch.record)
+        data['missing_ids'] = missing_ids
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'batch-run/(?P<batch_id>[0-9a-f]{32})', url_name='batch-run-status')
+    def batch_run_status(self, request, batch_id=None):
+        """查询批量运行的进度和汇总结果"""
+        from .batch_runner import batch_snapshot
+        from .models import UiCaseBatch
+
+        projects = UiProject.objects.filter(models.Q(owner=request.user) | models.Q(members=request.user))
+        record = UiCaseBatch.objects.filter(batch_id=batch_id, project__in=projects).first()
+        if record is None:
+            return Response({'error': '批量执行不存在'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(batch_snapshot(record))
 
     def perform_destroy(self, instance):
         # 记录操作（在删除前记录）
@@ -1905,6 +1987,23 @@ class TestCaseStepViewSet(viewsets.ModelViewSet):
         accessible_test_cases = TestCase.objects.filter(project__in=accessible_projects)
         return TestCaseStep.objects.filter(test_case__in=accessible_projects)
 
+    def _touch_test_case(self, test_case_id):
+        # 步骤没有更新时间，修改步骤时更新所属用例的 updated_at，使套件执行计划重新编译
+        TestCase.objects.filter(id=test_case_id).update(updated_at=timezone.now())
+
+    def perform_create(self, serializer):
+        step = serializer.save()
+        self._touch_test_case(step.test_case_id)
+
+    def perform_update(self, serializer):
+        step = serializer.save()
+        self._touch_test_case(step.test_case_id)
+
+    def perform_destroy(self, instance):
+        test_case_id = instance.test_case_id
+        instance.delete()
+        self._touch_test_case(test_case_id)
+
 
 class TestCaseExecutionViewSet(viewsets.ModelViewSet):
     """测试用例执行记录视图集"""
@@ -1926,11 +2025,20 @@ class TestCaseExecutionViewSet(viewsets.ModelViewSet):
         accessible_projects = UiProject.objects.filter(
             models.Q(owner=user) | models.Q(members=user)
         ).distinct()
-        return TestCaseExecution.objects.filter(
+        queryset = TestCaseExecution.objects.filter(
             project__in=accessible_projects
         ).select_related(
             'test_case', 'project', 'test_suite', 'created_by'
         )
+        if self.action == 'list':
+            # 列表不返回执行日志，避免读取大字段
+            queryset = queryset.defer('execution_logs')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return TestCaseExecutionListSerializer
+        return TestCaseExecutionSerializer
 
     def perform_destroy(self, instance):
         # 记录操作
@@ -1948,9 +2056,34 @@ class TestCaseExecutionViewSet(viewsets.ModelViewSet):
         # 确保只能删除有权限的记录
         queryset = self.get_queryset()
         deleted_count, _ = queryset.filter(id__in=ids).delete()
-        
+
         return Response({'message': f'成功删除 {deleted_count} 条记录'})
 
+    @action(detail=False, methods=['get'], url_path='slowest-steps')
+    def slowest_steps(self, request):
+        """项目最近一段时间平均耗时最长的元素、步骤和操作类型（含定位/等待/操作/断言/截图各阶段平均耗时）"""
+        from .step_timings import slowest_steps
+
+        project_id = request.query_params.get('project')
+        if not project_id:
+            return Response({'error': '需要指定项目ID'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            project_id = int(project_id)
+            days = int(request.query_params.get('days', 30))
+            limit = int(request.query_params.get('limit', 20))
+        except (TypeError, ValueError):
+            return Response({'error': 'project、days、limit 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        if days < 1 or limit < 1:
+            return Response({'error': 'days、limit 必须是正整数'}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        if not UiProject.objects.filter(
+            models.Q(owner=user) | models.Q(members=user), id=project_id
+        ).exists():
+            return Response({'error': '项目不存在或无权访问'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(slowest_steps(project_id, days=days, limit=min(limit, 100)))
+
 
 
 
@@ -2037,7 +2170,13 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def run_now(self, request, pk=None):
         """立即运行任务"""
+        import queue
+        from apps.core.workers import get_worker_pool
+
         task = self.get_object()
+        # 浏览器执行池队列已满时撤销本次运行对任务的修改
+        previous_run = (task.last_run_time, task.total_runs, task.next_run_time)
+        pool = get_worker_pool('ui')
 
         try:
             # 更新任务执行时间和次数
@@ -2064,11 +2203,11 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
                     }, status=status.HTTP_400_BAD_REQUEST)
 
                 # 更新套件执行状态
+                previous_suite_status = test_suite.execution_status
                 test_suite.execution_status = 'running'
                 test_suite.save()
 
-                # 在后台线程中执行测试
-                import threading
+                # 在执行池中执行测试
                 from .test_executor import TestExecutor
 
                 def run_test():
@@ -2102,10 +2241,13 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
                         # 发送失败通知
                         self._send_task_notification(task, success=False)
 
-                # 启动后台线程执行测试
-                thread = threading.Thread(target=run_test)
-                thread.daemon = True
-                thread.start()
+                # 在执行池中执行测试
+                try:
+                    pool.submit(run_test)
+                except queue.Full as e:
+                    test_suite.execution_status = previous_suite_status
+                    test_suite.save()
+                    return self._queue_full_response(task, previous_run, e)
 
                 log_operation('run', 'scheduled_task', task.id, task.name, request.user)
 
@@ -2136,9 +2278,7 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
                         'error': '找不到配置的测试用例'
                     }, status=status.HTTP_400_BAD_REQUEST)
 
-                # 在后台线程中执行测试用例
-                import threading
-
+                # 在执行池中执行测试用例
                 def run_test_cases():
                     """在后台线程中执行测试用例"""
                     success_count = 0
@@ -2244,14 +2384,17 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
                                             action_type = step_info['action_type']
                                             element_data = step_info['element_data']
 
+                                            step_timer = StepTimer(instrumented=False)
                                             success, step_log, screenshot_base64 = engine.execute_step(step, element_data or {})
 
                                             step_results.append({
                                                 'step_number': i,
                                                 'action_type': action_type,
                                                 'description': step_info['description'] or '',
+                                                'element_id': step.element_id,
                                                 'success': success,
-                                                'error': None if success else step_log
+                                                'error': None if success else step_log,
+                                                'timing': step_timer.breakdown(action_type)
                                             })
 
                                             if not success:
@@ -2320,14 +2463,17 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
                                                 action_type = step_info['action_type']
                                                 element_data = step_info['element_data']
 
+                                                step_timer = StepTimer(instrumented=False)
                                                 success, step_log, screenshot_base64 = await engine.execute_step(step, element_data or {})
 
                                                 step_results.append({
                                                     'step_number': i,
                                                     'action_type': action_type,
                                                     'description': step_info['description'] or '',
+                                                    'element_id': step.element_id,
                                                     'success': success,
-                                                    'error': None if success else step_log
+                                                    'error': None if success else step_log,
+                                                    'timing': step_timer.breakdown(action_type)
                                                 })
 
                                                 if not success:
@@ -2376,9 +2522,10 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
                                 execution.error_message = execution_result['error_message'] or ''
                                 execution.execution_logs = json.dumps(step_results, ensure_ascii=False)
                                 execution.execution_time = total_time
-                                execution.screenshots = screenshots
+                                execution.screenshots = externalize_screenshots(screenshots)
                                 execution.finished_at = timezone.now()
                                 execution.save()
+                                record_execution_timings(execution, step_results)
 
                                 if execution.status == 'passed':
                                     success_count += 1
@@ -2433,10 +2580,11 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
                         # 发送失败通知
                         self._send_task_notification(task, success=False)
 
-                # 启动后台线程执行测试
-                thread = threading.Thread(target=run_test_cases)
-                thread.daemon = True
-                thread.start()
+                # 在执行池中执行测试
+                try:
+                    pool.submit(run_test_cases)
+                except queue.Full as e:
+                    return self._queue_full_response(task, previous_run, e)
 
                 log_operation('run', 'scheduled_task', task.id, task.name, request.user)
 
@@ -2461,6 +2609,14 @@ class UiScheduledTaskViewSet(viewsets.ModelViewSet):
                 'error': f'执行失败: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _queue_full_response(self, task, previous_run, error):
+        """浏览器执行池队列已满: 恢复任务的上次运行时间、运行次数和下次运行时间，返回 503"""
+        task.last_run_time, task.total_runs, task.next_run_time = previous_run
+        task.save(update_fields=['last_run_time', 'total_runs', 'next_run_time'])
+        return Response({
+            'error': f'UI自动化{error}，请稍后重试'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
     def _send_task_notification(self, task, success):
         """发送任务执行通知"""
         try:
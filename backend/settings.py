@@ -261,6 +261,88 @@ SPECTACULAR_SETTINGS = {
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://:1234@127.0.0.1:6379/0')
 CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://:1234@127.0.0.1:6379/0')
 
+# API测试套件执行配置
+# 套件并发执行时允许的最大并发数（套件配置或请求参数超过该值时会被截断）
+API_TESTING_SUITE_MAX_CONCURRENCY = config('API_TESTING_SUITE_MAX_CONCURRENCY', default=16, cast=int)
+# 默认传输方式: sync(每次新建连接) / pooled(共享连接池) / async(httpx异步并发)
+API_TESTING_DEFAULT_TRANSPORT = config('API_TESTING_DEFAULT_TRANSPORT', default='pooled')
+# 开启后记录每个请求在准备、发送、断言、保存各阶段的耗时
+API_TESTING_PROFILE = config('API_TESTING_PROFILE', default=False, cast=bool)
+# 套件执行时请求历史批量写入的条数
+API_TESTING_HISTORY_FLUSH_SIZE = config('API_TESTING_HISTORY_FLUSH_SIZE', default=50, cast=int)
+# 请求历史中直接保存的响应体大小上限（字节），超过时只保存预览
+API_TESTING_HISTORY_INLINE_BODY_LIMIT = config('API_TESTING_HISTORY_INLINE_BODY_LIMIT', default=64 * 1024, cast=int)
+# 超过上限时保存的预览长度（字符）
+API_TESTING_HISTORY_BODY_PREVIEW = config('API_TESTING_HISTORY_BODY_PREVIEW', default=4096, cast=int)
+# 是否把超过上限的完整响应体压缩后保存到 MEDIA_ROOT/API_TESTING_HISTORY_BODY_DIR（按内容哈希去重）
+API_TESTING_HISTORY_BODY_STORE = config('API_TESTING_HISTORY_BODY_STORE', default=True, cast=bool)
+API_TESTING_HISTORY_BODY_DIR = 'request_history_bodies'
+
+# 执行历史数据保留策略，由 cleanup_execution_history 命令或调度器的 --retention-interval 执行
+# days: 保留天数，max_rows: 最大保留行数，超出的记录归档到 HISTORY_ARCHIVE_DIR 后删除
+HISTORY_RETENTION = {
+    'request_history': {'days': 30, 'max_rows': 200000},
+    'task_execution_log': {'days': 90, 'max_rows': 100000},
+    'notification_log': {'days': 90, 'max_rows': 100000},
+    'operation_log': {'days': 180, 'max_rows': 200000},
+    'ui_case_execution': {'days': 90, 'max_rows': 100000},
+    'test_run_case_history': {'days': 365},
+}
+HISTORY_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archives')
+HISTORY_RETENTION_BATCH_SIZE = config('HISTORY_RETENTION_BATCH_SIZE', default=1000, cast=int)
+
+# UI自动化: Playwright 浏览器复用多少个用例后回收重启（0 表示不限制），防止长时间运行的浏览器内存增长
+UI_AUTOMATION_BROWSER_MAX_USES = config('UI_AUTOMATION_BROWSER_MAX_USES', default=50, cast=int)
+# UI自动化: Selenium 会话复用多少个用例后关闭重建（0 表示不限制），以及每种浏览器最多保留的空闲会话数
+UI_AUTOMATION_SELENIUM_MAX_USES = config('UI_AUTOMATION_SELENIUM_MAX_USES', default=20, cast=int)
+UI_AUTOMATION_SELENIUM_MAX_IDLE = config('UI_AUTOMATION_SELENIUM_MAX_IDLE', default=2, cast=int)
+# UI自动化: 执行截图保存到 MEDIA_ROOT/UI_AUTOMATION_SCREENSHOT_DIR（按内容哈希去重），执行记录中只保存引用
+UI_AUTOMATION_SCREENSHOT_DIR = 'ui_step_screenshots'
+# 截图格式 webp/png/jpeg 及压缩质量（png 无损，忽略质量）
+UI_AUTOMATION_SCREENSHOT_FORMAT = config('UI_AUTOMATION_SCREENSHOT_FORMAT', default='webp')
+UI_AUTOMATION_SCREENSHOT_QUALITY = config('UI_AUTOMATION_SCREENSHOT_QUALITY', default=80, cast=int)
+# 截图最大宽度（像素），超过时等比缩小，0 表示保持原始尺寸
+UI_AUTOMATION_SCREENSHOT_MAX_WIDTH = config('UI_AUTOMATION_SCREENSHOT_MAX_WIDTH', default=0, cast=int)
+# 缩略图宽度（像素），列表界面使用，第一次访问时生成
+UI_AUTOMATION_SCREENSHOT_THUMBNAIL_WIDTH = config('UI_AUTOMATION_SCREENSHOT_THUMBNAIL_WIDTH', default=320, cast=int)
+# UI自动化: 测试套件默认的并行分片数，每个分片使用独立的浏览器（1 表示串行执行，执行时可通过 workers 参数覆盖）
+UI_AUTOMATION_SUITE_WORKERS = config('UI_AUTOMATION_SUITE_WORKERS', default=1, cast=int)
+# UI自动化: 执行时通过 workers 参数指定的分片数上限，分片在 UI 执行池（SCHEDULER_WORKER_POOLS['ui']）中执行
+UI_AUTOMATION_SUITE_MAX_WORKERS = config('UI_AUTOMATION_SUITE_MAX_WORKERS', default=4, cast=int)
+# UI自动化: 用例执行状态后台批量写入数据库的间隔（秒），用例结束时会立即唤醒写入
+UI_AUTOMATION_CASE_FLUSH_INTERVAL = config('UI_AUTOMATION_CASE_FLUSH_INTERVAL', default=1.0, cast=float)
+
+# AI用例生成: 大模型 API 共享连接池，每个模型配置的最大连接数、保持的空闲连接数和空闲连接保持时间（秒）
+AI_HTTP_MAX_CONNECTIONS = config('AI_HTTP_MAX_CONNECTIONS', default=20, cast=int)
+AI_HTTP_MAX_KEEPALIVE = config('AI_HTTP_MAX_KEEPALIVE', default=10, cast=int)
+AI_HTTP_KEEPALIVE_EXPIRY = config('AI_HTTP_KEEPALIVE_EXPIRY', default=60.0, cast=float)
+# 是否使用 HTTP/2（需要安装 h2: pip install httpx[http2]，未安装时使用 HTTP/1.1）
+AI_HTTP_HTTP2 = config('AI_HTTP_HTTP2', default=False, cast=bool)
+# AI用例生成: 需求文档超过 AI_SECTION_SPLIT_CHARS 个字符时按章节分块并发生成，每块最多 AI_SECTION_MAX_CHARS 个字符，
+# 同时最多 AI_SECTION_CONCURRENCY 个请求；AI_PROVIDER_RPM 为每个模型配置每分钟最多发起的分块请求数（0 表示不限制）
+AI_SECTION_SPLIT_CHARS = config('AI_SECTION_SPLIT_CHARS', default=12000, cast=int)
+AI_SECTION_MAX_CHARS = config('AI_SECTION_MAX_CHARS', default=6000, cast=int)
+AI_SECTION_CONCURRENCY = config('AI_SECTION_CONCURRENCY', default=3, cast=int)
+AI_PROVIDER_RPM = config('AI_PROVIDER_RPM', default=30, cast=int)
+# AI用例生成: 大模型响应缓存（默认关闭），相同模型参数和消息的确定性调用（temperature 为 0）直接返回缓存的响应；
+# 缓存过期时间（秒）、最多缓存条数和缓存内容总字符数
+AI_RESPONSE_CACHE_ENABLED = config('AI_RESPONSE_CACHE_ENABLED', default=False, cast=bool)
+AI_RESPONSE_CACHE_TTL = config('AI_RESPONSE_CACHE_TTL', default=86400, cast=int)
+AI_RESPONSE_CACHE_SIZE = config('AI_RESPONSE_CACHE_SIZE', default=256, cast=int)
+AI_RESPONSE_CACHE_MAX_CHARS = config('AI_RESPONSE_CACHE_MAX_CHARS', default=10000000, cast=int)
+
+# 定时任务执行池: 每种任务类型的工作线程数（同时执行的任务数）和最大排队数，队列满时跳过本次触发
+SCHEDULER_WORKER_POOLS = {
+    'api': {
+        'workers': config('SCHEDULER_API_WORKERS', default=4, cast=int),
+        'max_queue': config('SCHEDULER_API_MAX_QUEUE', default=100, cast=int),
+    },
+    'ui': {
+        'workers': config('SCHEDULER_UI_WORKERS', default=2, cast=int),
+        'max_queue': config('SCHEDULER_UI_MAX_QUEUE', default=20, cast=int),
+    },
+}
+
 # Email Configuration
 EMAIL_BACKEND = 'apps.api_testing.custom_email_backend.CustomEmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -140,6 +140,14 @@ export function getRequestHistory(params) {
   })
 }
 
+// 获取请求历史的完整响应体
+export function getRequestHistoryBody(id) {
+  return request({
+    url: `/api-testing/histories/${id}/body/`,
+    method: 'get'
+  })
+}
+
 // 删除请求历史
 export function deleteRequestHistory(id) {
   return request({
@@ -719,6 +719,14 @@ export function getTestCaseExecutions(params) {
   })
 }
 
+// 获取测试用例执行记录详情（包含执行日志和截图）
+export function getTestCaseExecution(id) {
+  return request({
+    url: `/ui-automation/test-case-executions/${id}/`,
+    method: 'get'
+  })
+}
+
 // 删除测试用例执行记录
 export function deleteTestCaseExecution(id) {
   return request({
@@ -736,6 +744,15 @@ export function batchDeleteTestCaseExecutions(ids) {
   })
 }
 
+// 获取项目耗时最长的元素、步骤和操作类型
+export function getSlowestSteps(params) {
+  return request({
+    url: '/ui-automation/test-case-executions/slowest-steps/',
+    method: 'get',
+    params
+  })
+}
+
 // 批量运行测试用例
 export function batchRunTestCases(data) {
   return request({
@@ -745,6 +762,14 @@ export function batchRunTestCases(data) {
   })
 }
 
+// 查询批量运行的进度和结果
+export function getBatchRunStatus(batchId) {
+  return request({
+    url: `/ui-automation/test-cases/batch-run/${batchId}/`,
+    method: 'get'
+  })
+}
+
 // 操作记录相关API
 
 // 获取操作记录列表